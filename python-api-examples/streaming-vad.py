@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Copyright (c)  2025  Xiaomi Corporation
+
+"""
+This file shows how to run VAD on audio that arrives incrementally,
+e.g., from a microphone or from a file that is too large to fit in memory.
+
+Please download VAD models from
+https://github.com/k2-fsa/sherpa/releases/tag/vad-models
+
+E.g.,
+wget \
+  https://github.com/k2-fsa/sherpa/releases/download/vad-models/silero-vad-v4.pt
+"""
+
+import soundfile as sf
+import torch
+
+import sherpa
+
+
+def create_vad():
+    config = sherpa.VoiceActivityDetectorConfig(
+        model=sherpa.VadModelConfig(
+            silero_vad=sherpa.SileroVadModelConfig(
+                model="./silero-vad-v4.pt",
+                threshold=0.5,
+                min_speech_duration=0.25,
+                min_silence_duration=0.5,
+            ),
+            sample_rate=16000,
+        ),
+    )
+    return sherpa.VoiceActivityDetector(config)
+
+
+def main():
+    vad = create_vad()
+    stream = vad.create_stream()
+
+    test_wave_file = "./lei-jun-test.wav"
+
+    # The file must be 16 kHz. We read 0.1 second at a time
+    for block in sf.blocks(test_wave_file, blocksize=1600, dtype="float32"):
+        if block.ndim == 2:
+            block = block[:, 0].copy()
+        stream.accept_waveform(torch.from_numpy(block))
+        vad.process_stream(stream)
+
+        while not stream.empty():
+            s = stream.pop_segment()
+            print(f"{s.start:.3f} -- {s.end:.3f}")
+
+    stream.flush()
+    vad.process_stream(stream)
+    while not stream.empty():
+        s = stream.pop_segment()
+        print(f"{s.start:.3f} -- {s.end:.3f}")
+
+
+if __name__ == "__main__":
+    main()
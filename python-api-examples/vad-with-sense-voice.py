@@ -81,16 +81,16 @@ def main():
         samples = librosa.resample(samples, orig_sr=sample_rate, target_sr=16000)
         sample_rate = 16000
 
-    segments = vad.process(torch.from_numpy(samples))
+    # Speech segments are decoded in batches
+    pipeline = sherpa.VadAsrPipeline(
+        config=sherpa.VadAsrPipelineConfig(max_batch_size=16),
+        vad=vad,
+        recognizer=recognizer,
+    )
+
+    segments = pipeline.process(torch.from_numpy(samples))
     for s in segments:
-        start_sample = int(s.start * sample_rate)
-        end_sample = int(s.end * sample_rate)
-        stream = recognizer.create_stream()
-        stream.accept_waveform(samples[start_sample:end_sample])
-        recognizer.decode_stream(stream)
-        text = stream.result.text
-
-        print(f"{s.start:.3f} -- {s.end:.3f} {text}")
+        print(f"{s.start:.3f} -- {s.end:.3f} {s.text}")
 
 
 if __name__ == "__main__":
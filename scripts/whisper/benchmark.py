@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Copyright    2025  Xiaomi Corp.
+
+"""
+Compare the throughput of decoding whisper models stream by stream
+with decoding a batch of streams.
+
+Usage:
+
+  ./benchmark.py \
+    --model ./model.pt \
+    --tokens ./tokens.txt \
+    --batch-size 16 \
+    ./0.wav ./1.wav
+
+The given wave files are repeated to fill a batch.
+"""
+
+import argparse
+import time
+from typing import List
+
+import torch
+
+import sherpa
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument("--model", type=str, required=True)
+    parser.add_argument("--tokens", type=str, required=True)
+    parser.add_argument("--language", type=str, default="")
+    parser.add_argument("--use-gpu", type=sherpa.str2bool, default=False)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument(
+        "--num-iters",
+        type=int,
+        default=3,
+        help="Number of runs for each method. The first run is not counted.",
+    )
+    parser.add_argument("sound_files", type=str, nargs="+")
+
+    return parser.parse_args()
+
+
+def create_streams(
+    recognizer: sherpa.OfflineRecognizer, filenames: List[str], batch_size: int
+) -> List[sherpa.OfflineStream]:
+    streams = []
+    for i in range(batch_size):
+        s = recognizer.create_stream()
+        s.accept_wave_file(filenames[i % len(filenames)])
+        streams.append(s)
+    return streams
+
+
+def sync(use_gpu: bool):
+    if use_gpu:
+        torch.cuda.synchronize()
+
+
+def benchmark(recognizer, args, batched: bool) -> float:
+    elapsed = []
+    for _ in range(args.num_iters):
+        streams = create_streams(recognizer, args.sound_files, args.batch_size)
+        sync(args.use_gpu)
+
+        start = time.time()
+        if batched:
+            recognizer.decode_streams(streams)
+        else:
+            for s in streams:
+                recognizer.decode_stream(s)
+        sync(args.use_gpu)
+        elapsed.append(time.time() - start)
+
+    # The first run is for warm up
+    return min(elapsed[1:]) if len(elapsed) > 1 else elapsed[0]
+
+
+def main():
+    args = get_args()
+
+    config = sherpa.OfflineRecognizerConfig(
+        model=sherpa.OfflineModelConfig(
+            whisper=sherpa.OfflineWhisperModelConfig(
+                model=args.model,
+                language=args.language,
+            ),
+            tokens=args.tokens,
+            use_gpu=args.use_gpu,
+        ),
+    )
+    recognizer = sherpa.OfflineRecognizer(config)
+
+    per_stream = benchmark(recognizer, args, batched=False)
+    batched = benchmark(recognizer, args, batched=True)
+
+    n = args.batch_size
+    print(f"batch size: {n}")
+    print(
+        f"per stream: {per_stream:.3f} s, {n / per_stream:.3f} utterances/s"
+    )
+    print(f"batched:    {batched:.3f} s, {n / batched:.3f} utterances/s")
+    print(f"speedup:    {per_stream / batched:.3f}")
+
+
+if __name__ == "__main__":
+    main()
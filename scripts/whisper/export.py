@@ -363,7 +363,7 @@ def MultiHeadAttentionForwardEncoder(self, x: torch.Tensor) -> torch.Tensor:
 
 @torch.jit.export
 def ResidualAttentionBlockForwardEncoder(self, x: torch.Tensor) -> torch.Tensor:
-    x = x + self.attn.forward_encoder(self.attn_ln(x))[0]
+    x = x + self.attn.forward_encoder(self.attn_ln(x))
     x = x + self.mlp(self.mlp_ln(x))
     return x
 
@@ -573,7 +573,9 @@ def main():
     meta_data = {
         "model_type": "whisper",
         "comment": f"whisper-{args.model}",
-        "version": "1",
+        # version 2: fix batched encoding. Version 1 used only the
+        # first utterance of a batch in the encoder.
+        "version": "2",
         "maintainer": "k2-fsa",
         "n_mels": str(model.dims.n_mels),
         "n_audio_ctx": str(model.dims.n_audio_ctx),
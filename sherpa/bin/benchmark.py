@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# Copyright      2023  Xiaomi Corp.
+
+"""
+A load generator for measuring the latency and throughput of the servers.
+
+It replays audio files against a running server with a given number of
+concurrent clients and prints a JSON report containing p50/p90/p99
+latencies, throughput and error rate.
+
+It depends only on websockets, so it can run on a machine
+without torch, icefall or lhotse.
+
+Usage:
+
+(1) Streaming server with 20 clients sending audio in real time
+
+    ./benchmark.py \
+      --server-addr localhost \
+      --server-port 6006 \
+      --mode streaming \
+      --concurrency 20 \
+      --ramp-up 10 \
+      --wav-dir /path/to/test_wavs
+
+(2) Offline server with a wav.scp, sending audio as fast as possible
+
+    ./benchmark.py \
+      --mode offline \
+      --concurrency 50 \
+      --num-requests 1000 \
+      --speed 0 \
+      --wav-scp /path/to/wav.scp
+
+(3) Synthetic audio, e.g., for a quick smoke test
+
+    ./benchmark.py --mode streaming --num-synthetic 10
+
+Only 16-bit PCM wave files are supported. They are sent to the server as
+s16le samples with their own sample rate. If a file has several channels,
+only the first one is used.
+
+Definitions of the reported metrics:
+
+  - first_partial_latency: Time from sending the first audio samples of a
+    request to receiving the first result with non-empty text.
+    Only for --mode streaming.
+  - final_latency: Time from sending the last audio samples of a request to
+    receiving its final result.
+  - throughput: Seconds of audio processed per second, i.e., the inverse of
+    the real time factor of the whole run.
+  - error_rate: Fraction of requests that failed, including those that are
+    refused by the server because it is overloaded.
+
+(Note: You have to first start the server before starting the client)
+"""
+
+import argparse
+import array
+import asyncio
+import http
+import json
+import logging
+import random
+import sys
+import time
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import websockets
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--server-addr",
+        type=str,
+        default="localhost",
+        help="Address of the server",
+    )
+
+    parser.add_argument(
+        "--server-port",
+        type=int,
+        default=6006,
+        help="Port of the server",
+    )
+
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default="streaming",
+        choices=["streaming", "offline"],
+        help="streaming: For ./streaming_server.py and "
+        "online-websocket-server. offline: For ./offline_transducer_server.py, "
+        "./offline_ctc_server.py and offline-websocket-server.",
+    )
+
+    parser.add_argument(
+        "--wav-dir",
+        type=str,
+        help="A directory containing *.wav files to send. "
+        "It is searched recursively.",
+    )
+
+    parser.add_argument(
+        "--wav-scp",
+        type=str,
+        help="A wav.scp file. Each line has the format 'utt_id /path/to.wav'",
+    )
+
+    parser.add_argument(
+        "--num-synthetic",
+        type=int,
+        default=0,
+        help="Number of synthetic audio files to generate. Used only if "
+        "neither --wav-dir nor --wav-scp is given.",
+    )
+
+    parser.add_argument(
+        "--synthetic-duration",
+        type=float,
+        default=5.0,
+        help="Duration in seconds of each synthetic audio file.",
+    )
+
+    parser.add_argument(
+        "--sample-rate",
+        type=int,
+        default=16000,
+        help="Sample rate of the synthetic audio.",
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Number of clients sending requests at the same time.",
+    )
+
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=0,
+        help="Clients are started evenly over this number of seconds, "
+        "so that the server is not hit by all of them at once.",
+    )
+
+    parser.add_argument(
+        "--num-requests",
+        type=int,
+        default=0,
+        help="Total number of requests. The audio files are reused if it is "
+        "larger than the number of files. 0 means to send each file once.",
+    )
+
+    parser.add_argument(
+        "--chunk-ms",
+        type=int,
+        default=100,
+        help="Duration in ms of the audio in each message "
+        "for --mode streaming.",
+    )
+
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="How fast the audio is sent for --mode streaming. 1 means in "
+        "real time, 2 means twice as fast. 0 means as fast as possible.",
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="A request fails if it does not get its final result within "
+        "this number of seconds after sending all of its audio.",
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="If given, the JSON report is also written to this file.",
+    )
+
+    return parser.parse_args()
+
+
+@dataclass
+class Audio:
+    name: str
+
+    # 16-bit samples in little endian, i.e., s16le
+    samples: bytes
+    sample_rate: int
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / 2 / self.sample_rate
+
+
+@dataclass
+class RequestStats:
+    name: str
+    duration: float
+    first_partial_latency: Optional[float] = None
+    final_latency: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class Report:
+    requests: List[RequestStats] = field(default_factory=list)
+    elapsed: float = 0
+
+    def as_dict(self) -> Dict:
+        ok = [r for r in self.requests if r.error is None]
+        errors: Dict[str, int] = {}
+        for r in self.requests:
+            if r.error is not None:
+                errors[r.error] = errors.get(r.error, 0) + 1
+
+        audio_duration = sum(r.duration for r in ok)
+        num_requests = len(self.requests)
+        return {
+            "num_requests": num_requests,
+            "num_errors": num_requests - len(ok),
+            "error_rate": round(1 - len(ok) / max(num_requests, 1), 4),
+            "errors": errors,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "audio_seconds": round(audio_duration, 3),
+            "throughput": round(audio_duration / max(self.elapsed, 1e-6), 3),
+            "requests_per_second": round(len(ok) / max(self.elapsed, 1e-6), 3),
+            "first_partial_latency": summarize(
+                [r.first_partial_latency for r in ok]
+            ),
+            "final_latency": summarize([r.final_latency for r in ok]),
+        }
+
+
+def summarize(values: List[Optional[float]]) -> Dict[str, float]:
+    """Return the count, mean and percentiles of the given latencies in
+    seconds. None values are ignored."""
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"count": 0}
+
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p90": round(percentile(values, 90), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Return the q-th percentile with linear interpolation, the same as
+    numpy.percentile()."""
+    pos = (len(sorted_values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    frac = pos - lower
+    return sorted_values[lower] * (1 - frac) + sorted_values[upper] * frac
+
+
+def read_wave(filename: str) -> Audio:
+    """Read a 16-bit PCM wave file. Only the first channel is kept."""
+    with wave.open(filename) as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(
+                f"{filename}: Only 16-bit PCM wave files are supported. "
+                f"Given sample width {f.getsampwidth()}"
+            )
+        num_channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        data = f.readframes(f.getnframes())
+
+    if num_channels > 1:
+        samples = array.array("h", data)[::num_channels]
+        if sys.byteorder == "big":
+            samples.byteswap()
+        data = samples.tobytes()
+
+    return Audio(name=filename, samples=data, sample_rate=sample_rate)
+
+
+def load_audios(args) -> List[Audio]:
+    if args.wav_scp:
+        filenames = []
+        with open(args.wav_scp) as f:
+            for line in f:
+                fields = line.strip().split(maxsplit=1)
+                if len(fields) == 2:
+                    filenames.append(fields[1])
+        return [read_wave(f) for f in filenames]
+
+    if args.wav_dir:
+        filenames = sorted(Path(args.wav_dir).rglob("*.wav"))
+        return [read_wave(str(f)) for f in filenames]
+
+    # Low level noise so that the server has to run the whole model
+    num_samples = int(args.synthetic_duration * args.sample_rate)
+    rng = random.Random(0)
+    ans = []
+    for i in range(args.num_synthetic):
+        samples = array.array(
+            "h", [int(rng.gauss(0, 300)) for _ in range(num_samples)]
+        )
+        if sys.byteorder == "big":
+            samples.byteswap()
+        ans.append(
+            Audio(
+                name=f"synthetic-{i}",
+                samples=samples.tobytes(),
+                sample_rate=args.sample_rate,
+            )
+        )
+    return ans
+
+
+def audio_format(audio: Audio) -> str:
+    """The message declaring the format of the samples we send."""
+    return json.dumps(
+        {"sample_rate": audio.sample_rate, "sample_format": "s16le"}
+    )
+
+
+async def run_streaming(
+    socket: websockets.WebSocketClientProtocol,
+    audio: Audio,
+    stats: RequestStats,
+    chunk_ms: int,
+    speed: float,
+    timeout: float,
+):
+    async def receive():
+        async for message in socket:
+            result = json.loads(message)
+            now = time.perf_counter()
+            if stats.first_partial_latency is None and result["text"]:
+                stats.first_partial_latency = now - start
+
+            # Note: The server also sets final to True at an endpoint
+            if result["final"] and done_time is not None:
+                stats.final_latency = now - done_time
+                return
+        raise ConnectionError("closed without a final result")
+
+    done_time = None
+    start = time.perf_counter()
+    receive_task = asyncio.create_task(receive())
+
+    await socket.send(audio_format(audio))
+
+    # in bytes
+    chunk_size = audio.sample_rate * chunk_ms // 1000 * 2
+    for i, offset in enumerate(range(0, len(audio.samples), chunk_size)):
+        if receive_task.done():
+            # The server closed the connection
+            break
+
+        end = offset + chunk_size
+        await socket.send(audio.samples[offset:end])
+        if speed > 0:
+            # Sleep until the time this chunk would be recorded so that
+            # the time spent in send() does not slow down the client
+            next_time = start + (i + 1) * chunk_ms / 1000 / speed
+            await asyncio.sleep(max(0, next_time - time.perf_counter()))
+
+    await socket.send("Done")
+    done_time = time.perf_counter()
+
+    await asyncio.wait_for(receive_task, timeout=timeout)
+
+
+async def run_offline(
+    socket: websockets.WebSocketClientProtocol,
+    audio: Audio,
+    stats: RequestStats,
+    timeout: float,
+):
+    await socket.send(audio_format(audio))
+
+    data = audio.samples
+    await socket.send(len(data).to_bytes(4, "little", signed=True))
+
+    frame_size = 2 ** 20  # max payload is 1MB
+    for start in range(0, len(data), frame_size):
+        end = start + frame_size
+        await socket.send(data[start:end])
+
+    done_time = time.perf_counter()
+    await asyncio.wait_for(socket.recv(), timeout=timeout)
+    stats.final_latency = time.perf_counter() - done_time
+
+    await socket.send("Done")
+
+
+async def run_request(args, audio: Audio) -> RequestStats:
+    stats = RequestStats(name=audio.name, duration=audio.duration)
+    try:
+        async with websockets.connect(
+            f"ws://{args.server_addr}:{args.server_port}",
+            max_size=None,
+        ) as socket:
+            if args.mode == "streaming":
+                await run_streaming(
+                    socket,
+                    audio,
+                    stats,
+                    chunk_ms=args.chunk_ms,
+                    speed=args.speed,
+                    timeout=args.timeout,
+                )
+            else:
+                await run_offline(socket, audio, stats, timeout=args.timeout)
+    except websockets.exceptions.InvalidStatusCode as e:
+        phrase = http.HTTPStatus(e.status_code).phrase
+        stats.error = f"HTTP {e.status_code} {phrase}"
+    except asyncio.TimeoutError:
+        stats.error = "timeout"
+    except Exception as e:
+        logging.warning(f"{audio.name}: {type(e).__name__}: {e}")
+        stats.error = type(e).__name__
+
+    return stats
+
+
+async def run_client(
+    args,
+    queue: "asyncio.Queue[Audio]",
+    report: Report,
+    delay: float,
+):
+    await asyncio.sleep(delay)
+    while not queue.empty():
+        audio = queue.get_nowait()
+        stats = await run_request(args, audio)
+        report.requests.append(stats)
+
+        num_requests = len(report.requests)
+        if num_requests % 10 == 0:
+            logging.info(f"Finished {num_requests} requests")
+
+
+def build_queue(audios: List[Audio], num_requests: int) -> asyncio.Queue:
+    if num_requests <= 0:
+        num_requests = len(audios)
+
+    queue = asyncio.Queue()
+    for i in range(num_requests):
+        queue.put_nowait(audios[i % len(audios)])
+    return queue
+
+
+async def main():
+    args = get_args()
+    audios = load_audios(args)
+    if not audios:
+        raise ValueError(
+            "No audio to send. Please provide --wav-dir, --wav-scp or "
+            "--num-synthetic"
+        )
+    assert args.concurrency > 0, args.concurrency
+
+    queue = build_queue(audios, args.num_requests)
+    logging.info(
+        f"Sending {queue.qsize()} requests with {args.concurrency} clients"
+    )
+
+    report = Report()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            run_client(
+                args,
+                queue,
+                report,
+                delay=args.ramp_up * i / args.concurrency,
+            )
+            for i in range(args.concurrency)
+        ]
+    )
+    report.elapsed = time.perf_counter() - start
+
+    s = json.dumps(report.as_dict(), indent=2)
+    print(s)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(s)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    formatter = "%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] %(message)s"  # noqa
+    logging.basicConfig(format=formatter, level=logging.INFO)
+    asyncio.run(main())
@@ -10,6 +10,9 @@ Usage:
     ./decode_manifest.py
 
 (Note: You have to first start the server before starting the client)
+
+See also ./benchmark.py for measuring latencies and throughput of a server
+without icefall or lhotse.
 """
 
 import argparse
@@ -45,11 +45,18 @@ python3 ./sherpa/bin/offline_client.py ./sherpa-nemo-ctc-en-conformer-medium/tes
 import argparse
 import asyncio
 import logging
+import socket
 import sys
 from pathlib import Path
+from typing import Optional
 
 import torch
-from offline_transducer_server import OfflineServer, add_resources_args
+from offline_transducer_server import (
+    OfflineServer,
+    add_admission_args,
+    add_bucketing_args,
+    add_resources_args,
+)
 
 import sherpa
 
@@ -205,6 +212,8 @@ def get_args():
     add_model_args(parser)
     add_decoding_args(parser)
     add_resources_args(parser)
+    add_bucketing_args(parser)
+    add_admission_args(parser)
 
     parser.add_argument(
         "--port",
@@ -229,9 +238,10 @@ def get_args():
         type=float,
         default=5,
         help="""Max time in millisecond to wait to build batches for inference.
-        If there are not enough requests in the feature queue to build a batch
-        of max_batch_size, it waits up to this time before fetching available
-        requests for computation.
+        It is measured from the arrival of the oldest request in the feature
+        queue. If there are not enough requests to build a batch of
+        max_batch_size before that, the available requests are sent for
+        computation. A batch is sent as soon as it is full.
         """,
     )
 
@@ -244,6 +254,18 @@ def get_args():
         """,
     )
 
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="""Number of worker processes. Each worker has its own recognizer
+        and uses --num-threads threads for computation. If it is larger than
+        1, all workers share the listening port and --max-active-connections
+        is the limit for all workers together, and /metrics is disabled
+        since each worker has its own metrics. Not supported on Windows.
+        """,
+    )
+
     parser.add_argument(
         "--nn-pool-size",
         type=int,
@@ -332,45 +354,81 @@ def create_recognizer(args) -> sherpa.OfflineRecognizer:
 
 
 @torch.no_grad()
-def main():
-    args = get_args()
-    logging.info(vars(args))
-    check_args(args)
+def run_worker(
+    worker_id: int,
+    args,
+    sock: Optional[socket.socket] = None,
+    connection_counter: Optional[sherpa.ConnectionCounter] = None,
+):
+    """Create a recognizer and run the server until it is killed.
+
+    Args:
+      worker_id:
+        ID of this worker. Used only for logging.
+      args:
+        The parsed command line arguments.
+      sock:
+        Optional. If not None, the listening socket shared by all workers.
+      connection_counter:
+        Optional. If not None, the number of active connections of all
+        workers.
+    """
+    logging.info(f"Worker {worker_id} started")
 
     torch.set_num_threads(args.num_threads)
     torch.set_num_interop_threads(args.num_threads)
     recognizer = create_recognizer(args)
 
-    port = args.port
-    max_wait_ms = args.max_wait_ms
-    max_batch_size = args.max_batch_size
-    feature_extractor_pool_size = args.feature_extractor_pool_size
-    nn_pool_size = args.nn_pool_size
-    max_message_size = args.max_message_size
-    max_queue_size = args.max_queue_size
-    max_active_connections = args.max_active_connections
-    certificate = args.certificate
-    doc_root = args.doc_root
+    offline_server = OfflineServer(
+        recognizer=recognizer,
+        sample_rate=args.sample_rate,
+        max_wait_ms=args.max_wait_ms,
+        max_batch_size=args.max_batch_size,
+        bucket_boundaries=[float(b) for b in args.bucket_boundaries.split(",")],
+        max_frames_per_batch=args.max_frames_per_batch,
+        feature_extractor_pool_size=args.feature_extractor_pool_size,
+        nn_pool_size=args.nn_pool_size,
+        max_message_size=args.max_message_size,
+        max_queue_size=args.max_queue_size,
+        max_active_connections=args.max_active_connections,
+        certificate=args.certificate,
+        doc_root=args.doc_root,
+        connection_counter=connection_counter,
+        max_queue_delay_ms=args.max_queue_delay_ms,
+        min_nn_pool_utilization=args.min_nn_pool_utilization,
+        max_defer_ms=args.max_defer_ms,
+        serve_metrics=args.num_workers == 1,
+    )
+    asyncio.run(offline_server.run(args.port, sock))
 
-    if certificate and not Path(certificate).is_file():
-        raise ValueError(f"{certificate} does not exist")
 
-    if not Path(doc_root).is_dir():
-        raise ValueError(f"Directory {doc_root} does not exist")
+def main():
+    args = get_args()
+    logging.info(vars(args))
+    check_args(args)
 
-    offline_server = OfflineServer(
-        recognizer=recognizer,
-        max_wait_ms=max_wait_ms,
-        max_batch_size=max_batch_size,
-        feature_extractor_pool_size=feature_extractor_pool_size,
-        nn_pool_size=nn_pool_size,
-        max_message_size=max_message_size,
-        max_queue_size=max_queue_size,
-        max_active_connections=max_active_connections,
-        certificate=certificate,
-        doc_root=doc_root,
+    if args.certificate and not Path(args.certificate).is_file():
+        raise ValueError(f"{args.certificate} does not exist")
+
+    if not Path(args.doc_root).is_dir():
+        raise ValueError(f"Directory {args.doc_root} does not exist")
+
+    if args.num_workers == 1:
+        run_worker(0, args)
+        return
+
+    # The socket and the counter are created before forking so that
+    # all workers share them
+    sock = sherpa.create_listening_socket(args.port)
+    connection_counter = sherpa.ConnectionCounter(
+        args.max_active_connections, args.num_workers
+    )
+    sherpa.run_workers(
+        args.num_workers,
+        target=run_worker,
+        args=(args, sock, connection_counter),
+        connection_counter=connection_counter,
     )
-    asyncio.run(offline_server.run(port))
 
 
 # See https://github.com/pytorch/pytorch/issues/38342
@@ -49,12 +49,11 @@ import logging
 import socket
 import ssl
 import sys
-import warnings
+import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
-import numpy as np
 import torch
 import websockets
 
@@ -111,6 +110,41 @@ def add_decoding_args(parser: argparse.ArgumentParser):
         """,
     )
 
+    parser.add_argument(
+        "--speculative-joiner",
+        type=sherpa.str2bool,
+        default=False,
+        help="""Used only when --decoding-method is greedy_search.
+        True to run the joiner on several frames in one call, assuming that
+        no token is emitted, and rerun it only from the first frame that
+        emits a token. It gives the same result with fewer joiner calls.
+        """,
+    )
+
+    parser.add_argument(
+        "--frame-reducer-blank-threshold",
+        type=float,
+        default=0,
+        help="""Used only for models trained with an auxiliary CTC head.
+        If positive, frames of the encoder output whose blank probability
+        from the CTC head is not less than it are dropped before the
+        search, e.g., 0.9. 0 to disable it. It changes the results:
+        tokens on dropped frames are deleted, and lower values drop more
+        frames. Measure its accuracy on your data with
+        sherpa-benchmark-greedy-search before enabling it.
+        """,
+    )
+
+    parser.add_argument(
+        "--decoder-cache-capacity",
+        type=int,
+        default=0,
+        help="""Max number of decoder outputs to cache, keyed by the last
+        context-size tokens. The decoder is run only for contexts that are
+        not in the cache. 0 to disable it.
+        """,
+    )
+
     add_modified_beam_search_args(parser)
     add_fast_beam_search_args(parser)
 
@@ -206,6 +240,29 @@ def add_resources_args(parser: argparse.ArgumentParser):
     )
 
 
+def add_bucketing_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--bucket-boundaries",
+        type=str,
+        default="2,5,10,20",
+        help="""Comma separated durations in seconds. Requests are put into
+        buckets by duration and a batch contains only requests from the same
+        bucket, so that little computation is spent on padding.
+        """,
+    )
+
+    parser.add_argument(
+        "--max-frames-per-batch",
+        type=int,
+        default=30000,
+        help="""Max number of feature frames of a batch after padding, i.e.,
+        (number of frames of the longest request) * (number of requests).
+        A frame is 10 ms. A request longer than it is processed in a batch
+        of its own.
+        """,
+    )
+
+
 def check_args(args):
     if args.use_gpu and not torch.cuda.is_available():
         sys.exit("no CUDA devices available but you set --use-gpu=true")
@@ -232,6 +289,38 @@ def check_args(args):
             raise ValueError(f"{args.LG} does not exist")
 
 
+def add_admission_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--max-queue-delay-ms",
+        type=float,
+        default=0,
+        help="""The latency SLO in milliseconds. New connections are refused
+        with 503 and a Retry-After header if the measured time that requests
+        spend in the batch queue exceeds it while the NN pool is busy.
+        It should be larger than --max-wait-ms. 0 disables it.
+        """,
+    )
+
+    parser.add_argument(
+        "--min-nn-pool-utilization",
+        type=float,
+        default=0.9,
+        help="""New connections are refused only if the fraction of time that
+        the threads of the NN pool are busy is at least this value.
+        Used only when --max-queue-delay-ms is positive.
+        """,
+    )
+
+    parser.add_argument(
+        "--max-defer-ms",
+        type=float,
+        default=0,
+        help="""Max time in milliseconds that a new connection waits for the
+        load to decrease before it is refused.
+        """,
+    )
+
+
 def get_args():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -240,6 +329,8 @@ def get_args():
     add_model_args(parser)
     add_decoding_args(parser)
     add_resources_args(parser)
+    add_bucketing_args(parser)
+    add_admission_args(parser)
 
     parser.add_argument(
         "--port",
@@ -264,9 +355,10 @@ def get_args():
         type=float,
         default=5,
         help="""Max time in millisecond to wait to build batches for inference.
-        If there are not enough requests in the feature queue to build a batch
-        of max_batch_size, it waits up to this time before fetching available
-        requests for computation.
+        It is measured from the arrival of the oldest request in the feature
+        queue. If there are not enough requests to build a batch of
+        max_batch_size before that, the available requests are sent for
+        computation. A batch is sent as soon as it is full.
         """,
     )
 
@@ -279,6 +371,18 @@ def get_args():
         """,
     )
 
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="""Number of worker processes. Each worker has its own recognizer
+        and uses --num-threads threads for computation. If it is larger than
+        1, all workers share the listening port and --max-active-connections
+        is the limit for all workers together, and /metrics is disabled
+        since each worker has its own metrics. Not supported on Windows.
+        """,
+    )
+
     parser.add_argument(
         "--nn-pool-size",
         type=int,
@@ -336,8 +440,11 @@ class OfflineServer:
     def __init__(
         self,
         recognizer: sherpa.OfflineRecognizer,
+        sample_rate: int,
         max_batch_size: int,
         max_wait_ms: float,
+        bucket_boundaries: List[float],
+        max_frames_per_batch: int,
         feature_extractor_pool_size: int,
         nn_pool_size: int,
         max_message_size: int,
@@ -345,16 +452,29 @@ class OfflineServer:
         max_active_connections: int,
         doc_root: str,
         certificate: Optional[str] = None,
+        connection_counter: Optional[sherpa.ConnectionCounter] = None,
+        max_queue_delay_ms: float = 0,
+        min_nn_pool_utilization: float = 0.9,
+        max_defer_ms: float = 0,
+        serve_metrics: bool = True,
     ):
         """
         Args:
           recognizer:
             An instance of the sherpa.OfflineRecognizer.
+          sample_rate:
+            Sample rate of the audio samples sent by the clients.
           max_batch_size:
             Max batch size for inference.
           max_wait_ms:
-            Max wait time in milliseconds in order to build a batch of
-            `max_batch_size`.
+            Max wait time in milliseconds, measured from the arrival of the
+            oldest queued request of a bucket, in order to build a batch.
+          bucket_boundaries:
+            Durations in seconds. Requests are put into buckets by duration
+            and each batch contains requests from a single bucket.
+          max_frames_per_batch:
+            Max number of feature frames (10 ms each) of a batch after
+            padding.
           feature_extractor_pool_size:
             Number of threads to create for the feature extractor thread pool.
           nn_pool_size:
@@ -374,26 +494,80 @@ class OfflineServer:
             Optional. If not None, it will use secure websocket.
             You can use ./sherpa/bin/web/generate-certificate.py to generate
             it (the default generated filename is `cert.pem`).
+          connection_counter:
+            Optional. If not None, it counts the active connections of all
+            worker processes and max_active_connections is ignored.
+          max_queue_delay_ms:
+            The latency SLO. New connections are refused if the time that
+            requests spend in the queue of the batch scheduler exceeds it
+            while the NN pool is busy. 0 disables it.
+          min_nn_pool_utilization:
+            New connections are refused only if the utilization of the
+            NN pool is at least this value.
+          max_defer_ms:
+            Max time in milliseconds that a new connection waits for the
+            load to decrease before it is refused.
+          serve_metrics:
+            True to serve the metrics at /metrics. It should be False if
+            there are several worker processes, since a scrape would return
+            only the metrics of the worker that handles it.
         """
         self.recognizer = recognizer
 
+        # Note: The offline recognizer does not report the time of the
+        # encoder and the search separately, so they are not recorded.
+        self.metrics = sherpa.ServerMetrics(
+            num_active_streams=lambda: self.connection_counter.value
+        )
+
         self.certificate = certificate
-        self.http_server = sherpa.HttpServer(doc_root)
+        self.http_server = sherpa.HttpServer(
+            doc_root, self.metrics if serve_metrics else None
+        )
+
+        # Feature extraction releases the GIL, so it can run in
+        # threads without blocking the event loop
+        self.feature_pool = ThreadPoolExecutor(
+            max_workers=feature_extractor_pool_size,
+            thread_name_prefix="feature",
+        )
 
         self.nn_pool = ThreadPoolExecutor(
             max_workers=nn_pool_size,
             thread_name_prefix="nn",
         )
 
-        self.stream_queue = asyncio.Queue()
+        self.sample_rate = sample_rate
+
+        self.scheduler = sherpa.BucketBatchScheduler(
+            process_batch=self.decode_streams,
+            executor=self.nn_pool,
+            bucket_boundaries=[int(b * 100) for b in sorted(bucket_boundaries)],
+            max_frames_per_batch=max_frames_per_batch,
+            max_wait_ms=max_wait_ms,
+            max_batch_size=max_batch_size,
+            max_in_flight=nn_pool_size,
+            on_dispatch=self.metrics.observe_dispatch,
+        )
 
         self.max_wait_ms = max_wait_ms
         self.max_batch_size = max_batch_size
         self.max_message_size = max_message_size
         self.max_queue_size = max_queue_size
-        self.max_active_connections = max_active_connections
+        if connection_counter is None:
+            connection_counter = sherpa.ConnectionCounter(
+                max_active_connections
+            )
+        self.connection_counter = connection_counter
+
+        self.admission_controller = sherpa.AdmissionController(
+            scheduler=self.scheduler,
+            max_queue_delay_ms=max_queue_delay_ms,
+            min_utilization=min_nn_pool_utilization,
+            max_defer_ms=max_defer_ms,
+        )
 
-        self.current_active_connections = 0
+        self.lag_monitor = sherpa.EventLoopLagMonitor()
 
     async def process_request(
         self,
@@ -415,21 +589,37 @@ class OfflineServer:
             header = {"Content-Type": mime_type}
             return status, header, response
 
-        if self.current_active_connections < self.max_active_connections:
-            self.current_active_connections += 1
+        # Sessions are refused if accepting them would violate the latency
+        # SLO, so that the connections being served are not slowed down.
+        if await self.admission_controller.admit(
+            self.connection_counter.try_acquire
+        ):
             return None
 
         # Refuse new connections
         status = http.HTTPStatus.SERVICE_UNAVAILABLE  # 503
-        header = {"Hint": "The server is overloaded. Please retry later."}
+        header = {
+            "Hint": "The server is overloaded. Please retry later.",
+            "Retry-After": str(self.admission_controller.retry_after),
+        }
         response = b"The server is busy. Please retry later."
 
         return status, header, response
 
-    async def run(self, port: int):
+    async def run(self, port: int, sock: Optional[socket.socket] = None):
+        """
+        Args:
+          port:
+            The port to listen on.
+          sock:
+            Optional. If not None, it is a listening socket shared by all
+            worker processes and `port` is only used for logging.
+        """
         logging.info("started")
 
-        task = asyncio.create_task(self.stream_consumer_task())
+        task = asyncio.create_task(self.scheduler.run())
+        monitor_task = asyncio.create_task(self.lag_monitor.run())
+        admission_task = asyncio.create_task(self.admission_controller.run())
 
         if self.certificate:
             logging.info(f"Using certificate: {self.certificate}")
@@ -439,10 +629,14 @@ class OfflineServer:
             ssl_context = None
             logging.info("No certificate provided")
 
+        if sock is not None:
+            address = dict(sock=sock)
+        else:
+            address = dict(host="", port=port)
+
         async with websockets.serve(
             self.handle_connection,
-            host="",
-            port=port,
+            **address,
             max_size=self.max_message_size,
             max_queue=self.max_queue_size,
             process_request=self.process_request,
@@ -458,10 +652,13 @@ class OfflineServer:
 
             await asyncio.Future()  # run forever
         await task
+        await monitor_task
+        await admission_task
 
     async def recv_audio_samples(
         self,
         socket: websockets.WebSocketServerProtocol,
+        audio_format: sherpa.AudioFormat,
     ) -> Optional[torch.Tensor]:
         """Receives a tensor from the client.
 
@@ -480,9 +677,17 @@ class OfflineServer:
 
         The second and remaining messages contain audio samples.
 
+        Before the first message, the client can send a text message declaring
+        the format of the samples of this and the following audio files, e.g.,
+        ``{"sample_rate": 8000, "sample_format": "s16le"}``. Supported sample
+        formats are f32le and s16le. The default is f32le with --sample-rate.
+
         Args:
           socket:
             The socket for communicating with the client.
+          audio_format:
+            Format of the audio samples. It is updated in-place if the client
+            declares a new one.
         Returns:
           Return a 1-D torch.float32 tensor containing the audio samples or
           return None indicating the end of utterance.
@@ -491,6 +696,15 @@ class OfflineServer:
         if header == "Done":
             return None
 
+        if isinstance(header, str):
+            if not audio_format.from_json(header):
+                raise ValueError(f"Invalid audio format: {header[:100]}")
+            logging.info(f"{socket.remote_address}: {audio_format}")
+
+            header = await socket.recv()
+            if header == "Done":
+                return None
+
         assert len(header) == 4, "The first message should contain 4 bytes"
 
         expected_num_bytes = int.from_bytes(header, "little", signed=True)
@@ -509,65 +723,50 @@ class OfflineServer:
             expected_num_bytes,
         )
 
-        samples = b"".join(received)
+        if len(received) == 1:
+            samples = received[0]
+        else:
+            samples = b"".join(received)
 
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            # PyTorch warns that the underlying buffer is not writable.
-            # We ignore it here as we are not going to write it anyway.
-            if hasattr(torch, "frombuffer"):
-                # Note: torch.frombuffer is available only in torch>= 1.10
-                return torch.frombuffer(samples, dtype=torch.float32)
-            else:
-                array = np.frombuffer(samples, dtype=np.float32)
-                return torch.from_numpy(array)
+        # It converts the samples in C++ without an intermediate copy
+        return audio_format.convert(samples)
 
-    async def stream_consumer_task(self):
-        """This function extracts streams from the queue, batches them up, sends
-        them to the RNN-T model for computation and decoding.
+    def decode_streams(
+        self,
+        streams: List[sherpa.OfflineStream],
+    ) -> List[float]:
+        """Decode a batch of streams. It is invoked in the NN pool.
+
+        Returns:
+          Return the computation time in seconds of the batch divided
+          equally among the streams.
         """
-        while True:
-            if self.stream_queue.empty():
-                await asyncio.sleep(self.max_wait_ms / 1000)
-                continue
-
-            batch = []
-            try:
-                while len(batch) < self.max_batch_size:
-                    item = self.stream_queue.get_nowait()
-
-                    batch.append(item)
-            except asyncio.QueueEmpty:
-                pass
-            stream_list = [b[0] for b in batch]
-            future_list = [b[1] for b in batch]
-
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(
-                self.nn_pool,
-                self.recognizer.decode_streams,
-                stream_list,
-            )
+        start = time.perf_counter()
+        self.recognizer.decode_streams(streams)
+        elapsed = time.perf_counter() - start
 
-            for f in future_list:
-                self.stream_queue.task_done()
-                f.set_result(None)
+        return [elapsed / len(streams)] * len(streams)
 
     async def compute_and_decode(
         self,
         stream: sherpa.OfflineStream,
-    ) -> None:
-        """Put the stream into the queue and wait it to be processed by the
-        consumer task.
+        num_samples: int,
+    ) -> float:
+        """Put the stream into the queue of the batch scheduler and wait it
+        to be processed.
 
         Args:
           stream:
             The stream to be processed. Note: It is changed in-place.
+          num_samples:
+            Number of audio samples of the stream. It is used to select
+            a bucket for the stream.
+        Returns:
+          Return the share of the stream of the computation time in seconds.
         """
-        loop = asyncio.get_running_loop()
-        future = loop.create_future()
-        await self.stream_queue.put((stream, future))
-        await future
+        # Number of feature frames. The frame shift is 10 ms.
+        num_frames = num_samples * 100 // self.sample_rate
+        return await self.scheduler.submit(stream, num_frames)
 
     async def handle_connection(
         self,
@@ -586,12 +785,43 @@ class OfflineServer:
             logging.info(f"{socket.remote_address} disconnected")
         finally:
             # Decrement so that it can accept new connections
-            self.current_active_connections -= 1
+            self.connection_counter.release()
 
             logging.info(
                 f"Disconnected: {socket.remote_address}. "
-                f"Number of connections: {self.current_active_connections}/{self.max_active_connections}"  # noqa
+                f"Number of connections: {self.connection_counter}"
             )
+            logging.info(f"Batch scheduler: {self.scheduler.stats}")
+            logging.info(f"Event loop: {self.lag_monitor}")
+            logging.info(f"Admission: {self.admission_controller}")
+
+    async def compute_features(
+        self,
+        stream: sherpa.OfflineStream,
+        samples: torch.Tensor,
+        sample_rate: int,
+    ) -> None:
+        """Compute features of the given samples in the feature extractor
+        thread pool so that the event loop is not blocked.
+
+        Args:
+          stream:
+            The stream to accept the samples. Note: It is changed in-place.
+          samples:
+            A 1-D torch.float32 tensor containing audio samples.
+          sample_rate:
+            Sample rate of the samples. If it is different from --sample-rate,
+            the samples are resampled.
+        """
+
+        def accept_samples(samples: torch.Tensor):
+            if sample_rate != self.sample_rate:
+                resampler = sherpa.LinearResample(sample_rate, self.sample_rate)
+                samples = resampler.resample(samples, flush=True)
+            stream.accept_samples(samples)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.feature_pool, accept_samples, samples)
 
     async def handle_connection_impl(
         self,
@@ -606,19 +836,33 @@ class OfflineServer:
         """
         logging.info(
             f"Connected: {socket.remote_address}. "
-            f"Number of connections: {self.current_active_connections}/{self.max_active_connections}"  # noqa
+            f"Number of connections: {self.connection_counter}"
         )
 
+        audio_format = sherpa.AudioFormat(self.sample_rate)
+
+        # For the real time factor of this connection
+        compute_time = 0
+        duration = 0
+
         while True:
             stream = self.recognizer.create_stream()
-            samples = await self.recv_audio_samples(socket)
+            samples = await self.recv_audio_samples(socket, audio_format)
             if samples is None:
                 break
-            # stream.accept_samples() runs in the main thread
-            # TODO(fangjun): Use a separate thread/process pool for it
-            stream.accept_samples(samples)
 
-            await self.compute_and_decode(stream)
+            start = time.perf_counter()
+            duration += samples.numel() / audio_format.sample_rate
+
+            await self.compute_features(
+                stream, samples, audio_format.sample_rate
+            )
+
+            # Number of samples after resampling
+            num_samples = (
+                samples.numel() * self.sample_rate // audio_format.sample_rate
+            )
+            compute_time += await self.compute_and_decode(stream, num_samples)
             result = stream.result.text
             logging.info(f"result: {result}")
 
@@ -630,6 +874,11 @@ class OfflineServer:
                 # wait for a reply indefinitely.
                 await socket.send("<EMPTY>")
 
+            self.metrics.latency.observe(time.perf_counter() - start)
+
+        if duration > 0:
+            self.metrics.rtf.observe(compute_time / duration)
+
 
 def create_recognizer(args) -> sherpa.OfflineRecognizer:
     feat_config = sherpa.FeatureConfig()
@@ -657,7 +906,10 @@ def create_recognizer(args) -> sherpa.OfflineRecognizer:
         feat_config=feat_config,
         decoding_method=args.decoding_method,
         fast_beam_search_config=fast_beam_search_config,
-        temperature=args.temperature
+        temperature=args.temperature,
+        speculative_joiner=args.speculative_joiner,
+        frame_reducer_blank_threshold=args.frame_reducer_blank_threshold,
+        decoder_cache_capacity=args.decoder_cache_capacity,
     )
 
     recognizer = sherpa.OfflineRecognizer(config)
@@ -666,45 +918,81 @@ def create_recognizer(args) -> sherpa.OfflineRecognizer:
 
 
 @torch.no_grad()
-def main():
-    args = get_args()
-    logging.info(vars(args))
-    check_args(args)
+def run_worker(
+    worker_id: int,
+    args,
+    sock: Optional[socket.socket] = None,
+    connection_counter: Optional[sherpa.ConnectionCounter] = None,
+):
+    """Create a recognizer and run the server until it is killed.
+
+    Args:
+      worker_id:
+        ID of this worker. Used only for logging.
+      args:
+        The parsed command line arguments.
+      sock:
+        Optional. If not None, the listening socket shared by all workers.
+      connection_counter:
+        Optional. If not None, the number of active connections of all
+        workers.
+    """
+    logging.info(f"Worker {worker_id} started")
 
     torch.set_num_threads(args.num_threads)
     torch.set_num_interop_threads(args.num_threads)
     recognizer = create_recognizer(args)
 
-    port = args.port
-    max_wait_ms = args.max_wait_ms
-    max_batch_size = args.max_batch_size
-    feature_extractor_pool_size = args.feature_extractor_pool_size
-    nn_pool_size = args.nn_pool_size
-    max_message_size = args.max_message_size
-    max_queue_size = args.max_queue_size
-    max_active_connections = args.max_active_connections
-    certificate = args.certificate
-    doc_root = args.doc_root
+    offline_server = OfflineServer(
+        recognizer=recognizer,
+        sample_rate=args.sample_rate,
+        max_wait_ms=args.max_wait_ms,
+        max_batch_size=args.max_batch_size,
+        bucket_boundaries=[float(b) for b in args.bucket_boundaries.split(",")],
+        max_frames_per_batch=args.max_frames_per_batch,
+        feature_extractor_pool_size=args.feature_extractor_pool_size,
+        nn_pool_size=args.nn_pool_size,
+        max_message_size=args.max_message_size,
+        max_queue_size=args.max_queue_size,
+        max_active_connections=args.max_active_connections,
+        certificate=args.certificate,
+        doc_root=args.doc_root,
+        connection_counter=connection_counter,
+        max_queue_delay_ms=args.max_queue_delay_ms,
+        min_nn_pool_utilization=args.min_nn_pool_utilization,
+        max_defer_ms=args.max_defer_ms,
+        serve_metrics=args.num_workers == 1,
+    )
+    asyncio.run(offline_server.run(args.port, sock))
+
+
+def main():
+    args = get_args()
+    logging.info(vars(args))
+    check_args(args)
 
-    if certificate and not Path(certificate).is_file():
-        raise ValueError(f"{certificate} does not exist")
+    if args.certificate and not Path(args.certificate).is_file():
+        raise ValueError(f"{args.certificate} does not exist")
 
-    if not Path(doc_root).is_dir():
-        raise ValueError(f"Directory {doc_root} does not exist")
+    if not Path(args.doc_root).is_dir():
+        raise ValueError(f"Directory {args.doc_root} does not exist")
 
-    offline_server = OfflineServer(
-        recognizer=recognizer,
-        max_wait_ms=max_wait_ms,
-        max_batch_size=max_batch_size,
-        feature_extractor_pool_size=feature_extractor_pool_size,
-        nn_pool_size=nn_pool_size,
-        max_message_size=max_message_size,
-        max_queue_size=max_queue_size,
-        max_active_connections=max_active_connections,
-        certificate=certificate,
-        doc_root=doc_root,
-    )
-    asyncio.run(offline_server.run(port))
+    if args.num_workers == 1:
+        run_worker(0, args)
+        return
+
+    # The socket and the counter are created before forking so that
+    # all workers share them
+    sock = sherpa.create_listening_socket(args.port)
+    connection_counter = sherpa.ConnectionCounter(
+        args.max_active_connections, args.num_workers
+    )
+    sherpa.run_workers(
+        args.num_workers,
+        target=run_worker,
+        args=(args, sock, connection_counter),
+        connection_counter=connection_counter,
+    )
 
 
 # See https://github.com/pytorch/pytorch/issues/38342
@@ -20,6 +20,7 @@ import asyncio
 import http
 import json
 import logging
+from typing import Optional
 
 import torchaudio
 import websockets
@@ -44,6 +45,17 @@ def get_args():
         help="Port of the server",
     )
 
+    parser.add_argument(
+        "--protocol",
+        type=str,
+        default="full",
+        choices=["full", "delta", "delta-msgpack"],
+        help="full: Each message from the server contains the full result. "
+        "delta: Each message contains only what has changed since the "
+        "previous message. delta-msgpack: Same as delta but messages are "
+        "encoded with MessagePack, which requires `pip install msgpack`.",
+    )
+
     parser.add_argument(
         "sound_files",
         type=str,
@@ -57,11 +69,60 @@ def get_args():
     return parser.parse_args()
 
 
-async def receive_results(socket: websockets.WebSocketServerProtocol):
+# Websocket subprotocols of the server for each --protocol
+SUBPROTOCOLS = {
+    "full": None,
+    "delta": "sherpa.delta.json",
+    "delta-msgpack": "sherpa.delta.msgpack",
+}
+
+
+def apply_delta(current: Optional[dict], delta: dict) -> dict:
+    """Return the full result of a segment given the result so far and
+    a delta message from the server.
+
+    Args:
+      current:
+        The full result so far. None if no message has been received.
+      delta:
+        A decoded message from the server when --protocol is delta or
+        delta-msgpack.
+    """
+    if current is None or current["segment"] != delta["segment"]:
+        current = dict(text="", tokens=[], timestamps=[])
+
+    token_start = delta["token_start"]
+    timestamps = current["timestamps"][:token_start]
+    timestamps += ["{:.3f}".format(t) for t in delta["timestamps"]]
+
+    return dict(
+        method="",
+        segment=delta["segment"],
+        text=current["text"][: delta["text_start"]] + delta["text"],
+        tokens=current["tokens"][:token_start] + delta["tokens"],
+        timestamps=timestamps,
+        final=delta["final"],
+    )
+
+
+async def receive_results(
+    socket: websockets.WebSocketServerProtocol,
+    protocol: str,
+):
     global done
     ans = []
+    current = None
     async for message in socket:
-        result = json.loads(message)
+        if protocol == "full":
+            result = json.loads(message)
+        else:
+            if protocol == "delta-msgpack":
+                import msgpack
+
+                delta = msgpack.unpackb(message)
+            else:
+                delta = json.loads(message)
+            result = current = apply_delta(current, delta)
 
         method = result["method"]
         segment = result["segment"]
@@ -93,10 +154,22 @@ async def receive_results(socket: websockets.WebSocketServerProtocol):
     return ans
 
 
-async def run(server_addr: str, server_port: int, test_wav: str):
+async def run(
+    server_addr: str,
+    server_port: int,
+    test_wav: str,
+    protocol: str,
+):
+    subprotocol = SUBPROTOCOLS[protocol]
     async with websockets.connect(
-        f"ws://{server_addr}:{server_port}"
+        f"ws://{server_addr}:{server_port}",
+        subprotocols=[subprotocol] if subprotocol else None,
     ) as websocket:  # noqa
+        if websocket.subprotocol != subprotocol:
+            raise ValueError(
+                f"The server does not support --protocol={protocol}"
+            )
+
         logging.info(f"Sending {test_wav}")
         wave, sample_rate = torchaudio.load(test_wav)
         # You have to ensure that sample_rate equals to
@@ -105,7 +178,7 @@ async def run(server_addr: str, server_port: int, test_wav: str):
         logging.info(f"sample_rate: {sample_rate}")
 
         wave = wave.squeeze(0)
-        receive_task = asyncio.create_task(receive_results(websocket))
+        receive_task = asyncio.create_task(receive_results(websocket, protocol))
 
         frame_size = 4096
         sleep_time = frame_size / sample_rate  # in seconds
@@ -123,7 +196,8 @@ async def run(server_addr: str, server_port: int, test_wav: str):
         decoding_results = await receive_task
         s = ""
         for r in decoding_results:
-            s += f"method: {r['method']}\n"
+            if r["method"]:
+                s += f"method: {r['method']}\n"
             s += f"segment: {r['segment']}\n"
             s += f"text: {r['text']}\n"
 
@@ -149,7 +223,7 @@ async def main():
         while count < max_retry_count:
             count += 1
             try:
-                await run(server_addr, server_port, sound_file)
+                await run(server_addr, server_port, sound_file, args.protocol)
                 break
             except websockets.exceptions.InvalidStatusCode as e:
                 print(e.status_code)
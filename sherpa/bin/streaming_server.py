@@ -77,6 +77,20 @@ cd /path/to/sherpa
 python3 ./sherpa/bin/streaming_client.py \
     --server-port 6006 \
     ./icefall-asr-librispeech-pruned-transducer-stateless7-streaming-2022-12-29/test_wavs/1089-134686-0001.wav
+
+The server also serves metrics in the Prometheus text format at /metrics,
+e.g., http://localhost:6006/metrics, unless --num-workers is larger than 1.
+
+By default, each message sent to the client contains the full result of the
+current segment. A client can request the websocket subprotocol
+"sherpa.delta.json" or "sherpa.delta.msgpack" to receive only what has
+changed since the previous message, encoded with JSON or MessagePack.
+See OnlineRecognitionResult.as_json_string() for the format.
+
+Clients send float32 samples with --sample-rate by default. A client can
+declare another format by sending a text message before any samples, e.g.,
+{"sample_rate": 8000, "sample_format": "s16le"}. Supported sample formats are
+f32le and s16le. Samples are resampled to --sample-rate by the server.
 """  # noqa
 
 import argparse
@@ -87,17 +101,20 @@ import logging
 import socket
 import ssl
 import sys
-import warnings
+import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
-import numpy as np
 import torch
 import websockets
 
 import sherpa
 
+# Websocket subprotocols for sending only the changes of the results
+DELTA_JSON_PROTOCOL = "sherpa.delta.json"
+DELTA_MSGPACK_PROTOCOL = "sherpa.delta.msgpack"
+
 
 def add_model_args(parser: argparse.ArgumentParser):
     parser.add_argument(
@@ -171,6 +188,28 @@ def add_decoding_args(parser: argparse.ArgumentParser):
         """,
     )
 
+    parser.add_argument(
+        "--speculative-joiner",
+        type=sherpa.str2bool,
+        default=False,
+        help="""Used only when --decoding-method is greedy_search.
+        True to run the joiner on all frames of a chunk in one call,
+        assuming that no token is emitted, and rerun it only from the first
+        frame that emits a token. It gives the same result with fewer
+        joiner calls.
+        """,
+    )
+
+    parser.add_argument(
+        "--decoder-cache-capacity",
+        type=int,
+        default=0,
+        help="""Max number of decoder outputs to cache, keyed by the last
+        context-size tokens. The decoder is run only for contexts that are
+        not in the cache. 0 to disable it.
+        """,
+    )
+
     add_modified_beam_search_args(parser)
     add_fast_beam_search_args(parser)
 
@@ -279,6 +318,71 @@ def add_fast_beam_search_args(parser: argparse.ArgumentParser):
     )
 
 
+def add_admission_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--max-queue-delay-ms",
+        type=float,
+        default=0,
+        help="""The latency SLO in milliseconds. New connections are refused
+        with 503 and a Retry-After header if the measured time that requests
+        spend in the batch queue exceeds it while the NN pool is busy.
+        It should be larger than --max-wait-ms. 0 disables it.
+        """,
+    )
+
+    parser.add_argument(
+        "--min-nn-pool-utilization",
+        type=float,
+        default=0.9,
+        help="""New connections are refused only if the fraction of time that
+        the threads of the NN pool are busy is at least this value.
+        Used only when --max-queue-delay-ms is positive.
+        """,
+    )
+
+    parser.add_argument(
+        "--max-defer-ms",
+        type=float,
+        default=0,
+        help="""Max time in milliseconds that a new connection waits for the
+        load to decrease before it is refused.
+        """,
+    )
+
+
+def add_session_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        help="""If a client sends nothing for this number of seconds, the
+        state of its stream is serialized into --spill-file and the memory
+        of the stream is released. It is restored when the client sends
+        audio again. 0 disables it.
+        """,
+    )
+
+    parser.add_argument(
+        "--spill-file",
+        type=str,
+        default="",
+        help="""Path to the memory-mapped file for the streams of idle
+        connections. If empty, an anonymous temporary file is used.
+        Each worker uses its own file; the worker ID is appended to the
+        path if --num-workers is larger than 1.
+        """,
+    )
+
+    parser.add_argument(
+        "--spill-file-size",
+        type=int,
+        default=1024,
+        help="""Size of --spill-file in MB. If it is full, streams of idle
+        connections are kept in memory.
+        """,
+    )
+
+
 def get_args():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -287,6 +391,8 @@ def get_args():
     add_model_args(parser)
     add_decoding_args(parser)
     add_endpointing_args(parser)
+    add_admission_args(parser)
+    add_session_args(parser)
 
     parser.add_argument(
         "--port",
@@ -295,6 +401,18 @@ def get_args():
         help="The server will listen on this port",
     )
 
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="""Number of worker processes. Each worker has its own recognizer
+        and uses --num-threads threads for computation. If it is larger than
+        1, all workers share the listening port and --max-active-connections
+        is the limit for all workers together, and /metrics is disabled
+        since each worker has its own metrics. Not supported on Windows.
+        """,
+    )
+
     parser.add_argument(
         "--nn-pool-size",
         type=int,
@@ -302,6 +420,15 @@ def get_args():
         help="Number of threads for NN computation and decoding.",
     )
 
+    parser.add_argument(
+        "--feature-extractor-pool-size",
+        type=int,
+        default=1,
+        help="""Number of threads for feature extraction. Feature extraction
+        runs in these threads instead of in the event loop thread.
+        """,
+    )
+
     parser.add_argument(
         "--max-batch-size",
         type=int,
@@ -318,9 +445,21 @@ def get_args():
         type=float,
         default=10,
         help="""Max time in millisecond to wait to build batches for inference.
-        If there are not enough requests in the stream queue to build a batch
-        of max_batch_size, it waits up to this time before fetching available
-        requests for computation.
+        It is measured from the arrival of the oldest request in the stream
+        queue. If there are not enough requests to build a batch of
+        max_batch_size before that, the available requests are sent for
+        computation. A batch is sent as soon as it is full.
+        """,
+    )
+
+    parser.add_argument(
+        "--resident-states",
+        type=sherpa.str2bool,
+        default=False,
+        help="""True to keep the encoder states of all connections in batched
+        tensors that persist across chunks. Each connection is assigned a
+        slot in them, so the states of a batch are not stacked and unstacked
+        for every chunk. It helps when --max-batch-size is large.
         """,
     )
 
@@ -389,7 +528,10 @@ def get_args():
         "--tail-padding-length",
         type=float,
         default=1.0,
-        help="Length of the tail padding in seconds",
+        help="Length of the tail padding in seconds. The recognizer also "
+        "decodes the last partial chunk of a stream with padding, but "
+        "that is not yet verified for every model type, so the padding "
+        "is kept by default. 0 disables it.",
     )
 
     return parser.parse_args()
@@ -430,6 +572,9 @@ def create_recognizer(args) -> sherpa.OnlineRecognizer:
         num_active_paths=args.num_active_paths,
         use_bbpe=args.use_bbpe,
         temperature=args.temperature,
+        resident_states=args.resident_states,
+        speculative_joiner=args.speculative_joiner,
+        decoder_cache_capacity=args.decoder_cache_capacity,
         feat_config=feat_config,
         decoding_method=args.decoding_method,
         fast_beam_search_config=fast_beam_search_config,
@@ -451,6 +596,7 @@ class StreamingServer(object):
         self,
         recognizer: sherpa.OnlineRecognizer,
         nn_pool_size: int,
+        feature_extractor_pool_size: int,
         max_wait_ms: float,
         max_batch_size: int,
         max_message_size: int,
@@ -459,6 +605,14 @@ class StreamingServer(object):
         doc_root: str,
         tail_padding_length: float,
         certificate: Optional[str] = None,
+        connection_counter: Optional[sherpa.ConnectionCounter] = None,
+        max_queue_delay_ms: float = 0,
+        min_nn_pool_utilization: float = 0.9,
+        max_defer_ms: float = 0,
+        idle_timeout: float = 0,
+        spill_file: Optional[str] = None,
+        spill_file_size: int = 1024,
+        serve_metrics: bool = True,
     ):
         """
         Args:
@@ -467,9 +621,13 @@ class StreamingServer(object):
           nn_pool_size:
             Number of threads for the thread pool that is responsible for
             neural network computation and decoding.
+          feature_extractor_pool_size:
+            Number of threads for the thread pool that is used for feature
+            extraction.
           max_wait_ms:
-            Max wait time in milliseconds in order to build a batch of
-            `batch_size`.
+            Max wait time in milliseconds, measured from the arrival of the
+            oldest queued request, in order to build a batch of
+            `max_batch_size`.
           max_batch_size:
             Max batch size for inference.
           max_message_size:
@@ -486,29 +644,90 @@ class StreamingServer(object):
           doc_root:
             Path to the directory where files like index.html for the HTTP
             server locate.
+          tail_padding_length:
+            Seconds of audio appended to the end of each utterance.
+            0 disables it.
           certificate:
             Optional. If not None, it will use secure websocket.
             You can use ./sherpa/bin/web/generate-certificate.py to generate
             it (the default generated filename is `cert.pem`).
+          connection_counter:
+            Optional. If not None, it counts the active connections of all
+            worker processes and max_active_connections is ignored.
+          max_queue_delay_ms:
+            The latency SLO. New connections are refused if the time that
+            requests spend in the queue of the batch scheduler exceeds it
+            while the NN pool is busy. 0 disables it.
+          min_nn_pool_utilization:
+            New connections are refused only if the utilization of the
+            NN pool is at least this value.
+          max_defer_ms:
+            Max time in milliseconds that a new connection waits for the
+            load to decrease before it is refused.
+          idle_timeout:
+            If a client sends nothing for this number of seconds, its
+            stream is serialized into the session store and released.
+            0 disables it.
+          spill_file:
+            Optional. Path to the file of the session store. If None, an
+            anonymous temporary file is used.
+          spill_file_size:
+            Size of the file of the session store in MB.
+          serve_metrics:
+            True to serve the metrics at /metrics. It should be False if
+            there are several worker processes, since a scrape would return
+            only the metrics of the worker that handles it.
         """
         self.recognizer = recognizer
 
+        self.metrics = sherpa.ServerMetrics(
+            num_active_streams=lambda: self.connection_counter.value
+        )
+
         self.certificate = certificate
-        self.http_server = sherpa.HttpServer(doc_root)
+        self.http_server = sherpa.HttpServer(
+            doc_root, self.metrics if serve_metrics else None
+        )
+
+        # Feature extraction releases the GIL, so it can run in
+        # threads without blocking the event loop
+        self.feature_pool = ThreadPoolExecutor(
+            max_workers=feature_extractor_pool_size,
+            thread_name_prefix="feature",
+        )
 
         self.nn_pool = ThreadPoolExecutor(
             max_workers=nn_pool_size,
             thread_name_prefix="nn",
         )
 
-        self.stream_queue = asyncio.Queue()
+        self.scheduler = sherpa.BatchScheduler(
+            process_batch=self.decode_streams,
+            executor=self.nn_pool,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_in_flight=nn_pool_size,
+            on_dispatch=self.metrics.observe_dispatch,
+        )
+
         self.max_wait_ms = max_wait_ms
         self.max_batch_size = max_batch_size
         self.max_message_size = max_message_size
         self.max_queue_size = max_queue_size
-        self.max_active_connections = max_active_connections
+        if connection_counter is None:
+            connection_counter = sherpa.ConnectionCounter(
+                max_active_connections
+            )
+        self.connection_counter = connection_counter
 
-        self.current_active_connections = 0
+        self.admission_controller = sherpa.AdmissionController(
+            scheduler=self.scheduler,
+            max_queue_delay_ms=max_queue_delay_ms,
+            min_utilization=min_nn_pool_utilization,
+            max_defer_ms=max_defer_ms,
+        )
+
+        self.lag_monitor = sherpa.EventLoopLagMonitor()
 
         self.sample_rate = int(
             recognizer.config.feat_config.fbank_opts.frame_opts.samp_freq
@@ -516,54 +735,72 @@ class StreamingServer(object):
         self.decoding_method = recognizer.config.decoding_method
         self.tail_padding_length = tail_padding_length
 
-    async def stream_consumer_task(self):
-        """This function extracts streams from the queue, batches them up, sends
-        them to the RNN-T model for computation and decoding.
-        """
-        while True:
-            if self.stream_queue.empty():
-                await asyncio.sleep(self.max_wait_ms / 1000)
-                continue
-
-            batch = []
-            try:
-                while len(batch) < self.max_batch_size:
-                    item = self.stream_queue.get_nowait()
-
-                    assert self.recognizer.is_ready(item[0])
-
-                    batch.append(item)
-            except asyncio.QueueEmpty:
-                pass
-            stream_list = [b[0] for b in batch]
-            future_list = [b[1] for b in batch]
-
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(
-                self.nn_pool,
-                self.recognizer.decode_streams,
-                stream_list,
+        # Streams of idle connections are moved into it
+        self.idle_timeout = idle_timeout
+        self.session_store = None
+        if idle_timeout > 0:
+            self.session_store = sherpa.SessionStore(
+                capacity=spill_file_size * 1024 * 1024,
+                filename=spill_file,
             )
 
-            for f in future_list:
-                self.stream_queue.task_done()
-                f.set_result(None)
+    def decode_streams(self, streams: List[sherpa.OnlineStream]) -> List[float]:
+        """Decode a batch of streams. It is invoked in the NN pool.
+
+        Returns:
+          Return the computation time in seconds of the batch divided
+          equally among the streams.
+        """
+        start = time.perf_counter()
+        timing = self.recognizer.decode_streams(streams)
+        elapsed = time.perf_counter() - start
+
+        self.metrics.encoder_time.observe(timing.encoder_time)
+        self.metrics.search_time.observe(timing.search_time)
+
+        return [elapsed / len(streams)] * len(streams)
 
     async def compute_and_decode(
         self,
         stream: sherpa.OnlineStream,
-    ) -> None:
-        """Put the stream into the queue and wait it to be processed by the
-        consumer task.
+    ) -> float:
+        """Put the stream into the queue of the batch scheduler and wait it
+        to be processed.
 
         Args:
           stream:
             The stream to be processed. Note: It is changed in-place.
+        Returns:
+          Return the share of the stream of the computation time in seconds.
+        """
+        assert self.recognizer.is_ready(stream)
+        return await self.scheduler.submit(stream)
+
+    async def accept_waveform(
+        self,
+        stream: sherpa.OnlineStream,
+        samples: torch.Tensor,
+        sample_rate: int,
+    ) -> None:
+        """Compute features of the given samples in the feature extractor
+        thread pool so that the event loop is not blocked.
+
+        Args:
+          stream:
+            The stream to accept the samples. Note: It is changed in-place.
+          samples:
+            A 1-D torch.float32 tensor containing audio samples.
+          sample_rate:
+            Sample rate of the samples. If it is different from --sample-rate,
+            the stream resamples them.
         """
         loop = asyncio.get_running_loop()
-        future = loop.create_future()
-        await self.stream_queue.put((stream, future))
-        await future
+        await loop.run_in_executor(
+            self.feature_pool,
+            stream.accept_waveform,
+            sample_rate,
+            samples,
+        )
 
     async def process_request(
         self,
@@ -585,19 +822,35 @@ class StreamingServer(object):
             header = {"Content-Type": mime_type}
             return status, header, response
 
-        if self.current_active_connections < self.max_active_connections:
-            self.current_active_connections += 1
+        # Sessions are refused if accepting them would violate the latency
+        # SLO, so that the connections being served are not slowed down.
+        if await self.admission_controller.admit(
+            self.connection_counter.try_acquire
+        ):
             return None
 
         # Refuse new connections
         status = http.HTTPStatus.SERVICE_UNAVAILABLE  # 503
-        header = {"Hint": "The server is overloaded. Please retry later."}
+        header = {
+            "Hint": "The server is overloaded. Please retry later.",
+            "Retry-After": str(self.admission_controller.retry_after),
+        }
         response = b"The server is busy. Please retry later."
 
         return status, header, response
 
-    async def run(self, port: int):
-        task = asyncio.create_task(self.stream_consumer_task())
+    async def run(self, port: int, sock: Optional[socket.socket] = None):
+        """
+        Args:
+          port:
+            The port to listen on.
+          sock:
+            Optional. If not None, it is a listening socket shared by all
+            worker processes and `port` is only used for logging.
+        """
+        task = asyncio.create_task(self.scheduler.run())
+        monitor_task = asyncio.create_task(self.lag_monitor.run())
+        admission_task = asyncio.create_task(self.admission_controller.run())
 
         if self.certificate:
             logging.info(f"Using certificate: {self.certificate}")
@@ -607,13 +860,18 @@ class StreamingServer(object):
             ssl_context = None
             logging.info("No certificate provided")
 
+        if sock is not None:
+            address = dict(sock=sock)
+        else:
+            address = dict(host="", port=port)
+
         async with websockets.serve(
             self.handle_connection,
-            host="",
-            port=port,
+            **address,
             max_size=self.max_message_size,
             max_queue=self.max_queue_size,
             process_request=self.process_request,
+            subprotocols=[DELTA_JSON_PROTOCOL, DELTA_MSGPACK_PROTOCOL],
             ssl=ssl_context,
         ):
             ip_list = ["0.0.0.0", "localhost", "127.0.0.1"]
@@ -627,6 +885,8 @@ class StreamingServer(object):
             await asyncio.Future()  # run forever
 
         await task  # not reachable
+        await monitor_task
+        await admission_task
 
     async def handle_connection(
         self,
@@ -645,12 +905,18 @@ class StreamingServer(object):
             logging.info(f"{socket.remote_address} disconnected")
         finally:
             # Decrement so that it can accept new connections
-            self.current_active_connections -= 1
+            self.connection_counter.release()
+
+            if self.session_store is not None:
+                self.session_store.discard(id(socket))
 
             logging.info(
                 f"Disconnected: {socket.remote_address}. "
-                f"Number of connections: {self.current_active_connections}/{self.max_active_connections}"  # noqa
+                f"Number of connections: {self.connection_counter}"
             )
+            logging.info(f"Batch scheduler: {self.scheduler.stats}")
+            logging.info(f"Event loop: {self.lag_monitor}")
+            logging.info(f"Admission: {self.admission_controller}")
 
     async def handle_connection_impl(
         self,
@@ -665,49 +931,123 @@ class StreamingServer(object):
         """
         logging.info(
             f"Connected: {socket.remote_address}. "
-            f"Number of connections: {self.current_active_connections}/{self.max_active_connections}"  # noqa
+            f"Number of connections: {self.connection_counter}"
         )
 
         stream = self.recognizer.create_stream()
 
+        # The result sent last time
+        last = sherpa.OnlineRecognitionResult()
+
+        # For the real time factor of this connection
+        compute_time = 0
+        duration = 0
+
+        # The client can declare the format of the audio samples in the
+        # first message, e.g., {"sample_rate": 8000, "sample_format": "s16le"}.
+        # Otherwise, it sends float32 samples with --sample-rate.
+        audio_format = sherpa.AudioFormat(self.sample_rate)
+        message = await socket.recv()
+        if isinstance(message, str) and message != "Done":
+            if not audio_format.from_json(message):
+                logging.info(f"Invalid audio format: {message[:100]}")
+                # 1003: The endpoint received data it cannot accept
+                await socket.close(code=1003, reason="Invalid audio format")
+                return
+
+            logging.info(f"{socket.remote_address}: {audio_format}")
+            message = None
+
         while True:
-            samples = await self.recv_audio_samples(socket)
+            if message is None and self.session_store is not None:
+                message = await self.recv_with_timeout(socket)
+                if message is None and await self.spill_stream(socket, stream):
+                    # Release the memory of the stream while the client
+                    # is idle
+                    stream = None
+                    message = await socket.recv()
+                    stream = await self.restore_stream(socket)
+
+            samples = await self.recv_audio_samples(
+                socket, audio_format, message
+            )
+            message = None
             if samples is None:
                 break
 
-            # TODO(fangjun): At present, we assume the sampling rate
-            # of the received audio samples equal to --sample-rate
-            stream.accept_waveform(
-                sampling_rate=self.sample_rate, waveform=samples
+            start = time.perf_counter()
+            duration += samples.numel() / audio_format.sample_rate
+
+            await self.accept_waveform(
+                stream, samples, audio_format.sample_rate
             )
 
             while self.recognizer.is_ready(stream):
-                await self.compute_and_decode(stream)
+                compute_time += await self.compute_and_decode(stream)
                 result = self.recognizer.get_result(stream)
+                # Clients of the default protocol expect a message for
+                # every decoded chunk. Only delta clients skip unchanged
+                # results.
+                if result != last or socket.subprotocol not in (
+                    DELTA_JSON_PROTOCOL,
+                    DELTA_MSGPACK_PROTOCOL,
+                ):
+                    await socket.send(
+                        self.encode_result(result, last, socket.subprotocol)
+                    )
+                    last = result
+
+                self.metrics.latency.observe(time.perf_counter() - start)
+
+        if self.tail_padding_length > 0:
+            # The padding has to use the same sample rate as the received
+            # samples since the stream resamples them with the same resampler.
+            tail_padding = torch.rand(
+                int(audio_format.sample_rate * self.tail_padding_length),
+                dtype=torch.float32,
+            )
+            await self.accept_waveform(
+                stream, tail_padding, audio_format.sample_rate
+            )
 
-                message = {
-                    "method": self.decoding_method,
-                    "segment": result.segment,
-                    "text": result.text,
-                    "tokens": result.tokens,
-                    "timestamps": format_timestamps(result.timestamps),
-                    "final": result.is_final,
-                }
-                print(message)
-
-                await socket.send(json.dumps(message))
-
-        tail_padding = torch.rand(
-            int(self.sample_rate * self.tail_padding_length), dtype=torch.float32
-        )
-        stream.accept_waveform(
-            sampling_rate=self.sample_rate, waveform=tail_padding
-        )
+        # The remaining frames that are fewer than a chunk are decoded
+        # with padding by the recognizer
         stream.input_finished()
         while self.recognizer.is_ready(stream):
-            await self.compute_and_decode(stream)
+            compute_time += await self.compute_and_decode(stream)
 
         result = self.recognizer.get_result(stream)
+        result.is_final = True  # end of connection, always set final to True
+
+        await socket.send(self.encode_result(result, last, socket.subprotocol))
+
+        if duration > 0:
+            self.metrics.rtf.observe(compute_time / duration)
+
+    def encode_result(
+        self,
+        result: sherpa.OnlineRecognitionResult,
+        last: sherpa.OnlineRecognitionResult,
+        protocol: Optional[str],
+    ) -> Union[str, bytes]:
+        """Encode a result as a message for the client.
+
+        Args:
+          result:
+            The result to send.
+          last:
+            The result sent last time. Used only for delta messages.
+          protocol:
+            The negotiated websocket subprotocol. If it is None, the message
+            contains the full result.
+        Returns:
+          Return a str for JSON or bytes for MessagePack.
+        """
+        if protocol == DELTA_MSGPACK_PROTOCOL:
+            return result.as_msgpack(last)
+
+        if protocol == DELTA_JSON_PROTOCOL:
+            return result.as_json_string(last)
 
         message = {
             "method": self.decoding_method,
@@ -715,41 +1055,109 @@ class StreamingServer(object):
             "text": result.text,
             "tokens": result.tokens,
             "timestamps": format_timestamps(result.timestamps),
-            "final": True,  # end of connection, always set final to True
+            "final": result.is_final,
         }
+        return json.dumps(message)
+
+    async def recv_with_timeout(
+        self,
+        socket: websockets.WebSocketServerProtocol,
+    ) -> Optional[Union[str, bytes]]:
+        """Receive a message from the client.
+
+        Returns:
+          Return the message or return None if the client sends nothing
+          within --idle-timeout seconds.
+        """
+        try:
+            return await asyncio.wait_for(socket.recv(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def spill_stream(
+        self,
+        socket: websockets.WebSocketServerProtocol,
+        stream: sherpa.OnlineStream,
+    ) -> bool:
+        """Serialize the stream of an idle connection into the session store.
+
+        Args:
+          socket:
+            The socket of the connection. Its id is used as the key.
+          stream:
+            The stream of the connection.
+        Returns:
+          Return True if the stream is stored, in which case the caller
+          should drop it. Return False if the stream does not support
+          serialization or the store is full.
+        """
+        if not stream.is_serializable:
+            return False
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.feature_pool, stream.serialize)
+
+        if not self.session_store.put(id(socket), data):
+            logging.info(
+                f"Session store is full ({self.session_store.used} bytes). "
+                f"Keep the stream of {socket.remote_address} in memory"
+            )
+            return False
 
-        await socket.send(json.dumps(message))
+        return True
+
+    async def restore_stream(
+        self,
+        socket: websockets.WebSocketServerProtocol,
+    ) -> sherpa.OnlineStream:
+        """Restore the stream of a connection from the session store.
+
+        Args:
+          socket:
+            The socket of the connection that was passed to
+            :meth:`spill_stream`.
+        Returns:
+          Return the restored stream.
+        """
+        data = self.session_store.pop(id(socket))
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.feature_pool, self.recognizer.restore_stream, data
+        )
 
     async def recv_audio_samples(
         self,
         socket: websockets.WebSocketServerProtocol,
+        audio_format: sherpa.AudioFormat,
+        message: Optional[Union[str, bytes]] = None,
     ) -> Optional[torch.Tensor]:
         """Receives a tensor from the client.
 
         Each message contains either a bytes buffer containing audio samples
-        in 16 kHz or contains "Done" meaning the end of utterance.
+        in the format declared by the client or contains "Done" meaning the
+        end of utterance.
 
         Args:
           socket:
             The socket for communicating with the client.
+          audio_format:
+            Format of the audio samples.
+          message:
+            Optional. If not None, it is used instead of a message received
+            from the socket.
         Returns:
           Return a 1-D torch.float32 tensor containing the audio samples or
           return None.
         """
-        message = await socket.recv()
+        if message is None:
+            message = await socket.recv()
+
         if message == "Done":
             return None
 
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            # PyTorch warns that the underlying buffer is not writable.
-            # We ignore it here as we are not going to write it anyway.
-            if hasattr(torch, "frombuffer"):
-                # Note: torch.frombuffer is available only in torch>= 1.10
-                return torch.frombuffer(message, dtype=torch.float32)
-            else:
-                array = np.frombuffer(message, dtype=np.float32)
-                return torch.from_numpy(array)
+        # It converts the samples in C++ without an intermediate copy
+        return audio_format.convert(message)
 
 
 def check_args(args):
@@ -803,45 +1211,86 @@ def check_args(args):
 
 
 @torch.no_grad()
-def main():
-    args = get_args()
-    logging.info(vars(args))
-    check_args(args)
+def run_worker(
+    worker_id: int,
+    args,
+    sock: Optional[socket.socket] = None,
+    connection_counter: Optional[sherpa.ConnectionCounter] = None,
+):
+    """Create a recognizer and run the server until it is killed.
+
+    Args:
+      worker_id:
+        ID of this worker. Used only for logging.
+      args:
+        The parsed command line arguments.
+      sock:
+        Optional. If not None, the listening socket shared by all workers.
+      connection_counter:
+        Optional. If not None, the number of active connections of all
+        workers.
+    """
+    logging.info(f"Worker {worker_id} started")
 
     torch.set_num_threads(args.num_threads)
     torch.set_num_interop_threads(args.num_threads)
     recognizer = create_recognizer(args)
 
-    port = args.port
-    nn_pool_size = args.nn_pool_size
-    max_batch_size = args.max_batch_size
-    max_wait_ms = args.max_wait_ms
-    max_message_size = args.max_message_size
-    max_queue_size = args.max_queue_size
-    max_active_connections = args.max_active_connections
-    certificate = args.certificate
-    doc_root = args.doc_root
-    tail_padding_length = args.tail_padding_length
-
-    if certificate and not Path(certificate).is_file():
-        raise ValueError(f"{certificate} does not exist")
-
-    if not Path(doc_root).is_dir():
-        raise ValueError(f"Directory {doc_root} does not exist")
+    spill_file = args.spill_file or None
+    if spill_file is not None and args.num_workers > 1:
+        spill_file = f"{spill_file}.{worker_id}"
 
     server = StreamingServer(
         recognizer=recognizer,
-        nn_pool_size=nn_pool_size,
-        max_batch_size=max_batch_size,
-        max_wait_ms=max_wait_ms,
-        max_message_size=max_message_size,
-        max_queue_size=max_queue_size,
-        max_active_connections=max_active_connections,
-        certificate=certificate,
-        doc_root=doc_root,
-        tail_padding_length=tail_padding_length
-    )
-    asyncio.run(server.run(port))
+        nn_pool_size=args.nn_pool_size,
+        feature_extractor_pool_size=args.feature_extractor_pool_size,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_message_size=args.max_message_size,
+        max_queue_size=args.max_queue_size,
+        max_active_connections=args.max_active_connections,
+        certificate=args.certificate,
+        doc_root=args.doc_root,
+        tail_padding_length=args.tail_padding_length,
+        connection_counter=connection_counter,
+        max_queue_delay_ms=args.max_queue_delay_ms,
+        min_nn_pool_utilization=args.min_nn_pool_utilization,
+        max_defer_ms=args.max_defer_ms,
+        idle_timeout=args.idle_timeout,
+        spill_file=spill_file,
+        spill_file_size=args.spill_file_size,
+        serve_metrics=args.num_workers == 1,
+    )
+    asyncio.run(server.run(args.port, sock))
+
+
+def main():
+    args = get_args()
+    logging.info(vars(args))
+    check_args(args)
+
+    if args.certificate and not Path(args.certificate).is_file():
+        raise ValueError(f"{args.certificate} does not exist")
+
+    if not Path(args.doc_root).is_dir():
+        raise ValueError(f"Directory {args.doc_root} does not exist")
+
+    if args.num_workers == 1:
+        run_worker(0, args)
+        return
+
+    # The socket and the counter are created before forking so that
+    # all workers share them
+    sock = sherpa.create_listening_socket(args.port)
+    connection_counter = sherpa.ConnectionCounter(
+        args.max_active_connections, args.num_workers
+    )
+    sherpa.run_workers(
+        args.num_workers,
+        target=run_worker,
+        args=(args, sock, connection_counter),
+        connection_counter=connection_counter,
+    )
 
 
 # See https://github.com/pytorch/pytorch/issues/38342
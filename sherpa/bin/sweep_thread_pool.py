@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# Copyright      2025  Xiaomi Corp.
+
+"""
+Sweep the size of the thread pool for NN computation and decoding and the
+number of intra-op threads of a server on one machine.
+
+For each combination, it starts the server with
+--nn-pool-size=K --num-threads=T, runs ./benchmark.py against it, and
+stops the server. The throughput and latencies of all combinations are
+printed as a table at the end.
+
+All threads of the pool share one recognizer. --num-threads is the
+process-wide number of intra-op threads of PyTorch.
+
+Usage:
+
+    ./sweep_thread_pool.py \
+      --pool-size 1,2,4 \
+      --num-threads 1,2,4 \
+      --max-cores 8 \
+      --server "./streaming_server.py --nn-model=/path/to/cpu_jit.pt \
+                --tokens=/path/to/tokens.txt" \
+      --benchmark-args "--mode streaming --concurrency 40 --speed 0 \
+                        --wav-dir /path/to/test_wavs" \
+      --output sweep.json
+
+The C++ servers set the number of intra-op threads to 1 and use
+--num-work-threads as the size of the thread pool, e.g.,
+
+    ./sweep_thread_pool.py \
+      --pool-size-flag=--num-work-threads \
+      --num-threads-flag= \
+      --server "sherpa-online-websocket-server --nn-model=... --tokens=..." \
+      --benchmark-args "--mode streaming --num-synthetic 100 --speed 0"
+
+Do not pass the port to the server. It is given by --port.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--server",
+        type=str,
+        required=True,
+        help="Command to start the server, including the model arguments.",
+    )
+
+    parser.add_argument(
+        "--benchmark-args",
+        type=str,
+        default="--num-synthetic 50 --speed 0",
+        help="Arguments passed to ./benchmark.py, "
+        "except --server-port and --output.",
+    )
+
+    parser.add_argument(
+        "--pool-size",
+        type=str,
+        default="1,2,4",
+        help="Comma separated values of the size of the thread pool.",
+    )
+
+    parser.add_argument(
+        "--num-threads",
+        type=str,
+        default="1,2,4",
+        help="Comma separated values of the number of intra-op threads. "
+        "It is ignored if --num-threads-flag is empty.",
+    )
+
+    parser.add_argument(
+        "--max-cores",
+        type=int,
+        default=os.cpu_count(),
+        help="Combinations using more than this number of threads in total "
+        "are skipped.",
+    )
+
+    parser.add_argument(
+        "--pool-size-flag",
+        type=str,
+        default="--nn-pool-size",
+        help="Flag of the server for the size of the thread pool. It is "
+        "--nn-pool-size for the Python servers and --num-work-threads for "
+        "the C++ servers.",
+    )
+
+    parser.add_argument(
+        "--num-threads-flag",
+        type=str,
+        default="--num-threads",
+        help="Flag of the server for the number of intra-op threads. "
+        "Leave it empty if the server has no such flag.",
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=6006,
+        help="Port of the server.",
+    )
+
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=300,
+        help="Max seconds to wait for the server to listen on the port.",
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="If given, the results are also written to this file as JSON.",
+    )
+
+    return parser.parse_args()
+
+
+def parse_list(s: str) -> List[int]:
+    return [int(i) for i in s.split(",") if i.strip()]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> bool:
+    """Return True once the port accepts connections. Return False if the
+    process exits or the timeout expires."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+
+        try:
+            with socket.create_connection(("localhost", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.5)
+
+    return False
+
+
+def run_one(args, pool_size: int, num_threads: int) -> Optional[Dict]:
+    """Start the server, run the benchmark and stop the server.
+
+    Returns:
+      Return the report of ./benchmark.py or None if the server
+      failed to start.
+    """
+    cmd = shlex.split(args.server) + [
+        f"--port={args.port}",
+        f"{args.pool_size_flag}={pool_size}",
+    ]
+    if args.num_threads_flag:
+        cmd.append(f"{args.num_threads_flag}={num_threads}")
+
+    logging.info(f"Starting {cmd}")
+    server = subprocess.Popen(cmd)
+
+    try:
+        if not wait_for_port(args.port, server, args.startup_timeout):
+            logging.info(f"The server failed to start: {cmd}")
+            return None
+
+        with tempfile.TemporaryDirectory() as d:
+            output = Path(d) / "report.json"
+            benchmark = Path(__file__).parent / "benchmark.py"
+            subprocess.run(
+                [sys.executable, str(benchmark)]
+                + shlex.split(args.benchmark_args)
+                + [f"--server-port={args.port}", f"--output={output}"],
+                check=True,
+            )
+            with open(output) as f:
+                return json.load(f)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def format_table(results: List[Dict]) -> str:
+    header = (
+        f"{'pool':>8} {'threads':>7} {'throughput':>10} "
+        f"{'p50(s)':>8} {'p99(s)':>8} {'errors':>7}"
+    )
+    lines = [header]
+    for r in results:
+        final = r["final_latency"]
+        lines.append(
+            f"{r['pool_size']:>8} {r['num_threads']:>7} "
+            f"{r['throughput']:>10} {final.get('p50', '-'):>8} "
+            f"{final.get('p99', '-'):>8} {r['error_rate']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    args = get_args()
+
+    # The server does not set the number of intra-op threads, so there is
+    # only one value of it to try
+    num_threads = parse_list(args.num_threads) if args.num_threads_flag else [1]
+
+    results = []
+    for k in parse_list(args.pool_size):
+        for t in num_threads:
+            # With the OpenMP backend of PyTorch, each thread of the pool
+            # runs its own team of t intra-op threads
+            if k * t > args.max_cores:
+                logging.info(f"Skip {k} x {t} > {args.max_cores} cores")
+                continue
+
+            report = run_one(args, k, t)
+            if report is None:
+                continue
+
+            report["pool_size"] = k
+            report["num_threads"] = t
+            results.append(report)
+
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    formatter = "%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] %(message)s"  # noqa
+    logging.basicConfig(format=formatter, level=logging.INFO)
+    main()
@@ -18,11 +18,17 @@
 #include "sherpa/cpp_api/offline-recognizer.h"
 
 #include <chrono>  // NOLINT
+#include <map>
+#include <memory>
+#include <string>
+#include <utility>
+#include <vector>
 
 #include "kaldi_native_io/csrc/kaldi-table.h"
 #include "kaldi_native_io/csrc/text-utils.h"
 #include "kaldi_native_io/csrc/wave-reader.h"
 #include "sherpa/cpp_api/parse-options.h"
+#include "sherpa/csrc/length-bucket-queue.h"
 #include "sherpa/csrc/log.h"
 #include "torch/script.h"
 
@@ -77,6 +83,80 @@ See:
 for more details.
 )";
 
+struct Item {
+  // Position of the utterance in the input
+  int32_t index;
+  std::string key;
+  std::unique_ptr<sherpa::OfflineStream> stream;
+};
+
+/* Write results in the order of the input utterances.
+ *
+ * Utterances are decoded in the order in which their buckets become ready,
+ * so a result is kept until the results of all preceding utterances have
+ * been written.
+ */
+class OrderedResultWriter {
+ public:
+  explicit OrderedResultWriter(const std::string &wspecifier)
+      : writer_(wspecifier) {}
+
+  void Write(int32_t index, const std::string &key,
+             std::vector<std::string> words) {
+    pending_.emplace(index, std::make_pair(key, std::move(words)));
+
+    for (auto it = pending_.begin();
+         it != pending_.end() && it->first == next_index_;
+         it = pending_.erase(it)) {
+      writer_.Write(it->second.first, it->second.second);
+      ++next_index_;
+    }
+  }
+
+  // Number of results that wait for a preceding utterance
+  int32_t NumPending() const { return pending_.size(); }
+
+ private:
+  kaldiio::TableWriter<kaldiio::TokenVectorHolder> writer_;
+  std::map<int32_t, std::pair<std::string, std::vector<std::string>>>
+      pending_;
+  int32_t next_index_ = 0;
+};
+
+/* Decode batches from the queue and write the results.
+ *
+ * @param force  If false, only batches that are full are decoded. If true,
+ *               all items in the queue are decoded.
+ */
+static void DecodeBatches(
+    sherpa::OfflineRecognizer *recognizer, bool force,
+    sherpa::LengthBucketQueue<Item> *queue, sherpa::PaddingStats *stats,
+    OrderedResultWriter *writer) {
+  std::vector<int32_t> lengths;
+  while (!queue->Empty()) {
+    std::vector<Item> items = queue->Pop(force, &lengths);
+    if (items.empty()) {
+      break;
+    }
+    stats->Add(lengths);
+
+    std::vector<sherpa::OfflineStream *> p_ss;
+    p_ss.reserve(items.size());
+    for (auto &p : items) {
+      p_ss.push_back(p.stream.get());
+    }
+
+    recognizer->DecodeStreams(p_ss.data(), p_ss.size());
+
+    for (const auto &p : items) {
+      std::vector<std::string> words;
+      kaldiio::SplitStringToVector(p.stream->GetResult().text, " ", true,
+                                   &words);
+      writer->Write(p.index, p.key, std::move(words));
+    }
+  }
+}
+
 int main(int argc, char *argv[]) {
   // see
   // https://pytorch.org/docs/stable/notes/cpu_threading_torchscript_inference.html
@@ -98,6 +178,11 @@ int main(int argc, char *argv[]) {
   sherpa::OfflineRecognizerConfig config;
   config.Register(&po);
 
+  // Used only when --use-wav-scp=true or --use-feats-scp=true so that
+  // utterances of similar lengths are decoded together
+  sherpa::LengthBucketQueueConfig bucket_config;
+  bucket_config.Register(&po);
+
   po.Register("use-wav-scp", &use_wav_scp,
               "If true, user should provide two arguments: "
               "scp:wav.scp ark,scp,t:results.ark,results.scp");
@@ -108,10 +193,15 @@ int main(int argc, char *argv[]) {
 
   po.Register("batch-size", &batch_size,
               "Used only when --use-wav-scp=true or --use-feats-scp=true. "
-              "It specifies the batch size to use for decoding");
+              "It specifies the max batch size to use for decoding");
 
   po.Read(argc, argv);
 
+  // All utterances are available in advance, so a bucket is decoded only
+  // when it is full. The remaining ones are decoded at the end.
+  bucket_config.max_batch_size = batch_size;
+  bucket_config.max_wait_ms = -1;
+
   if (po.NumArgs() < 1) {
     po.PrintUsage();
     exit(EXIT_FAILURE);
@@ -150,17 +240,21 @@ int main(int argc, char *argv[]) {
 
     SHERPA_CHECK_GT(batch_size, 0);
 
-    kaldiio::TableWriter<kaldiio::TokenVectorHolder> writer(po.GetArg(2));
+    OrderedResultWriter writer(po.GetArg(2));
 
     kaldiio::SequentialTableReader<kaldiio::WaveHolder> wav_reader(
         po.GetArg(1));
 
-    std::vector<std::string> keys;
-    std::vector<torch::Tensor> values;
-    std::vector<std::unique_ptr<sherpa::OfflineStream>> ss;
-    std::vector<sherpa::OfflineStream *> p_ss;
+    SHERPA_CHECK(bucket_config.Validate());
+    sherpa::LengthBucketQueue<Item> queue(bucket_config);
+    sherpa::PaddingStats stats;
+    int32_t num_utterances = 0;
+
+    const auto &frame_opts = config.feat_config.fbank_opts.frame_opts;
+    int32_t window_shift = frame_opts.samp_freq * frame_opts.frame_shift_ms /
+                           1000;
+
     for (; !wav_reader.Done(); wav_reader.Next()) {
-      keys.push_back(wav_reader.Key());
       auto &wave_data = wav_reader.Value();
       if (wave_data.SampFreq() != expected_sample_rate) {
         SHERPA_LOG(FATAL) << wav_reader.Key()
@@ -180,37 +274,16 @@ int main(int argc, char *argv[]) {
                     32768;
       auto s = recognizer.CreateStream();
       s->AcceptSamples(tensor.data_ptr<float>(), tensor.numel());
-      ss.push_back(std::move(s));
-      p_ss.push_back(ss.back().get());
+      queue.Push({num_utterances++, wav_reader.Key(), std::move(s)},
+                 d.NumCols() / window_shift);
 
-      if (static_cast<int32_t>(keys.size()) >= batch_size) {
-        // now for recognition
-        recognizer.DecodeStreams(p_ss.data(), p_ss.size());
-
-        for (size_t i = 0; i != keys.size(); ++i) {
-          std::vector<std::string> words;
-          kaldiio::SplitStringToVector(ss[i]->GetResult().text, " ", true,
-                                       &words);
-          writer.Write(keys[i], words);
-        }
-        keys.clear();
-        ss.clear();
-        p_ss.clear();
-      }
+      DecodeBatches(&recognizer, false, &queue, &stats, &writer);
     }
 
-    if (!keys.empty()) {
-      recognizer.DecodeStreams(p_ss.data(), p_ss.size());
-      for (size_t i = 0; i != keys.size(); ++i) {
-        std::vector<std::string> words;
-        kaldiio::SplitStringToVector(ss[i]->GetResult().text, " ", true,
-                                     &words);
-        writer.Write(keys[i], words);
-      }
-      keys.clear();
-      ss.clear();
-      p_ss.clear();
-    }
+    DecodeBatches(&recognizer, true, &queue, &stats, &writer);
+    SHERPA_CHECK_EQ(writer.NumPending(), 0);
+
+    SHERPA_LOG(INFO) << stats.ToString();
 
     return 0;
   }
@@ -240,53 +313,34 @@ int main(int argc, char *argv[]) {
 
     SHERPA_CHECK_GT(batch_size, 0);
 
-    kaldiio::TableWriter<kaldiio::TokenVectorHolder> writer(po.GetArg(2));
+    OrderedResultWriter writer(po.GetArg(2));
 
     kaldiio::SequentialTableReader<
         kaldiio::KaldiObjectHolder<kaldiio::Matrix<float>>>
         feature_reader(po.GetArg(1));
-    std::vector<std::string> keys;
-    std::vector<torch::Tensor> values;
-    std::vector<std::unique_ptr<sherpa::OfflineStream>> ss;
-    std::vector<sherpa::OfflineStream *> p_ss;
+
+    SHERPA_CHECK(bucket_config.Validate());
+    sherpa::LengthBucketQueue<Item> queue(bucket_config);
+    sherpa::PaddingStats stats;
+    int32_t num_utterances = 0;
+
     for (; !feature_reader.Done(); feature_reader.Next()) {
-      keys.push_back(feature_reader.Key());
       auto &d = feature_reader.Value();
       auto tensor = torch::from_blob(const_cast<float *>(d.Data()),
                                      {d.NumRows(), d.NumCols()}, torch::kFloat);
       auto s = recognizer.CreateStream();
       s->AcceptFeatures(tensor.data_ptr<float>(), tensor.size(0),
                         tensor.size(1));
-      ss.push_back(std::move(s));
-      p_ss.push_back(ss.back().get());
+      queue.Push({num_utterances++, feature_reader.Key(), std::move(s)},
+                 d.NumRows());
 
-      if (static_cast<int32_t>(keys.size()) >= batch_size) {
-        recognizer.DecodeStreams(p_ss.data(), p_ss.size());
-
-        for (size_t i = 0; i != keys.size(); ++i) {
-          std::vector<std::string> words;
-          kaldiio::SplitStringToVector(ss[i]->GetResult().text, " ", true,
-                                       &words);
-          writer.Write(keys[i], words);
-        }
-        keys.clear();
-        ss.clear();
-        p_ss.clear();
-      }
+      DecodeBatches(&recognizer, false, &queue, &stats, &writer);
     }
 
-    if (!keys.empty()) {
-      recognizer.DecodeStreams(p_ss.data(), p_ss.size());
-      for (size_t i = 0; i != keys.size(); ++i) {
-        std::vector<std::string> words;
-        kaldiio::SplitStringToVector(ss[i]->GetResult().text, " ", true,
-                                     &words);
-        writer.Write(keys[i], words);
-      }
-      keys.clear();
-      ss.clear();
-      p_ss.clear();
-    }
+    DecodeBatches(&recognizer, true, &queue, &stats, &writer);
+    SHERPA_CHECK_EQ(writer.NumPending(), 0);
+
+    SHERPA_LOG(INFO) << stats.ToString();
 
     return 0;
   }
@@ -117,7 +117,7 @@ int32_t main(int32_t argc, char *argv[]) {
               "scp:wav.scp ark,scp,t:results.ark,results.scp");
 
   po.Register("padding-seconds", &padding_seconds,
-              "Number of seconds for tail padding.");
+              "Number of seconds for tail padding. 0 disables it.");
 
   sherpa::OnlineRecognizerConfig config;
   config.Register(&po);
@@ -191,7 +191,9 @@ int32_t main(int32_t argc, char *argv[]) {
                     32768;
       auto s = recognizer.CreateStream();
       s->AcceptWaveform(expected_sample_rate, tensor);
-      s->AcceptWaveform(expected_sample_rate, tail_padding);
+      if (padding_seconds > 0) {
+        s->AcceptWaveform(expected_sample_rate, tail_padding);
+      }
       s->InputFinished();
 
       while (recognizer.IsReady(s.get())) {
@@ -238,7 +240,9 @@ int32_t main(int32_t argc, char *argv[]) {
         }
       }
 
-      s->AcceptWaveform(expected_sample_rate, tail_padding);
+      if (padding_seconds > 0) {
+        s->AcceptWaveform(expected_sample_rate, tail_padding);
+      }
       s->InputFinished();
       while (recognizer.IsReady(s.get())) {
         recognizer.DecodeStream(s.get());
@@ -265,7 +269,9 @@ int32_t main(int32_t argc, char *argv[]) {
 
         s->AcceptWaveform(expected_sample_rate, wave);
 
-        s->AcceptWaveform(expected_sample_rate, tail_padding);
+        if (padding_seconds > 0) {
+          s->AcceptWaveform(expected_sample_rate, tail_padding);
+        }
         s->InputFinished();
         ss.push_back(std::move(s));
         p_ss.push_back(ss.back().get());
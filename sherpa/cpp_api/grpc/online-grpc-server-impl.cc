@@ -23,14 +23,14 @@ void OnlineGrpcDecoderConfig::Register(ParseOptions *po) {
                "Max batch size for recognition.");
 
   po->Register("padding-seconds", &padding_seconds,
-               "Num of seconds for tail padding.");
+               "Num of seconds for tail padding. 0 disables it.");
 }
 
 void OnlineGrpcDecoderConfig::Validate() const {
   recognizer_config.Validate();
   SHERPA_CHECK_GT(loop_interval_ms, 0);
   SHERPA_CHECK_GT(max_batch_size, 0);
-  SHERPA_CHECK_GT(padding_seconds, 0);
+  SHERPA_CHECK_GE(padding_seconds, 0);
 }
 
 void OnlineGrpcServerConfig::Register(ParseOptions *po) {
@@ -86,8 +86,9 @@ void OnlineGrpcDecoder::OnSpeechEnd(std::shared_ptr<Connection> c) {
 
 void OnlineGrpcDecoder::AcceptWaveform(std::shared_ptr<Connection> c) {
   std::lock_guard<std::mutex> lock(c->mutex);
-  float sample_rate =
-      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+  // The stream resamples the samples if it is different from the sample
+  // rate of the model
+  int32_t sample_rate = c->audio_format.sample_rate;
   while (!c->samples.empty()) {
     c->s->AcceptWaveform(sample_rate, c->samples.front());
     c->samples.pop_front();
@@ -97,21 +98,24 @@ void OnlineGrpcDecoder::AcceptWaveform(std::shared_ptr<Connection> c) {
 void OnlineGrpcDecoder::InputFinished(std::shared_ptr<Connection> c) {
   std::lock_guard<std::mutex> lock(c->mutex);
 
-  float sample_rate =
-      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+  int32_t sample_rate = c->audio_format.sample_rate;
 
   while (!c->samples.empty()) {
     c->s->AcceptWaveform(sample_rate, c->samples.front());
     c->samples.pop_front();
   }
 
-  // TODO(fangjun): Change the amount of paddings to be configurable
-  torch::Tensor tail_padding =
-      torch::zeros({static_cast<int64_t>
-           (config_.padding_seconds * sample_rate)}).to(torch::kFloat);
+  if (config_.padding_seconds > 0) {
+    torch::Tensor tail_padding =
+        torch::zeros({static_cast<int64_t>(config_.padding_seconds *
+                                           sample_rate)})
+            .to(torch::kFloat);
 
-  c->s->AcceptWaveform(sample_rate, tail_padding);
+    c->s->AcceptWaveform(sample_rate, tail_padding);
+  }
 
+  // The remaining frames that are fewer than a chunk are decoded with
+  // padding by the recognizer
   c->s->InputFinished();
 }
 
@@ -254,7 +258,21 @@ Status OnlineGrpcServer::Recognize(ServerContext* context,
   while (stream->Read(c->request.get())) {
     if (!c->start_flag) {
       c->start_flag = true;
-      c->reqid = c->request->decode_config().reqid();
+      const auto &decode_config = c->request->decode_config();
+      c->reqid = decode_config.reqid();
+
+      c->audio_format.sample_rate = decode_config.sample_rate() > 0
+                                        ? decode_config.sample_rate()
+                                        : sample_rate;
+      c->audio_format.sample_format = SampleFormat::kS16LE;
+      if (!decode_config.sample_format().empty() &&
+          !ParseSampleFormat(decode_config.sample_format(),
+                             &c->audio_format.sample_format)) {
+        SHERPA_LOG(INFO) << c->reqid << " Unsupported sample format: "
+                         << decode_config.sample_format();
+        return Status(grpc::StatusCode::INVALID_ARGUMENT,
+                      "Unsupported sample format");
+      }
 
       mutex_.lock();
       connections_.insert(c->reqid);
@@ -264,15 +282,11 @@ Status OnlineGrpcServer::Recognize(ServerContext* context,
       decoder_.connections_.insert({c->reqid, c});
       decoder_.mutex_.unlock();
     } else {
-      const int16_t* pcm_data =
-           reinterpret_cast<const int16_t*>(c->request->audio_data().c_str());
-      int32_t num_samples =
-                          c->request->audio_data().length() / sizeof(int16_t);
+      const std::string &audio_data = c->request->audio_data();
+      torch::Tensor samples =
+          c->audio_format.Convert(audio_data.data(), audio_data.size());
       SHERPA_LOG(INFO) << c->reqid << "Received "
-                       << num_samples << " samples";
-      torch::Tensor samples = torch::from_blob(const_cast<int16_t *>(pcm_data),
-                                      {num_samples},
-                                      torch::kShort).to(torch::kFloat) / 32768;
+                       << samples.numel() << " samples";
       c->samples.push_back(samples);
       decoder_.AcceptWaveform(c);
     }
@@ -19,6 +19,7 @@
 #include "sherpa/cpp_api/online-stream.h"
 #include "sherpa/cpp_api/parse-options.h"
 #include "sherpa/cpp_api/grpc/sherpa.grpc.pb.h"
+#include "sherpa/csrc/audio-format.h"
 
 namespace sherpa {
 using grpc::ServerContext;
@@ -46,6 +47,10 @@ struct Connection {
   // and invoke work threads to compute features
   std::deque<torch::Tensor> samples;
 
+  // Format of the received samples. It is set by the decode config of the
+  // first request.
+  AudioFormat audio_format;
+
   bool start_flag = false;       // first time read request flag
   bool finish_flag = false;      // connection finish flag
 
@@ -69,6 +74,7 @@ struct OnlineGrpcDecoderConfig {
 
   int32_t max_batch_size = 5;
 
+  // Seconds of tail padding. 0 disables it.
   float padding_seconds = 0.8;
 
   void Register(ParseOptions *po);
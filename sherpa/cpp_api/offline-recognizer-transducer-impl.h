@@ -7,13 +7,17 @@
 
 #include <memory>
 #include <string>
+#include <tuple>
 #include <utility>
 #include <vector>
 
 #include "sherpa/cpp_api/feature-config.h"
 #include "sherpa/cpp_api/offline-recognizer-impl.h"
 #include "sherpa/csrc/byte_util.h"
+#include "sherpa/csrc/context-graph-cache.h"
 #include "sherpa/csrc/context-graph.h"
+#include "sherpa/csrc/decoder-cache.h"
+#include "sherpa/csrc/frame-reducer.h"
 #include "sherpa/csrc/offline-conformer-transducer-model.h"
 #include "sherpa/csrc/offline-transducer-decoder.h"
 #include "sherpa/csrc/offline-transducer-fast-beam-search-decoder.h"
@@ -71,9 +75,30 @@ class OfflineRecognizerTransducerImpl : public OfflineRecognizerImpl {
 
     WarmUp();
 
+    if (config.frame_reducer_blank_threshold > 0 && !model_->HasCtcOutput()) {
+      SHERPA_LOG(WARNING) << "The model does not have a CTC head. "
+                          << "Ignore --frame-reducer-blank-threshold";
+      config_.frame_reducer_blank_threshold = 0;
+    } else if (config.frame_reducer_blank_threshold > 0) {
+      SHERPA_LOG(INFO) << "Drop frames with CTC blank probability >= "
+                       << config.frame_reducer_blank_threshold
+                       << " before the search. Tokens on dropped frames "
+                       << "are deleted";
+    }
+
+    if (config.decoder_cache_capacity > 0) {
+      model_->SetDecoderCache(
+          std::make_shared<DecoderCache>(config.decoder_cache_capacity));
+    }
+
+    if (config.context_graph_cache_capacity > 0) {
+      context_graph_cache_ = std::make_unique<ContextGraphCache>(
+          config.context_graph_cache_capacity);
+    }
+
     if (config.decoding_method == "greedy_search") {
-      decoder_ =
-          std::make_unique<OfflineTransducerGreedySearchDecoder>(model_.get());
+      decoder_ = std::make_unique<OfflineTransducerGreedySearchDecoder>(
+          model_.get(), config.speculative_joiner);
     } else if (config.decoding_method == "modified_beam_search") {
       decoder_ = std::make_unique<OfflineTransducerModifiedBeamSearchDecoder>(
           model_.get(), config.num_active_paths, config.temperature);
@@ -97,8 +122,14 @@ class OfflineRecognizerTransducerImpl : public OfflineRecognizerImpl {
     // We create context_graph at this level, because we might have default
     // context_graph(will be added later if needed) that belongs to the whole
     // model rather than each stream.
-    auto context_graph =
-        std::make_shared<ContextGraph>(context_list, config_.context_score);
+    ContextGraphPtr context_graph;
+    if (context_graph_cache_) {
+      context_graph =
+          context_graph_cache_->Get(context_list, config_.context_score);
+    } else {
+      context_graph =
+          std::make_shared<ContextGraph>(context_list, config_.context_score);
+    }
     return std::make_unique<OfflineStream>(&fbank_, config_.feat_config,
                                            context_graph);
   }
@@ -127,8 +158,22 @@ class OfflineRecognizerTransducerImpl : public OfflineRecognizerImpl {
     torch::Tensor encoder_out;
     torch::Tensor encoder_out_length;
 
-    std::tie(encoder_out, encoder_out_length) =
-        model_->RunEncoder(features, features_length);
+    // Not empty if frame reduction is used. It maps frames after reduction
+    // to frames of the encoder output.
+    torch::Tensor frame_index;
+
+    if (config_.frame_reducer_blank_threshold > 0) {
+      torch::Tensor ctc_output;
+      std::tie(encoder_out, encoder_out_length, ctc_output) =
+          model_->RunEncoderWithCtcOutput(features, features_length);
+
+      std::tie(encoder_out, encoder_out_length, frame_index) =
+          ReduceFrames(encoder_out, encoder_out_length, ctc_output,
+                       config_.frame_reducer_blank_threshold);
+    } else {
+      std::tie(encoder_out, encoder_out_length) =
+          model_->RunEncoder(features, features_length);
+    }
     encoder_out_length = encoder_out_length.cpu();
 
     OfflineStream **streams = has_context_graph ? ss : nullptr;
@@ -136,6 +181,15 @@ class OfflineRecognizerTransducerImpl : public OfflineRecognizerImpl {
     auto results =
         decoder_->Decode(encoder_out, encoder_out_length, streams, num_streams);
 
+    if (frame_index.defined()) {
+      auto frame_index_accessor = frame_index.accessor<int64_t, 2>();
+      for (int32_t i = 0; i != n; ++i) {
+        for (auto &t : results[i].timestamps) {
+          t = frame_index_accessor[i][t];
+        }
+      }
+    }
+
     for (int32_t i = 0; i != n; ++i) {
       auto ans =
           Convert(results[i], symbol_table_,
@@ -169,6 +223,10 @@ class OfflineRecognizerTransducerImpl : public OfflineRecognizerImpl {
   SymbolTable symbol_table_;
   std::unique_ptr<OfflineTransducerModel> model_;
   std::unique_ptr<OfflineTransducerDecoder> decoder_;
+
+  // Not null if config_.context_graph_cache_capacity is positive
+  std::unique_ptr<ContextGraphCache> context_graph_cache_;
+
   kaldifeat::Fbank fbank_;
   torch::Device device_;
 };
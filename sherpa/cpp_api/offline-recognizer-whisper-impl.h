@@ -5,12 +5,14 @@
 #ifndef SHERPA_CPP_API_OFFLINE_RECOGNIZER_WHISPER_IMPL_H_
 #define SHERPA_CPP_API_OFFLINE_RECOGNIZER_WHISPER_IMPL_H_
 
+#include <algorithm>
 #include <memory>
 #include <string>
 #include <utility>
 #include <vector>
 
 #include "sherpa/csrc/macros.h"
+#include "sherpa/csrc/offline-whisper-long-audio.h"
 #include "sherpa/csrc/offline-whisper-model.h"
 #include "sherpa/csrc/symbol-table.h"
 
@@ -55,52 +57,89 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
 
   void DecodeStreams(OfflineStream **ss, int32_t n) override {
     InferenceMode no_grad;
-    if (n == 1) {
-      DecodeStream(ss[0]);
+
+    if (!config_.model.whisper.long_audio) {
+      std::vector<torch::Tensor> features(n);
+      for (int32_t i = 0; i != n; ++i) {
+        features[i] = ss[i]->GetFeatures();
+      }
+
+      auto token_ids = DecodeFeatures(features);
+      for (int32_t i = 0; i != n; ++i) {
+        ss[i]->SetResult(Convert(token_ids[i], symbol_table_));
+      }
       return;
     }
 
-    auto device = model_->Device();
+    // Split each utterance into overlapping windows of 30 seconds.
+    // Windows of all utterances are decoded together.
+    int32_t overlap = static_cast<int32_t>(
+        config_.model.whisper.long_audio_overlap * kFramesPerSecond);
 
-#if 0
-    // TODO(fangjun): Figure out why this branch does not work.
-    // All wave files are decoded into the same result like the first wave file
-    std::vector<torch::Tensor> features_vec(n);
+    std::vector<torch::Tensor> windows;
+    std::vector<int32_t> num_windows(n);
+    std::vector<int32_t> num_frames;
     for (int32_t i = 0; i != n; ++i) {
-      auto features = ss[i]->GetFeatures();
-      features = PadOrTrimFeatures(features);
-      features_vec[i] = PadOrTrimFeatures(features);
+      auto w = SplitFeaturesIntoWindows(ss[i]->GetFeatures(), kNumFrames,
+                                        overlap);
+      num_windows[i] = w.size();
+      for (const auto &t : w) {
+        num_frames.push_back(t.size(0));
+      }
+      windows.insert(windows.end(), w.begin(), w.end());
     }
 
-    auto features = torch::stack(features_vec, 0).to(device).permute({0, 2, 1});
+    std::vector<std::vector<int32_t>> token_ids;
+    token_ids.reserve(windows.size());
 
-    torch::Tensor n_layer_cross_k_cache;
-    torch::Tensor n_layer_cross_v_cache;
+    int32_t num_total_windows = windows.size();
+    for (int32_t start = 0; start < num_total_windows;
+         start += kMaxNumWindowsPerBatch) {
+      int32_t end = std::min(start + kMaxNumWindowsPerBatch, num_total_windows);
+      std::vector<torch::Tensor> batch(windows.begin() + start,
+                                       windows.begin() + end);
 
-    std::tie(n_layer_cross_k_cache, n_layer_cross_v_cache) =
-        model_->RunEncoder(features);
-#else
-    std::vector<torch::Tensor> n_layer_cross_k_cache_list;
-    std::vector<torch::Tensor> n_layer_cross_v_cache_list;
+      auto r = DecodeFeatures(batch);
+      for (auto &t : r) {
+        token_ids.push_back(std::move(t));
+      }
+    }
 
+    int32_t k = 0;
     for (int32_t i = 0; i != n; ++i) {
-      auto features = ss[i]->GetFeatures();
-      features = PadOrTrimFeatures(features).to(device).t().unsqueeze(0);
-
-      torch::Tensor n_layer_cross_k_cache;
-      torch::Tensor n_layer_cross_v_cache;
+      std::vector<int32_t> tokens = token_ids[k++];
+      for (int32_t j = 1; j < num_windows[i]; ++j, ++k) {
+        // Used only if no common token sequence is found in the overlap
+        int32_t num_overlap_a = EstimateNumOverlapTokens(
+            token_ids[k - 1].size(), num_frames[k - 1], overlap);
+        int32_t num_overlap_b = EstimateNumOverlapTokens(
+            token_ids[k].size(), num_frames[k], overlap);
+
+        tokens = MergeOverlappingTokens(tokens, token_ids[k], num_overlap_a,
+                                        num_overlap_b);
+      }
 
-      std::tie(n_layer_cross_k_cache, n_layer_cross_v_cache) =
-          model_->RunEncoder(features);
-      n_layer_cross_k_cache_list.push_back(n_layer_cross_k_cache);
-      n_layer_cross_v_cache_list.push_back(n_layer_cross_v_cache);
+      ss[i]->SetResult(Convert(tokens, symbol_table_));
     }
+  }
+
+ private:
+  /** Decode a batch of features.
+   *
+   * @param features features[i] is a 2-D tensor of shape (num_frames, n_mels).
+   *                 Only the first 30 seconds are used.
+   * @return Return the token IDs of each utterance.
+   */
+  std::vector<std::vector<int32_t>> DecodeFeatures(
+      const std::vector<torch::Tensor> &features) {
+    auto device = model_->Device();
+    int32_t n = features.size();
 
-    torch::Tensor n_layer_cross_k_cache =
-        torch::cat(n_layer_cross_k_cache_list, 1);
-    torch::Tensor n_layer_cross_v_cache =
-        torch::cat(n_layer_cross_v_cache_list, 1);
-#endif
+    torch::Tensor n_layer_cross_k_cache;
+    torch::Tensor n_layer_cross_v_cache;
+
+    std::tie(n_layer_cross_k_cache, n_layer_cross_v_cache) =
+        RunEncoder(features);
 
     auto meta_data = model_->GetModelMetadata();
     auto sot_sequence = meta_data.sot_sequence;
@@ -127,7 +166,7 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
         tokens.index_put_({"...", 1}, detected_language);
 
         if (config_.model.debug) {
-          detected_language = detected_language.cpu();
+          detected_language = detected_language.cpu().reshape({-1});
           auto acc = detected_language.accessor<int64_t, 1>();
           for (int32_t i = 0; i != n; ++i) {
             SHERPA_LOGE("Wave %d: detected language: %s", i,
@@ -141,174 +180,168 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
       }
     }
 
-    torch::Tensor logits;
-
-    torch::Tensor n_layer_self_k_cache =
-        torch::zeros({meta_data.n_text_layer, n, meta_data.n_text_ctx,
-                      meta_data.n_text_state},
-                     torch::dtype(torch::kFloat).device(device));
-
-    torch::Tensor n_layer_self_v_cache =
-        torch::zeros({meta_data.n_text_layer, n, meta_data.n_text_ctx,
-                      meta_data.n_text_state},
-                     torch::dtype(torch::kFloat).device(device));
-
-    torch::Tensor offset =
-        torch::zeros({n}, torch::dtype(torch::kInt).device(device));
-
-    std::tie(logits, n_layer_self_k_cache, n_layer_self_v_cache) =
-        model_->RunDecoder(tokens, n_layer_self_k_cache, n_layer_self_v_cache,
-                           n_layer_cross_k_cache, n_layer_cross_v_cache,
-                           offset);
-
-    torch::Tensor eot = torch::tensor(
-        {meta_data.eot}, torch::dtype(torch::kLong).device(device));
-
     torch::Tensor results =
-        torch::full({n, meta_data.n_text_ctx}, meta_data.eot,
-                    torch::dtype(torch::kLong).device(device));
+        GreedySearch(tokens, n_layer_cross_k_cache, n_layer_cross_v_cache);
 
-    torch::Tensor num_decoded_tokens =
-        torch::zeros({n}, torch::dtype(torch::kLong).device(device));
-
-    torch::Tensor new2old =
-        torch::arange(n, torch::dtype(torch::kLong).device(device));
+    std::vector<std::vector<int32_t>> ans(n);
 
-    for (int32_t i = 0; i < meta_data.n_text_ctx; ++i) {
-      tokens = logits.slice(1, -1).argmax(-1);
-      torch::Tensor eot_indexes = (tokens.squeeze() == eot).nonzero().squeeze();
+    const int64_t *p = results.data_ptr<int64_t>();
+    for (int32_t i = 0; i != n; ++i) {
+      const int64_t *begin = p + i * results.size(1);
+      const int64_t *end = std::find(begin, begin + results.size(1),
+                                     static_cast<int64_t>(meta_data.eot));
+      ans[i] = {begin, end};
+    }
 
-      if (eot_indexes.numel()) {
-        num_decoded_tokens.index_put_(
-            {"...", new2old.index_select(0, eot_indexes)}, i);
+    return ans;
+  }
 
-        if (eot_indexes.numel() == tokens.size(0)) {
-          break;
-        }
+  /** Run the encoder for a batch of features.
+   *
+   * @return Return n_layer_cross_k_cache and n_layer_cross_v_cache. Both are
+   *         of shape (n_text_layer, n, n_audio_ctx, n_text_state).
+   */
+  std::pair<torch::Tensor, torch::Tensor> RunEncoder(
+      const std::vector<torch::Tensor> &features) {
+    auto device = model_->Device();
+    int32_t n = features.size();
 
-        torch::Tensor non_eot_indexes =
-            (tokens.squeeze() != eot).nonzero().squeeze();
-
-        tokens = tokens.index_select(0, non_eot_indexes);
-
-        offset = offset.index_select(0, non_eot_indexes);
-        new2old = new2old.index_select(0, non_eot_indexes);
-        n_layer_cross_k_cache =
-            n_layer_cross_k_cache.index_select(1, non_eot_indexes);
-        n_layer_cross_v_cache =
-            n_layer_cross_v_cache.index_select(1, non_eot_indexes);
-        n_layer_self_k_cache =
-            n_layer_self_k_cache.index_select(1, non_eot_indexes);
-        n_layer_self_v_cache =
-            n_layer_self_v_cache.index_select(1, non_eot_indexes);
+    if (model_->GetModelMetadata().version >= 2) {
+      std::vector<torch::Tensor> features_vec(n);
+      for (int32_t i = 0; i != n; ++i) {
+        features_vec[i] = PadOrTrimFeatures(features[i]);
       }
 
-      results.index_put_({new2old, i}, tokens.squeeze());
-      offset.add_(logits.size(1));
+      // (n, T, C) -> (n, C, T)
+      auto features =
+          torch::stack(features_vec, 0).to(device).permute({0, 2, 1});
 
-      std::tie(logits, n_layer_self_k_cache, n_layer_self_v_cache) =
-          model_->RunDecoder(tokens, n_layer_self_k_cache, n_layer_self_v_cache,
-                             n_layer_cross_k_cache, n_layer_cross_v_cache,
-                             offset);
+      return model_->RunEncoder(features);
     }
-    num_decoded_tokens = num_decoded_tokens.cpu();
-    auto acc = num_decoded_tokens.accessor<int64_t, 1>();
-    results = results.cpu();
-    auto p = results.data_ptr<int64_t>();
-    for (int32_t i = 0; i != n; ++i) {
-      auto token_ids = std::vector<int32_t>{p + i * results.size(1),
-                                            p + i * results.size(1) + acc[i]};
 
-      ss[i]->SetResult(Convert(token_ids, symbol_table_));
+    // Models exported by scripts/whisper/export.py before version 2 use
+    // only the first utterance of a batch in the encoder, so we have to
+    // run the encoder for each utterance separately.
+    if (n > 1 && !warned_about_version_) {
+      SHERPA_LOGE(
+          "Please re-export your whisper model with the latest "
+          "scripts/whisper/export.py to enable batched encoding");
+      warned_about_version_ = true;
     }
-  }
-
- private:
-  void DecodeStream(OfflineStream *s) {
-    auto device = model_->Device();
-
-    torch::Tensor features = s->GetFeatures();
-    features = PadOrTrimFeatures(features);
-    features = features.t().unsqueeze(0).to(device);
 
-    torch::Tensor n_layer_cross_k_cache;
-    torch::Tensor n_layer_cross_v_cache;
+    std::vector<torch::Tensor> n_layer_cross_k_cache_list;
+    std::vector<torch::Tensor> n_layer_cross_v_cache_list;
 
-    std::tie(n_layer_cross_k_cache, n_layer_cross_v_cache) =
-        model_->RunEncoder(features);
+    for (int32_t i = 0; i != n; ++i) {
+      auto f = PadOrTrimFeatures(features[i]).to(device).t().unsqueeze(0);
 
-    auto meta_data = model_->GetModelMetadata();
-    auto sot_sequence = meta_data.sot_sequence;
-    sot_sequence.push_back(meta_data.no_timestamps);
+      torch::Tensor n_layer_cross_k_cache;
+      torch::Tensor n_layer_cross_v_cache;
 
-    if (meta_data.is_multilingual) {
-      // sot_sequence: [sot, language, task, notimestamp]
-      auto language = config_.model.whisper.language;
-      if (!language.empty()) {
-        if (!meta_data.lang2id.count(language)) {
-          SHERPA_LOG(FATAL) << "language '" << language << " is not valid";
-        }
+      std::tie(n_layer_cross_k_cache, n_layer_cross_v_cache) =
+          model_->RunEncoder(f);
+      n_layer_cross_k_cache_list.push_back(n_layer_cross_k_cache);
+      n_layer_cross_v_cache_list.push_back(n_layer_cross_v_cache);
+    }
 
-        sot_sequence[1] = meta_data.lang2id.at(language);
-      } else {
-        if (config_.model.debug) {
-          SHERPA_LOGE("Begin to detect language");
-        }
-        sot_sequence[1] =
-            model_->DetectLanguage(n_layer_cross_k_cache, n_layer_cross_v_cache)
-                .item()
-                .toInt();
-        if (config_.model.debug) {
-          SHERPA_LOGE("Detected language: %s",
-                      meta_data.id2lang.at(sot_sequence[1]).c_str());
-        }
-      }
+    return {torch::cat(n_layer_cross_k_cache_list, 1),
+            torch::cat(n_layer_cross_v_cache_list, 1)};
+  }
 
-      if (config_.model.whisper.task == "translate") {
-        sot_sequence[2] = meta_data.translate;
-      }
-    }
+  /** Greedy search for a batch of utterances.
+   *
+   * To avoid synchronizing the device at every step, we don't check
+   * whether an utterance has decoded EOT after each step. Instead, an
+   * utterance that has finished keeps emitting EOT, and we check every
+   * kCheckEotInterval steps whether all utterances have finished. Finished
+   * utterances are removed from the batch only when at least half of the
+   * batch has finished, since removing them requires copying the caches.
+   *
+   * @param tokens  A 2-D tensor of shape (n, num_sot_tokens).
+   * @param n_layer_cross_k_cache  Returned by RunEncoder().
+   * @param n_layer_cross_v_cache  Returned by RunEncoder().
+   *
+   * @return Return a 2-D int64 tensor of shape (n, num_steps) on CPU.
+   *         The tokens of each utterance end at the first EOT.
+   */
+  torch::Tensor GreedySearch(torch::Tensor tokens,
+                             torch::Tensor n_layer_cross_k_cache,
+                             torch::Tensor n_layer_cross_v_cache) {
+    // Number of decoding steps between two checks for EOT
+    constexpr int32_t kCheckEotInterval = 8;
 
-    torch::Tensor tokens =
-        torch::from_blob(sot_sequence.data(),
-                         {1, static_cast<int32_t>(sot_sequence.size())},
-                         torch::kLong)
-            .to(device);
+    auto device = model_->Device();
+    const auto &meta_data = model_->GetModelMetadata();
+    int32_t n = tokens.size(0);
 
     torch::Tensor logits;
 
     torch::Tensor n_layer_self_k_cache =
-        torch::zeros({meta_data.n_text_layer, 1, meta_data.n_text_ctx,
+        torch::zeros({meta_data.n_text_layer, n, meta_data.n_text_ctx,
                       meta_data.n_text_state},
                      torch::dtype(torch::kFloat).device(device));
 
     torch::Tensor n_layer_self_v_cache =
-        torch::zeros({meta_data.n_text_layer, 1, meta_data.n_text_ctx,
+        torch::zeros({meta_data.n_text_layer, n, meta_data.n_text_ctx,
                       meta_data.n_text_state},
                      torch::dtype(torch::kFloat).device(device));
 
     torch::Tensor offset =
-        torch::zeros({1}, torch::dtype(torch::kInt).device(device));
+        torch::zeros({n}, torch::dtype(torch::kInt).device(device));
+
+    // The decoder cannot process more than n_text_ctx tokens
+    int32_t max_num_steps = meta_data.n_text_ctx - tokens.size(1);
 
     std::tie(logits, n_layer_self_k_cache, n_layer_self_v_cache) =
         model_->RunDecoder(tokens, n_layer_self_k_cache, n_layer_self_v_cache,
                            n_layer_cross_k_cache, n_layer_cross_v_cache,
                            offset);
 
-    torch::Tensor eot = torch::tensor(
-        {meta_data.eot}, torch::dtype(torch::kLong).device(device));
-
     torch::Tensor results =
-        torch::full({1, meta_data.n_text_ctx}, meta_data.eot,
+        torch::full({n, max_num_steps}, meta_data.eot,
                     torch::dtype(torch::kLong).device(device));
 
+    // new2old[i] is the index in results of the i-th utterance in the batch
+    torch::Tensor new2old =
+        torch::arange(n, torch::dtype(torch::kLong).device(device));
+
+    // finished[i] is true if the i-th utterance in the batch has decoded EOT
+    torch::Tensor finished =
+        torch::zeros({n}, torch::dtype(torch::kBool).device(device));
+
     int32_t i;
-    for (i = 0; i < meta_data.n_text_ctx; ++i) {
+    for (i = 0; i < max_num_steps; ++i) {
       tokens = logits.slice(1, -1).argmax(-1);
-      if ((tokens == eot).sum().item().toInt() == 1) {
-        break;
+      // tokens.shape (num_active, 1)
+
+      tokens.masked_fill_(finished.unsqueeze(1), meta_data.eot);
+      finished = finished.logical_or(tokens.squeeze(1) == meta_data.eot);
+
+      results.index_put_({new2old, i}, tokens.squeeze(1));
+
+      if ((i + 1) % kCheckEotInterval == 0) {
+        int32_t num_active = finished.size(0);
+        int32_t num_finished = finished.sum().item().toInt();
+        if (num_finished == num_active) {
+          break;
+        }
+
+        if (num_finished * 2 >= num_active) {
+          torch::Tensor indexes = finished.logical_not().nonzero().squeeze(1);
+
+          tokens = tokens.index_select(0, indexes);
+          offset = offset.index_select(0, indexes);
+          new2old = new2old.index_select(0, indexes);
+          finished = finished.index_select(0, indexes);
+          n_layer_cross_k_cache =
+              n_layer_cross_k_cache.index_select(1, indexes);
+          n_layer_cross_v_cache =
+              n_layer_cross_v_cache.index_select(1, indexes);
+          n_layer_self_k_cache = n_layer_self_k_cache.index_select(1, indexes);
+          n_layer_self_v_cache = n_layer_self_v_cache.index_select(1, indexes);
+        }
       }
-      results.slice(1, i, i + 1) = tokens;
+
       offset.add_(logits.size(1));
 
       std::tie(logits, n_layer_self_k_cache, n_layer_self_v_cache) =
@@ -316,13 +349,8 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
                              n_layer_cross_k_cache, n_layer_cross_v_cache,
                              offset);
     }
-    results = results.slice(1, 0, i).cpu();
 
-    std::vector<int32_t> token_ids = {
-        results.data_ptr<int64_t>(),
-        results.data_ptr<int64_t>() + results.numel()};
-
-    s->SetResult(Convert(token_ids, symbol_table_));
+    return results.slice(1, 0, std::min(i + 1, max_num_steps)).cpu();
   }
 
  private:
@@ -334,12 +362,13 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
 
   torch::Tensor PadOrTrimFeatures(const torch::Tensor &feat) {
     auto features = feat;
-    int32_t target_len = 3000;
+    int32_t target_len = kNumFrames;
     int32_t src_len = features.size(0);
     if (src_len > target_len) {
       SHERPA_LOGE(
           "\nInput audio is too long (about %.3f seconds). Only the first %d "
-          "seconds are used.",
+          "seconds are used. Please use --whisper-long-audio=true to decode "
+          "all of it.",
           src_len * 0.01, static_cast<int32_t>(target_len * 0.01));
       features = features.slice(0, 0, target_len);
     } else if (src_len < target_len) {
@@ -354,10 +383,22 @@ class OfflineRecognizerWhisperImpl : public OfflineRecognizerImpl {
   }
 
  private:
+  // Number of feature frames per second
+  static constexpr int32_t kFramesPerSecond = 100;
+
+  // Number of feature frames in 30 seconds, which is the input size of
+  // the whisper encoder
+  static constexpr int32_t kNumFrames = 30 * kFramesPerSecond;
+
+  // In long audio mode, max number of windows to decode at the same time.
+  // It limits the memory used by the decoder caches.
+  static constexpr int32_t kMaxNumWindowsPerBatch = 16;
+
   OfflineRecognizerConfig config_;
   SymbolTable symbol_table_;
   std::unique_ptr<kaldifeat::WhisperFbank> whisper_;
   std::unique_ptr<OfflineWhisperModel> model_;
+  bool warned_about_version_ = false;
 };
 }  // namespace sherpa
 #endif  // SHERPA_CPP_API_OFFLINE_RECOGNIZER_WHISPER_IMPL_H_
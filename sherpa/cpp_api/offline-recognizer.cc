@@ -123,6 +123,34 @@ void OfflineRecognizerConfig::Register(ParseOptions *po) {
   po->Register("temperature", &temperature,
                "Softmax temperature,. "
                "Used only when decoding_method is modified_beam_search.");
+
+  po->Register("speculative-joiner", &speculative_joiner,
+               "true to run the joiner on several frames in one call, "
+               "assuming that no token is emitted, and rerun it only from "
+               "the first frame that emits a token. It gives the same "
+               "result with fewer joiner calls. "
+               "Used only when decoding_method is greedy_search.");
+
+  po->Register("frame-reducer-blank-threshold",
+               &frame_reducer_blank_threshold,
+               "If positive, drop frames of the encoder output whose blank "
+               "probability from the CTC head is not less than it before "
+               "running the search, e.g., 0.9. Used only for transducer "
+               "models trained with an auxiliary CTC head. 0 to disable it. "
+               "It changes the results: tokens on dropped frames are "
+               "deleted, and lower values drop more frames. Measure its "
+               "accuracy on your data with sherpa-benchmark-greedy-search "
+               "before enabling it.");
+
+  po->Register("decoder-cache-capacity", &decoder_cache_capacity,
+               "Max number of decoder outputs to cache, keyed by the last "
+               "context-size tokens, so that the decoder is run only for "
+               "contexts that are not in the cache. 0 to disable it.");
+
+  po->Register("context-graph-cache-capacity", &context_graph_cache_capacity,
+               "Max number of context graphs to cache, so that streams "
+               "created with the same contexts share a graph instead of "
+               "building a new one. 0 to disable it.");
 }
 
 void OfflineRecognizerConfig::Validate() const {
@@ -160,6 +188,11 @@ void OfflineRecognizerConfig::Validate() const {
   if (decoding_method == "modified_beam_search") {
     SHERPA_CHECK_GT(num_active_paths, 0);
   }
+
+  SHERPA_CHECK_GE(frame_reducer_blank_threshold, 0);
+  SHERPA_CHECK_LE(frame_reducer_blank_threshold, 1);
+  SHERPA_CHECK_GE(decoder_cache_capacity, 0);
+  SHERPA_CHECK_GE(context_graph_cache_capacity, 0);
 }
 
 std::string OfflineRecognizerConfig::ToString() const {
@@ -176,7 +209,14 @@ std::string OfflineRecognizerConfig::ToString() const {
   os << "num_active_paths=" << num_active_paths << ", ";
   os << "context_score=" << context_score << ", ";
   os << "use_bbpe=" << (use_bbpe ? "True" : "False") << ", ";
-  os << "temperature=" << temperature << ")";
+  os << "temperature=" << temperature << ", ";
+  os << "speculative_joiner=" << (speculative_joiner ? "True" : "False")
+     << ", ";
+  os << "frame_reducer_blank_threshold=" << frame_reducer_blank_threshold
+     << ", ";
+  os << "decoder_cache_capacity=" << decoder_cache_capacity << ", ";
+  os << "context_graph_cache_capacity=" << context_graph_cache_capacity
+     << ")";
 
   return os.str();
 }
@@ -78,6 +78,30 @@ struct OfflineRecognizerConfig {
   // temperature for the softmax in the joiner
   float temperature = 1.0;
 
+  /// Used only for greedy_search. true to evaluate the joiner for several
+  /// frames in one call, assuming no utterance emits a token.
+  /// It is re-evaluated only from the first frame at which one emits.
+  /// The result is the same as evaluating the joiner frame by frame.
+  bool speculative_joiner = false;
+
+  /// Used only for transducer models with a CTC head. If positive, frames
+  /// of the encoder output whose CTC blank probability is not less than it
+  /// are dropped before the search. 0 to disable it.
+  /// It is lossy. See docs/source/cpp/offline_asr/frame-reducer.rst
+  float frame_reducer_blank_threshold = 0;
+
+  /// Max number of decoder outputs to cache, keyed by the last
+  /// context_size tokens. The decoder is stateless, so searches reuse
+  /// the cached output of a context instead of running the decoder
+  /// again. 0 to disable the cache.
+  int32_t decoder_cache_capacity = 0;
+
+  /// Max number of compiled context graphs to cache, keyed by the
+  /// token IDs of the contexts and context_score. Streams created with
+  /// the same contexts share a graph instead of building a new one.
+  /// 0 to disable the cache.
+  int32_t context_graph_cache_capacity = 0;
+
   void Register(ParseOptions *po);
 
   void Validate() const;
@@ -4,17 +4,25 @@
 
 #include "sherpa/cpp_api/online-recognizer.h"
 
+#include <algorithm>
+#include <chrono>  // NOLINT
 #include <locale>
 #include <memory>
+#include <mutex>  // NOLINT
+#include <string>
 #include <utility>
+#include <vector>
 
 #include "nlohmann/json.hpp"
 #include "sherpa/csrc/byte_util.h"
+#include "sherpa/csrc/context-graph-cache.h"
+#include "sherpa/csrc/decoder-cache.h"
 #include "sherpa/csrc/file-utils.h"
 #include "sherpa/csrc/log.h"
 #include "sherpa/csrc/online-conformer-transducer-model.h"
 #include "sherpa/csrc/online-conv-emformer-transducer-model.h"
 #include "sherpa/csrc/online-emformer-transducer-model.h"
+#include "sherpa/csrc/online-encoder-state-pool.h"
 #include "sherpa/csrc/online-lstm-transducer-model.h"
 #include "sherpa/csrc/online-transducer-decoder.h"
 #include "sherpa/csrc/online-transducer-fast-beam-search-decoder.h"
@@ -27,6 +35,10 @@
 
 namespace sherpa {
 
+// Features of the missing frames of the last chunk of a stream are set
+// to it. It is the same value used by icefall for padding features.
+static constexpr float kLogEps = -23.025850929940457f;  // math.log(1e-10)
+
 std::string OnlineRecognitionResult::AsJsonString() const {
   using json = nlohmann::json;
   json j;
@@ -54,6 +66,68 @@ std::string OnlineRecognitionResult::AsJsonString() const {
   return j.dump();
 }
 
+static nlohmann::json DeltaAsJson(const OnlineRecognitionResult &r,
+                                  const OnlineRecognitionResult &prev) {
+  int32_t num_tokens = 0;
+  int32_t num_bytes = 0;
+
+  if (r.segment == prev.segment) {
+    int32_t n = std::min(r.tokens.size(), prev.tokens.size());
+    while (num_tokens < n && r.tokens[num_tokens] == prev.tokens[num_tokens]) {
+      ++num_tokens;
+    }
+
+    n = std::min(r.text.size(), prev.text.size());
+    while (num_bytes < n && r.text[num_bytes] == prev.text[num_bytes]) {
+      ++num_bytes;
+    }
+
+    // Don't split a multi-byte UTF-8 character
+    while (num_bytes > 0 && num_bytes < static_cast<int32_t>(r.text.size()) &&
+           (static_cast<uint8_t>(r.text[num_bytes]) & 0xc0) == 0x80) {
+      --num_bytes;
+    }
+  }
+
+  // The receiver counts characters instead of bytes
+  int32_t num_chars = 0;
+  for (int32_t i = 0; i != num_bytes; ++i) {
+    if ((static_cast<uint8_t>(r.text[i]) & 0xc0) != 0x80) {
+      ++num_chars;
+    }
+  }
+
+  using json = nlohmann::json;
+  json j;
+  j["segment"] = r.segment;
+  j["start_time"] = r.start_time;
+  j["text_start"] = num_chars;
+  j["text"] = r.text.substr(num_bytes);
+  j["token_start"] = num_tokens;
+  j["tokens"] = std::vector<std::string>(r.tokens.begin() + num_tokens,
+                                         r.tokens.end());
+  if (num_tokens < static_cast<int32_t>(r.timestamps.size())) {
+    j["timestamps"] = std::vector<float>(r.timestamps.begin() + num_tokens,
+                                         r.timestamps.end());
+  } else {
+    j["timestamps"] = std::vector<float>();
+  }
+  j["final"] = r.is_final;
+
+  return j;
+}
+
+std::string OnlineRecognitionResult::AsJsonString(
+    const OnlineRecognitionResult &prev) const {
+  return DeltaAsJson(*this, prev).dump();
+}
+
+std::string OnlineRecognitionResult::AsMsgpack(
+    const OnlineRecognitionResult &prev) const {
+  std::vector<uint8_t> v = nlohmann::json::to_msgpack(DeltaAsJson(*this, prev));
+  return std::string(v.begin(), v.end());
+}
+
 void OnlineRecognizerConfig::Register(ParseOptions *po) {
   feat_config.Register(po);
   endpoint_config.Register(po);
@@ -125,6 +199,29 @@ void OnlineRecognizerConfig::Register(ParseOptions *po) {
   po->Register("temperature", &temperature,
                "Softmax temperature,. "
                "Used only when decoding_method is modified_beam_search.");
+
+  po->Register("resident-states", &resident_states,
+               "true to keep the encoder states of all streams in batched "
+               "tensors that persist across chunks, so that they are not "
+               "stacked and unstacked for every chunk. It is useful when "
+               "decoding many streams at the same time.");
+
+  po->Register("speculative-joiner", &speculative_joiner,
+               "true to run the joiner on all frames of a chunk in one call, "
+               "assuming that no token is emitted, and rerun it only from "
+               "the first frame that emits a token. It gives the same "
+               "result with fewer joiner calls. "
+               "Used only when decoding_method is greedy_search.");
+
+  po->Register("decoder-cache-capacity", &decoder_cache_capacity,
+               "Max number of decoder outputs to cache, keyed by the last "
+               "context-size tokens, so that the decoder is run only for "
+               "contexts that are not in the cache. 0 to disable it.");
+
+  po->Register("context-graph-cache-capacity", &context_graph_cache_capacity,
+               "Max number of context graphs to cache, so that streams "
+               "created with the same contexts share a graph instead of "
+               "building a new one. 0 to disable it.");
 }
 
 void OnlineRecognizerConfig::Validate() const {
@@ -163,6 +260,9 @@ void OnlineRecognizerConfig::Validate() const {
   if (decoding_method == "modified_beam_search") {
     SHERPA_CHECK_GT(num_active_paths, 0);
   }
+
+  SHERPA_CHECK_GE(decoder_cache_capacity, 0);
+  SHERPA_CHECK_GE(context_graph_cache_capacity, 0);
 }
 
 std::string OnlineRecognizerConfig::ToString() const {
@@ -186,7 +286,13 @@ std::string OnlineRecognizerConfig::ToString() const {
   os << "right_context=" << right_context << ", ";
   os << "chunk_size=" << chunk_size << ", ";
   os << "use_bbpe=" << (use_bbpe ? "True" : "False") << ", ";
-  os << "temperature=" << temperature << ")";
+  os << "temperature=" << temperature << ", ";
+  os << "resident_states=" << (resident_states ? "True" : "False") << ", ";
+  os << "speculative_joiner=" << (speculative_joiner ? "True" : "False")
+     << ", ";
+  os << "decoder_cache_capacity=" << decoder_cache_capacity << ", ";
+  os << "context_graph_cache_capacity=" << context_graph_cache_capacity
+     << ")";
   return os.str();
 }
 
@@ -312,9 +418,30 @@ class OnlineRecognizer::OnlineRecognizerImpl {
 
     WarmUp();
 
+    if (config.decoder_cache_capacity > 0) {
+      model_->SetDecoderCache(
+          std::make_shared<DecoderCache>(config.decoder_cache_capacity));
+    }
+
+    if (config.context_graph_cache_capacity > 0) {
+      context_graph_cache_ = std::make_unique<ContextGraphCache>(
+          config.context_graph_cache_capacity);
+    }
+
+    if (config.resident_states) {
+      if (OnlineEncoderStatePool::IsSupported(model_.get())) {
+        state_pool_ = std::make_shared<OnlineEncoderStatePool>(model_.get());
+      } else {
+        SHERPA_LOG(WARNING) << "The encoder states of " << class_name
+                            << " cannot be kept in batched tensors. "
+                            << "Ignore --resident-states";
+      }
+    }
+
     if (config.decoding_method == "greedy_search") {
       decoder_ =
-          std::make_unique<OnlineTransducerGreedySearchDecoder>(model_.get());
+          std::make_unique<OnlineTransducerGreedySearchDecoder>(
+              model_.get(), config.speculative_joiner);
     } else if (config.decoding_method == "modified_beam_search") {
       decoder_ = std::make_unique<OnlineTransducerModifiedBeamSearchDecoder>(
           model_.get(), config.num_active_paths, config.temperature);
@@ -343,7 +470,11 @@ class OnlineRecognizer::OnlineRecognizerImpl {
     stream->SetResult(r);
 
     auto state = model_->GetEncoderInitStates();
-    stream->SetState(state);
+    if (state_pool_) {
+      stream->SetStateSlot(state_pool_->Allocate(state));
+    } else {
+      stream->SetState(state);
+    }
   }
 
   std::unique_ptr<OnlineStream> CreateStream() {
@@ -357,21 +488,48 @@ class OnlineRecognizer::OnlineRecognizerImpl {
     // We create context_graph at this level, because we might have default
     // context_graph(will be added later if needed) that belongs to the whole
     // model rather than each stream.
-    auto context_graph =
-        std::make_shared<ContextGraph>(contexts, config_.context_score);
+    ContextGraphPtr context_graph;
+    if (context_graph_cache_) {
+      context_graph =
+          context_graph_cache_->Get(contexts, config_.context_score);
+    } else {
+      context_graph =
+          std::make_shared<ContextGraph>(contexts, config_.context_score);
+    }
     auto s = std::make_unique<OnlineStream>(config_.feat_config,
                                             context_graph);
     InitOnlineStream(s.get());
     return s;
   }
 
+  std::unique_ptr<OnlineStream> RestoreStream(const std::string &data) {
+    auto s = std::make_unique<OnlineStream>(config_.feat_config);
+
+    auto state = s->Deserialize(data, model_->GetEncoderInitStates());
+    if (state_pool_) {
+      s->SetStateSlot(state_pool_->Allocate(state));
+    } else {
+      s->SetState(state);
+    }
+
+    return s;
+  }
+
   bool IsReady(OnlineStream *s) {
     // TODO(fangjun): Pass chunk_size to OnlineStream on creation
     int32_t chunk_size = model_->ChunkSize();
-    return s->NumFramesReady() - s->GetNumProcessedFrames() >= chunk_size;
+    int32_t num_frames = s->NumFramesReady() - s->GetNumProcessedFrames();
+    if (num_frames >= chunk_size) {
+      return true;
+    }
+
+    // Flush the remaining frames once the input is finished.
+    // See DecodeStreams() for how a partial chunk is padded.
+    return num_frames > 0 && s->IsLastFrame(s->NumFramesReady() - 1);
   }
 
-  void DecodeStreams(OnlineStream **ss, int32_t n) {
+  void DecodeStreams(OnlineStream **ss, int32_t n,
+                     OnlineDecodeTiming *timing) {
     InferenceMode no_grad;
 
     SHERPA_CHECK_GT(n, 0);
@@ -380,9 +538,20 @@ class OnlineRecognizer::OnlineRecognizerImpl {
     int32_t chunk_size = model_->ChunkSize();
     int32_t chunk_shift = model_->ChunkShift();
 
-    std::vector<torch::Tensor> all_features(n);
-    std::vector<torch::IValue> all_states(n);
+    // Features of all streams are copied directly into a reusable batch
+    // buffer, so there is no per-frame tensor, torch::cat or torch::stack
+    torch::Tensor feature_buffer = AcquireFeatureBuffer(n);
+
+    std::vector<torch::IValue> all_states;
+    std::vector<int32_t> all_slots;
+    if (state_pool_) {
+      all_slots.resize(n);
+    } else {
+      all_states.resize(n);
+    }
+
     std::vector<int32_t> all_processed_frames(n);
+    std::vector<int32_t> all_num_frames(n);
     std::vector<OnlineTransducerDecoderResult> all_results(n);
     bool has_context_graph = false;
     for (int32_t i = 0; i != n; ++i) {
@@ -393,26 +562,41 @@ class OnlineRecognizer::OnlineRecognizerImpl {
       SHERPA_CHECK(IsReady(s));
       int32_t num_processed_frames = s->GetNumProcessedFrames();
 
-      std::vector<torch::Tensor> features_vec(chunk_size);
-      for (int32_t k = 0; k != chunk_size; ++k) {
-        features_vec[k] = s->GetFrame(num_processed_frames + k);
+      // It is less than chunk_size only for the last chunk of a stream
+      // whose input is finished. Instead of decoding extra seconds of
+      // padded audio, we pad only the missing frames and pass the actual
+      // number of frames to the encoder so that it can mask them.
+      int32_t num_frames =
+          std::min(chunk_size, s->NumFramesReady() - num_processed_frames);
+
+      torch::Tensor dst = feature_buffer[i];
+      s->CopyFramesTo(num_processed_frames, num_frames,
+                      dst.slice(/*dim*/ 0, 0, num_frames));
+      if (num_frames < chunk_size) {
+        dst.slice(/*dim*/ 0, num_frames).fill_(kLogEps);
       }
 
-      torch::Tensor features = torch::cat(features_vec, /*dim*/ 0);
-
-      all_features[i] = std::move(features);
-      all_states[i] = s->GetState();
+      if (state_pool_) {
+        all_slots[i] = s->GetStateSlot()->Index();
+      } else {
+        all_states[i] = s->GetState();
+      }
       all_processed_frames[i] = num_processed_frames;
+      all_num_frames[i] = num_frames;
       all_results[i] = s->GetResult();
     }  // for (int32_t i = 0; i != n; ++i) {
 
-    auto batched_features = torch::stack(all_features, /*dim*/ 0);
-    batched_features = batched_features.to(device);
+    // The buffer is in pinned memory if device is CUDA, so the copy
+    // can be asynchronous. If device is CPU, no copy is made.
+    auto batched_features = feature_buffer.slice(/*dim*/ 0, 0, n).to(
+        device, /*non_blocking*/ true);
 
     torch::Tensor features_length =
-        torch::full({n}, chunk_size, torch::kLong).to(device);
+        torch::tensor(all_num_frames, torch::kLong).to(device);
 
-    torch::IValue stacked_states = model_->StackStates(all_states);
+    torch::IValue stacked_states = state_pool_
+                                       ? state_pool_->Gather(all_slots)
+                                       : model_->StackStates(all_states);
     torch::Tensor processed_frames =
         torch::tensor(all_processed_frames, torch::kLong).to(device);
 
@@ -420,25 +604,49 @@ class OnlineRecognizer::OnlineRecognizerImpl {
     torch::Tensor encoder_out_lens;
     torch::IValue next_states;
 
+    using Clock = std::chrono::steady_clock;
+    auto start = Clock::now();
+
     std::tie(encoder_out, encoder_out_lens, next_states) = model_->RunEncoder(
         batched_features, features_length, processed_frames, stacked_states);
 
+    auto encoder_end = Clock::now();
+
     if (has_context_graph) {
       decoder_->Decode(encoder_out, ss, n, &all_results);
     } else {
       decoder_->Decode(encoder_out, &all_results);
     }
 
-    std::vector<torch::IValue> unstacked_states =
-        model_->UnStackStates(next_states);
+    if (timing) {
+      auto search_end = Clock::now();
+      timing->encoder_time =
+          std::chrono::duration<float>(encoder_end - start).count();
+      timing->search_time =
+          std::chrono::duration<float>(search_end - encoder_end).count();
+    }
+
+    std::vector<torch::IValue> unstacked_states;
+    if (state_pool_) {
+      state_pool_->Scatter(all_slots, std::move(next_states));
+    } else {
+      unstacked_states = model_->UnStackStates(next_states);
+    }
 
     for (int32_t i = 0; i != n; ++i) {
       OnlineStream *s = ss[i];
       all_results[i].num_processed_frames += chunk_shift;
       s->SetResult(all_results[i]);
-      s->SetState(std::move(unstacked_states[i]));
+      if (!state_pool_) {
+        s->SetState(std::move(unstacked_states[i]));
+      }
       s->GetNumProcessedFrames() += chunk_shift;  // TODO(fangjun): Remove it
     }
+
+    // The decoder has copied its results to CPU, which synchronizes
+    // with the copy of batched_features above, so it is safe to reuse
+    // the buffer now.
+    ReleaseFeatureBuffer(std::move(feature_buffer));
   }
 
   OnlineRecognitionResult GetResult(OnlineStream *s) {
@@ -515,12 +723,45 @@ class OnlineRecognizer::OnlineRecognizerImpl {
     s->AcceptWaveform(sample_rate, samples);
     s->InputFinished();
     OnlineStream ss[1] = {s.get()};
-    DecodeStreams(ss, 1);
+    DecodeStreams(ss, 1, nullptr);
 #endif
 
     SHERPA_LOG(INFO) << "WarmUp ended";
   }
 
+  /** Return a buffer of shape (N, chunk_size, feature_dim) with N >= n
+   *  for the features of a batch. It is in pinned memory if the model
+   *  is on GPU.
+   *
+   *  DecodeStreams() may be called from several threads at the same time,
+   *  so we keep a pool of buffers instead of a single one.
+   */
+  torch::Tensor AcquireFeatureBuffer(int32_t n) {
+    torch::Tensor buffer;
+    {
+      std::lock_guard<std::mutex> lock(feature_buffers_mutex_);
+      if (!feature_buffers_.empty()) {
+        buffer = std::move(feature_buffers_.back());
+        feature_buffers_.pop_back();
+      }
+    }
+
+    if (!buffer.defined() || buffer.size(0) < n) {
+      int32_t feature_dim = config_.feat_config.fbank_opts.mel_opts.num_bins;
+      auto options =
+          torch::TensorOptions().dtype(torch::kFloat).pinned_memory(
+              device_.is_cuda());
+      buffer = torch::empty({n, model_->ChunkSize(), feature_dim}, options);
+    }
+
+    return buffer;
+  }
+
+  void ReleaseFeatureBuffer(torch::Tensor buffer) {
+    std::lock_guard<std::mutex> lock(feature_buffers_mutex_);
+    feature_buffers_.push_back(std::move(buffer));
+  }
+
  private:
   OnlineRecognizerConfig config_;
   torch::Device device_{"cpu"};
@@ -528,6 +769,15 @@ class OnlineRecognizer::OnlineRecognizerImpl {
   std::unique_ptr<OnlineTransducerDecoder> decoder_;
   SymbolTable symbol_table_;
   std::unique_ptr<Endpoint> endpoint_;
+
+  // Not null if config_.context_graph_cache_capacity is positive
+  std::unique_ptr<ContextGraphCache> context_graph_cache_;
+
+  // Not null if config_.resident_states is true
+  std::shared_ptr<OnlineEncoderStatePool> state_pool_;
+
+  std::mutex feature_buffers_mutex_;
+  std::vector<torch::Tensor> feature_buffers_;
 };
 
 OnlineRecognizer::OnlineRecognizer(const OnlineRecognizerConfig &config)
@@ -544,15 +794,22 @@ std::unique_ptr<OnlineStream> OnlineRecognizer::CreateStream(
   return impl_->CreateStream(contexts_list);
 }
 
+std::unique_ptr<OnlineStream> OnlineRecognizer::RestoreStream(
+    const std::string &data) {
+  InferenceMode no_grad;
+  return impl_->RestoreStream(data);
+}
+
 bool OnlineRecognizer::IsReady(OnlineStream *s) { return impl_->IsReady(s); }
 
 bool OnlineRecognizer::IsEndpoint(OnlineStream *s) {
   return impl_->IsEndpoint(s);
 }
 
-void OnlineRecognizer::DecodeStreams(OnlineStream **ss, int32_t n) {
+void OnlineRecognizer::DecodeStreams(OnlineStream **ss, int32_t n,
+                                     OnlineDecodeTiming *timing) {
   InferenceMode no_grad;
-  impl_->DecodeStreams(ss, n);
+  impl_->DecodeStreams(ss, n, timing);
 }
 
 OnlineRecognitionResult OnlineRecognizer::GetResult(OnlineStream *s) {
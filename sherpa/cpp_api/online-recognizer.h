@@ -76,6 +76,30 @@ struct OnlineRecognizerConfig {
   // temperature for the softmax in the joiner
   float temperature = 1.0;
 
+  /// true to keep the encoder states of all streams in persistent batched
+  /// tensors owned by the recognizer. Each stream is assigned a slot in
+  /// them, so we don't need to stack and unstack the states of a batch
+  /// for every chunk.
+  bool resident_states = false;
+
+  /// Used only for greedy_search. true to evaluate the joiner for all
+  /// frames of a chunk in one call, assuming no stream emits a token.
+  /// It is re-evaluated only from the first frame at which a stream emits.
+  /// The result is the same as evaluating the joiner frame by frame.
+  bool speculative_joiner = false;
+
+  /// Max number of decoder outputs to cache, keyed by the last
+  /// context_size tokens. The decoder is stateless, so searches reuse
+  /// the cached output of a context instead of running the decoder
+  /// again. 0 to disable the cache.
+  int32_t decoder_cache_capacity = 0;
+
+  /// Max number of compiled context graphs to cache, keyed by the
+  /// token IDs of the contexts and context_score. Streams created with
+  /// the same contexts share a graph instead of building a new one.
+  /// 0 to disable the cache.
+  int32_t context_graph_cache_capacity = 0;
+
   void Register(ParseOptions *po);
 
   void Validate() const;
@@ -84,6 +108,19 @@ struct OnlineRecognizerConfig {
   std::string ToString() const;
 };
 
+// Time spent in OnlineRecognizer::DecodeStreams()
+struct OnlineDecodeTiming {
+  // Time in seconds to run the encoder
+  float encoder_time = 0;
+
+  // Time in seconds to run the search, e.g., greedy search. It includes
+  // the time to run the decoder and the joiner.
+  //
+  // Note: On GPU, the encoder runs asynchronously, so part of its time is
+  // counted here when the search waits for its output.
+  float search_time = 0;
+};
+
 class OnlineRecognizer {
  public:
   /** Construct an instance of OnlineRecognizer.
@@ -103,9 +140,24 @@ class OnlineRecognizer {
   std::unique_ptr<OnlineStream> CreateStream(
       const std::vector<std::vector<int32_t>> &context_list);
 
+  /** Restore a stream saved by OnlineStream::Serialize().
+   *
+   * The stream must be saved from a recognizer with the same model and
+   * feature config, possibly in another process.
+   *
+   * @param data  A string returned by OnlineStream::Serialize().
+   */
+  std::unique_ptr<OnlineStream> RestoreStream(const std::string &data);
+
   /**
    * Return true if the given stream has enough frames for decoding.
    * Return false otherwise
+   *
+   * After s->InputFinished(), it also returns true if there are remaining
+   * frames that are fewer than a chunk. They are decoded in a chunk whose
+   * missing frames are padded and features_length gives the number of
+   * real frames. Not every encoder is known to mask the padding, so the
+   * servers still append tail paddings to the audio samples by default.
    */
   bool IsReady(OnlineStream *s);
 
@@ -125,8 +177,11 @@ class OnlineRecognizer {
    *
    * @param ss Pointer array containing streams to be decoded.
    * @param n Number of streams in `ss`.
+   * @param timing If not null, it contains the time spent in each step
+   *               on return.
    */
-  void DecodeStreams(OnlineStream **ss, int32_t n);
+  void DecodeStreams(OnlineStream **ss, int32_t n,
+                     OnlineDecodeTiming *timing = nullptr);
 
   OnlineRecognitionResult GetResult(OnlineStream *s);
 
@@ -51,9 +51,47 @@ struct OnlineRecognitionResult {
    *   }
    */
   std::string AsJsonString() const;
+
+  /** Return a json string containing only what has changed since a
+   * previous result of the same stream.
+   *
+   * The returned string contains:
+   *   {
+   *     "segment": x,
+   *     "start_time": x,
+   *     "text_start": x,
+   *     "text": "Characters appended after text_start",
+   *     "token_start": x,
+   *     "tokens": [x, x, x],
+   *     "timestamps": [x, x, x],
+   *     "final": true|false
+   *   }
+   *
+   * The first text_start characters (Unicode code points) of the text and
+   * the first token_start tokens and timestamps of prev are unchanged,
+   * so the receiver keeps them and appends the given ones. If prev is from
+   * a different segment, nothing is kept.
+   *
+   * @param prev  The result that was sent last time.
+   */
+  std::string AsJsonString(const OnlineRecognitionResult &prev) const;
+
+  /** Same as AsJsonString(prev) but the result is encoded with MessagePack.
+   */
+  std::string AsMsgpack(const OnlineRecognitionResult &prev) const;
+
+  bool operator==(const OnlineRecognitionResult &other) const {
+    return segment == other.segment && is_final == other.is_final &&
+           text == other.text && tokens == other.tokens;
+  }
+
+  bool operator!=(const OnlineRecognitionResult &other) const {
+    return !(*this == other);
+  }
 };
 
 class Hypotheses;
+class OnlineEncoderStateSlot;
 struct OnlineTransducerDecoderResult;
 
 class OnlineStream {
@@ -100,9 +138,32 @@ class OnlineStream {
    */
   torch::Tensor GetFrame(int32_t frame);
 
+  /** Get n consecutive frames.
+   *
+   * Unlike calling GetFrame() n times, it locks the feature extractor only
+   * once and does not create a tensor for each frame.
+   *
+   * @param start  Index of the first frame. It starts from 0.
+   * @param n  Number of frames to get.
+   *
+   * @return Return a contiguous 2-D array of shape [n, feature_dim]
+   */
+  torch::Tensor GetFrames(int32_t start, int32_t n);
+
+  /** Copy n consecutive frames to the given tensor.
+   *
+   * @param start  Index of the first frame. It starts from 0.
+   * @param n  Number of frames to copy.
+   * @param dst  A 2-D float tensor of shape [n, feature_dim], e.g., a view
+   *             into a preallocated batch buffer.
+   */
+  void CopyFramesTo(int32_t start, int32_t n, torch::Tensor dst);
+
   /**
    * Get the state of the encoder network corresponding to this stream.
    *
+   * If the stream has a state slot, the state is read from the slot.
+   *
    * @return Return the state of the encoder network for this stream.
    */
   torch::IValue GetState() const;
@@ -110,10 +171,23 @@ class OnlineStream {
   /**
    * Set the state of the encoder network corresponding to this stream.
    *
+   * If the stream has a state slot, the state is written to the slot.
+   *
    * @param state The state to set.
    */
   void SetState(torch::IValue state);
 
+  /**
+   * Assign a slot in an OnlineEncoderStatePool to this stream. After that,
+   * the encoder state of this stream is kept in the pool.
+   */
+  void SetStateSlot(std::shared_ptr<OnlineEncoderStateSlot> slot);
+
+  /** Return the state slot of this stream. It returns nullptr if the
+   *  state is kept in this stream.
+   */
+  OnlineEncoderStateSlot *GetStateSlot() const;
+
   /**
    * Get the context graph corresponding to this stream.
    *
@@ -121,8 +195,44 @@ class OnlineStream {
    */
   const ContextGraphPtr &GetContextGraph() const;
 
+  /** Return true if Serialize() supports this stream.
+   *
+   * Streams with a context graph and streams decoded with
+   * fast_beam_search are not supported.
+   */
+  bool IsSerializable() const;
+
+  /** Save the state of this stream into a compact binary string, e.g.,
+   * to move it to another process or to keep an idle stream on disk.
+   *
+   * It contains the encoder state, the decoding result and the feature
+   * frames that have not been processed yet. Audio samples that have not
+   * been converted into feature frames, i.e., less than a frame length,
+   * are dropped. Numbers are saved in the native byte order.
+   *
+   * Use OnlineRecognizer::RestoreStream() to restore it.
+   * IsSerializable() must be true.
+   */
+  std::string Serialize() const;
+
+  /** Restore the state saved by Serialize() into this newly created stream.
+   *
+   * You should use OnlineRecognizer::RestoreStream() instead of calling
+   * it directly.
+   *
+   * @param data  A string returned by Serialize().
+   * @param init_state  The initial encoder state of the model. The returned
+   *                    state has the same structure and device as it.
+   *
+   * @return Return the encoder state. The caller should pass it to
+   *         SetState() or SetStateSlot().
+   */
+  torch::IValue Deserialize(const std::string &data,
+                            const torch::IValue &init_state);
+
   // Return a reference to the number of processed frames so far.
-  // Initially, it is 0. It is always less than NumFramesReady().
+  // Initially, it is 0. It is less than NumFramesReady() except after
+  // decoding the last chunk of a stream, which may be padded.
   //
   // The returned reference is valid as long as this object is alive.
   int32_t &GetNumProcessedFrames();
@@ -0,0 +1,173 @@
+// sherpa/cpp_api/vad-asr-pipeline.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/cpp_api/vad-asr-pipeline.h"
+
+#include <algorithm>
+#include <memory>
+#include <numeric>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include "sherpa/csrc/log.h"
+#include "sherpa/csrc/macros.h"
+
+namespace sherpa {
+
+void VadAsrPipelineConfig::Register(ParseOptions *po) {
+  po->Register("vad-asr-max-batch-size", &max_batch_size,
+               "Max number of speech segments to decode in a batch");
+
+  po->Register("vad-asr-max-batch-duration", &max_batch_duration,
+               "In seconds. Max value of (number of segments) * (duration "
+               "of the longest segment) of a batch");
+}
+
+bool VadAsrPipelineConfig::Validate() const {
+  if (max_batch_size < 1) {
+    SHERPA_LOGE("--vad-asr-max-batch-size='%d' is less than 1",
+                max_batch_size);
+    return false;
+  }
+
+  if (max_batch_duration <= 0) {
+    SHERPA_LOGE("--vad-asr-max-batch-duration='%.3f' is not positive",
+                max_batch_duration);
+    return false;
+  }
+
+  return true;
+}
+
+std::string VadAsrPipelineConfig::ToString() const {
+  std::ostringstream os;
+
+  os << "VadAsrPipelineConfig(";
+  os << "max_batch_size=" << max_batch_size << ", ";
+  os << "max_batch_duration=" << max_batch_duration << ")";
+
+  return os.str();
+}
+
+VadAsrPipeline::VadAsrPipeline(const VadAsrPipelineConfig &config,
+                               const VoiceActivityDetector *vad,
+                               OfflineRecognizer *recognizer)
+    : config_(config), vad_(vad), recognizer_(recognizer) {
+  if (!config_.Validate()) {
+    SHERPA_EXIT(-1);
+  }
+}
+
+std::vector<VadAsrSegment> VadAsrPipeline::Process(
+    torch::Tensor samples) const {
+  SHERPA_CHECK_EQ(samples.dim(), 1);
+  SHERPA_CHECK_EQ(samples.scalar_type(), torch::kFloat);
+
+  // The streams below use pointers into samples, so there is no need to
+  // copy the audio of each segment.
+  samples = samples.contiguous().cpu();
+
+  std::vector<SpeechSegment> segments = vad_->Process(samples);
+
+  int32_t sample_rate = vad_->GetConfig().model.sample_rate;
+  int64_t total = samples.numel();
+
+  std::vector<VadAsrSegment> ans;
+  std::vector<int64_t> offsets;
+  std::vector<int32_t> num_samples;
+
+  ans.reserve(segments.size());
+  offsets.reserve(segments.size());
+  num_samples.reserve(segments.size());
+
+  for (const auto &s : segments) {
+    int64_t start = std::max<int64_t>(s.start * sample_rate, 0);
+    int64_t end = std::min<int64_t>(s.end * sample_rate, total);
+    if (end <= start) {
+      continue;
+    }
+
+    ans.push_back({s.start, s.end, {}});
+    offsets.push_back(start);
+    num_samples.push_back(end - start);
+  }
+
+  if (ans.empty()) {
+    return ans;
+  }
+
+  int64_t max_batch_samples =
+      static_cast<int64_t>(config_.max_batch_duration * sample_rate);
+
+  std::vector<std::vector<int32_t>> batches =
+      GetBatches(num_samples, config_.max_batch_size, max_batch_samples);
+
+  const float *p = samples.data_ptr<float>();
+
+  for (const auto &batch : batches) {
+    // Features are computed batch by batch to bound the memory usage
+    std::vector<std::unique_ptr<OfflineStream>> streams;
+    std::vector<OfflineStream *> ss;
+    streams.reserve(batch.size());
+    ss.reserve(batch.size());
+
+    for (int32_t i : batch) {
+      streams.push_back(recognizer_->CreateStream());
+      streams.back()->AcceptSamples(p + offsets[i], num_samples[i]);
+      ss.push_back(streams.back().get());
+    }
+
+    recognizer_->DecodeStreams(ss.data(), ss.size());
+
+    for (size_t k = 0; k != batch.size(); ++k) {
+      ans[batch[k]].result = streams[k]->GetResult();
+    }
+  }
+
+  return ans;
+}
+
+std::vector<std::vector<int32_t>> VadAsrPipeline::GetBatches(
+    const std::vector<int32_t> &num_samples, int32_t max_batch_size,
+    int64_t max_batch_samples) {
+  std::vector<int32_t> indexes(num_samples.size());
+  std::iota(indexes.begin(), indexes.end(), 0);
+
+  // From the longest to the shortest, so the first segment of a batch
+  // determines the padded length of the batch
+  std::stable_sort(indexes.begin(), indexes.end(),
+                   [&num_samples](int32_t a, int32_t b) {
+                     return num_samples[a] > num_samples[b];
+                   });
+
+  std::vector<std::vector<int32_t>> ans;
+  std::vector<int32_t> batch;
+  int64_t max_len = 0;
+
+  for (int32_t i : indexes) {
+    if (batch.empty()) {
+      max_len = num_samples[i];
+    }
+
+    int64_t padded = max_len * static_cast<int64_t>(batch.size() + 1);
+    if (!batch.empty() && (static_cast<int32_t>(batch.size()) >=
+                               max_batch_size ||
+                           padded > max_batch_samples)) {
+      ans.push_back(std::move(batch));
+      batch.clear();
+      max_len = num_samples[i];
+    }
+
+    batch.push_back(i);
+  }
+
+  if (!batch.empty()) {
+    ans.push_back(std::move(batch));
+  }
+
+  return ans;
+}
+
+}  // namespace sherpa
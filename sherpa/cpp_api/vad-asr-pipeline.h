@@ -0,0 +1,95 @@
+// sherpa/cpp_api/vad-asr-pipeline.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#ifndef SHERPA_CPP_API_VAD_ASR_PIPELINE_H_
+#define SHERPA_CPP_API_VAD_ASR_PIPELINE_H_
+
+#include <string>
+#include <vector>
+
+#include "sherpa/cpp_api/offline-recognizer.h"
+#include "sherpa/cpp_api/parse-options.h"
+#include "sherpa/csrc/voice-activity-detector.h"
+#include "torch/script.h"
+
+namespace sherpa {
+
+struct VadAsrPipelineConfig {
+  /// Max number of speech segments in a batch
+  int32_t max_batch_size = 16;
+
+  /// Max total duration in seconds of a batch after padding, i.e.,
+  /// (duration of the longest segment) * (number of segments).
+  /// It limits memory usage when there are long segments.
+  float max_batch_duration = 300;
+
+  VadAsrPipelineConfig() = default;
+  VadAsrPipelineConfig(int32_t max_batch_size, float max_batch_duration)
+      : max_batch_size(max_batch_size),
+        max_batch_duration(max_batch_duration) {}
+
+  void Register(ParseOptions *po);
+  bool Validate() const;
+
+  std::string ToString() const;
+};
+
+struct VadAsrSegment {
+  float start;  // seconds
+  float end;    // seconds
+  OfflineRecognitionResult result;
+};
+
+/** Run VAD on the input audio and decode the detected speech segments
+ * with an offline recognizer.
+ *
+ * Segments are sorted by duration and decoded in batches so that segments
+ * in the same batch have similar lengths and little padding is needed.
+ */
+class VadAsrPipeline {
+ public:
+  /**
+   * @param config  The config for the pipeline.
+   * @param vad  Not owned by this class.
+   * @param recognizer  Not owned by this class.
+   */
+  VadAsrPipeline(const VadAsrPipelineConfig &config,
+                 const VoiceActivityDetector *vad,
+                 OfflineRecognizer *recognizer);
+
+  const VadAsrPipelineConfig &GetConfig() const { return config_; }
+
+  /**
+   * @param samples 1-D float32 tensor. Its sample rate must be equal to
+   *                the one of the VAD model.
+   * @return Return the recognition results of the detected speech segments,
+   *         sorted by start time.
+   */
+  std::vector<VadAsrSegment> Process(torch::Tensor samples) const;
+
+  /** Split segments into batches.
+   *
+   * @param num_samples  num_samples[i] is the number of samples of the i-th
+   *                     segment.
+   * @param max_batch_size  Max number of segments in a batch.
+   * @param max_batch_samples  Max value of (number of segments) *
+   *                           (max number of samples of a segment) of a
+   *                           batch. A segment exceeding it is put in a
+   *                           batch of its own.
+   * @return Return a list of batches. Each batch contains indexes into
+   *         num_samples and segments in a batch are of similar lengths.
+   */
+  static std::vector<std::vector<int32_t>> GetBatches(
+      const std::vector<int32_t> &num_samples, int32_t max_batch_size,
+      int64_t max_batch_samples);
+
+ private:
+  VadAsrPipelineConfig config_;
+  const VoiceActivityDetector *vad_;  // not owned
+  OfflineRecognizer *recognizer_;     // not owned
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CPP_API_VAD_ASR_PIPELINE_H_
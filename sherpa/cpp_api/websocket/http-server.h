@@ -23,6 +23,8 @@
 #include <string>
 #include <unordered_map>
 
+#include "sherpa/csrc/metrics.h"
+
 namespace sherpa {
 
 /** Read a text or a binary file.
@@ -66,10 +68,18 @@ static const char *kKnownFiles[] = {
 /** A very simple http server.
  *
  * It serves only static files, e.g., html, js., css, etc.
+ * If metrics are given, it also serves them at /metrics.
  */
 class HttpServer {
  public:
-  explicit HttpServer(const std::string &root) {
+  /**
+   * @param root  Directory containing the static files.
+   * @param metrics  If not null, it is rendered for /metrics. It must
+   *                 outlive this object.
+   */
+  explicit HttpServer(const std::string &root,
+                      const Metrics *metrics = nullptr)
+      : metrics_(metrics) {
     for (const auto filename : kKnownFiles) {
       content_.emplace(filename, ReadFile(root + filename));
     }
@@ -91,6 +101,11 @@ class HttpServer {
    * @return Return true if the given file is found; return false otherwise.
    */
   bool ProcessRequest(const std::string &filename, std::string *content) const {
+    if (metrics_ && filename == "/metrics") {
+      *content = metrics_->ToPrometheus();
+      return true;
+    }
+
     auto it = content_.find(filename);
     if (it == content_.end()) {
       *content = error_content_;
@@ -110,6 +125,8 @@ class HttpServer {
 
   /** Map filename to its content.*/
   std::unordered_map<std::string, std::string> content_;
+
+  const Metrics *metrics_;  // not owned
 };
 
 }  // namespace sherpa
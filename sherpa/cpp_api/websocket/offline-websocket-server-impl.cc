@@ -5,17 +5,20 @@
 #include "sherpa/cpp_api/websocket/offline-websocket-server-impl.h"
 
 #include <algorithm>
+#include <chrono>  // NOLINT
 #include <memory>
 #include <utility>
 #include <vector>
 
 #include "sherpa/csrc/file-utils.h"
 #include "sherpa/csrc/log.h"
+#include "sherpa/csrc/resample.h"
 
 namespace sherpa {
 
 void OfflineWebsocketDecoderConfig::Register(ParseOptions *po) {
   recognizer_config.Register(po);
+  bucket_config.Register(po);
 
   po->Register(
       "max-batch-size", &max_batch_size,
@@ -37,29 +40,113 @@ void OfflineWebsocketDecoderConfig::Validate() const {
   SHERPA_CHECK_GT(max_batch_size, 0);
 
   SHERPA_CHECK_GT(max_utterance_length, 0);
+
+  SHERPA_CHECK(bucket_config.Validate());
+
+  // Otherwise an utterance may never be decoded if its bucket is not full
+  SHERPA_CHECK_GE(bucket_config.max_wait_ms, 0);
+}
+
+static LengthBucketQueueConfig GetBucketConfig(
+    const OfflineWebsocketDecoderConfig &config) {
+  LengthBucketQueueConfig ans = config.bucket_config;
+  ans.max_batch_size = config.max_batch_size;
+  return ans;
 }
 
 OfflineWebsocketDecoder::OfflineWebsocketDecoder(
     const OfflineWebsocketDecoderConfig &config, OfflineWebsocketServer *server)
-    : config_(config), server_(server), recognizer_(config.recognizer_config) {}
+    : config_(config),
+      streams_(GetBucketConfig(config)),
+      server_(server),
+      recognizer_(config.recognizer_config) {
+  const auto &frame_opts =
+      config.recognizer_config.feat_config.fbank_opts.frame_opts;
+  window_shift_ = frame_opts.samp_freq * frame_opts.frame_shift_ms / 1000;
+}
 
 void OfflineWebsocketDecoder::Push(connection_hdl hdl, ConnectionDataPtr d) {
+  const auto &audio_format = d->audio_format;
+  float sample_rate =
+      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+
+  // Number of samples after resampling
+  int64_t num_samples = static_cast<int64_t>(d->expected_byte_size) /
+                        audio_format.BytesPerSample() * sample_rate /
+                        audio_format.sample_rate;
+
   std::lock_guard<std::mutex> lock(mutex_);
-  streams_.push_back({hdl, d});
+  streams_.Push({hdl, d}, num_samples / window_shift_);
+}
+
+torch::Tensor OfflineWebsocketDecoder::GetSamples(
+    const ConnectionData &d) const {
+  const auto &audio_format = d.audio_format;
+  torch::Tensor samples =
+      audio_format.Convert(d.data.data(), d.expected_byte_size);
+
+  int32_t sample_rate =
+      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+  if (audio_format.sample_rate == sample_rate) {
+    return samples;
+  }
+
+  float min_freq = std::min<int32_t>(audio_format.sample_rate, sample_rate);
+  float lowpass_cutoff = 0.99 * 0.5 * min_freq;
+  int32_t lowpass_filter_width = 6;
+
+  LinearResample resampler(audio_format.sample_rate, sample_rate,
+                           lowpass_cutoff, lowpass_filter_width);
+
+  return resampler.Resample(samples, /*flush*/ true);
 }
 
 void OfflineWebsocketDecoder::Decode() {
   std::unique_lock<std::mutex> lock(mutex_);
-  if (streams_.empty()) {
+  if (streams_.Empty()) {
+    return;
+  }
+
+  std::vector<int32_t> lengths;
+  auto items = streams_.Pop(false, &lengths);
+  if (items.empty()) {
+    // No bucket is ready. Decode again once the oldest item has waited
+    // long enough.
+    float wait_ms = streams_.TimeToNextDeadlineMs();
+    if (wait_ms >= 0 && !timer_pending_) {
+      timer_pending_ = true;
+
+      auto timer = std::make_shared<asio::steady_timer>(
+          server_->GetWorkContext(),
+          std::chrono::microseconds(static_cast<int64_t>(wait_ms * 1000) + 1));
+
+      timer->async_wait([this, timer](const asio::error_code &) {
+        {
+          std::lock_guard<std::mutex> lock(mutex_);
+          timer_pending_ = false;
+        }
+        Decode();
+      });
+    }
     return;
   }
 
-  int32_t size =
-      std::min(static_cast<int32_t>(streams_.size()), config_.max_batch_size);
+  padding_stats_.Add(lengths);
+  if (padding_stats_.num_batches % 100 == 0) {
+    SHERPA_LOG(INFO) << padding_stats_.ToString();
+  }
+
+  if (!streams_.Empty()) {
+    // Other buckets may also be ready
+    asio::post(server_->GetWorkContext(), [this]() { Decode(); });
+  }
 
   // We first lock the mutex for streams_, take items from it, and then
   // unlock the mutex; in doing so we don't need to lock the mutex to
   // access hdl and connection_data later.
+  lock.unlock();
+
+  int32_t size = items.size();
   std::vector<connection_hdl> handles(size);
 
   // Store connection_data here to prevent the data from being freed
@@ -72,23 +159,17 @@ void OfflineWebsocketDecoder::Decode() {
   std::vector<OfflineStream *> p_ss(size);
 
   for (int32_t i = 0; i != size; ++i) {
-    auto &p = streams_.front();
-    handles[i] = p.first;
-    connection_data[i] = p.second;
-    streams_.pop_front();
-
-    auto samples =
-        reinterpret_cast<const float *>(&connection_data[i]->data[0]);
-    auto num_samples = connection_data[i]->expected_byte_size / sizeof(float);
+    handles[i] = items[i].first;
+    connection_data[i] = items[i].second;
+
+    torch::Tensor samples = GetSamples(*connection_data[i]);
     auto s = recognizer_.CreateStream();
-    s->AcceptSamples(samples, num_samples);
+    s->AcceptSamples(samples.data_ptr<float>(), samples.numel());
 
     ss[i] = std::move(s);
     p_ss[i] = ss[i].get();
   }
 
-  lock.unlock();
-
   // Note: DecodeStreams is thread-safe
   recognizer_.DecodeStreams(p_ss.data(), size);
 
@@ -154,15 +235,8 @@ OfflineWebsocketServer::OfflineWebsocketServer(
         OnMessage(hdl, msg);
       });
 
-  auto sample_rate = decoder_config.recognizer_config.feat_config.fbank_opts
-                         .frame_opts.samp_freq;
-
-  max_byte_size_ =
-      decoder_config.max_utterance_length * sample_rate * sizeof(float);
-
   SHERPA_LOG(INFO) << "max_utterance_length: "
-                   << decoder_config.max_utterance_length << " s,"
-                   << "max_byte_size_: " << max_byte_size_;
+                   << decoder_config.max_utterance_length << " s";
 }
 
 void OfflineWebsocketServer::SetupLog() {
@@ -176,8 +250,13 @@ void OfflineWebsocketServer::SetupLog() {
 }
 
 void OfflineWebsocketServer::OnOpen(connection_hdl hdl) {
+  auto d = std::make_shared<ConnectionData>();
+  d->audio_format.sample_rate = decoder_.GetConfig()
+                                    .recognizer_config.feat_config.fbank_opts
+                                    .frame_opts.samp_freq;
+
   std::lock_guard<std::mutex> lock(mutex_);
-  connections_.emplace(hdl, std::make_shared<ConnectionData>());
+  connections_.emplace(hdl, d);
 
   SHERPA_LOG(INFO) << "Number of active connections: " << connections_.size()
                    << "\n";
@@ -236,6 +315,10 @@ void OfflineWebsocketServer::OnMessage(connection_hdl hdl,
         // The client will not send any more data. We can close the
         // connection now.
         Close(hdl, websocketpp::close::status::normal, "Done");
+      } else if (connection_data->expected_byte_size == 0 &&
+                 connection_data->audio_format.FromJson(payload)) {
+        // e.g., {"sample_rate": 8000, "sample_format": "s16le"}
+        SHERPA_LOG(INFO) << connection_data->audio_format.ToString();
       } else {
         Close(hdl, websocketpp::close::status::normal,
               std::string("Invalid payload: ") + payload);
@@ -256,16 +339,13 @@ void OfflineWebsocketServer::OnMessage(connection_hdl hdl,
         connection_data->expected_byte_size =
             *reinterpret_cast<const int32_t *>(p);
 
-        if (connection_data->expected_byte_size > max_byte_size_) {
-          float num_samples =
-              connection_data->expected_byte_size / sizeof(float);
-
-          auto sample_rate = decoder_.GetConfig()
-                                 .recognizer_config.feat_config.fbank_opts
-                                 .frame_opts.samp_freq;
+        const auto &audio_format = connection_data->audio_format;
+        float num_samples = connection_data->expected_byte_size /
+                            audio_format.BytesPerSample();
 
-          float duration = num_samples / sample_rate;
+        float duration = num_samples / audio_format.sample_rate;
 
+        if (duration > decoder_.GetConfig().max_utterance_length) {
           std::ostringstream os;
           os << "Max utterance length is configured to "
              << decoder_.GetConfig().max_utterance_length
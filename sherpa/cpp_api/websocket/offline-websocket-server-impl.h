@@ -5,7 +5,6 @@
 #ifndef SHERPA_CPP_API_WEBSOCKET_OFFLINE_WEBSOCKET_SERVER_IMPL_H_
 #define SHERPA_CPP_API_WEBSOCKET_OFFLINE_WEBSOCKET_SERVER_IMPL_H_
 
-#include <deque>
 #include <map>
 #include <memory>
 #include <string>
@@ -17,6 +16,8 @@
 #include "sherpa/cpp_api/parse-options.h"
 #include "sherpa/cpp_api/websocket/http-server.h"
 #include "sherpa/cpp_api/websocket/tee-stream.h"
+#include "sherpa/csrc/audio-format.h"
+#include "sherpa/csrc/length-bucket-queue.h"
 #include "websocketpp/config/asio_no_tls.hpp"  // TODO(fangjun): support TLS
 #include "websocketpp/server.hpp"
 
@@ -35,6 +36,10 @@ struct ConnectionData {
   // It saves the received contents from the client
   std::vector<int8_t> data;
 
+  // Format of the received samples. The client can declare it with a text
+  // message before sending the number of bytes. It is not changed by Clear().
+  AudioFormat audio_format;
+
   void Clear() {
     expected_byte_size = 0;
     cur = 0;
@@ -50,6 +55,9 @@ struct OfflineWebsocketDecoderConfig {
 
   float max_utterance_length = 300;  // seconds
 
+  // Its max_batch_size is set from the above max_batch_size
+  LengthBucketQueueConfig bucket_config;
+
   void Register(ParseOptions *po);
   void Validate() const;
 };
@@ -79,6 +87,11 @@ class OfflineWebsocketDecoder {
 
   const OfflineWebsocketDecoderConfig &GetConfig() const { return config_; }
 
+ private:
+  // Convert the received samples to float and resample them to the
+  // sample rate of the model
+  torch::Tensor GetSamples(const ConnectionData &d) const;
+
  private:
   OfflineWebsocketDecoderConfig config_;
 
@@ -86,12 +99,20 @@ class OfflineWebsocketDecoder {
    * this queue, the worker threads will get items from this queue for
    * decoding.
    *
-   * Number of items to take from this queue is determined by
-   * `--max-batch-size`. If there are not enough items in the queue, we won't
-   * wait and take whatever we have for decoding.
+   * Items are put into buckets by length so that utterances of similar
+   * lengths are decoded together. A batch is taken from a bucket once it
+   * reaches `--max-batch-size` or `--max-frames-per-batch`, or once its
+   * oldest item has waited `--max-wait-ms`.
    */
   std::mutex mutex_;
-  std::deque<std::pair<connection_hdl, ConnectionDataPtr>> streams_;
+  LengthBucketQueue<std::pair<connection_hdl, ConnectionDataPtr>> streams_;
+  PaddingStats padding_stats_;
+
+  // True if a Decode() is scheduled for the deadline of streams_
+  bool timer_pending_ = false;
+
+  // Number of samples per feature frame
+  int32_t window_shift_;
 
   OfflineWebsocketServer *server_;  // Not owned
   OfflineRecognizer recognizer_;
@@ -114,6 +135,7 @@ class OfflineWebsocketServer {
                          const OfflineWebsocketDecoderConfig &decoder_config);
 
   asio::io_context &GetConnectionContext() { return io_conn_; }
+  asio::io_context &GetWorkContext() { return io_work_; }
   server &GetServer() { return server_; }
 
   void Run(uint16_t port);
@@ -151,13 +173,19 @@ class OfflineWebsocketServer {
   //     text message containing "Done" to the server and closes the connection
   // (7) The server receives a text message "Done" and closes the connection
   //
+  // Before (2), the client can send a text message declaring the format of
+  // the audio samples, e.g., {"sample_rate": 8000, "sample_format": "s16le"}.
+  // Supported sample formats are f32le and s16le. It applies to all
+  // following audio files of the connection. The default is f32le with the
+  // sample rate of the model.
+  //
   // Note:
   //  (a) All models in icefall are trained using audio samples at sampling
-  //      rate 16 kHz. Please send audio samples with a sampling rate matching
-  //      the one expected by the model.
+  //      rate 16 kHz. Audio samples with a different sampling rate are
+  //      resampled by the server.
   //  (b) All models in icefall use features extracted from audio samples
   //      normalized to the range [-1, 1]. Please send normalized audio samples
-  //      if you use models from icefall.
+  //      if you use models from icefall and f32le.
   //  (c) Only sound files with a single channel is supported
   //  (d) Step (2) and step (3) can be merged into one step to send bandwidth.
   //  (e) Only audio samples are sent. For instance, if we want to decode
@@ -184,7 +212,6 @@ class OfflineWebsocketServer {
   sherpa::TeeStream tee_;
 
   OfflineWebsocketDecoder decoder_;
-  int32_t max_byte_size_;
 };
 
 }  // namespace sherpa
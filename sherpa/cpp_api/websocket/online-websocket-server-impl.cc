@@ -4,6 +4,9 @@
 
 #include "sherpa/cpp_api/websocket/online-websocket-server-impl.h"
 
+#include <chrono>  // NOLINT
+#include <string>
+#include <utility>
 #include <vector>
 
 #include "sherpa/csrc/file-utils.h"
@@ -19,12 +22,26 @@ void OnlineWebsocketDecoderConfig::Register(ParseOptions *po) {
 
   po->Register("max-batch-size", &max_batch_size,
                "Max batch size for recognition.");
+
+  po->Register("num-work-threads", &num_work_threads,
+               "Number of threads to use for neural network "
+               "computation and decoding.");
+
+  po->Register("max-pending-chunks", &max_pending_chunks,
+               "Max number of messages of a connection that have not been "
+               "processed. Once it is reached, the server stops reading from "
+               "the connection until the work threads catch up.");
+
+  admission_config.Register(po);
 }
 
 void OnlineWebsocketDecoderConfig::Validate() const {
   recognizer_config.Validate();
   SHERPA_CHECK_GT(loop_interval_ms, 0);
   SHERPA_CHECK_GT(max_batch_size, 0);
+  SHERPA_CHECK_GT(num_work_threads, 0);
+  SHERPA_CHECK_GT(max_pending_chunks, 0);
+  SHERPA_CHECK(admission_config.Validate());
 }
 
 void OnlineWebsocketServerConfig::Register(sherpa::ParseOptions *po) {
@@ -55,8 +72,33 @@ void OnlineWebsocketServerConfig::Validate() const {
 OnlineWebsocketDecoder::OnlineWebsocketDecoder(OnlineWebsocketServer *server)
     : server_(server),
       config_(server->GetConfig().decoder_config),
-      timer_(server->GetWorkContext()) {
+      timer_(server->GetWorkContext()),
+      admission_controller_(config_.admission_config,
+                            config_.num_work_threads) {
   recognizer_ = std::make_unique<OnlineRecognizer>(config_.recognizer_config);
+
+  Metrics &metrics = server->GetMetrics();
+  queue_wait_ = metrics.AddHistogram(
+      "sherpa_queue_wait_seconds",
+      "Time that a request waits in the batch queue.", LatencyBuckets());
+  batch_size_ = metrics.AddHistogram("sherpa_batch_size",
+                                     "Number of requests in a batch.",
+                                     {1, 2, 4, 8, 16, 32, 64, 128, 256});
+  encoder_time_ = metrics.AddHistogram("sherpa_encoder_seconds",
+                                       "Time to run the encoder for a batch.",
+                                       LatencyBuckets());
+  search_time_ = metrics.AddHistogram("sherpa_search_seconds",
+                                      "Time to run the search for a batch.",
+                                      LatencyBuckets());
+  chunk_latency_ = metrics.AddHistogram(
+      "sherpa_chunk_latency_seconds",
+      "Time from receiving a message to sending its result.",
+      LatencyBuckets());
+  rtf_ = metrics.AddHistogram(
+      "sherpa_connection_rtf",
+      "Real time factor of a connection, i.e., its share of the "
+      "computation time divided by the duration of its audio.",
+      {0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2});
 }
 
 std::shared_ptr<Connection> OnlineWebsocketDecoder::GetOrCreateConnection(
@@ -69,6 +111,9 @@ std::shared_ptr<Connection> OnlineWebsocketDecoder::GetOrCreateConnection(
     // create a new connection
     std::shared_ptr<OnlineStream> s = recognizer_->CreateStream();
     auto c = std::make_shared<Connection>(hdl, s);
+    c->audio_format.sample_rate =
+        config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+    c->protocol = server_->GetServer().get_con_from_hdl(hdl)->get_subprotocol();
     connections_.insert({hdl, c});
     return c;
   }
@@ -76,19 +121,25 @@ std::shared_ptr<Connection> OnlineWebsocketDecoder::GetOrCreateConnection(
 
 void OnlineWebsocketDecoder::AcceptWaveform(std::shared_ptr<Connection> c) {
   std::lock_guard<std::mutex> lock(c->mutex);
-  float sample_rate =
-      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+  // The stream resamples the samples if it is different from the sample
+  // rate of the model
+  int32_t sample_rate = c->audio_format.sample_rate;
   while (!c->samples.empty()) {
     c->s->AcceptWaveform(sample_rate, c->samples.front());
     c->samples.pop_front();
   }
+
+  if (c->paused) {
+    c->paused = false;
+    asio::post(server_->GetConnectionContext(),
+               [this, hdl = c->hdl]() { server_->ResumeReading(hdl); });
+  }
 }
 
 void OnlineWebsocketDecoder::InputFinished(std::shared_ptr<Connection> c) {
   std::lock_guard<std::mutex> lock(c->mutex);
 
-  float sample_rate =
-      config_.recognizer_config.feat_config.fbank_opts.frame_opts.samp_freq;
+  int32_t sample_rate = c->audio_format.sample_rate;
 
   while (!c->samples.empty()) {
     c->s->AcceptWaveform(sample_rate, c->samples.front());
@@ -117,6 +168,7 @@ void OnlineWebsocketDecoder::ProcessConnections(const asio::error_code &ec) {
   }
 
   std::lock_guard<std::mutex> lock(mutex_);
+  auto now = std::chrono::steady_clock::now();
   std::vector<connection_hdl> to_remove;
   for (auto &p : connections_) {
     auto hdl = p.first;
@@ -126,6 +178,11 @@ void OnlineWebsocketDecoder::ProcessConnections(const asio::error_code &ec) {
     if (!server_->Contains(hdl)) {
       // If the connection is disconnected, we stop processing it
       to_remove.push_back(hdl);
+
+      std::lock_guard<std::mutex> c_lock(c->mutex);
+      if (c->audio_duration > 0) {
+        rtf_->Observe(c->compute_time / c->audio_duration);
+      }
       continue;
     }
 
@@ -144,6 +201,7 @@ void OnlineWebsocketDecoder::ProcessConnections(const asio::error_code &ec) {
 
     // this stream has enough frames and is currently not processed by any
     // threads, so put it into the ready queue
+    c->ready_time = now;
     ready_connections_.push_back(c);
 
     // In `Decode()`, it will remove hdl from `active_`
@@ -154,6 +212,14 @@ void OnlineWebsocketDecoder::ProcessConnections(const asio::error_code &ec) {
     connections_.erase(hdl);
   }
 
+  float oldest_wait_ms = 0;
+  if (!ready_connections_.empty()) {
+    oldest_wait_ms = std::chrono::duration<float, std::milli>(
+                         now - ready_connections_.front()->ready_time)
+                         .count();
+  }
+  admission_controller_.Update(oldest_wait_ms, now);
+
   if (!ready_connections_.empty()) {
     asio::post(server_->GetWorkContext(), [this]() { Decode(); });
   }
@@ -173,8 +239,11 @@ void OnlineWebsocketDecoder::Decode() {
     return;
   }
 
+  auto now = std::chrono::steady_clock::now();
+
   std::vector<std::shared_ptr<Connection>> c_vec;
   std::vector<OnlineStream *> s_vec;
+  std::vector<float> queue_delay_ms;
   while (!ready_connections_.empty() &&
          static_cast<int32_t>(s_vec.size()) < config_.max_batch_size) {
     auto c = ready_connections_.front();
@@ -182,6 +251,8 @@ void OnlineWebsocketDecoder::Decode() {
 
     c_vec.push_back(c);
     s_vec.push_back(c->s.get());
+    queue_delay_ms.push_back(
+        std::chrono::duration<float, std::milli>(now - c->ready_time).count());
   }
 
   if (!ready_connections_.empty()) {
@@ -191,17 +262,64 @@ void OnlineWebsocketDecoder::Decode() {
     asio::post(server_->GetWorkContext(), [this]() { Decode(); });
   }
 
+  admission_controller_.BeginBatch(queue_delay_ms, now);
+
+  batch_size_->Observe(s_vec.size());
+  for (auto d : queue_delay_ms) {
+    queue_wait_->Observe(d / 1000);
+  }
+
+  OnlineDecodeTiming timing;
+
   lock.unlock();
-  recognizer_->DecodeStreams(s_vec.data(), s_vec.size());
+  recognizer_->DecodeStreams(s_vec.data(), s_vec.size(), &timing);
   lock.lock();
 
+  admission_controller_.EndBatch();
+
+  encoder_time_->Observe(timing.encoder_time);
+  search_time_->Observe(timing.search_time);
+
+  // The computation time is divided equally among the streams
+  float compute_time =
+      (timing.encoder_time + timing.search_time) / s_vec.size();
+
   for (auto c : c_vec) {
+    c->compute_time += compute_time;
+
     auto result = recognizer_->GetResult(c->s.get());
 
-    asio::post(server_->GetConnectionContext(),
-               [this, hdl = c->hdl, json = result.AsJsonString()]() {
-                 server_->Send(hdl, json);
-               });
+    // Clients of the default protocol expect a message for every decoded
+    // chunk. Only delta clients skip unchanged results.
+    bool is_delta = c->protocol == kDeltaJsonProtocol ||
+                    c->protocol == kDeltaMsgpackProtocol;
+    if (!is_delta || result != c->last_result) {
+      std::string message;
+      auto op = websocketpp::frame::opcode::text;
+      if (c->protocol == kDeltaMsgpackProtocol) {
+        message = result.AsMsgpack(c->last_result);
+        op = websocketpp::frame::opcode::binary;
+      } else if (c->protocol == kDeltaJsonProtocol) {
+        message = result.AsJsonString(c->last_result);
+      } else {
+        message = result.AsJsonString();
+      }
+      c->last_result = std::move(result);
+
+      asio::post(server_->GetConnectionContext(),
+                 [this, hdl = c->hdl, message = std::move(message), op]() {
+                   server_->Send(hdl, message, op);
+                 });
+    }
+
+    {
+      std::lock_guard<std::mutex> c_lock(c->mutex);
+      chunk_latency_->Observe(std::chrono::duration<float>(
+                                  std::chrono::steady_clock::now() -
+                                  c->last_message_time)
+                                  .count());
+    }
+
     active_.erase(c->hdl);
   }
 }
@@ -212,14 +330,26 @@ OnlineWebsocketServer::OnlineWebsocketServer(
     : config_(config),
       io_conn_(io_conn),
       io_work_(io_work),
-      http_server_(config.doc_root),
+      http_server_(config.doc_root, &metrics_),
       log_(config.log_file, std::ios::app),
       tee_(std::cout, log_),
       decoder_(this) {
   SetupLog();
 
+  metrics_.AddGauge("sherpa_active_streams", "Number of active streams.",
+                    [this]() -> double {
+                      std::lock_guard<std::mutex> lock(mutex_);
+                      return connections_.size();
+                    });
+
+  metrics_.AddGauge("sherpa_resident_memory_bytes",
+                    "Resident memory of the process.", GetResidentMemoryBytes);
+
   server_.init_asio(&io_conn_);
 
+  server_.set_validate_handler(
+      [this](connection_hdl hdl) { return OnValidate(hdl); });
+
   server_.set_open_handler([this](connection_hdl hdl) { OnOpen(hdl); });
 
   server_.set_close_handler([this](connection_hdl hdl) { OnClose(hdl); });
@@ -249,18 +379,43 @@ void OnlineWebsocketServer::SetupLog() {
   server_.get_elog().set_ostream(&tee_);
 }
 
-void OnlineWebsocketServer::Send(connection_hdl hdl, const std::string &text) {
+void OnlineWebsocketServer::Send(connection_hdl hdl, const std::string &text,
+                                 websocketpp::frame::opcode::value op) {
   websocketpp::lib::error_code ec;
   if (!Contains(hdl)) {
     return;
   }
 
-  server_.send(hdl, text, websocketpp::frame::opcode::text, ec);
+  server_.send(hdl, text, op, ec);
   if (ec) {
     server_.get_alog().write(websocketpp::log::alevel::app, ec.message());
   }
 }
 
+bool OnlineWebsocketServer::OnValidate(connection_hdl hdl) {
+  auto con = server_.get_con_from_hdl(hdl);
+
+  // Refuse new clients if accepting them would violate the latency SLO,
+  // so that the connected clients are not slowed down
+  int32_t retry_after = 0;
+  if (!decoder_.GetAdmissionController().Admit(&retry_after)) {
+    con->set_status(websocketpp::http::status_code::service_unavailable);
+    con->append_header("Retry-After", std::to_string(retry_after));
+    con->set_body("The server is busy. Please retry later.");
+    return false;
+  }
+
+  // Clients that don't request a subprotocol get the full result
+  for (const auto &p : con->get_requested_subprotocols()) {
+    if (p == kDeltaJsonProtocol || p == kDeltaMsgpackProtocol) {
+      con->select_subprotocol(p);
+      break;
+    }
+  }
+
+  return true;
+}
+
 void OnlineWebsocketServer::OnOpen(connection_hdl hdl) {
   std::lock_guard<std::mutex> lock(mutex_);
   connections_.insert(hdl);
@@ -277,7 +432,8 @@ void OnlineWebsocketServer::OnClose(connection_hdl hdl) {
   connections_.erase(hdl);
 
   SHERPA_LOG(INFO) << "Number of active connections: " << connections_.size()
-                   << "\n";
+                   << "\n"
+                   << decoder_.GetAdmissionController().ToString() << "\n";
 }
 
 bool OnlineWebsocketServer::Contains(connection_hdl hdl) const {
@@ -285,6 +441,17 @@ bool OnlineWebsocketServer::Contains(connection_hdl hdl) const {
   return connections_.count(hdl);
 }
 
+void OnlineWebsocketServer::ResumeReading(connection_hdl hdl) {
+  if (!Contains(hdl)) {
+    return;
+  }
+
+  auto ec = server_.get_con_from_hdl(hdl)->resume_reading();
+  if (ec) {
+    server_.get_alog().write(websocketpp::log::alevel::app, ec.message());
+  }
+}
+
 void OnlineWebsocketServer::OnHttp(connection_hdl hdl) {
   auto con = server_.get_con_from_hdl(hdl);
 
@@ -310,6 +477,9 @@ Go back to <a href="/streaming_record.html">/streaming_record.html</a>
 
   if (found) {
     con->set_status(websocketpp::http::status_code::ok);
+    if (filename == "/metrics") {
+      con->append_header("Content-Type", kPrometheusContentType);
+    }
   } else {
     con->set_status(websocketpp::http::status_code::not_found);
   }
@@ -327,19 +497,41 @@ void OnlineWebsocketServer::OnMessage(connection_hdl hdl,
     case websocketpp::frame::opcode::text:
       if (payload == "Done") {
         asio::post(io_work_, [this, c]() { decoder_.InputFinished(c); });
+      } else if (!c->started && c->audio_format.FromJson(payload)) {
+        // e.g., {"sample_rate": 8000, "sample_format": "s16le"}
+        SHERPA_LOG(INFO) << c->audio_format.ToString();
+      } else {
+        Close(hdl, websocketpp::close::status::unsupported_data,
+              "Invalid audio format");
       }
       break;
     case websocketpp::frame::opcode::binary: {
-      auto p = reinterpret_cast<const float *>(payload.data());
-      int32_t num_samples = payload.size() / sizeof(float);
-      torch::Tensor samples = torch::from_blob(const_cast<float *>(p),
-                                               {num_samples}, torch::kFloat);
-      // Caution(fangjun): We have to make a copy here since the tensor
-      // is referenced inside the fbank computer.
-      // Otherwise, it will cause segfault for the next invocation
-      // of AcceptWaveform since payload is freed after this function returns
-      samples = samples.clone();
+      c->started = true;
+
+      // Note: It returns a copy of the samples. We cannot reference the
+      // payload since it is freed after this function returns.
+      torch::Tensor samples =
+          c->audio_format.Convert(payload.data(), payload.size());
+
+      std::lock_guard<std::mutex> lock(c->mutex);
       c->samples.push_back(samples);
+      c->last_message_time = std::chrono::steady_clock::now();
+      c->audio_duration +=
+          static_cast<float>(samples.numel()) / c->audio_format.sample_rate;
+
+      // Backpressure: Stop reading from the client until the work threads
+      // have processed its samples. Otherwise, a client sending faster than
+      // we can process makes the queue grow without bound.
+      if (!c->paused && static_cast<int32_t>(c->samples.size()) >=
+                            config_.decoder_config.max_pending_chunks) {
+        auto ec = server_.get_con_from_hdl(hdl)->pause_reading();
+        if (ec) {
+          server_.get_alog().write(websocketpp::log::alevel::app,
+                                   ec.message());
+        } else {
+          c->paused = true;
+        }
+      }
 
       asio::post(io_work_, [this, c]() { decoder_.AcceptWaveform(c); });
       break;
@@ -21,6 +21,9 @@
 #include "sherpa/cpp_api/parse-options.h"
 #include "sherpa/cpp_api/websocket/http-server.h"
 #include "sherpa/cpp_api/websocket/tee-stream.h"
+#include "sherpa/csrc/admission-controller.h"
+#include "sherpa/csrc/audio-format.h"
+#include "sherpa/csrc/metrics.h"
 #include "websocketpp/config/asio_no_tls.hpp"  // TODO(fangjun): support TLS
 #include "websocketpp/server.hpp"
 using server = websocketpp::server<websocketpp::config::asio>;
@@ -28,6 +31,12 @@ using connection_hdl = websocketpp::connection_hdl;
 
 namespace sherpa {
 
+// Websocket subprotocols that a client can request to receive only what
+// has changed since the previous message.
+// See OnlineRecognitionResult::AsJsonString(prev) for the format.
+constexpr const char *kDeltaJsonProtocol = "sherpa.delta.json";
+constexpr const char *kDeltaMsgpackProtocol = "sherpa.delta.msgpack";
+
 struct Connection {
   // handle to the connection. We can use it to send messages to the client
   connection_hdl hdl;
@@ -46,6 +55,40 @@ struct Connection {
   // and invoke work threads to compute features
   std::deque<torch::Tensor> samples;
 
+  // True if we have stopped reading from the client since there are too
+  // many samples in the queue. Protected by mutex.
+  bool paused = false;
+
+  // Format of the received samples. The client can declare it with a text
+  // message before sending any samples.
+  AudioFormat audio_format;
+
+  // True if we have received samples from the client
+  bool started = false;
+
+  // The negotiated subprotocol. Empty to send the full result each time.
+  std::string protocol;
+
+  // The result sent last time. It is accessed only by the thread that is
+  // decoding this connection.
+  OnlineRecognitionResult last_result;
+
+  // The time it was put into the ready queue of the decoder
+  std::chrono::steady_clock::time_point ready_time;
+
+  // The time we received the last audio samples from the client.
+  // Protected by mutex.
+  std::chrono::steady_clock::time_point last_message_time;
+
+  // Duration in seconds of the audio received from the client.
+  // Protected by mutex.
+  float audio_duration = 0;
+
+  // Share in seconds of this connection in the computation time of the
+  // batches containing it. It is accessed only by the thread that is
+  // decoding this connection.
+  float compute_time = 0;
+
   Connection() = default;
   Connection(connection_hdl hdl, std::shared_ptr<OnlineStream> s)
       : hdl(hdl), s(s), last_active(std::chrono::steady_clock::now()) {}
@@ -59,6 +102,15 @@ struct OnlineWebsocketDecoderConfig {
 
   int32_t max_batch_size = 5;
 
+  // size of the thread pool for neural network computation and decoding
+  int32_t num_work_threads = 5;
+
+  // Stop reading from a client once it has this number of messages
+  // that have not been processed
+  int32_t max_pending_chunks = 32;
+
+  AdmissionControllerConfig admission_config;
+
   void Register(ParseOptions *po);
   void Validate() const;
 };
@@ -82,6 +134,10 @@ class OnlineWebsocketDecoder {
 
   void Run();
 
+  AdmissionController &GetAdmissionController() {
+    return admission_controller_;
+  }
+
  private:
   void ProcessConnections(const asio::error_code &ec);
 
@@ -94,6 +150,15 @@ class OnlineWebsocketDecoder {
   std::unique_ptr<OnlineRecognizer> recognizer_;
   OnlineWebsocketDecoderConfig config_;
   asio::steady_timer timer_;
+  AdmissionController admission_controller_;
+
+  // Owned by server_->GetMetrics()
+  Histogram *queue_wait_;
+  Histogram *batch_size_;
+  Histogram *encoder_time_;
+  Histogram *search_time_;
+  Histogram *chunk_latency_;
+  Histogram *rtf_;
 
   // It protects `connections_`, `ready_connections_`, and `active_`
   std::mutex mutex_;
@@ -134,14 +199,24 @@ class OnlineWebsocketServer {
   asio::io_context &GetConnectionContext() { return io_conn_; }
   asio::io_context &GetWorkContext() { return io_work_; }
   server &GetServer() { return server_; }
+  Metrics &GetMetrics() { return metrics_; }
 
-  void Send(connection_hdl hdl, const std::string &text);
+  void Send(connection_hdl hdl, const std::string &text,
+            websocketpp::frame::opcode::value op =
+                websocketpp::frame::opcode::text);
 
   bool Contains(connection_hdl hdl) const;
 
+  // Resume reading from a client that is paused in OnMessage()
+  void ResumeReading(connection_hdl hdl);
+
  private:
   void SetupLog();
 
+  // It is invoked before a websocket client is connected to select
+  // the subprotocol. It refuses the client if the server is overloaded.
+  bool OnValidate(connection_hdl hdl);
+
   // When a websocket client is connected, it will invoke this method
   // (Not for HTTP)
   void OnOpen(connection_hdl hdl);
@@ -162,6 +237,10 @@ class OnlineWebsocketServer {
   OnlineWebsocketServerConfig config_;
   asio::io_context &io_conn_;
   asio::io_context &io_work_;
+
+  // It is served at /metrics by http_server_, so it has to be
+  // declared before http_server_
+  Metrics metrics_;
   HttpServer http_server_;
   server server_;
 
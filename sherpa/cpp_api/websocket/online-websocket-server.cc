@@ -43,16 +43,9 @@ int32_t main(int32_t argc, char *argv[]) {
   // size of the thread pool for handling network connections
   int32_t num_io_threads = 1;
 
-  // size of the thread pool for neural network computation and decoding
-  int32_t num_work_threads = 5;
-
   po.Register("num-io-threads", &num_io_threads,
               "Number of threads to use for network connections.");
 
-  po.Register("num-work-threads", &num_work_threads,
-              "Number of threads to use for neural network "
-              "computation and decoding.");
-
   po.Register("port", &port, "The port on which the server will listen.");
 
   config.Register(&po);
@@ -72,6 +65,8 @@ int32_t main(int32_t argc, char *argv[]) {
 
   config.Validate();
 
+  int32_t num_work_threads = config.decoder_config.num_work_threads;
+
   asio::io_context io_conn;  // for network connections
   asio::io_context io_work;  // for neural network and decoding
 
@@ -0,0 +1,166 @@
+// sherpa/csrc/admission-controller.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/admission-controller.h"
+
+#include <algorithm>
+#include <cmath>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include "sherpa/csrc/log.h"
+#include "sherpa/csrc/macros.h"
+
+namespace sherpa {
+
+void AdmissionControllerConfig::Register(ParseOptions *po) {
+  po->Register("max-queue-delay-ms", &max_queue_delay_ms,
+               "The latency SLO in milliseconds. New connections are refused "
+               "with 503 and a Retry-After header if the measured time that "
+               "requests wait for decoding exceeds it while the work threads "
+               "are busy. 0 disables it.");
+
+  po->Register("min-nn-pool-utilization", &min_utilization,
+               "New connections are refused only if the fraction of time "
+               "that the work threads are busy is at least this value. "
+               "Used only when --max-queue-delay-ms is positive.");
+}
+
+bool AdmissionControllerConfig::Validate() const {
+  if (min_utilization < 0 || min_utilization > 1) {
+    SHERPA_LOGE("--min-nn-pool-utilization '%.3f' is not in the range [0, 1]",
+                min_utilization);
+    return false;
+  }
+
+  if (smoothing <= 0 || smoothing > 1) {
+    SHERPA_LOGE("smoothing '%.3f' is not in the range (0, 1]", smoothing);
+    return false;
+  }
+
+  return true;
+}
+
+std::string AdmissionControllerConfig::ToString() const {
+  std::ostringstream os;
+
+  os << "AdmissionControllerConfig(";
+  os << "max_queue_delay_ms=" << max_queue_delay_ms << ", ";
+  os << "min_utilization=" << min_utilization << ", ";
+  os << "smoothing=" << smoothing << ")";
+
+  return os.str();
+}
+
+AdmissionController::AdmissionController(
+    const AdmissionControllerConfig &config, int32_t num_threads)
+    : config_(config),
+      num_threads_(num_threads),
+      busy_since_(Clock::now()),
+      last_update_(busy_since_) {
+  SHERPA_CHECK_GT(num_threads_, 0);
+}
+
+void AdmissionController::AccountBusyTime(Clock::time_point now) {
+  busy_time_ms_ += num_in_flight_ *
+                   std::chrono::duration<double, std::milli>(now - busy_since_)
+                       .count();
+  busy_since_ = now;
+}
+
+void AdmissionController::BeginBatch(const std::vector<float> &queue_delay_ms,
+                                     Clock::time_point now) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  AccountBusyTime(now);
+  ++num_in_flight_;
+
+  for (auto d : queue_delay_ms) {
+    sum_queue_delay_ms_ += d;
+  }
+  num_requests_ += queue_delay_ms.size();
+}
+
+void AdmissionController::EndBatch(Clock::time_point now) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  AccountBusyTime(now);
+  --num_in_flight_;
+}
+
+void AdmissionController::Update(float oldest_wait_ms, Clock::time_point now) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  double elapsed =
+      std::chrono::duration<double, std::milli>(now - last_update_).count();
+  if (elapsed <= 0) {
+    return;
+  }
+
+  AccountBusyTime(now);
+
+  float utilization = static_cast<float>(
+      (busy_time_ms_ - last_busy_time_ms_) / (elapsed * num_threads_));
+
+  float delay = num_requests_ > 0 ? sum_queue_delay_ms_ / num_requests_ : 0;
+  delay = std::max(delay, oldest_wait_ms);
+
+  float a = config_.smoothing;
+  utilization_ = a * std::min(utilization, 1.0f) + (1 - a) * utilization_;
+  queue_delay_ms_ = a * delay + (1 - a) * queue_delay_ms_;
+
+  last_update_ = now;
+  last_busy_time_ms_ = busy_time_ms_;
+  sum_queue_delay_ms_ = 0;
+  num_requests_ = 0;
+}
+
+bool AdmissionController::OverloadedImpl() const {
+  return config_.max_queue_delay_ms > 0 &&
+         queue_delay_ms_ > config_.max_queue_delay_ms &&
+         utilization_ >= config_.min_utilization;
+}
+
+bool AdmissionController::Overloaded() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return OverloadedImpl();
+}
+
+bool AdmissionController::Admit(int32_t *retry_after) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (!OverloadedImpl()) {
+    ++num_admitted_;
+    return true;
+  }
+
+  ++num_rejected_;
+
+  float r = std::ceil(queue_delay_ms_ / config_.max_queue_delay_ms);
+  *retry_after = std::min(std::max(static_cast<int32_t>(r), 1), 60);
+
+  return false;
+}
+
+float AdmissionController::QueueDelayMs() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return queue_delay_ms_;
+}
+
+float AdmissionController::Utilization() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return utilization_;
+}
+
+std::string AdmissionController::ToString() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  std::ostringstream os;
+
+  os << "AdmissionController(";
+  os << "queue_delay_ms=" << queue_delay_ms_ << ", ";
+  os << "utilization=" << utilization_ << ", ";
+  os << "num_admitted=" << num_admitted_ << ", ";
+  os << "num_rejected=" << num_rejected_ << ")";
+
+  return os.str();
+}
+
+}  // namespace sherpa
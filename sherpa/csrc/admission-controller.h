@@ -0,0 +1,131 @@
+// sherpa/csrc/admission-controller.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_ADMISSION_CONTROLLER_H_
+#define SHERPA_CSRC_ADMISSION_CONTROLLER_H_
+
+#include <chrono>  // NOLINT
+#include <cstdint>
+#include <mutex>  // NOLINT
+#include <string>
+#include <vector>
+
+#include "sherpa/cpp_api/parse-options.h"
+
+namespace sherpa {
+
+struct AdmissionControllerConfig {
+  // The latency SLO in milliseconds. New sessions are rejected if the time
+  // that requests wait for decoding exceeds it while the work threads are
+  // busy. A non-positive value disables it.
+  float max_queue_delay_ms = 0;
+
+  // New sessions are rejected only if the fraction of time that the work
+  // threads are busy is at least this value.
+  float min_utilization = 0.9;
+
+  // Weight of a new measurement in the moving averages
+  float smoothing = 0.2;
+
+  void Register(ParseOptions *po);
+  bool Validate() const;
+
+  std::string ToString() const;
+};
+
+/** Decide whether to accept a new session from the measured load of
+ * the work threads.
+ *
+ * Each time Update() is called, it measures
+ *
+ *  - the queue delay, i.e., the mean time that the requests taken from
+ *    the queue since the last call have waited, or the time that the oldest
+ *    queued request has waited if that is larger, and
+ *  - the utilization, i.e., the fraction of time since the last call during
+ *    which the work threads were processing batches.
+ *
+ * Both are smoothed with an exponential moving average. The server is
+ * overloaded if the queue delay exceeds max_queue_delay_ms while the
+ * utilization is at least min_utilization.
+ *
+ * It is thread-safe.
+ */
+class AdmissionController {
+ public:
+  using Clock = std::chrono::steady_clock;
+
+  /**
+   * @param config
+   * @param num_threads  Number of threads that process batches.
+   */
+  AdmissionController(const AdmissionControllerConfig &config,
+                      int32_t num_threads);
+
+  /** It is called when a thread starts to process a batch.
+   *
+   * @param queue_delay_ms  The time in milliseconds that each request of
+   *                        the batch has waited in the queue.
+   */
+  void BeginBatch(const std::vector<float> &queue_delay_ms,
+                  Clock::time_point now = Clock::now());
+
+  // It is called when a thread finishes processing a batch.
+  void EndBatch(Clock::time_point now = Clock::now());
+
+  /** Take a measurement. It should be called periodically.
+   *
+   * @param oldest_wait_ms  The time in milliseconds that the oldest request
+   *                        in the queue has waited. 0 if the queue is empty.
+   */
+  void Update(float oldest_wait_ms, Clock::time_point now = Clock::now());
+
+  bool Overloaded() const;
+
+  /** Return true if a new session can be accepted. Otherwise, retry_after
+   * is set to the number of seconds that the client should wait before
+   * retrying. The more the queue delay exceeds the SLO, the longer it is.
+   */
+  bool Admit(int32_t *retry_after);
+
+  float QueueDelayMs() const;
+  float Utilization() const;
+
+  std::string ToString() const;
+
+ private:
+  bool OverloadedImpl() const;
+
+  // Add the time that batches have been processed since busy_since_
+  // to busy_time_ms_. The caller should hold mutex_.
+  void AccountBusyTime(Clock::time_point now);
+
+ private:
+  AdmissionControllerConfig config_;
+  int32_t num_threads_;
+
+  mutable std::mutex mutex_;
+
+  // Number of batches being processed
+  int32_t num_in_flight_ = 0;
+
+  // Integral of num_in_flight_ over time
+  double busy_time_ms_ = 0;
+  Clock::time_point busy_since_;
+
+  // Measurements since the last call of Update()
+  Clock::time_point last_update_;
+  double last_busy_time_ms_ = 0;
+  double sum_queue_delay_ms_ = 0;
+  int32_t num_requests_ = 0;
+
+  // Smoothed measurements
+  float queue_delay_ms_ = 0;
+  float utilization_ = 0;
+
+  int64_t num_admitted_ = 0;
+  int64_t num_rejected_ = 0;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_ADMISSION_CONTROLLER_H_
@@ -0,0 +1,103 @@
+// sherpa/csrc/audio-format.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/audio-format.h"
+
+#include <cstring>
+#include <sstream>
+#include <string>
+
+#include "nlohmann/json.hpp"
+
+namespace sherpa {
+
+bool ParseSampleFormat(const std::string &name, SampleFormat *format) {
+  if (name == "f32le") {
+    *format = SampleFormat::kF32LE;
+    return true;
+  }
+
+  if (name == "s16le") {
+    *format = SampleFormat::kS16LE;
+    return true;
+  }
+
+  return false;
+}
+
+std::string SampleFormatToString(SampleFormat format) {
+  switch (format) {
+    case SampleFormat::kF32LE:
+      return "f32le";
+    case SampleFormat::kS16LE:
+      return "s16le";
+  }
+
+  return "unknown";
+}
+
+bool AudioFormat::FromJson(const std::string &s) {
+  using json = nlohmann::json;
+  json j = json::parse(s, nullptr, /*allow_exceptions*/ false);
+  if (j.is_discarded() || !j.is_object()) {
+    return false;
+  }
+
+  int32_t rate = sample_rate;
+  if (j.contains("sample_rate")) {
+    const auto &v = j["sample_rate"];
+    if (!v.is_number_integer() || v.get<int64_t>() <= 0 ||
+        v.get<int64_t>() > 384000) {
+      return false;
+    }
+    rate = v.get<int32_t>();
+  }
+
+  SampleFormat format = sample_format;
+  if (j.contains("sample_format")) {
+    const auto &v = j["sample_format"];
+    if (!v.is_string() || !ParseSampleFormat(v.get<std::string>(), &format)) {
+      return false;
+    }
+  }
+
+  sample_rate = rate;
+  sample_format = format;
+
+  return true;
+}
+
+torch::Tensor AudioFormat::Convert(const void *data, int32_t num_bytes) const {
+  int32_t n = num_bytes / BytesPerSample();
+  torch::Tensor ans = torch::empty({n}, torch::kFloat);
+  float *p = ans.data_ptr<float>();
+
+  // Note: We assume that the current machine is little endian.
+  // Also, data is not necessarily aligned, so we use memcpy.
+  if (sample_format == SampleFormat::kF32LE) {
+    std::memcpy(p, data, n * sizeof(float));
+    return ans;
+  }
+
+  const char *src = reinterpret_cast<const char *>(data);
+  for (int32_t i = 0; i != n; ++i) {
+    int16_t v;
+    std::memcpy(&v, src + i * sizeof(int16_t), sizeof(int16_t));
+    p[i] = v / 32768.0f;
+  }
+
+  return ans;
+}
+
+std::string AudioFormat::ToString() const {
+  std::ostringstream os;
+
+  os << "AudioFormat(";
+  os << "sample_rate=" << sample_rate << ", ";
+  os << "sample_format=\"" << SampleFormatToString(sample_format) << "\")";
+
+  return os.str();
+}
+
+}  // namespace sherpa
@@ -0,0 +1,67 @@
+// sherpa/csrc/audio-format.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_AUDIO_FORMAT_H_
+#define SHERPA_CSRC_AUDIO_FORMAT_H_
+
+#include <cstdint>
+#include <string>
+
+#include "torch/script.h"
+
+namespace sherpa {
+
+enum class SampleFormat {
+  kF32LE,  // 32-bit float, little endian
+  kS16LE,  // 16-bit signed integer, little endian
+};
+
+/** Return true and set format if name is "f32le" or "s16le".
+ */
+bool ParseSampleFormat(const std::string &name, SampleFormat *format);
+
+std::string SampleFormatToString(SampleFormat format);
+
+/* Format of the audio samples sent by a client.
+ *
+ * A client declares it with a handshake message before sending any
+ * samples, e.g.,
+ *
+ *   {"sample_rate": 8000, "sample_format": "s16le"}
+ */
+struct AudioFormat {
+  int32_t sample_rate = 16000;
+  SampleFormat sample_format = SampleFormat::kF32LE;
+
+  AudioFormat() = default;
+  AudioFormat(int32_t sample_rate, SampleFormat sample_format)
+      : sample_rate(sample_rate), sample_format(sample_format) {}
+
+  int32_t BytesPerSample() const {
+    return sample_format == SampleFormat::kS16LE ? 2 : 4;
+  }
+
+  /** Update it from a json string. Fields that are not present in the
+   * string are not changed.
+   *
+   * @return Return false if the string is not valid. It is not changed
+   *         in that case.
+   */
+  bool FromJson(const std::string &s);
+
+  /** Convert samples received from a client to a 1-D float tensor.
+   * 16-bit samples are divided by 32768 so that they are in the
+   * range [-1, 1).
+   *
+   * @param data  Samples in this format.
+   * @param num_bytes  Number of bytes of data. Trailing bytes that don't
+   *                   form a complete sample are ignored.
+   */
+  torch::Tensor Convert(const void *data, int32_t num_bytes) const;
+
+  std::string ToString() const;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_AUDIO_FORMAT_H_
@@ -0,0 +1,113 @@
+// sherpa/csrc/context-graph-cache.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#include "sherpa/csrc/context-graph-cache.h"
+
+#include <cstring>
+#include <memory>
+#include <utility>
+
+namespace sherpa {
+
+static inline void HashCombine(uint64_t *h, uint64_t v) {
+  // FNV-1a
+  *h ^= v;
+  *h *= 1099511628211ULL;
+}
+
+ContextGraphCache::ContextGraphCache(int32_t capacity) : capacity_(capacity) {
+  SHERPA_CHECK_GT(capacity_, 0);
+}
+
+uint64_t ContextGraphCache::Hash(
+    const std::vector<std::vector<int32_t>> &token_ids, float context_score) {
+  uint32_t score_bits;
+  std::memcpy(&score_bits, &context_score, sizeof(score_bits));
+
+  uint64_t h = 14695981039346656037ULL;
+  HashCombine(&h, score_bits);
+  HashCombine(&h, token_ids.size());
+  for (const auto &ids : token_ids) {
+    // Include the length so that [[1, 2], [3]] and [[1], [2, 3]] differ
+    HashCombine(&h, ids.size());
+    for (auto i : ids) {
+      HashCombine(&h, static_cast<uint32_t>(i));
+    }
+  }
+
+  return h;
+}
+
+ContextGraphPtr ContextGraphCache::Get(
+    const std::vector<std::vector<int32_t>> &token_ids, float context_score) {
+  uint64_t hash = Hash(token_ids, context_score);
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    auto graph = Find(hash, token_ids, context_score);
+    if (graph) {
+      ++num_hits_;
+      return graph;
+    }
+    ++num_misses_;
+  }
+
+  // Build the graph without holding the lock, so that streams with
+  // cached graphs are not blocked by it.
+  auto graph = std::make_shared<ContextGraph>(token_ids, context_score);
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  auto it = index_.find(hash);
+  if (it != index_.end()) {
+    // Either another thread has added the same graph in the meantime, or
+    // it is a hash collision. In both cases, keep the newer one.
+    entries_.erase(it->second);
+    index_.erase(it);
+  }
+
+  entries_.push_front({hash, context_score, token_ids, graph});
+  index_[hash] = entries_.begin();
+
+  while (static_cast<int32_t>(entries_.size()) > capacity_) {
+    index_.erase(entries_.back().hash);
+    entries_.pop_back();
+  }
+
+  return graph;
+}
+
+int32_t ContextGraphCache::Size() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return index_.size();
+}
+
+int64_t ContextGraphCache::NumHits() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return num_hits_;
+}
+
+int64_t ContextGraphCache::NumMisses() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return num_misses_;
+}
+
+ContextGraphPtr ContextGraphCache::Find(
+    uint64_t hash, const std::vector<std::vector<int32_t>> &token_ids,
+    float context_score) {
+  auto it = index_.find(hash);
+  if (it == index_.end()) {
+    return nullptr;
+  }
+
+  const Entry &entry = *it->second;
+
+  // Compare the content in case of a hash collision
+  if (entry.context_score != context_score || entry.token_ids != token_ids) {
+    return nullptr;
+  }
+
+  entries_.splice(entries_.begin(), entries_, it->second);
+
+  return entry.graph;
+}
+
+}  // namespace sherpa
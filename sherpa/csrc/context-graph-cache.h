@@ -0,0 +1,88 @@
+// sherpa/csrc/context-graph-cache.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_CONTEXT_GRAPH_CACHE_H_
+#define SHERPA_CSRC_CONTEXT_GRAPH_CACHE_H_
+
+#include <cstdint>
+#include <list>
+#include <mutex>  // NOLINT
+#include <unordered_map>
+#include <vector>
+
+#include "sherpa/csrc/context-graph.h"
+
+namespace sherpa {
+
+/** A bounded cache of compiled context graphs keyed by their content.
+ *
+ * Building a ContextGraph for thousands of hotwords, including the
+ * Aho-Corasick fail links, is costly. Clients usually send the same
+ * hotwords for every stream, so the graph built for the first stream
+ * can be shared by the later ones. A ContextGraph is not modified after
+ * it is built, so it is safe to share it among streams.
+ *
+ * Least recently used graphs are evicted once the cache is full. Streams
+ * using an evicted graph keep it alive through their ContextGraphPtr.
+ *
+ * It is thread-safe.
+ */
+class ContextGraphCache {
+ public:
+  /**
+   * @param capacity Max number of graphs to keep. Must be positive.
+   */
+  explicit ContextGraphCache(int32_t capacity);
+
+  /** Return the context graph for the given token IDs and score.
+   *
+   * It is built only if there is no graph of the same content in the cache.
+   */
+  ContextGraphPtr Get(const std::vector<std::vector<int32_t>> &token_ids,
+                      float context_score);
+
+  int32_t Capacity() const { return capacity_; }
+
+  /// Number of graphs in the cache
+  int32_t Size() const;
+
+  /// Number of calls to Get() that found the graph in the cache
+  int64_t NumHits() const;
+
+  /// Number of calls to Get() that built the graph
+  int64_t NumMisses() const;
+
+  /// Return the hash of the given token IDs and score.
+  static uint64_t Hash(const std::vector<std::vector<int32_t>> &token_ids,
+                       float context_score);
+
+ private:
+  struct Entry {
+    uint64_t hash;
+    float context_score;
+    std::vector<std::vector<int32_t>> token_ids;
+    ContextGraphPtr graph;
+  };
+
+  // Return nullptr if there is no graph with the given content. Otherwise,
+  // mark it as the most recently used one. Caller should hold mutex_.
+  ContextGraphPtr Find(uint64_t hash,
+                       const std::vector<std::vector<int32_t>> &token_ids,
+                       float context_score);
+
+ private:
+  int32_t capacity_;
+
+  mutable std::mutex mutex_;
+
+  // The most recently used entry is at the front
+  std::list<Entry> entries_;
+  std::unordered_map<uint64_t, std::list<Entry>::iterator> index_;
+
+  int64_t num_hits_ = 0;
+  int64_t num_misses_ = 0;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_CONTEXT_GRAPH_CACHE_H_
@@ -0,0 +1,141 @@
+// sherpa/csrc/decoder-cache.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#include "sherpa/csrc/decoder-cache.h"
+
+#include "sherpa/csrc/log.h"
+
+namespace sherpa {
+
+DecoderCache::DecoderCache(int32_t capacity) : capacity_(capacity) {
+  SHERPA_CHECK_GT(capacity_, 0);
+}
+
+torch::Tensor DecoderCache::Run(torch::Tensor decoder_input,
+                                const RunDecoderFunc &run_decoder) {
+  TORCH_CHECK(decoder_input.dim() == 2, decoder_input.dim(), " vs ", 2);
+
+  decoder_input = decoder_input.to(torch::kCPU).to(torch::kLong).contiguous();
+
+  int32_t num_rows = decoder_input.size(0);
+  int32_t context_size = decoder_input.size(1);
+  if (num_rows == 0) {
+    return run_decoder(decoder_input);
+  }
+
+  std::vector<torch::Tensor> rows(num_rows);
+
+  // Contexts that are not in the cache. Rows with the same context
+  // are computed only once.
+  std::vector<Key> miss_keys;
+
+  // miss_rows[i] is the first row in decoder_input of miss_keys[i]
+  std::vector<int64_t> miss_rows;
+
+  // (row in decoder_input, index into miss_keys)
+  std::vector<std::pair<int32_t, int32_t>> pending;
+
+  std::unordered_map<Key, int32_t, KeyHash> miss_index;
+
+  const int64_t *p = decoder_input.data_ptr<int64_t>();
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    for (int32_t i = 0; i != num_rows; ++i, p += context_size) {
+      Key key(p, p + context_size);
+
+      const torch::Tensor *value = Find(key);
+      if (value) {
+        rows[i] = *value;
+        ++num_hits_;
+        continue;
+      }
+
+      ++num_misses_;
+
+      auto it = miss_index.find(key);
+      if (it == miss_index.end()) {
+        it = miss_index.emplace(key, miss_keys.size()).first;
+        miss_rows.push_back(i);
+        miss_keys.push_back(std::move(key));
+      }
+      pending.emplace_back(i, it->second);
+    }
+  }
+
+  if (miss_keys.empty()) {
+    return torch::stack(rows);
+  }
+
+  // Run the decoder without holding the lock so that other threads
+  // can use the cache in the meantime.
+  torch::Tensor decoder_out =
+      run_decoder(decoder_input.index_select(0, torch::tensor(miss_rows)));
+
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    for (int32_t i = 0; i != static_cast<int32_t>(miss_keys.size()); ++i) {
+      // Clone it so that the entry does not keep decoder_out alive
+      Insert(std::move(miss_keys[i]), decoder_out[i].clone());
+    }
+  }
+
+  if (static_cast<int32_t>(miss_rows.size()) == num_rows) {
+    // All rows are computed and they are in order
+    return decoder_out;
+  }
+
+  for (const auto &r : pending) {
+    rows[r.first] = decoder_out[r.second];
+  }
+
+  return torch::stack(rows);
+}
+
+int32_t DecoderCache::Size() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return index_.size();
+}
+
+int64_t DecoderCache::NumHits() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return num_hits_;
+}
+
+int64_t DecoderCache::NumMisses() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return num_misses_;
+}
+
+void DecoderCache::Clear() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  index_.clear();
+  entries_.clear();
+}
+
+const torch::Tensor *DecoderCache::Find(const Key &key) {
+  auto it = index_.find(key);
+  if (it == index_.end()) {
+    return nullptr;
+  }
+
+  entries_.splice(entries_.begin(), entries_, it->second);
+
+  return &it->second->second;
+}
+
+void DecoderCache::Insert(Key key, torch::Tensor value) {
+  if (Find(key)) {
+    // Another thread has added it after we released the lock
+    return;
+  }
+
+  entries_.emplace_front(std::move(key), std::move(value));
+  index_[entries_.front().first] = entries_.begin();
+
+  while (static_cast<int32_t>(entries_.size()) > capacity_) {
+    index_.erase(entries_.back().first);
+    entries_.pop_back();
+  }
+}
+
+}  // namespace sherpa
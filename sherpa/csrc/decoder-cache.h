@@ -0,0 +1,109 @@
+// sherpa/csrc/decoder-cache.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_DECODER_CACHE_H_
+#define SHERPA_CSRC_DECODER_CACHE_H_
+
+#include <cstdint>
+#include <functional>
+#include <list>
+#include <memory>
+#include <mutex>  // NOLINT
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+#include "torch/script.h"
+
+namespace sherpa {
+
+/** A bounded cache of decoder outputs keyed by the decoder input.
+ *
+ * The stateless decoders from icefall are pure functions of the last
+ * `context_size` tokens, so the output for a given context can be reused
+ * across frames, hypotheses, and streams. Least recently used entries are
+ * evicted once the cache is full.
+ *
+ * It is thread-safe. A single cache can be shared by all threads that
+ * decode with the same model.
+ */
+class DecoderCache {
+ public:
+  using RunDecoderFunc = std::function<torch::Tensor(const torch::Tensor &)>;
+
+  /**
+   * @param capacity Max number of contexts to keep. Must be positive.
+   */
+  explicit DecoderCache(int32_t capacity);
+
+  /** Return the decoder output for each row of `decoder_input`.
+   *
+   * @param decoder_input A 2-D tensor of shape (N, context_size) of dtype
+   *                      torch.int64. It is moved to CPU if needed.
+   * @param run_decoder It is called once with the rows of `decoder_input`
+   *                    that are not in the cache, each context only once.
+   *                    The argument is a CPU tensor. It should return the
+   *                    decoder output of the given rows, on the device
+   *                    of the model.
+   *
+   * @return Return a tensor of shape (N, ...) where ... is the shape of a
+   *         row of the output of `run_decoder`.
+   */
+  torch::Tensor Run(torch::Tensor decoder_input,
+                    const RunDecoderFunc &run_decoder);
+
+  int32_t Capacity() const { return capacity_; }
+
+  /// Number of contexts in the cache
+  int32_t Size() const;
+
+  /// Number of rows found in the cache by Run()
+  int64_t NumHits() const;
+
+  /// Number of rows not found in the cache by Run()
+  int64_t NumMisses() const;
+
+  /// Remove all entries. The counters are not changed.
+  void Clear();
+
+ private:
+  using Key = std::vector<int64_t>;
+
+  struct KeyHash {
+    size_t operator()(const Key &key) const {
+      uint64_t h = 14695981039346656037ULL;
+      for (auto i : key) {
+        h ^= static_cast<uint64_t>(i);
+        h *= 1099511628211ULL;
+      }
+      return h;
+    }
+  };
+
+  using Entry = std::pair<Key, torch::Tensor>;
+
+  // Return nullptr if the key is not in the cache. Otherwise, mark the
+  // entry as the most recently used one. Caller should hold mutex_.
+  const torch::Tensor *Find(const Key &key);
+
+  // Caller should hold mutex_
+  void Insert(Key key, torch::Tensor value);
+
+ private:
+  int32_t capacity_;
+
+  mutable std::mutex mutex_;
+
+  // The most recently used entry is at the front
+  std::list<Entry> entries_;
+  std::unordered_map<Key, std::list<Entry>::iterator, KeyHash> index_;
+
+  int64_t num_hits_ = 0;
+  int64_t num_misses_ = 0;
+};
+
+using DecoderCachePtr = std::shared_ptr<DecoderCache>;
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_DECODER_CACHE_H_
@@ -0,0 +1,58 @@
+// sherpa/csrc/frame-reducer.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/frame-reducer.h"
+
+#include <cmath>
+#include <tuple>
+
+namespace sherpa {
+
+std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> ReduceFrames(
+    torch::Tensor encoder_out, torch::Tensor encoder_out_length,
+    torch::Tensor ctc_output, float blank_threshold,
+    int32_t blank_id /*= 0*/) {
+  TORCH_CHECK(encoder_out.dim() == 3, encoder_out.dim(), " vs ", 3);
+  TORCH_CHECK(ctc_output.dim() == 3, ctc_output.dim(), " vs ", 3);
+  TORCH_CHECK(encoder_out.size(1) == ctc_output.size(1), encoder_out.size(1),
+              " vs ", ctc_output.size(1));
+  TORCH_CHECK(blank_threshold > 0 && blank_threshold <= 1, blank_threshold);
+
+  torch::Device device = encoder_out.device();
+
+  int32_t N = encoder_out.size(0);
+  int32_t T = encoder_out.size(1);
+  int32_t C = encoder_out.size(2);
+
+  auto lengths = encoder_out_length.to(device);
+
+  auto index = torch::arange(T, torch::dtype(torch::kLong).device(device))
+                   .unsqueeze(0)
+                   .expand({N, T});
+
+  auto keep = ctc_output.select(2, blank_id).to(device) <
+              static_cast<float>(std::log(blank_threshold));
+  keep.logical_and_(index < lengths.unsqueeze(1));
+
+  // Keep the first frame of utterances whose frames are all dropped, so that
+  // the search has at least one frame to process for each utterance
+  auto empty = keep.sum(1) == 0;
+  keep.select(1, 0).logical_or_(empty);
+
+  auto out_length = keep.sum(1);
+  int32_t max_len = out_length.max().item<int64_t>();
+
+  // Sort the kept frames before the dropped ones, keeping their order.
+  // The dropped ones end up in the padding part and are ignored.
+  auto key = torch::where(keep, index, index + T);
+  auto frame_index =
+      std::get<0>(key.sort(/*dim*/ 1)).slice(/*dim*/ 1, 0, max_len) % T;
+
+  auto out = encoder_out.gather(
+      1, frame_index.unsqueeze(2).expand({N, max_len, C}));
+
+  return {out, out_length.to(encoder_out_length.device()), frame_index.cpu()};
+}
+
+}  // namespace sherpa
@@ -0,0 +1,48 @@
+// sherpa/csrc/frame-reducer.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#ifndef SHERPA_CSRC_FRAME_REDUCER_H_
+#define SHERPA_CSRC_FRAME_REDUCER_H_
+
+#include <tuple>
+
+#include "torch/script.h"
+
+namespace sherpa {
+
+/** Drop frames of the encoder output that are almost certainly blank.
+ *
+ * It is the same as the frame reducer from
+ * https://github.com/k2-fsa/icefall/blob/master/egs/librispeech/ASR/pruned_transducer_stateless7_ctc_bs/frame_reducer.py
+ * A frame is dropped if its blank probability from the CTC head is not
+ * less than the given threshold. The remaining frames of each utterance
+ * are moved to the front, keeping their order.
+ *
+ * At least one frame is kept for each utterance.
+ *
+ * @param encoder_out  A 3-D tensor of shape (N, T, C)
+ * @param encoder_out_length  A 1-D tensor of shape (N,) containing number of
+ *                            valid frames in `encoder_out` before padding.
+ * @param ctc_output  A 3-D tensor of shape (N, T, vocab_size) containing
+ *                    log-probabilities.
+ * @param blank_threshold  A probability in the range (0, 1].
+ * @param blank_id  ID of the blank symbol.
+ *
+ * @return Return a tuple containing:
+ *  - out: A 3-D tensor of shape (N, T', C)
+ *  - out_length: A 1-D tensor of shape (N,) containing number of valid
+ *                frames in `out` before padding. It is on the same
+ *                device as `encoder_out_length`.
+ *  - frame_index: A 2-D tensor of shape (N, T') on CPU. For a valid frame,
+ *                 frame_index[n][t] is the index of out[n][t] in
+ *                 encoder_out[n]. It can be used to map timestamps back to
+ *                 frames of the encoder output.
+ */
+std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> ReduceFrames(
+    torch::Tensor encoder_out, torch::Tensor encoder_out_length,
+    torch::Tensor ctc_output, float blank_threshold, int32_t blank_id = 0);
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_FRAME_REDUCER_H_
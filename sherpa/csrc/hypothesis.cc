@@ -21,19 +21,88 @@
 #include <algorithm>
 #include <utility>
 
+#include "sherpa/csrc/log.h"
 #include "sherpa/csrc/math.h"
+
 namespace sherpa {
 
+// Compaction is skipped for stores smaller than this number of tokens
+static constexpr int32_t kMinSizeToCompact = 1024;
+
+Hypotheses::Hypotheses(const std::vector<int32_t> &ys, double log_prob,
+                       const ContextState *context_state /*= nullptr*/)
+    : store_(std::make_shared<TokenStore>()) {
+  Hypothesis hyp;
+  for (auto y : ys) {
+    hyp = Extend(hyp, y);
+  }
+  hyp.log_prob = log_prob;
+  hyp.context_state = context_state;
+  Add(std::move(hyp));
+}
+
+Hypothesis Hypotheses::Extend(const Hypothesis &hyp, int32_t token,
+                              int32_t timestamp /*= -1*/) {
+  if (!store_) {
+    store_ = std::make_shared<TokenStore>();
+  }
+
+  Hypothesis ans = hyp;
+  ans.last_token = store_->Append(hyp.last_token, token, timestamp);
+  ans.num_tokens += 1;
+  ans.hash = Hypothesis::HashAppend(hyp.hash, token);
+  ans.decoder_out_index = -1;
+  return ans;
+}
+
+std::unordered_multimap<uint64_t, Hypothesis>::iterator Hypotheses::Find(
+    const Hypothesis &hyp) {
+  auto range = hyps_dict_.equal_range(hyp.hash);
+  for (auto it = range.first; it != range.second; ++it) {
+    if (SameTokens(it->second, hyp)) {
+      return it;
+    }
+  }
+  return hyps_dict_.end();
+}
+
 void Hypotheses::Add(Hypothesis hyp) {
-  auto key = hyp.Key();
-  auto it = hyps_dict_.find(key);
+  auto it = Find(hyp);
   if (it == hyps_dict_.end()) {
-    hyps_dict_[key] = std::move(hyp);
+    uint64_t hash = hyp.hash;
+    hyps_dict_.emplace(hash, std::move(hyp));
   } else {
     it->second.log_prob = LogAdd<double>()(it->second.log_prob, hyp.log_prob);
   }
 }
 
+void Hypotheses::Remove(const Hypothesis &hyp) {
+  auto it = Find(hyp);
+  if (it != hyps_dict_.end()) {
+    hyps_dict_.erase(it);
+  }
+}
+
+bool Hypotheses::SameTokens(const Hypothesis &a, const Hypothesis &b) const {
+  if (a.num_tokens != b.num_tokens) {
+    return false;
+  }
+
+  int32_t i = a.last_token;
+  int32_t k = b.last_token;
+  // Once both reach the same node, the remaining prefix is shared
+  while (i != k) {
+    const auto &x = (*store_)[i];
+    const auto &y = (*store_)[k];
+    if (x.token != y.token) {
+      return false;
+    }
+    i = x.parent;
+    k = y.parent;
+  }
+  return true;
+}
+
 Hypothesis Hypotheses::GetMostProbable(bool length_norm) const {
   if (length_norm == false) {
     return std::max_element(hyps_dict_.begin(), hyps_dict_.end(),
@@ -47,11 +116,91 @@ Hypothesis Hypotheses::GetMostProbable(bool length_norm) const {
     return std::max_element(
                hyps_dict_.begin(), hyps_dict_.end(),
                [](const auto &left, const auto &right) -> bool {
-                 return left.second.log_prob / left.second.ys.size() <
-                        right.second.log_prob / right.second.ys.size();
+                 return left.second.log_prob / left.second.num_tokens <
+                        right.second.log_prob / right.second.num_tokens;
                })
         ->second;
   }
 }
 
+std::vector<int32_t> Hypotheses::GetTokens(const Hypothesis &hyp) const {
+  std::vector<int32_t> ans(hyp.num_tokens);
+  int32_t k = hyp.last_token;
+  for (int32_t i = hyp.num_tokens - 1; i >= 0; --i) {
+    const auto &node = (*store_)[k];
+    ans[i] = node.token;
+    k = node.parent;
+  }
+  return ans;
+}
+
+std::vector<int32_t> Hypotheses::GetTimestamps(const Hypothesis &hyp) const {
+  std::vector<int32_t> ans(hyp.num_tokens);
+  int32_t k = hyp.last_token;
+  for (int32_t i = hyp.num_tokens - 1; i >= 0; --i) {
+    const auto &node = (*store_)[k];
+    ans[i] = node.timestamp;
+    k = node.parent;
+  }
+  return ans;
+}
+
+void Hypotheses::GetLastTokens(const Hypothesis &hyp, int32_t n,
+                               int64_t *p) const {
+  SHERPA_CHECK_GE(hyp.num_tokens, n);
+  int32_t k = hyp.last_token;
+  for (int32_t i = n - 1; i >= 0; --i) {
+    const auto &node = (*store_)[k];
+    p[i] = node.token;
+    k = node.parent;
+  }
+}
+
+void Hypotheses::MaybeCompact() {
+  if (!store_ || store_->Size() < kMinSizeToCompact ||
+      store_->Size() < 2 * store_->GetCompactedSize()) {
+    return;
+  }
+
+  Compact();
+}
+
+void Hypotheses::Compact() {
+  const TokenStore &old_store = *store_;
+  int32_t old_size = old_store.Size();
+
+  // new_index[i] is the index in the new store of the i-th node
+  // in the old store, or -1 if it is not reachable.
+  std::vector<int32_t> new_index(old_size, -1);
+  for (const auto &p : hyps_dict_) {
+    int32_t k = p.second.last_token;
+    // Stop at the first node that has been visited by other hyps since
+    // its ancestors have also been visited
+    while (k != -1 && new_index[k] == -1) {
+      new_index[k] = 0;
+      k = old_store[k].parent;
+    }
+  }
+
+  // The parent of a node is always added to the store before the node,
+  // so iterating in increasing order visits parents first.
+  auto store = std::make_shared<TokenStore>();
+  for (int32_t i = 0; i != old_size; ++i) {
+    if (new_index[i] == -1) continue;
+
+    const auto &node = old_store[i];
+    int32_t parent = node.parent == -1 ? -1 : new_index[node.parent];
+    new_index[i] = store->Append(parent, node.token, node.timestamp);
+  }
+  store->GetCompactedSize() = store->Size();
+
+  for (auto &p : hyps_dict_) {
+    if (p.second.last_token != -1) {
+      p.second.last_token = new_index[p.second.last_token];
+    }
+  }
+
+  store_ = std::move(store);
+}
+
 }  // namespace sherpa
@@ -19,45 +19,107 @@
 #ifndef SHERPA_CSRC_HYPOTHESIS_H_
 #define SHERPA_CSRC_HYPOTHESIS_H_
 
+#include <cstdint>
+#include <memory>
+#include <sstream>
 #include <string>
 #include <unordered_map>
 #include <utility>
 #include <vector>
 
 #include "sherpa/csrc/context-graph.h"
-#include "torch/all.h"
 
 namespace sherpa {
 
+/** A node in the shared-prefix token store.
+ *
+ * Hypotheses of an utterance share the nodes of their common prefix,
+ * so extending a hypothesis by one token costs O(1), no matter how long
+ * the token sequence is.
+ */
+struct TokenNode {
+  /// The token ID
+  int32_t token;
+
+  /// The frame number after subsampling on which `token` is decoded.
+  /// It is -1 for tokens that are not decoded, e.g., leading blanks.
+  int32_t timestamp;
+
+  /// Index of the previous token in the store. -1 for the first token.
+  int32_t parent;
+};
+
+class TokenStore {
+ public:
+  /** Append a token after the node with index `parent`.
+   *
+   * @return Return the index of the newly added node.
+   */
+  int32_t Append(int32_t parent, int32_t token, int32_t timestamp) {
+    nodes_.push_back({token, timestamp, parent});
+    return static_cast<int32_t>(nodes_.size()) - 1;
+  }
+
+  const TokenNode &operator[](int32_t i) const { return nodes_[i]; }
+
+  int32_t Size() const { return nodes_.size(); }
+
+  // Size of the store after the last compaction.
+  // See Hypotheses::MaybeCompact()
+  int32_t &GetCompactedSize() { return compacted_size_; }
+
+ private:
+  std::vector<TokenNode> nodes_;
+  int32_t compacted_size_ = 0;
+};
+
+using TokenStorePtr = std::shared_ptr<TokenStore>;
+
 struct Hypothesis {
-  // The predicted tokens so far. Newly predicated tokens are appended.
-  std::vector<int32_t> ys;
+  // Index of the last token in the TokenStore of the Hypotheses
+  // containing this hyp. -1 means there are no tokens.
+  int32_t last_token = -1;
 
-  // timestamps[i] contains the frame number after subsampling
-  // on which ys[i] is decoded.
-  std::vector<int32_t> timestamps;
+  // Number of tokens in this hyp
+  int32_t num_tokens = 0;
 
-  // The total score of ys in log space.
+  // Rolling hash of the token sequence. It is updated incrementally
+  // when a token is appended. Hypotheses with different hashes contain
+  // different token sequences. Hypotheses with the same hash have to be
+  // compared token by token, see Hypotheses::SameTokens().
+  uint64_t hash = kInitialHash;
+
+  // The total score of the token sequence in log space.
   double log_prob = 0;
 
   // The state of contextual-baising graph
-  const ContextState *context_state;
+  const ContextState *context_state = nullptr;
 
   int32_t num_trailing_blanks = 0;
 
-  Hypothesis() = default;
-  Hypothesis(const std::vector<int32_t> &ys, double log_prob,
-             const ContextState *context_state = nullptr)
-      : ys(ys), log_prob(log_prob), context_state(context_state) {}
-
-  // If two Hypotheses have the same `Key`, then they contain
-  // the same token sequence.
-  std::string Key() const { return torch::Join("-", ys); }
+  // Row of the decoder output of this hyp in the decoder output of the
+  // frame it was created from. It is set only for hyps extended with a
+  // blank, whose tokens and thus decoder output did not change, so that
+  // beam search can reuse the row instead of running the decoder again.
+  // -1 means the decoder output has to be computed.
+  int32_t decoder_out_index = -1;
+
+  static constexpr uint64_t kInitialHash = 14695981039346656037ULL;
+
+  // Return the hash of the token sequence after appending `token`
+  // to a sequence whose hash is `h`.
+  static uint64_t HashAppend(uint64_t h, int32_t token) {
+    // FNV-1a on the token, followed by a multiplicative mix
+    h ^= static_cast<uint64_t>(static_cast<uint32_t>(token));
+    h *= 1099511628211ULL;
+    h ^= h >> 29;
+    return h;
+  }
 
   // For debugging
   std::string ToString() const {
     std::ostringstream os;
-    os << "(" << Key() << ", " << log_prob << ")";
+    os << "(" << hash << ", " << num_tokens << ", " << log_prob << ")";
     return os.str();
   }
 };
@@ -66,27 +128,47 @@ class Hypotheses {
  public:
   Hypotheses() = default;
 
-  explicit Hypotheses(std::vector<Hypothesis> hyps) {
-    for (auto &h : hyps) {
-      hyps_dict_[h.Key()] = std::move(h);
-    }
-  }
-
-  explicit Hypotheses(std::unordered_map<std::string, Hypothesis> hyps_dict)
-      : hyps_dict_(std::move(hyps_dict)) {}
-
-  // Add hyp to this object. If it already exists, its log_prob
-  // is updated with the given hyp using log-sum-exp.
+  /** Create an object that shares the given token store.
+   *
+   * Hypotheses created from the same object at different frames of an
+   * utterance should share the same store.
+   */
+  explicit Hypotheses(TokenStorePtr store) : store_(std::move(store)) {}
+
+  /** Create an object containing a single hyp with the given tokens.
+   *
+   * @param ys  The tokens of the hyp, e.g., the leading blanks.
+   * @param log_prob The score of the hyp.
+   * @param context_state The state of the context graph.
+   */
+  Hypotheses(const std::vector<int32_t> &ys, double log_prob,
+             const ContextState *context_state = nullptr);
+
+  /** Return a hyp by appending a token to the given hyp.
+   *
+   * The given hyp must belong to an object sharing the store with this
+   * object.
+   *
+   * @param hyp  The hyp to extend.
+   * @param token The token to append.
+   * @param timestamp The frame number on which `token` is decoded.
+   */
+  Hypothesis Extend(const Hypothesis &hyp, int32_t token,
+                    int32_t timestamp = -1);
+
+  // Add hyp to this object. If a hyp with the same token sequence
+  // already exists, its log_prob is updated with the given hyp using
+  // log-sum-exp.
   void Add(Hypothesis hyp);
 
   // Get the hyp that has the largest log_prob.
   // If length_norm is true, hyp's log_prob are divided by
-  // len(hyp.ys) before comparison.
+  // the number of tokens of hyp before comparison.
   Hypothesis GetMostProbable(bool length_norm) const;
 
   // Remove the given hyp from this object.
   // It is *NOT* an error if hyp does not exist in this object.
-  void Remove(const Hypothesis &hyp) { hyps_dict_.erase(hyp.Key()); }
+  void Remove(const Hypothesis &hyp);
 
   // Return a list of hyps contained in this object.
   std::vector<Hypothesis> Vec() const {
@@ -100,6 +182,38 @@ class Hypotheses {
 
   int32_t Size() const { return hyps_dict_.size(); }
 
+  /// Return the token sequence of the given hyp. Its cost is linear
+  /// in the number of tokens, so use it only for producing results.
+  std::vector<int32_t> GetTokens(const Hypothesis &hyp) const;
+
+  /// Return the timestamps of all tokens of the given hyp.
+  /// See TokenNode::timestamp.
+  std::vector<int32_t> GetTimestamps(const Hypothesis &hyp) const;
+
+  /** Return true if the two hyps contain the same token sequence.
+   *
+   * Both hyps must use the token store of this object. Its cost is linear
+   * in the number of tokens after the common prefix in the store.
+   */
+  bool SameTokens(const Hypothesis &a, const Hypothesis &b) const;
+
+  /** Copy the last n tokens of the given hyp to p.
+   *
+   * The hyp must contain at least n tokens.
+   */
+  void GetLastTokens(const Hypothesis &hyp, int32_t n, int64_t *p) const;
+
+  const TokenStorePtr &GetTokenStore() const { return store_; }
+
+  /** Drop tokens that are no longer reachable from any hyp in this object
+   * once the store has grown to twice its size after the last compaction.
+   *
+   * Tokens of pruned hyps are never removed from the store otherwise.
+   * Copies of this object made before compaction keep using the old
+   * store and remain valid.
+   */
+  void MaybeCompact();
+
   std::string ToString() const {
     std::ostringstream os;
     for (const auto &p : hyps_dict_) {
@@ -115,7 +229,18 @@ class Hypotheses {
   const auto end() const { return hyps_dict_.end(); }
 
  private:
-  using Map = std ::unordered_map<std::string, Hypothesis>;
+  void Compact();
+
+  // Return the hyp in hyps_dict_ with the same token sequence as the
+  // given hyp, or end() if there is none.
+  std::unordered_multimap<uint64_t, Hypothesis>::iterator Find(
+      const Hypothesis &hyp);
+
+ private:
+  // Keyed by the hash of the token sequence. Different token sequences
+  // with the same hash are kept as separate entries.
+  using Map = std::unordered_multimap<uint64_t, Hypothesis>;
+  TokenStorePtr store_;
   Map hyps_dict_;
 };
 
@@ -0,0 +1,109 @@
+// sherpa/csrc/length-bucket-queue.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/length-bucket-queue.h"
+
+#include <algorithm>
+#include <sstream>
+#include <string>
+#include <vector>
+
+#include "sherpa/csrc/log.h"
+#include "sherpa/csrc/macros.h"
+#include "sherpa/csrc/text-utils.h"
+
+namespace sherpa {
+
+void LengthBucketQueueConfig::Register(ParseOptions *po) {
+  po->Register("bucket-boundaries", &bucket_boundaries,
+               "Comma separated number of feature frames, e.g., "
+               "200,500,1000,2000. Utterances are put into buckets by "
+               "length and a batch contains only utterances from the same "
+               "bucket so that little computation is spent on padding.");
+
+  po->Register("max-frames-per-batch", &max_frames_per_batch,
+               "Max number of feature frames of a batch after padding, i.e., "
+               "(number of frames of the longest utterance) * (number of "
+               "utterances). An utterance longer than it is decoded in a "
+               "batch of its own.");
+
+  po->Register("max-wait-ms", &max_wait_ms,
+               "Max time in milliseconds that the oldest utterance of a "
+               "bucket waits for a full batch.");
+}
+
+bool LengthBucketQueueConfig::Validate() const {
+  std::vector<int32_t> boundaries;
+  if (!SplitStringToIntegers(bucket_boundaries, ",", true, &boundaries)) {
+    SHERPA_LOGE("Invalid --bucket-boundaries='%s'", bucket_boundaries.c_str());
+    return false;
+  }
+
+  if (!std::is_sorted(boundaries.begin(), boundaries.end())) {
+    SHERPA_LOGE("--bucket-boundaries='%s' is not sorted",
+                bucket_boundaries.c_str());
+    return false;
+  }
+
+  if (max_frames_per_batch < 1) {
+    SHERPA_LOGE("--max-frames-per-batch='%d' is less than 1",
+                max_frames_per_batch);
+    return false;
+  }
+
+  if (max_batch_size < 1) {
+    SHERPA_LOGE("max_batch_size '%d' is less than 1", max_batch_size);
+    return false;
+  }
+
+  return true;
+}
+
+std::string LengthBucketQueueConfig::ToString() const {
+  std::ostringstream os;
+
+  os << "LengthBucketQueueConfig(";
+  os << "bucket_boundaries=\"" << bucket_boundaries << "\", ";
+  os << "max_frames_per_batch=" << max_frames_per_batch << ", ";
+  os << "max_batch_size=" << max_batch_size << ", ";
+  os << "max_wait_ms=" << max_wait_ms << ")";
+
+  return os.str();
+}
+
+std::vector<int32_t> LengthBucketQueueConfig::GetBucketBoundaries() const {
+  std::vector<int32_t> ans;
+  bool ok = SplitStringToIntegers(bucket_boundaries, ",", true, &ans);
+  SHERPA_CHECK(ok) << "Invalid bucket boundaries: " << bucket_boundaries;
+  std::sort(ans.begin(), ans.end());
+  return ans;
+}
+
+void PaddingStats::Add(const std::vector<int32_t> &lengths) {
+  if (lengths.empty()) {
+    return;
+  }
+
+  int32_t max_len = *std::max_element(lengths.begin(), lengths.end());
+
+  for (auto n : lengths) {
+    num_frames += n;
+  }
+  num_padded_frames += static_cast<int64_t>(max_len) * lengths.size();
+  num_batches += 1;
+}
+
+std::string PaddingStats::ToString() const {
+  std::ostringstream os;
+
+  os << "PaddingStats(";
+  os << "num_batches=" << num_batches << ", ";
+  os << "num_frames=" << num_frames << ", ";
+  os << "num_padded_frames=" << num_padded_frames << ", ";
+  os << "efficiency=" << Efficiency() << ")";
+
+  return os.str();
+}
+
+}  // namespace sherpa
@@ -0,0 +1,242 @@
+// sherpa/csrc/length-bucket-queue.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_LENGTH_BUCKET_QUEUE_H_
+#define SHERPA_CSRC_LENGTH_BUCKET_QUEUE_H_
+
+#include <algorithm>
+#include <chrono>  // NOLINT
+#include <deque>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "sherpa/cpp_api/parse-options.h"
+
+namespace sherpa {
+
+struct LengthBucketQueueConfig {
+  // Comma separated number of frames. An item with num_frames in the range
+  // (boundaries[i-1], boundaries[i]] is put into the i-th bucket. Items
+  // longer than the last boundary are put into the last bucket.
+  std::string bucket_boundaries = "200,500,1000,2000";
+
+  // Max value of (number of frames of the longest item) * (number of items)
+  // of a batch.
+  int32_t max_frames_per_batch = 30000;
+
+  // Max number of items in a batch
+  int32_t max_batch_size = 100;
+
+  // Max time in milliseconds that the oldest item of a bucket waits for
+  // a full batch. A negative value means to wait until the bucket is full.
+  float max_wait_ms = 5;
+
+  void Register(ParseOptions *po);
+  bool Validate() const;
+
+  std::string ToString() const;
+
+  std::vector<int32_t> GetBucketBoundaries() const;
+};
+
+struct PaddingStats {
+  // Sum of the number of frames of all items
+  int64_t num_frames = 0;
+
+  // Sum of the number of frames of all items after padding
+  int64_t num_padded_frames = 0;
+
+  int64_t num_batches = 0;
+
+  // Update the statistics with a batch of items
+  void Add(const std::vector<int32_t> &lengths);
+
+  // Ratio of the non-padding frames to all frames
+  float Efficiency() const {
+    return num_padded_frames == 0
+               ? 1
+               : static_cast<float>(num_frames) / num_padded_frames;
+  }
+
+  std::string ToString() const;
+};
+
+/** A queue that puts items into buckets by length so that a batch contains
+ * items of similar lengths.
+ *
+ * A batch is taken from a bucket once no more items can be added to the
+ * batch, or once the oldest item of the bucket has waited max_wait_ms.
+ *
+ * It is not thread-safe.
+ */
+template <typename T>
+class LengthBucketQueue {
+ public:
+  using Clock = std::chrono::steady_clock;
+
+  explicit LengthBucketQueue(const LengthBucketQueueConfig &config)
+      : config_(config),
+        boundaries_(config.GetBucketBoundaries()),
+        buckets_(boundaries_.size() + 1) {}
+
+  void Push(T item, int32_t num_frames) {
+    int32_t i = std::lower_bound(boundaries_.begin(), boundaries_.end(),
+                                 num_frames) -
+                boundaries_.begin();
+    buckets_[i].push_back({std::move(item), num_frames, Clock::now()});
+    ++size_;
+  }
+
+  bool Empty() const { return size_ == 0; }
+
+  int32_t Size() const { return size_; }
+
+  /** Take a batch from the queue.
+   *
+   * @param force  If true, take a batch from the bucket with the oldest
+   *               item even if it is not ready.
+   * @param lengths  If not null, it contains the number of frames of the
+   *                 returned items on return.
+   * @return Return the items of a batch. It is empty if no bucket is ready.
+   */
+  std::vector<T> Pop(bool force = false,
+                     std::vector<int32_t> *lengths = nullptr) {
+    int32_t index = SelectBucket(force, nullptr);
+
+    std::vector<T> ans;
+    if (lengths) {
+      lengths->clear();
+    }
+
+    if (index == -1) {
+      return ans;
+    }
+
+    auto &bucket = buckets_[index];
+    int32_t n = BatchSize(bucket, nullptr);
+    ans.reserve(n);
+    for (int32_t i = 0; i != n; ++i) {
+      ans.push_back(std::move(bucket.front().item));
+      if (lengths) {
+        lengths->push_back(bucket.front().num_frames);
+      }
+      bucket.pop_front();
+    }
+    size_ -= n;
+
+    return ans;
+  }
+
+  /** Return the time in milliseconds until some bucket is ready.
+   * It is 0 if some bucket is ready and it is negative if the queue is
+   * empty or max_wait_ms is negative.
+   */
+  float TimeToNextDeadlineMs() const {
+    float ans = -1;
+    SelectBucket(false, &ans);
+    return ans;
+  }
+
+ private:
+  struct Item {
+    T item;
+    int32_t num_frames;
+    Clock::time_point enqueue_time;
+  };
+
+  // Number of items at the front of the bucket that fit into a batch.
+  // It is at least 1 for a non-empty bucket.
+  int32_t BatchSize(const std::deque<Item> &bucket, int32_t *max_len) const {
+    int32_t n = 0;
+    int32_t m = 0;
+    for (const auto &item : bucket) {
+      int32_t len = std::max(m, item.num_frames);
+      if (n > 0 && (n >= config_.max_batch_size ||
+                    static_cast<int64_t>(len) * (n + 1) >
+                        config_.max_frames_per_batch)) {
+        break;
+      }
+      m = len;
+      ++n;
+    }
+
+    if (max_len) {
+      *max_len = m;
+    }
+
+    return n;
+  }
+
+  /* Return the index of a bucket that is ready, or -1 if there is none.
+   *
+   * @param force  If true, return the bucket with the oldest item if no
+   *               bucket is ready.
+   * @param time_to_deadline_ms  If not null, it is set to the time to the
+   *                             earliest deadline of all buckets.
+   */
+  int32_t SelectBucket(bool force, float *time_to_deadline_ms) const {
+    auto now = Clock::now();
+    int32_t oldest = -1;
+
+    for (int32_t i = 0; i != static_cast<int32_t>(buckets_.size()); ++i) {
+      const auto &bucket = buckets_[i];
+      if (bucket.empty()) {
+        continue;
+      }
+
+      int32_t max_len;
+      int32_t n = BatchSize(bucket, &max_len);
+      if (i < static_cast<int32_t>(boundaries_.size())) {
+        // Items arriving later may be as long as the boundary
+        max_len = std::max(max_len, boundaries_[i]);
+      }
+
+      if (n < static_cast<int32_t>(bucket.size()) ||
+          n >= config_.max_batch_size ||
+          static_cast<int64_t>(max_len) * (n + 1) >
+              config_.max_frames_per_batch) {
+        // No more items can be added to the batch
+        if (time_to_deadline_ms) {
+          *time_to_deadline_ms = 0;
+        }
+        return i;
+      }
+
+      const auto &t = bucket.front().enqueue_time;
+      if (oldest == -1 || t < buckets_[oldest].front().enqueue_time) {
+        oldest = i;
+      }
+    }
+
+    if (oldest == -1) {
+      return -1;
+    }
+
+    if (config_.max_wait_ms >= 0) {
+      float waited = std::chrono::duration<float, std::milli>(
+                         now - buckets_[oldest].front().enqueue_time)
+                         .count();
+      float remaining = config_.max_wait_ms - waited;
+      if (time_to_deadline_ms) {
+        *time_to_deadline_ms = std::max(remaining, 0.0f);
+      }
+
+      if (remaining <= 0) {
+        return oldest;
+      }
+    }
+
+    return force ? oldest : -1;
+  }
+
+ private:
+  LengthBucketQueueConfig config_;
+  std::vector<int32_t> boundaries_;
+  std::vector<std::deque<Item>> buckets_;
+  int32_t size_ = 0;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_LENGTH_BUCKET_QUEUE_H_
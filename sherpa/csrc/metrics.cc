@@ -0,0 +1,133 @@
+// sherpa/csrc/metrics.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/metrics.h"
+
+#include <algorithm>
+#include <fstream>
+#include <iomanip>
+#include <limits>
+#include <sstream>
+#include <string>
+#include <utility>
+#include <vector>
+
+#if defined(__linux__)
+#include <unistd.h>
+#endif
+
+#include "sherpa/csrc/log.h"
+
+namespace sherpa {
+
+static std::string FormatValue(double v) {
+  if (v == std::numeric_limits<double>::infinity()) {
+    return "+Inf";
+  }
+
+  std::ostringstream os;
+  os << std::setprecision(10) << v;
+  return os.str();
+}
+
+std::vector<double> LatencyBuckets() {
+  return {0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+          0.25,  0.5,    1,     2.5,  5,     10};
+}
+
+Histogram::Histogram(const std::string &name, const std::string &help,
+                     const std::vector<double> &buckets)
+    : name_(name),
+      help_(help),
+      buckets_(buckets),
+      counts_(buckets.size() + 1, 0) {
+  SHERPA_CHECK(std::is_sorted(buckets_.begin(), buckets_.end())) << name;
+}
+
+void Histogram::Observe(double value) {
+  int32_t i = std::lower_bound(buckets_.begin(), buckets_.end(), value) -
+              buckets_.begin();
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  counts_[i] += 1;
+  sum_ += value;
+}
+
+int64_t Histogram::Count() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  int64_t ans = 0;
+  for (auto c : counts_) {
+    ans += c;
+  }
+  return ans;
+}
+
+std::string Histogram::ToPrometheus() const {
+  std::vector<int64_t> counts;
+  double sum;
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    counts = counts_;
+    sum = sum_;
+  }
+
+  std::ostringstream os;
+  os << "# HELP " << name_ << " " << help_ << "\n";
+  os << "# TYPE " << name_ << " histogram\n";
+
+  int64_t n = 0;
+  for (int32_t i = 0; i != static_cast<int32_t>(counts.size()); ++i) {
+    n += counts[i];
+    double b = i < static_cast<int32_t>(buckets_.size())
+                   ? buckets_[i]
+                   : std::numeric_limits<double>::infinity();
+    os << name_ << "_bucket{le=\"" << FormatValue(b) << "\"} " << n << "\n";
+  }
+  os << name_ << "_sum " << FormatValue(sum) << "\n";
+  os << name_ << "_count " << n << "\n";
+
+  return os.str();
+}
+
+Histogram *Metrics::AddHistogram(const std::string &name,
+                                 const std::string &help,
+                                 const std::vector<double> &buckets) {
+  histograms_.push_back(std::make_unique<Histogram>(name, help, buckets));
+  Histogram *h = histograms_.back().get();
+  renderers_.push_back([h]() { return h->ToPrometheus(); });
+  return h;
+}
+
+void Metrics::AddGauge(const std::string &name, const std::string &help,
+                       std::function<double()> fn) {
+  renderers_.push_back([name, help, fn = std::move(fn)]() {
+    std::ostringstream os;
+    os << "# HELP " << name << " " << help << "\n";
+    os << "# TYPE " << name << " gauge\n";
+    os << name << " " << FormatValue(fn()) << "\n";
+    return os.str();
+  });
+}
+
+std::string Metrics::ToPrometheus() const {
+  std::string ans;
+  for (const auto &f : renderers_) {
+    ans += f();
+  }
+  return ans;
+}
+
+double GetResidentMemoryBytes() {
+#if defined(__linux__)
+  std::ifstream is("/proc/self/statm");
+  int64_t size = 0;
+  int64_t resident = 0;
+  if (is >> size >> resident) {
+    return static_cast<double>(resident) * sysconf(_SC_PAGESIZE);
+  }
+#endif
+  return 0;
+}
+
+}  // namespace sherpa
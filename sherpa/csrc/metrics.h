@@ -0,0 +1,96 @@
+// sherpa/csrc/metrics.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_METRICS_H_
+#define SHERPA_CSRC_METRICS_H_
+
+#include <cstdint>
+#include <functional>
+#include <memory>
+#include <mutex>  // NOLINT
+#include <string>
+#include <vector>
+
+namespace sherpa {
+
+// Content type of the Prometheus text format
+constexpr const char *kPrometheusContentType =
+    "text/plain; version=0.0.4; charset=utf-8";
+
+// Buckets in seconds for latencies
+std::vector<double> LatencyBuckets();
+
+/** A Prometheus histogram.
+ *
+ * Observe() costs a binary search and a few additions, so it can be called
+ * for every chunk. It is thread-safe.
+ */
+class Histogram {
+ public:
+  /**
+   * @param name  Name of the metric, e.g., sherpa_queue_wait_seconds.
+   * @param help  Description of the metric.
+   * @param buckets  Sorted upper bounds of the buckets. The +Inf bucket
+   *                 is added automatically.
+   */
+  Histogram(const std::string &name, const std::string &help,
+            const std::vector<double> &buckets);
+
+  void Observe(double value);
+
+  // Number of observations
+  int64_t Count() const;
+
+  std::string ToPrometheus() const;
+
+ private:
+  std::string name_;
+  std::string help_;
+  std::vector<double> buckets_;
+
+  mutable std::mutex mutex_;
+
+  // counts_[i] is the number of observations in (buckets_[i-1], buckets_[i]].
+  // The last one is for +Inf.
+  std::vector<int64_t> counts_;
+  double sum_ = 0;
+};
+
+/** A collection of metrics that can be rendered in the Prometheus text
+ * format. See https://prometheus.io/docs/instrumenting/exposition_formats/
+ *
+ * Metrics are added before the server starts. After that, it is
+ * thread-safe.
+ */
+class Metrics {
+ public:
+  /** Add a histogram.
+   *
+   * @return Return a pointer to it. It is owned by this object.
+   */
+  Histogram *AddHistogram(const std::string &name, const std::string &help,
+                          const std::vector<double> &buckets);
+
+  /** Add a gauge. Its value is computed by the given function when
+   * the metrics are rendered, so it costs nothing in between.
+   */
+  void AddGauge(const std::string &name, const std::string &help,
+                std::function<double()> fn);
+
+  std::string ToPrometheus() const;
+
+ private:
+  std::vector<std::unique_ptr<Histogram>> histograms_;
+
+  // In the order the metrics are added
+  std::vector<std::function<std::string()>> renderers_;
+};
+
+/** Return the resident set size of the current process in bytes.
+ * It returns 0 if it is not supported on the current platform.
+ */
+double GetResidentMemoryBytes();
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_METRICS_H_
@@ -5,6 +5,7 @@
 #include "sherpa/csrc/offline-conformer-transducer-model.h"
 
 #include <string>
+#include <tuple>
 #include <utility>
 
 #include "sherpa/cpp_api/macros.h"
@@ -33,6 +34,11 @@ OfflineConformerTransducerModel::OfflineConformerTransducerModel(
   decoder_proj_ = joiner_.attr("decoder_proj").toModule();
 
   context_size_ = decoder_.attr("context_size").toInt();
+
+  if (model_.hasattr("ctc_output")) {
+    ctc_output_ = model_.attr("ctc_output").toModule();
+    has_ctc_output_ = true;
+  }
 }
 
 std::pair<torch::Tensor, torch::Tensor>
@@ -52,6 +58,25 @@ OfflineConformerTransducerModel::RunEncoder(
   return {projected_encoder_out, encoder_out_length};
 }
 
+std::tuple<torch::Tensor, torch::Tensor, torch::Tensor>
+OfflineConformerTransducerModel::RunEncoderWithCtcOutput(
+    const torch::Tensor &features, const torch::Tensor &features_length) {
+  InferenceMode no_grad;
+
+  auto outputs =
+      encoder_.run_method("forward", features, features_length).toTuple();
+
+  auto encoder_out = outputs->elements()[0];
+  auto encoder_out_length = outputs->elements()[1].toTensor();
+
+  auto ctc_output = ctc_output_.run_method("forward", encoder_out).toTensor();
+
+  auto projected_encoder_out =
+      encoder_proj_.run_method("forward", encoder_out).toTensor();
+
+  return {projected_encoder_out, encoder_out_length, ctc_output};
+}
+
 torch::Tensor OfflineConformerTransducerModel::RunDecoder(
     const torch::Tensor &decoder_input) {
   InferenceMode no_grad;
@@ -5,6 +5,7 @@
 #define SHERPA_CSRC_OFFLINE_CONFORMER_TRANSDUCER_MODEL_H_
 
 #include <string>
+#include <tuple>
 #include <utility>
 
 #include "sherpa/csrc/offline-transducer-model.h"
@@ -67,6 +68,20 @@ class OfflineConformerTransducerModel : public OfflineTransducerModel {
   torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
                           const torch::Tensor &decoder_out) override;
 
+  // It is true if the model is trained jointly with CTC and the
+  // module `ctc_output` is exported, e.g., icefall's zipformer recipe
+  // with --use-ctc 1.
+  bool HasCtcOutput() const override { return has_ctc_output_; }
+
+  /**
+   * The CTC head `ctc_output` is applied to the output of the encoder before
+   * the projection. It contains a log-softmax, see
+   * https://github.com/k2-fsa/icefall/blob/master/egs/librispeech/ASR/zipformer/model.py
+   */
+  std::tuple<torch::Tensor, torch::Tensor, torch::Tensor>
+  RunEncoderWithCtcOutput(const torch::Tensor &features,
+                          const torch::Tensor &features_length) override;
+
   torch::Device Device() const override { return device_; }
 
   /* See
@@ -85,6 +100,10 @@ class OfflineConformerTransducerModel : public OfflineTransducerModel {
   torch::jit::Module encoder_proj_;
   torch::jit::Module decoder_proj_;
 
+  // Valid only if has_ctc_output_ is true
+  torch::jit::Module ctc_output_;
+  bool has_ctc_output_ = false;
+
   torch::Device device_{"cpu"};
   int32_t context_size_;
 };
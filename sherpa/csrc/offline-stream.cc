@@ -112,7 +112,8 @@ class OfflineStream::OfflineStreamImpl {
         torch::from_blob(const_cast<float *>(samples), {n}, torch::kFloat);
 
     if (!feat_config_.normalize_samples) {
-      tensor.mul_(32767);
+      // Don't use mul_() since samples are not owned by us
+      tensor = tensor.mul(32767);
     }
 
     if (feat_config_.return_waveform) {
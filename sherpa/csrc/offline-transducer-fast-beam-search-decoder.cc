@@ -52,7 +52,7 @@ OfflineTransducerFastBeamSearchDecoder::Decode(torch::Tensor encoder_out,
     contexts = contexts.to(torch::kLong);
     // contexts.shape: (num_hyps, context_size)
 
-    auto decoder_out = model_->RunDecoder(contexts).unsqueeze(1);
+    auto decoder_out = model_->RunDecoderWithCache(contexts).unsqueeze(1);
     // decoder_out.shape: (num_hyps, 1, 1, joiner_dim)
 
     auto cur_encoder_out = encoder_out.index({torch::indexing::Slice(), t});
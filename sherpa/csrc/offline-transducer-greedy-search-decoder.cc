@@ -5,10 +5,12 @@
 #include "sherpa/csrc/offline-transducer-greedy-search-decoder.h"
 
 #include <algorithm>
+#include <numeric>
 #include <utility>
 #include <vector>
 
 #include "sherpa/cpp_api/macros.h"
+#include "sherpa/csrc/speculative-joiner.h"
 #include "torch/all.h"
 
 namespace sherpa {
@@ -54,8 +56,6 @@ OfflineTransducerGreedySearchDecoder::Decode(torch::Tensor encoder_out,
 
   TORCH_CHECK(encoder_out_length.device().is_cpu());
 
-  torch::Device device = model_->Device();
-
   torch::nn::utils::rnn::PackedSequence packed_seq =
       torch::nn::utils::rnn::pack_padded_sequence(encoder_out,
                                                   encoder_out_length,
@@ -86,64 +86,184 @@ OfflineTransducerGreedySearchDecoder::Decode(torch::Tensor encoder_out,
   decoder_input.index({torch::indexing::Slice(), -1}) = blank_id;
 
   // its shape is (N, 1, joiner_dim)
-  auto decoder_out = model_->RunDecoder(decoder_input.to(device));
+  auto decoder_out = model_->RunDecoderWithCache(decoder_input);
 
   using torch::indexing::Slice;
-  auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
+  if (speculative_joiner_) {
+    DecodeSpeculative(packed_seq, decoder_out, decoder_input, &results);
+  } else {
+    auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
+
+    int32_t max_T = packed_seq.batch_sizes().numel();
+
+    int32_t offset = 0;
+    for (int32_t t = 0; t != max_T; ++t) {
+      int32_t cur_batch_size = batch_sizes_accessor[t];
+      int32_t start = offset;
+      int32_t end = start + cur_batch_size;
+      auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
+      offset = end;
+
+      DecodeFrame(cur_encoder_out, t, &decoder_out, &decoder_input, &results);
+    }  // for (int32_t t = 0; t != max_T; ++t) {
+  }
+
+  auto unsorted_indices = packed_seq.unsorted_indices().cpu();
+  auto unsorted_indices_accessor = unsorted_indices.accessor<int64_t, 1>();
+
+  std::vector<OfflineTransducerDecoderResult> ans(N);
+
+  for (int32_t i = 0; i != N; ++i) {
+    int32_t k = unsorted_indices_accessor[i];
+    torch::ArrayRef<int32_t> arr(results[k].tokens);
+    ans[i].tokens = arr.slice(context_size).vec();
+    ans[i].timestamps = std::move(results[k].timestamps);
+  }
+
+  return ans;
+}
+
+void OfflineTransducerGreedySearchDecoder::DecodeFrame(
+    torch::Tensor cur_encoder_out, int32_t t, torch::Tensor *decoder_out,
+    torch::Tensor *decoder_input,
+    std::vector<OfflineTransducerDecoderResult> *results) {
+  using torch::indexing::Slice;
+
+  int32_t blank_id = 0;  // hard-code
+  int32_t cur_batch_size = cur_encoder_out.size(0);
+
+  cur_encoder_out = cur_encoder_out.unsqueeze(1).unsqueeze(1);
+  // Now cur_encoder_out is of shape (cur_batch_size, 1, 1, joiner_dim)
+  if (cur_batch_size < decoder_out->size(0)) {
+    *decoder_out = decoder_out->index({Slice(0, cur_batch_size)});
+  }
+
+  auto logits = model_->RunJoiner(cur_encoder_out, decoder_out->unsqueeze(1));
+  // logits' shape is (cur_batch_size, 1, 1, vocab_size)
+  // logits is the output of nn.Linear. Since we are using greedy search
+  // and only the magnitude matters, we don't invoke log_softmax here
+
+  logits = logits.squeeze(1).squeeze(1);
+  auto max_indices = logits.argmax(/*dim*/ -1).cpu();
+  auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
+  bool emitted = false;
+  for (int32_t k = 0; k != cur_batch_size; ++k) {
+    auto index = max_indices_accessor[k];
+    if (index != blank_id) {
+      emitted = true;
+      (*results)[k].tokens.push_back(index);
+      (*results)[k].timestamps.push_back(t);
+    }
+  }
+
+  if (emitted) {
+    BuildDecoderInput(*results, decoder_input);
+    *decoder_out = model_->RunDecoderWithCache(*decoder_input);
+  }
+}
 
+void OfflineTransducerGreedySearchDecoder::DecodeSpeculative(
+    const torch::nn::utils::rnn::PackedSequence &packed_seq,
+    torch::Tensor decoder_out, torch::Tensor decoder_input,
+    std::vector<OfflineTransducerDecoderResult> *results) {
+  using torch::indexing::Slice;
+
+  torch::Device device = model_->Device();
+  int32_t blank_id = 0;  // hard-code
+
+  auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
   int32_t max_T = packed_seq.batch_sizes().numel();
 
-  int32_t offset = 0;
+  // Rows [offsets[t], offsets[t+1]) of packed_seq.data() are for frame t.
+  // Row offsets[t] + k is for the k-th stream in sorted order.
+  std::vector<int32_t> offsets(max_T + 1, 0);
   for (int32_t t = 0; t != max_T; ++t) {
-    int32_t cur_batch_size = batch_sizes_accessor[t];
-    int32_t start = offset;
-    int32_t end = start + cur_batch_size;
-    auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
-    offset = end;
+    offsets[t + 1] = offsets[t] + batch_sizes_accessor[t];
+  }
 
-    cur_encoder_out = cur_encoder_out.unsqueeze(1).unsqueeze(1);
-    // Now cur_encoder_out is of shape (cur_batch_size, 1, 1, joiner_dim)
-    if (cur_batch_size < decoder_out.size(0)) {
-      decoder_out = decoder_out.index({Slice(0, cur_batch_size)});
+  auto is_token = [blank_id](int64_t i) { return i != blank_id; };
+  auto is_unclear = [](bool clear) { return !clear; };
+
+  int32_t t = 0;
+  while (t < max_T) {
+    // Evaluate the joiner for frames [t, end_t) with the current
+    // decoder_out, i.e., assume that no stream emits a token in these
+    // frames. The number of frames is limited since an utterance can be
+    // long and each emission wastes the evaluation of the remaining frames.
+    int32_t end_t = std::min(t + kMaxSpeculativeFrames, max_T);
+    int32_t start = offsets[t];
+    int32_t end = offsets[end_t];
+
+    std::vector<int64_t> stream_index(end - start);
+    for (int32_t u = t; u != end_t; ++u) {
+      auto begin = stream_index.begin() + (offsets[u] - start);
+      std::iota(begin, begin + batch_sizes_accessor[u], 0);
     }
 
-    auto logits = model_->RunJoiner(cur_encoder_out, decoder_out.unsqueeze(1));
-    // logits' shape is (cur_batch_size, 1, 1, vocab_size)
-    // logits is the output of nn.Linear. Since we are using greedy search
-    // and only the magnitude matters, we don't invoke log_softmax here
+    auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
+    cur_encoder_out = cur_encoder_out.unsqueeze(1).unsqueeze(1);
+    // Now cur_encoder_out is of shape (end - start, 1, 1, joiner_dim)
 
+    auto cur_decoder_out = decoder_out.index_select(
+        0, torch::tensor(stream_index, torch::kLong).to(device));
+    // cur_decoder_out is of shape (end - start, 1, joiner_dim)
+
+    auto logits =
+        model_->RunJoiner(cur_encoder_out, cur_decoder_out.unsqueeze(1));
     logits = logits.squeeze(1).squeeze(1);
+    // logits is of shape (end - start, vocab_size)
+
     auto max_indices = logits.argmax(/*dim*/ -1).cpu();
-    auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
-    bool emitted = false;
-    for (int32_t k = 0; k != cur_batch_size; ++k) {
-      auto index = max_indices_accessor[k];
-      if (index != blank_id) {
-        emitted = true;
-        results[k].tokens.push_back(index);
-        results[k].timestamps.push_back(t);
+    const int64_t *p = max_indices.data_ptr<int64_t>();
+
+    auto is_clear = IsArgmaxClear(logits);
+    const bool *c = is_clear.data_ptr<bool>();
+
+    // Find the first frame at which any stream emits a token or has a
+    // near-tie. All frames before it are blank for all streams, and the
+    // margins of blank are larger than the rounding errors of the joiner,
+    // so their results are the same as if they were evaluated one by one.
+    int32_t u = t;
+    for (; u != end_t; ++u) {
+      const int64_t *q = p + (offsets[u] - start);
+      const bool *d = c + (offsets[u] - start);
+      if (std::any_of(q, q + batch_sizes_accessor[u], is_token) ||
+          std::any_of(d, d + batch_sizes_accessor[u], is_unclear)) {
+        break;
       }
     }
 
-    if (emitted) {
-      BuildDecoderInput(results, &decoder_input);
-      decoder_out = model_->RunDecoder(decoder_input.to(device));
+    if (u == end_t) {
+      t = end_t;
+      continue;
     }
-  }  // for (int32_t t = 0; t != max_T; ++t) {
 
-  auto unsorted_indices = packed_seq.unsorted_indices().cpu();
-  auto unsorted_indices_accessor = unsorted_indices.accessor<int64_t, 1>();
+    const bool *d = c + (offsets[u] - start);
+    if (std::any_of(d, d + batch_sizes_accessor[u], is_unclear)) {
+      // Evaluate frame u with the same joiner call as the frame-by-frame
+      // search, so that its near-ties are broken in the same way
+      auto frame_encoder_out =
+          packed_seq.data().index({Slice(offsets[u], offsets[u + 1])});
+      DecodeFrame(frame_encoder_out, u, &decoder_out, &decoder_input,
+                  results);
+      t = u + 1;
+      continue;
+    }
 
-  std::vector<OfflineTransducerDecoderResult> ans(N);
+    // decoder_out is still valid for frame u, so its result is final
+    const int64_t *q = p + (offsets[u] - start);
+    for (int32_t k = 0; k != batch_sizes_accessor[u]; ++k) {
+      if (q[k] != blank_id) {
+        (*results)[k].tokens.push_back(q[k]);
+        (*results)[k].timestamps.push_back(u);
+      }
+    }
 
-  for (int32_t i = 0; i != N; ++i) {
-    int32_t k = unsorted_indices_accessor[i];
-    torch::ArrayRef<int32_t> arr(results[k].tokens);
-    ans[i].tokens = arr.slice(context_size).vec();
-    ans[i].timestamps = std::move(results[k].timestamps);
-  }
+    BuildDecoderInput(*results, &decoder_input);
+    decoder_out = model_->RunDecoderWithCache(decoder_input);
 
-  return ans;
+    t = u + 1;
+  }
 }
 
 }  // namespace sherpa
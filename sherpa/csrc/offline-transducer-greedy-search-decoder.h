@@ -14,8 +14,25 @@ namespace sherpa {
 
 class OfflineTransducerGreedySearchDecoder : public OfflineTransducerDecoder {
  public:
-  explicit OfflineTransducerGreedySearchDecoder(OfflineTransducerModel *model)
-      : model_(model) {}
+  /**
+   * @param model  Not owned.
+   * @param speculative_joiner  If true, the joiner is evaluated for up to
+   *                            kMaxSpeculativeFrames frames in one call,
+   *                            assuming no utterance emits a token. It is
+   *                            re-evaluated only from the first frame at
+   *                            which an utterance emits or the argmax of an
+   *                            utterance is a near-tie. Near-ties are
+   *                            re-evaluated frame by frame, so the decoding
+   *                            result is the same as evaluating every frame
+   *                            one by one.
+   */
+  explicit OfflineTransducerGreedySearchDecoder(OfflineTransducerModel *model,
+                                                bool speculative_joiner = false)
+      : model_(model), speculative_joiner_(speculative_joiner) {}
+
+  // Max number of frames evaluated in one call of the joiner with
+  // speculative_joiner
+  static constexpr int32_t kMaxSpeculativeFrames = 32;
 
   /** Run greedy search given the output from the encoder model.
    *
@@ -31,8 +48,30 @@ class OfflineTransducerGreedySearchDecoder : public OfflineTransducerDecoder {
       torch::Tensor encoder_out, torch::Tensor encoder_out_length,
       OfflineStream **ss = nullptr, int32_t n = 0) override;
 
+ private:
+  /** Run one step of frame-by-frame greedy search.
+   *
+   * @param cur_encoder_out  Frame t of the packed encoder_out. Its shape is
+   *                         (cur_batch_size, joiner_dim).
+   * @param t  Index of the frame.
+   * @param decoder_out  The decoder output for the current results. Its
+   *                     first cur_batch_size rows are used. It is updated
+   *                     if an utterance emits a token.
+   * @param decoder_input  Used to run the decoder.
+   * @param results  The results are updated in-place.
+   */
+  void DecodeFrame(torch::Tensor cur_encoder_out, int32_t t,
+                   torch::Tensor *decoder_out, torch::Tensor *decoder_input,
+                   std::vector<OfflineTransducerDecoderResult> *results);
+
+  void DecodeSpeculative(
+      const torch::nn::utils::rnn::PackedSequence &packed_seq,
+      torch::Tensor decoder_out, torch::Tensor decoder_input,
+      std::vector<OfflineTransducerDecoderResult> *results);
+
  private:
   OfflineTransducerModel *model_;  // Not owned
+  bool speculative_joiner_;
 };
 
 }  // namespace sherpa
@@ -4,8 +4,10 @@
 #ifndef SHERPA_CSRC_OFFLINE_TRANSDUCER_MODEL_H_
 #define SHERPA_CSRC_OFFLINE_TRANSDUCER_MODEL_H_
 
+#include <tuple>
 #include <utility>
 
+#include "sherpa/csrc/decoder-cache.h"
 #include "torch/script.h"
 
 namespace sherpa {
@@ -28,6 +30,30 @@ class OfflineTransducerModel {
   virtual std::pair<torch::Tensor, torch::Tensor> RunEncoder(
       const torch::Tensor &features, const torch::Tensor &features_length) = 0;
 
+  /** Return true if the model has a CTC head on top of the encoder.
+   * Only such models support RunEncoderWithCtcOutput().
+   */
+  virtual bool HasCtcOutput() const { return false; }
+
+  /** Run the encoder network and the CTC head.
+   *
+   * @param features  A 3-D tensor of shape (N, T, C)
+   * @param features_length  A 1-D tensor of shape (N,) containing number of
+   *                         valid frames in `features` before padding.
+   *
+   * @return Return a tuple containing:
+   *  - encoder_out: The same as the one from RunEncoder()
+   *  - encoder_out_length: The same as the one from RunEncoder()
+   *  - ctc_output: A 3-D tensor of shape (N, T', vocab_size) containing
+   *                the log-probabilities from the CTC head.
+   */
+  virtual std::tuple<torch::Tensor, torch::Tensor, torch::Tensor>
+  RunEncoderWithCtcOutput(const torch::Tensor & /*features*/,
+                          const torch::Tensor & /*features_length*/) {
+    TORCH_CHECK(false, "The model does not have a CTC head");
+    return {};
+  }
+
   /** Run the decoder network.
    *
    * Caution: We assume there are no recurrent connections in the decoder and
@@ -68,6 +94,32 @@ class OfflineTransducerModel {
 
   int32_t VocabSize() const { return vocab_size_; }
 
+  /** Set the cache used by RunDecoderWithCache(). Pass nullptr to
+   * disable it.
+   */
+  void SetDecoderCache(DecoderCachePtr cache) {
+    decoder_cache_ = std::move(cache);
+  }
+
+  DecoderCache *GetDecoderCache() const { return decoder_cache_.get(); }
+
+  /** Same as RunDecoder() except that the outputs of contexts in the
+   * decoder cache are reused and the decoder is run only for the others.
+   *
+   * @param decoder_input A tensor of shape (N, context_size). It can be
+   *                      on CPU.
+   * @return Return a tensor of shape (N, 1, decoder_dim) on Device().
+   */
+  torch::Tensor RunDecoderWithCache(const torch::Tensor &decoder_input) {
+    if (!decoder_cache_) {
+      return RunDecoder(decoder_input.to(Device()));
+    }
+
+    return decoder_cache_->Run(decoder_input, [this](const torch::Tensor &x) {
+      return RunDecoder(x.to(Device()));
+    });
+  }
+
   void WarmUp(torch::Tensor features, torch::Tensor features_length) {
     torch::Tensor encoder_out;
     torch::Tensor encoder_out_length;
@@ -99,6 +151,8 @@ class OfflineTransducerModel {
 
  private:
   int32_t vocab_size_ = -1;
+
+  DecoderCachePtr decoder_cache_;
 };
 
 }  // namespace sherpa
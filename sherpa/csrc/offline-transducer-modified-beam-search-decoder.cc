@@ -5,6 +5,7 @@
 #include "sherpa/csrc/offline-transducer-modified-beam-search-decoder.h"
 
 #include <algorithm>
+#include <limits>
 #include <deque>
 #include <utility>
 
@@ -23,24 +24,80 @@ static torch::Tensor FloorDivide(torch::Tensor a, int32_t b) {
 #endif
 }
 
-static torch::Tensor BuildDecoderInput(const std::vector<Hypothesis> &hyps,
-                                       int32_t context_size) {
-  int32_t num_hyps = hyps.size();
+/** Run the decoder for the last `context_size` tokens of each hyp.
+ *
+ * Hyps that were extended with a blank on the previous frame have the
+ * same tokens as before. Their decoder output is copied from the row
+ * Hypothesis::decoder_out_index of `prev_decoder_out` and the decoder
+ * is run only for the remaining hyps.
+ *
+ * @param model The transducer model.
+ * @param hyps hyps.size() == batch_size. Each entry contains the active
+ *             hypotheses of an utterance.
+ * @param num_hyps Total number of hyps in `hyps`.
+ * @param context_size Context size of the decoder model.
+ * @param prev_decoder_out The decoder output of the previous frame. If it
+ *                         is undefined, the decoder is run for all hyps.
+ *
+ * @return Return a tensor of shape (num_hyps, 1, joiner_dim). Hyps are
+ *         ordered in the same way as iterating over `hyps`.
+ */
+static torch::Tensor RunDecoder(OfflineTransducerModel *model,
+                                const std::vector<Hypotheses> &hyps,
+                                int32_t num_hyps, int32_t context_size,
+                                torch::Tensor prev_decoder_out) {
+  auto device = model->Device();
+
   torch::Tensor decoder_input =
       torch::empty({num_hyps, context_size},
                    torch::dtype(torch::kLong)
                        .memory_format(torch::MemoryFormat::Contiguous));
 
+  // Rows of the returned tensor of hyps that run the decoder
+  std::vector<int64_t> new_rows;
+
+  // Rows of the returned tensor of hyps that reuse prev_decoder_out
+  std::vector<int64_t> reused_rows;
+
+  // Rows of prev_decoder_out for reused_rows
+  std::vector<int64_t> src_rows;
+
   int64_t *p = decoder_input.data_ptr<int64_t>();
-  for (const auto &h : hyps) {
-    auto start = h.ys.end() - context_size;
-    auto end = h.ys.end();
+  int64_t i = 0;
+  for (const auto &hs : hyps) {
+    for (const auto &h : hs) {
+      if (prev_decoder_out.defined() && h.second.decoder_out_index >= 0) {
+        reused_rows.push_back(i);
+        src_rows.push_back(h.second.decoder_out_index);
+      } else {
+        hs.GetLastTokens(h.second, context_size, p);
+        p += context_size;
+        new_rows.push_back(i);
+      }
+      ++i;
+    }
+  }
 
-    std::copy(start, end, p);
-    p += context_size;
+  if (reused_rows.empty()) {
+    return model->RunDecoderWithCache(decoder_input);
   }
 
-  return decoder_input;
+  auto sizes = prev_decoder_out.sizes().vec();
+  sizes[0] = num_hyps;
+  torch::Tensor decoder_out = torch::empty(sizes, prev_decoder_out.options());
+
+  decoder_out.index_copy_(
+      /*dim*/ 0, torch::tensor(reused_rows).to(device),
+      prev_decoder_out.index_select(/*dim*/ 0,
+                                    torch::tensor(src_rows).to(device)));
+
+  if (!new_rows.empty()) {
+    decoder_input = decoder_input.narrow(0, 0, new_rows.size());
+    decoder_out.index_copy_(/*dim*/ 0, torch::tensor(new_rows).to(device),
+                            model->RunDecoderWithCache(decoder_input));
+  }
+
+  return decoder_out;
 }
 
 /** Return a ragged shape with axes [utt][num_hyps].
@@ -65,6 +122,81 @@ static k2::RaggedShapePtr GetHypsShape(const std::vector<Hypotheses> &hyps) {
   return k2::RaggedShape2(row_splits, torch::Tensor(), row_splits_acc[num_utt]);
 }
 
+/** Select the top-k (hyp, token) pairs of each utterance.
+ *
+ * Instead of running topk for each utterance, log_probs is scattered into
+ * a dense tensor of shape (N, max_num_hyps * vocab_size), padded with
+ * -inf, so that a single topk selects the candidates of all utterances.
+ * Entries of log_probs that are -inf are clamped to the lowest finite
+ * value, so that they are always selected before the padding.
+ *
+ * @param log_probs A 2-D tensor of shape (num_hyps, vocab_size).
+ * @param hyps_shape A ragged shape with axes [utt][num_hyps].
+ * @param k  Number of candidates to select for each utterance.
+ * @param values  On return, it contains a 2-D CPU tensor of shape (N, k)
+ *                containing the top-k log_probs of each utterance in
+ *                descending order. Padded entries are -inf.
+ * @param hyp_indexes On return, it contains a 2-D CPU tensor of shape (N, k).
+ *                    It is the index of the hyp within the utterance.
+ * @param token_indexes On return, it contains a 2-D CPU tensor of shape
+ *                      (N, k).
+ * @param num_candidates On return, num_candidates[i] is the number of
+ *                       selected entries of the i-th utterance. Entries
+ *                       after it in each row are padding.
+ */
+static void BatchedTopk(torch::Tensor log_probs, k2::RaggedShapePtr hyps_shape,
+                        int32_t k, torch::Tensor *values,
+                        torch::Tensor *hyp_indexes,
+                        torch::Tensor *token_indexes,
+                        std::vector<int32_t> *num_candidates) {
+  int32_t num_hyps = log_probs.size(0);
+  int32_t vocab_size = log_probs.size(1);
+
+  auto row_splits = k2::RowSplits(hyps_shape, 1);
+  auto row_splits_acc = row_splits.accessor<int32_t, 1>();
+  int32_t num_utt = row_splits.numel() - 1;
+
+  int32_t max_num_hyps = 0;
+  for (int32_t i = 0; i != num_utt; ++i) {
+    max_num_hyps =
+        std::max(max_num_hyps, row_splits_acc[i + 1] - row_splits_acc[i]);
+  }
+
+  // dest[i] is the row of the i-th hyp in the padded tensor
+  torch::Tensor dest = torch::empty({num_hyps}, torch::kLong);
+  int64_t *p = dest.data_ptr<int64_t>();
+  for (int32_t i = 0; i != num_utt; ++i) {
+    for (int32_t j = row_splits_acc[i]; j != row_splits_acc[i + 1]; ++j) {
+      *p++ = i * max_num_hyps + (j - row_splits_acc[i]);
+    }
+  }
+
+  torch::Tensor padded =
+      torch::full({num_utt * max_num_hyps, vocab_size},
+                  -std::numeric_limits<float>::infinity(), log_probs.options());
+  padded.index_copy_(/*dim*/ 0, dest.to(log_probs.device()),
+                     log_probs.clamp_min(std::numeric_limits<float>::lowest()));
+
+  k = std::min(k, max_num_hyps * vocab_size);
+
+  num_candidates->resize(num_utt);
+  for (int32_t i = 0; i != num_utt; ++i) {
+    (*num_candidates)[i] =
+        std::min(k, (row_splits_acc[i + 1] - row_splits_acc[i]) * vocab_size);
+  }
+
+  torch::Tensor indexes;
+  std::tie(*values, indexes) =
+      padded.reshape({num_utt, -1})
+          .topk(k, /*dim*/ 1, /*largest*/ true, /*sorted*/ true);
+
+  *values = values->cpu();
+  indexes = indexes.cpu();
+
+  *hyp_indexes = FloorDivide(indexes, vocab_size);
+  *token_indexes = torch::remainder(indexes, vocab_size);
+}
+
 std::vector<OfflineTransducerDecoderResult>
 OfflineTransducerModifiedBeamSearchDecoder::Decode(
     torch::Tensor encoder_out, torch::Tensor encoder_out_length,
@@ -103,12 +235,16 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
   std::vector<int32_t> blanks(context_size, -1);
   blanks.back() = blank_id;
 
-  Hypotheses blank_hyp({{blanks, 0}});
-
   std::deque<Hypotheses> finalized;
   std::vector<Hypotheses> cur;
   std::vector<Hypothesis> prev;
 
+  // Decoder output of the hyps in `prev`
+  torch::Tensor decoder_out;
+
+  // stores[k] is shared by all hyps of the k-th utterance in `cur`
+  std::vector<TokenStorePtr> stores;
+
   std::vector<ContextGraphPtr> context_graphs(batch_size, nullptr);
 
   auto sorted_indices = packed_seq.sorted_indices().cpu();
@@ -121,7 +257,7 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
       if (context_graphs[i] != nullptr)
         context_state = context_graphs[i]->Root();
     }
-    Hypotheses blank_hyp({{blanks, 0, context_state}});
+    Hypotheses blank_hyp(blanks, 0, context_state);
     cur.emplace_back(std::move(blank_hyp));
   }
 
@@ -153,9 +289,15 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
     auto hyps_shape = GetHypsShape(cur);
     int32_t num_hyps = k2::TotSize(hyps_shape, 1);
 
+    decoder_out = RunDecoder(model_, cur, num_hyps, context_size, decoder_out);
+    // decoder_out is of shape (num_hyps, 1, joiner_dim)
+
     prev.clear();
     prev.reserve(num_hyps);
+    stores.clear();
+    stores.reserve(cur_batch_size);
     for (auto &hyps : cur) {
+      stores.push_back(hyps.GetTokenStore());
       for (auto &h : hyps) {
         prev.push_back(std::move(h.second));
       }
@@ -170,11 +312,6 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
       ys_log_probs_acc[k][0] = prev[k].log_prob;
     }
 
-    auto decoder_input = BuildDecoderInput(prev, context_size).to(device);
-
-    auto decoder_out = model_->RunDecoder(decoder_input);
-    // decoder_out is of shape (num_hyps, 1, joiner_dim)
-
     auto index = k2::RowIds(hyps_shape, 1).to(torch::kLong).to(device);
 
     cur_encoder_out = cur_encoder_out.index_select(/*dim*/ 0, /*index*/ index);
@@ -186,58 +323,60 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
     logits = logits.squeeze(1).squeeze(1);
     // now logits' shape is (num_hyps, vocab_size)
 
-    auto log_probs = (logits / temperature_).log_softmax(-1).cpu();
+    auto log_probs = (logits / temperature_).log_softmax(-1);
+
+    log_probs.add_(ys_log_probs.to(device));
+
+    // values, topk_hyp_indexes, and topk_token_indexes are of shape
+    // (batch_size, num_active_paths)
+    torch::Tensor values, topk_hyp_indexes, topk_token_indexes;
+    std::vector<int32_t> num_candidates;
+    BatchedTopk(log_probs, hyps_shape, num_active_paths_, &values,
+                &topk_hyp_indexes, &topk_token_indexes, &num_candidates);
 
-    log_probs.add_(ys_log_probs);
+    auto values_acc = values.accessor<float, 2>();
+    auto topk_hyp_indexes_acc = topk_hyp_indexes.accessor<int64_t, 2>();
+    auto topk_token_indexes_acc = topk_token_indexes.accessor<int64_t, 2>();
 
-    int32_t vocab_size = log_probs.size(1);
-    log_probs = log_probs.reshape(-1);
     auto row_splits = k2::RowSplits(hyps_shape, 1);
     auto row_splits_acc = row_splits.accessor<int32_t, 1>();
 
     for (int32_t k = 0; k != cur_batch_size; ++k) {
       int32_t start = row_splits_acc[k];
-      int32_t end = row_splits_acc[k + 1];
-
-      torch::Tensor values, indexes;
-      std::tie(values, indexes) =
-          log_probs.slice(/*dim*/ 0, start * vocab_size, end * vocab_size)
-              .topk(/*k*/ num_active_paths_, /*dim*/ 0,
-                    /*largest*/ true, /*sorted*/ true);
-
-      auto topk_hyp_indexes = FloorDivide(indexes, vocab_size);
-      auto topk_token_indexes = torch::remainder(indexes, vocab_size);
-
-      auto values_acc = values.accessor<float, 1>();
-      auto topk_hyp_indexes_acc = topk_hyp_indexes.accessor<int64_t, 1>();
-      auto topk_token_indexes_acc = topk_token_indexes.accessor<int64_t, 1>();
 
-      Hypotheses hyps;
-      for (int32_t j = 0; j != values.numel(); ++j) {
-        int32_t hyp_idx = topk_hyp_indexes_acc[j];
-        Hypothesis new_hyp = prev[start + hyp_idx];  // note: hyp_idx is 0 based
+      Hypotheses hyps(stores[k]);
+      // If the utterance has fewer than num_active_paths_ candidates,
+      // the remaining entries are padding.
+      for (int32_t j = 0; j != num_candidates[k]; ++j) {
+        int32_t hyp_idx = topk_hyp_indexes_acc[k][j];
+        // note: hyp_idx is 0 based
+        const Hypothesis &prev_hyp = prev[start + hyp_idx];
 
-        int32_t new_token = topk_token_indexes_acc[j];
+        int32_t new_token = topk_token_indexes_acc[k][j];
 
         float context_score = 0;
-        auto context_state = new_hyp.context_state;
+        auto context_state = prev_hyp.context_state;
 
+        Hypothesis new_hyp = prev_hyp;
         if (new_token != blank_id) {
-          new_hyp.ys.push_back(new_token);
-          new_hyp.timestamps.push_back(t);
+          // It shares the tokens of prev_hyp and costs O(1)
+          new_hyp = hyps.Extend(prev_hyp, new_token, t);
           if (context_graphs[k] != nullptr) {
             auto context_res =
                 context_graphs[k]->ForwardOneStep(context_state, new_token);
             context_score = context_res.first;
             new_hyp.context_state = context_res.second;
           }
+        } else {
+          new_hyp.decoder_out_index = start + hyp_idx;
         }
 
         // We already added log_prob of the path to log_probs before, so
         // we use values_acc[j] here directly.
-        new_hyp.log_prob = values_acc[j] + context_score;
+        new_hyp.log_prob = values_acc[k][j] + context_score;
         hyps.Add(std::move(new_hyp));
       }
+      hyps.MaybeCompact();
       cur.push_back(std::move(hyps));
     }
   }
@@ -265,9 +404,12 @@ OfflineTransducerModifiedBeamSearchDecoder::Decode(
   for (int32_t i = 0; i != batch_size; ++i) {
     int32_t k = unsorted_indices_accessor[i];
     Hypothesis hyp = cur[k].GetMostProbable(true);
-    torch::ArrayRef<int32_t> arr(hyp.ys);
-    ans[i].tokens = arr.slice(context_size).vec();
-    ans[i].timestamps = std::move(hyp.timestamps);
+    auto tokens = cur[k].GetTokens(hyp);
+    auto timestamps = cur[k].GetTimestamps(hyp);
+    ans[i].tokens =
+        std::vector<int32_t>(tokens.begin() + context_size, tokens.end());
+    ans[i].timestamps = std::vector<int32_t>(timestamps.begin() + context_size,
+                                             timestamps.end());
   }
 
   return ans;
@@ -0,0 +1,107 @@
+// sherpa/csrc/offline-whisper-long-audio.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/offline-whisper-long-audio.h"
+
+#include <algorithm>
+#include <cmath>
+#include <vector>
+
+#include "sherpa/csrc/log.h"
+
+namespace sherpa {
+
+std::vector<torch::Tensor> SplitFeaturesIntoWindows(
+    const torch::Tensor &features, int32_t window_size, int32_t overlap) {
+  SHERPA_CHECK_EQ(features.dim(), 2);
+  SHERPA_CHECK_GT(window_size, 0);
+  SHERPA_CHECK_GE(overlap, 0);
+  SHERPA_CHECK_LT(overlap, window_size);
+
+  int32_t num_frames = features.size(0);
+  int32_t shift = window_size - overlap;
+
+  std::vector<torch::Tensor> ans;
+  int32_t start = 0;
+  while (true) {
+    int32_t end = std::min(start + window_size, num_frames);
+    ans.push_back(features.slice(0, start, end));
+
+    if (end == num_frames) {
+      break;
+    }
+    start += shift;
+  }
+
+  return ans;
+}
+
+std::vector<int32_t> MergeOverlappingTokens(const std::vector<int32_t> &a,
+                                            const std::vector<int32_t> &b,
+                                            int32_t num_overlap_tokens_a,
+                                            int32_t num_overlap_tokens_b,
+                                            int32_t max_overlap_tokens /*=50*/,
+                                            int32_t min_match_tokens /*=2*/) {
+  int32_t na = std::min<int32_t>(a.size(), max_overlap_tokens);
+  int32_t nb = std::min<int32_t>(b.size(), max_overlap_tokens);
+
+  // Search for the longest common substring of
+  // a[a.size() - na, a.size()) and b[0, nb).
+  //
+  // len[i][j] is the length of the common suffix of the first i tokens
+  // of the tail of a and the first j tokens of b.
+  int32_t offset = static_cast<int32_t>(a.size()) - na;
+  std::vector<std::vector<int32_t>> len(na + 1,
+                                        std::vector<int32_t>(nb + 1, 0));
+  int32_t best_len = 0;
+  int32_t best_end_a = 0;  // end of the match in a, exclusive
+  int32_t best_end_b = 0;  // end of the match in b, exclusive
+
+  for (int32_t i = 1; i <= na; ++i) {
+    for (int32_t j = 1; j <= nb; ++j) {
+      if (a[offset + i - 1] != b[j - 1]) {
+        continue;
+      }
+
+      len[i][j] = len[i - 1][j - 1] + 1;
+      if (len[i][j] > best_len) {
+        best_len = len[i][j];
+        best_end_a = offset + i;
+        best_end_b = j;
+      }
+    }
+  }
+
+  std::vector<int32_t> ans;
+  ans.reserve(a.size() + b.size());
+
+  if (best_len < min_match_tokens) {
+    // Cut at the midpoint of the overlap
+    int32_t num_a = static_cast<int32_t>(a.size());
+    int32_t num_b = static_cast<int32_t>(b.size());
+    int32_t drop_a = std::min(std::max(num_overlap_tokens_a, 0) / 2, num_a);
+    int32_t drop_b = std::min(std::max(num_overlap_tokens_b, 0) / 2, num_b);
+
+    ans.insert(ans.end(), a.begin(), a.end() - drop_a);
+    ans.insert(ans.end(), b.begin() + drop_b, b.end());
+    return ans;
+  }
+
+  ans.insert(ans.end(), a.begin(), a.begin() + best_end_a);
+  ans.insert(ans.end(), b.begin() + best_end_b, b.end());
+  return ans;
+}
+
+int32_t EstimateNumOverlapTokens(int32_t num_tokens, int32_t num_frames,
+                                 int32_t num_overlap_frames) {
+  if (num_frames <= 0) {
+    return 0;
+  }
+
+  num_overlap_frames = std::min(num_overlap_frames, num_frames);
+  return static_cast<int32_t>(std::lround(
+      static_cast<double>(num_tokens) * num_overlap_frames / num_frames));
+}
+
+}  // namespace sherpa
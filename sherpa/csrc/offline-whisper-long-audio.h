@@ -0,0 +1,73 @@
+// sherpa/csrc/offline-whisper-long-audio.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_OFFLINE_WHISPER_LONG_AUDIO_H_
+#define SHERPA_CSRC_OFFLINE_WHISPER_LONG_AUDIO_H_
+
+#include <cstdint>
+#include <vector>
+
+#include "torch/script.h"
+
+namespace sherpa {
+
+/** Split features into windows of at most window_size frames.
+ * Adjacent windows overlap by `overlap` frames.
+ *
+ * @param features A 2-D tensor of shape (num_frames, feature_dim).
+ * @param window_size Number of frames of a window, e.g., 3000 for whisper.
+ * @param overlap Number of frames shared by two adjacent windows. It must be
+ *                less than window_size.
+ *
+ * @return Return views of features. Only the last window can have less than
+ *         window_size frames. If num_frames <= window_size, it returns
+ *         a single window containing all frames.
+ */
+std::vector<torch::Tensor> SplitFeaturesIntoWindows(
+    const torch::Tensor &features, int32_t window_size, int32_t overlap);
+
+/** Join the tokens of two adjacent windows that overlap in time.
+ *
+ * The end of `a` and the beginning of `b` are decoded from the same audio.
+ * We look for the longest token sequence shared by the last
+ * `max_overlap_tokens` tokens of `a` and the first `max_overlap_tokens`
+ * tokens of `b`, keep `a` up to the end of the shared sequence and
+ * append what follows it in `b`.
+ *
+ * If no sequence of at least `min_match_tokens` tokens is shared, the
+ * overlap is cut at its midpoint: the first half of the overlapping
+ * tokens is taken from `a` and the second half from `b`, so that the
+ * overlapping text is not duplicated.
+ *
+ * @param a  Tokens decoded so far. Its end is decoded from the overlap.
+ * @param b  Tokens of the next window. Its beginning is decoded from the
+ *           overlap.
+ * @param num_overlap_tokens_a  Estimated number of tokens at the end of `a`
+ *                              that are decoded from the overlap, e.g.,
+ *                              from the ratio of the overlap to the
+ *                              duration of the window.
+ * @param num_overlap_tokens_b  Estimated number of tokens at the beginning
+ *                              of `b` that are decoded from the overlap.
+ *
+ * @return Return the joined tokens.
+ */
+std::vector<int32_t> MergeOverlappingTokens(const std::vector<int32_t> &a,
+                                            const std::vector<int32_t> &b,
+                                            int32_t num_overlap_tokens_a,
+                                            int32_t num_overlap_tokens_b,
+                                            int32_t max_overlap_tokens = 50,
+                                            int32_t min_match_tokens = 2);
+
+/** Estimate the number of tokens decoded from a part of a window by
+ * assuming that the tokens are evenly distributed over the window.
+ *
+ * @param num_tokens Number of tokens decoded from the window.
+ * @param num_frames Number of frames of the window.
+ * @param num_overlap_frames Number of frames of the part.
+ */
+int32_t EstimateNumOverlapTokens(int32_t num_tokens, int32_t num_frames,
+                                 int32_t num_overlap_frames);
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_OFFLINE_WHISPER_LONG_AUDIO_H_
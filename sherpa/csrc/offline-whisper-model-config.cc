@@ -27,6 +27,15 @@ void OfflineWhisperModelConfig::Register(ParseOptions *po) {
                "Valid values: transcribe, translate. "
                "Note that for non-multilingual models, it supports "
                "only 'transcribe'");
+
+  po->Register("whisper-long-audio", &long_audio,
+               "true to decode audio longer than 30 seconds by splitting it "
+               "into overlapping windows of 30 seconds. If false, only the "
+               "first 30 seconds are decoded.");
+
+  po->Register("whisper-long-audio-overlap", &long_audio_overlap,
+               "Used only when --whisper-long-audio is true. Overlap in "
+               "seconds between two adjacent windows.");
 }
 
 bool OfflineWhisperModelConfig::Validate() const {
@@ -48,6 +57,14 @@ bool OfflineWhisperModelConfig::Validate() const {
     return false;
   }
 
+  if (long_audio && (long_audio_overlap < 0 || long_audio_overlap >= 15)) {
+    SHERPA_LOGE(
+        "--whisper-long-audio-overlap should be in the range [0, 15). "
+        "Given: %.3f",
+        long_audio_overlap);
+    return false;
+  }
+
   return true;
 }
 
@@ -57,7 +74,9 @@ std::string OfflineWhisperModelConfig::ToString() const {
   os << "OfflineWhisperModelConfig(";
   os << "model=\"" << model << "\", ";
   os << "language=\"" << language << "\", ";
-  os << "task=\"" << task << "\")";
+  os << "task=\"" << task << "\", ";
+  os << "long_audio=" << (long_audio ? "True" : "False") << ", ";
+  os << "long_audio_overlap=" << long_audio_overlap << ")";
 
   return os.str();
 }
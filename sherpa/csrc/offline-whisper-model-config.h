@@ -27,11 +27,25 @@ struct OfflineWhisperModelConfig {
   // Note: For non-multilingual models, it supports only "transcribe"
   std::string task = "transcribe";
 
+  // If true, audio longer than 30 seconds is split into overlapping
+  // windows of 30 seconds. All windows are decoded in batches and the
+  // results are joined. If false, only the first 30 seconds are decoded.
+  bool long_audio = false;
+
+  // Used only when long_audio is true.
+  // Overlap in seconds between two adjacent windows.
+  float long_audio_overlap = 2.0;
+
   OfflineWhisperModelConfig() = default;
   OfflineWhisperModelConfig(const std::string &model,
                             const std::string &language,
-                            const std::string &task)
-      : model(model), language(language), task(task) {}
+                            const std::string &task, bool long_audio = false,
+                            float long_audio_overlap = 2.0)
+      : model(model),
+        language(language),
+        task(task),
+        long_audio(long_audio),
+        long_audio_overlap(long_audio_overlap) {}
 
   void Register(ParseOptions *po);
   bool Validate() const;
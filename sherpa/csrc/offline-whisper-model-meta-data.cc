@@ -16,6 +16,7 @@ std::string OfflineWhisperModelMetaData::ToString() const {
   os << "----------whisper meta data----------\n";
 
   os << " comment: " << comment << "\n";
+  os << " version: " << version << "\n";
   os << " n_mels: " << n_mels << "\n";
   os << " n_audio_ctx: " << n_audio_ctx << "\n";
   os << " n_audio_state: " << n_audio_state << "\n";
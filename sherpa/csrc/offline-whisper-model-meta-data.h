@@ -13,6 +13,9 @@
 namespace sherpa {
 
 struct OfflineWhisperModelMetaData {
+  // Models with version < 2 do not support batched encoding.
+  // See scripts/whisper/export.py
+  int32_t version;
   int32_t n_mels;
   int32_t n_audio_ctx;
   int32_t n_audio_state;
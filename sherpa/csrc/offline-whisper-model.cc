@@ -155,6 +155,7 @@ class OfflineWhisperModel::Impl {
  private:
   void InitMetaData(const torch::jit::ExtraFilesMap &meta_data) {
     meta_data_.comment = meta_data.at("comment");
+    meta_data_.version = atoi(meta_data.at("version").c_str());
     meta_data_.n_mels = atoi(meta_data.at("n_mels").c_str());
     meta_data_.n_audio_ctx = atoi(meta_data.at("n_audio_ctx").c_str());
     meta_data_.n_audio_state = atoi(meta_data.at("n_audio_state").c_str());
@@ -0,0 +1,350 @@
+// sherpa/csrc/online-encoder-state-pool.cc
+//
+// Copyright (c)  2023  Xiaomi Corporation
+#include "sherpa/csrc/online-encoder-state-pool.h"
+
+#include <algorithm>
+#include <utility>
+#include <vector>
+
+#include "sherpa/cpp_api/macros.h"
+#include "sherpa/csrc/log.h"
+
+namespace sherpa {
+
+void FlattenStates(const torch::IValue &v,
+                   std::vector<torch::Tensor> *leaves) {
+  if (v.isTensor()) {
+    leaves->push_back(v.toTensor());
+  } else if (v.isList()) {
+    auto list = v.toList();
+    for (size_t i = 0; i != list.size(); ++i) {
+      FlattenStates(list.get(i), leaves);
+    }
+  } else if (v.isTuple()) {
+    for (const auto &e : v.toTuple()->elements()) {
+      FlattenStates(e, leaves);
+    }
+  } else {
+    SHERPA_LOG(FATAL) << "Unsupported type in encoder states: " << v.tagKind();
+  }
+}
+
+// The inverse of FlattenStates(). It replaces tensors in layout with leaves.
+static torch::IValue Unflatten(const torch::IValue &layout,
+                               const std::vector<torch::Tensor> &leaves,
+                               int32_t *pos) {
+  if (layout.isTensor()) {
+    return leaves[(*pos)++];
+  }
+
+  if (layout.isList()) {
+    auto list = layout.toList();
+    c10::impl::GenericList ans(list.elementType());
+    ans.reserve(list.size());
+    for (size_t i = 0; i != list.size(); ++i) {
+      ans.push_back(Unflatten(list.get(i), leaves, pos));
+    }
+    return ans;
+  }
+
+  const auto &elements = layout.toTuple()->elements();
+  std::vector<torch::IValue> ans;
+  ans.reserve(elements.size());
+  for (const auto &e : elements) {
+    ans.push_back(Unflatten(e, leaves, pos));
+  }
+  return torch::ivalue::Tuple::create(std::move(ans));
+}
+
+torch::IValue UnflattenStates(const torch::IValue &layout,
+                              const std::vector<torch::Tensor> &leaves) {
+  int32_t pos = 0;
+  torch::IValue ans = Unflatten(layout, leaves, &pos);
+  SHERPA_CHECK_EQ(pos, static_cast<int32_t>(leaves.size()));
+  return ans;
+}
+
+/* Find the batch axis of each tensor in a batched state by comparing
+ * a batch of 1 stream with a batch of 2 streams.
+ *
+ * @param model  The model.
+ * @param layout  On return, it contains a batched state of 1 stream.
+ * @param batch_dims  On return, batch_dims[i] is the batch axis of the i-th
+ *                    tensor returned by FlattenStates().
+ * @return Return false if some tensor has no batch axis.
+ */
+static bool GetBatchDims(OnlineTransducerModel *model, torch::IValue *layout,
+                         std::vector<int32_t> *batch_dims) {
+  InferenceMode no_grad;
+
+  torch::IValue s = model->GetEncoderInitStates();
+  *layout = model->StackStates({s});
+
+  std::vector<torch::Tensor> b1;
+  std::vector<torch::Tensor> b2;
+  FlattenStates(*layout, &b1);
+  FlattenStates(model->StackStates({s, s}), &b2);
+
+  if (b1.empty() || b1.size() != b2.size()) {
+    return false;
+  }
+
+  batch_dims->clear();
+  batch_dims->reserve(b1.size());
+  for (size_t i = 0; i != b1.size(); ++i) {
+    if (b1[i].dim() != b2[i].dim()) {
+      return false;
+    }
+
+    int32_t batch_dim = -1;
+    for (int32_t d = 0; d != b1[i].dim(); ++d) {
+      if (b1[i].size(d) == b2[i].size(d)) {
+        continue;
+      }
+
+      if (batch_dim != -1 || b1[i].size(d) != 1 || b2[i].size(d) != 2) {
+        return false;
+      }
+      batch_dim = d;
+    }
+
+    if (batch_dim == -1) {
+      return false;
+    }
+
+    batch_dims->push_back(batch_dim);
+  }
+
+  return true;
+}
+
+static bool IsContiguous(const std::vector<int32_t> &slots) {
+  for (size_t i = 1; i < slots.size(); ++i) {
+    if (slots[i] != slots[0] + static_cast<int32_t>(i)) {
+      return false;
+    }
+  }
+  return true;
+}
+
+OnlineEncoderStateSlot::~OnlineEncoderStateSlot() { pool_->Free(index_); }
+
+torch::IValue OnlineEncoderStateSlot::GetState() const {
+  return pool_->Get(index_);
+}
+
+void OnlineEncoderStateSlot::SetState(torch::IValue state) {
+  pool_->Set(index_, std::move(state));
+}
+
+OnlineEncoderStatePool::OnlineEncoderStatePool(OnlineTransducerModel *model,
+                                               int32_t capacity /*= 16*/)
+    : model_(model) {
+  InferenceMode no_grad;
+
+  bool ok = GetBatchDims(model, &layout_, &batch_dims_);
+  SHERPA_CHECK(ok) << "Not every encoder state of the model has a batch axis";
+
+  std::vector<torch::Tensor> leaves;
+  FlattenStates(layout_, &leaves);
+
+  buffers_.reserve(leaves.size());
+  for (size_t i = 0; i != leaves.size(); ++i) {
+    auto shape = leaves[i].sizes().vec();
+    shape[batch_dims_[i]] = 0;
+    buffers_.push_back(torch::empty(shape, leaves[i].options()));
+  }
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  GrowLocked(std::max(capacity, 1));
+}
+
+bool OnlineEncoderStatePool::IsSupported(OnlineTransducerModel *model) {
+  torch::IValue layout;
+  std::vector<int32_t> batch_dims;
+  return GetBatchDims(model, &layout, &batch_dims);
+}
+
+std::shared_ptr<OnlineEncoderStateSlot> OnlineEncoderStatePool::Allocate(
+    torch::IValue state) {
+  int32_t slot;
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (free_slots_.empty()) {
+      GrowLocked(2 * capacity_);
+    }
+    slot = *free_slots_.begin();
+    free_slots_.erase(free_slots_.begin());
+  }
+
+  auto ans = std::make_shared<OnlineEncoderStateSlot>(shared_from_this(), slot);
+  Set(slot, std::move(state));
+
+  return ans;
+}
+
+torch::IValue OnlineEncoderStatePool::Gather(
+    const std::vector<int32_t> &slots) {
+  InferenceMode no_grad;
+  SHERPA_CHECK(!slots.empty());
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (!cached_slots_.empty()) {
+    if (cached_slots_ == slots) {
+      // The batch composition is not changed
+      return cached_states_;
+    }
+    FlushLocked();
+  }
+
+  int32_t n = slots.size();
+  std::vector<torch::Tensor> leaves(buffers_.size());
+
+  if (IsContiguous(slots)) {
+    for (size_t i = 0; i != buffers_.size(); ++i) {
+      torch::Tensor t = buffers_[i].narrow(batch_dims_[i], slots[0], n);
+      // A view is used directly only if it is contiguous, since the model
+      // may expect contiguous states.
+      leaves[i] = t.is_contiguous() ? t : t.contiguous();
+    }
+  } else {
+    torch::Tensor indexes =
+        torch::tensor(slots, torch::kLong).to(buffers_[0].device());
+    for (size_t i = 0; i != buffers_.size(); ++i) {
+      leaves[i] = buffers_[i].index_select(batch_dims_[i], indexes);
+    }
+  }
+
+  int32_t pos = 0;
+  return Unflatten(layout_, leaves, &pos);
+}
+
+void OnlineEncoderStatePool::Scatter(const std::vector<int32_t> &slots,
+                                     torch::IValue states) {
+  InferenceMode no_grad;
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (!cached_slots_.empty() && cached_slots_ != slots) {
+    FlushLocked();
+  }
+
+  // We don't copy the states to buffers_ until the batch composition
+  // is changed.
+  cached_slots_ = slots;
+  cached_states_ = std::move(states);
+}
+
+int32_t OnlineEncoderStatePool::Capacity() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return capacity_;
+}
+
+int32_t OnlineEncoderStatePool::NumUsedSlots() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return capacity_ - static_cast<int32_t>(free_slots_.size());
+}
+
+torch::IValue OnlineEncoderStatePool::Get(int32_t slot) {
+  InferenceMode no_grad;
+
+  std::vector<torch::Tensor> leaves(buffers_.size());
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (IsCachedLocked(slot)) {
+      FlushLocked();
+    }
+
+    for (size_t i = 0; i != buffers_.size(); ++i) {
+      // We need a copy since buffers_ is changed in-place
+      leaves[i] = buffers_[i].narrow(batch_dims_[i], slot, 1).clone();
+    }
+  }
+
+  int32_t pos = 0;
+  return model_->UnStackStates(Unflatten(layout_, leaves, &pos))[0];
+}
+
+void OnlineEncoderStatePool::Set(int32_t slot, torch::IValue state) {
+  InferenceMode no_grad;
+
+  std::vector<torch::Tensor> leaves;
+  FlattenStates(model_->StackStates({state}), &leaves);
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (IsCachedLocked(slot)) {
+    FlushLocked();
+  }
+
+  WriteLocked({slot}, leaves);
+}
+
+void OnlineEncoderStatePool::Free(int32_t slot) {
+  InferenceMode no_grad;
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (IsCachedLocked(slot)) {
+    FlushLocked();
+  }
+
+  free_slots_.insert(slot);
+}
+
+void OnlineEncoderStatePool::FlushLocked() {
+  if (cached_slots_.empty()) {
+    return;
+  }
+
+  std::vector<torch::Tensor> leaves;
+  FlattenStates(cached_states_, &leaves);
+  WriteLocked(cached_slots_, leaves);
+
+  cached_slots_.clear();
+  cached_states_ = torch::IValue();
+}
+
+void OnlineEncoderStatePool::WriteLocked(
+    const std::vector<int32_t> &slots,
+    const std::vector<torch::Tensor> &leaves) {
+  SHERPA_CHECK_EQ(leaves.size(), buffers_.size());
+
+  int32_t n = slots.size();
+  if (IsContiguous(slots)) {
+    for (size_t i = 0; i != buffers_.size(); ++i) {
+      buffers_[i].narrow(batch_dims_[i], slots[0], n).copy_(leaves[i]);
+    }
+  } else {
+    torch::Tensor indexes =
+        torch::tensor(slots, torch::kLong).to(buffers_[0].device());
+    for (size_t i = 0; i != buffers_.size(); ++i) {
+      buffers_[i].index_copy_(batch_dims_[i], indexes, leaves[i]);
+    }
+  }
+}
+
+void OnlineEncoderStatePool::GrowLocked(int32_t capacity) {
+  InferenceMode no_grad;
+
+  for (size_t i = 0; i != buffers_.size(); ++i) {
+    int32_t d = batch_dims_[i];
+    auto shape = buffers_[i].sizes().vec();
+    shape[d] = capacity;
+
+    torch::Tensor t = torch::empty(shape, buffers_[i].options());
+    t.narrow(d, 0, capacity_).copy_(buffers_[i]);
+    buffers_[i] = std::move(t);
+  }
+
+  for (int32_t i = capacity_; i != capacity; ++i) {
+    free_slots_.insert(i);
+  }
+
+  capacity_ = capacity;
+}
+
+bool OnlineEncoderStatePool::IsCachedLocked(int32_t slot) const {
+  return std::find(cached_slots_.begin(), cached_slots_.end(), slot) !=
+         cached_slots_.end();
+}
+
+}  // namespace sherpa
@@ -0,0 +1,169 @@
+// sherpa/csrc/online-encoder-state-pool.h
+//
+// Copyright (c)  2023  Xiaomi Corporation
+#ifndef SHERPA_CSRC_ONLINE_ENCODER_STATE_POOL_H_
+#define SHERPA_CSRC_ONLINE_ENCODER_STATE_POOL_H_
+
+#include <memory>
+#include <mutex>  // NOLINT
+#include <set>
+#include <utility>
+#include <vector>
+
+#include "sherpa/csrc/online-transducer-model.h"
+#include "torch/script.h"
+
+namespace sherpa {
+
+/** Collect all tensors in a (possibly nested) list or tuple of encoder
+ * states in depth-first order.
+ */
+void FlattenStates(const torch::IValue &v, std::vector<torch::Tensor> *leaves);
+
+/** The inverse of FlattenStates(). It returns an IValue with the same
+ * structure as layout whose tensors are replaced with leaves.
+ */
+torch::IValue UnflattenStates(const torch::IValue &layout,
+                              const std::vector<torch::Tensor> &leaves);
+
+class OnlineEncoderStatePool;
+
+/** A slot in an OnlineEncoderStatePool that is assigned to a stream.
+ *
+ * The slot is returned to the pool on destruction.
+ */
+class OnlineEncoderStateSlot {
+ public:
+  OnlineEncoderStateSlot(std::shared_ptr<OnlineEncoderStatePool> pool,
+                         int32_t index)
+      : pool_(std::move(pool)), index_(index) {}
+
+  ~OnlineEncoderStateSlot();
+
+  OnlineEncoderStateSlot(const OnlineEncoderStateSlot &) = delete;
+  OnlineEncoderStateSlot &operator=(const OnlineEncoderStateSlot &) = delete;
+
+  int32_t Index() const { return index_; }
+
+  /// Return the state of this slot, i.e., the state of a single stream.
+  torch::IValue GetState() const;
+
+  /// Overwrite the state of this slot with the state of a single stream.
+  void SetState(torch::IValue state);
+
+ private:
+  std::shared_ptr<OnlineEncoderStatePool> pool_;
+  int32_t index_;
+};
+
+/** Encoder states of all streams that are kept resident in batched tensors.
+ *
+ * Each stream is assigned a slot, i.e., an index along the batch axis of
+ * every state tensor. Instead of stacking the states of a batch with
+ * torch::cat before RunEncoder() and splitting them with torch::chunk
+ * afterwards, we gather the slots of the batch with index_select (or take
+ * a view if the slots are contiguous) and write the next states back with
+ * index_copy_.
+ *
+ * Furthermore, the next states of the most recent batch are kept as is.
+ * If the next batch consists of the same streams in the same order, which
+ * is the common case in steady state, they are passed to the encoder
+ * without any copy. They are written back to the batched tensors only when
+ * the batch composition changes.
+ *
+ * The layout of the batched state is inferred from the StackStates() of
+ * the model, so it works with all streaming models, as long as every
+ * tensor in the batched state has a batch axis.
+ */
+class OnlineEncoderStatePool
+    : public std::enable_shared_from_this<OnlineEncoderStatePool> {
+ public:
+  /**
+   * @param model  The model. It is not owned by this class and must
+   *               outlive this object.
+   * @param capacity  Initial number of slots. The pool grows as needed.
+   */
+  explicit OnlineEncoderStatePool(OnlineTransducerModel *model,
+                                  int32_t capacity = 16);
+
+  /** Return true if the state of the model can be kept in the pool,
+   *  i.e., if every tensor in a batched state has a batch axis.
+   */
+  static bool IsSupported(OnlineTransducerModel *model);
+
+  /** Assign a slot and initialize it with the given state.
+   *
+   * @param state  The state of a single stream, e.g., the return value of
+   *               OnlineTransducerModel::GetEncoderInitStates().
+   */
+  std::shared_ptr<OnlineEncoderStateSlot> Allocate(torch::IValue state);
+
+  /** Return the batched state of the given slots, which can be passed
+   *  to OnlineTransducerModel::RunEncoder().
+   */
+  torch::IValue Gather(const std::vector<int32_t> &slots);
+
+  /** Save the next states returned by RunEncoder() for the given slots.
+   *
+   * @param slots  The same slots that are passed to Gather().
+   * @param states  The batched next states.
+   */
+  void Scatter(const std::vector<int32_t> &slots, torch::IValue states);
+
+  /// Number of slots in the batched tensors
+  int32_t Capacity() const;
+
+  /// Number of slots that are in use
+  int32_t NumUsedSlots() const;
+
+ private:
+  friend class OnlineEncoderStateSlot;
+
+  torch::IValue Get(int32_t slot);
+  void Set(int32_t slot, torch::IValue state);
+  void Free(int32_t slot);
+
+  // Write the cached next states back to the batched tensors.
+  // The caller must hold mutex_.
+  void FlushLocked();
+
+  // Write the given leaf tensors of a batched state to the given slots.
+  // The caller must hold mutex_.
+  void WriteLocked(const std::vector<int32_t> &slots,
+                   const std::vector<torch::Tensor> &leaves);
+
+  // The caller must hold mutex_.
+  void GrowLocked(int32_t capacity);
+
+  bool IsCachedLocked(int32_t slot) const;
+
+ private:
+  OnlineTransducerModel *model_;  // not owned
+
+  mutable std::mutex mutex_;
+
+  // A batched state whose structure is used to rebuild an IValue from
+  // leaf tensors.
+  torch::IValue layout_;
+
+  // batch_dims_[i] is the batch axis of the i-th leaf tensor
+  std::vector<int32_t> batch_dims_;
+
+  // The i-th leaf tensor of the batched state of all slots
+  std::vector<torch::Tensor> buffers_;
+
+  int32_t capacity_ = 0;
+
+  // Free slots, sorted so that we always allocate the smallest one,
+  // which keeps the slots of a batch contiguous if possible.
+  std::set<int32_t> free_slots_;
+
+  // Next states of the most recent batch that have not been written
+  // back to buffers_
+  std::vector<int32_t> cached_slots_;
+  torch::IValue cached_states_;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_ONLINE_ENCODER_STATE_POOL_H_
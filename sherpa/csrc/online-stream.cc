@@ -18,8 +18,12 @@
 
 #include "sherpa/cpp_api/online-stream.h"
 
+#include <algorithm>
+#include <cstring>
 #include <memory>
 #include <mutex>  // NOLINT
+#include <string>
+#include <type_traits>
 #include <utility>
 #include <vector>
 
@@ -28,11 +32,99 @@
 #include "sherpa/csrc/context-graph.h"
 #include "sherpa/csrc/hypothesis.h"
 #include "sherpa/csrc/log.h"
+#include "sherpa/csrc/online-encoder-state-pool.h"
 #include "sherpa/csrc/online-transducer-decoder.h"
 #include "sherpa/csrc/resample.h"
 
 namespace sherpa {
 
+// "SOS1": Serialized OnlineStream, version 1
+static constexpr uint32_t kSerializationMagic = 0x31534f53;
+
+namespace {
+
+class BinaryWriter {
+ public:
+  template <typename T>
+  void Write(T v) {
+    static_assert(std::is_trivially_copyable<T>::value, "");
+    Write(&v, sizeof(T));
+  }
+
+  void Write(const void *p, size_t n) {
+    buf_.append(reinterpret_cast<const char *>(p), n);
+  }
+
+  template <typename T>
+  void WriteVector(const std::vector<T> &v) {
+    Write<int32_t>(v.size());
+    Write(v.data(), v.size() * sizeof(T));
+  }
+
+  void WriteTensor(torch::Tensor t) {
+    t = t.cpu().contiguous();
+    Write<int8_t>(static_cast<int8_t>(t.scalar_type()));
+    Write<int32_t>(t.dim());
+    for (auto d : t.sizes()) {
+      Write<int64_t>(d);
+    }
+    Write(t.data_ptr(), t.nbytes());
+  }
+
+  std::string &Data() { return buf_; }
+
+ private:
+  std::string buf_;
+};
+
+class BinaryReader {
+ public:
+  explicit BinaryReader(const std::string &data) : data_(data) {}
+
+  template <typename T>
+  T Read() {
+    static_assert(std::is_trivially_copyable<T>::value, "");
+    T v;
+    Read(&v, sizeof(T));
+    return v;
+  }
+
+  void Read(void *p, size_t n) {
+    SHERPA_CHECK_LE(pos_ + n, data_.size()) << "Truncated data";
+    std::memcpy(p, data_.data() + pos_, n);
+    pos_ += n;
+  }
+
+  template <typename T>
+  std::vector<T> ReadVector() {
+    int32_t n = Read<int32_t>();
+    SHERPA_CHECK_GE(n, 0);
+    std::vector<T> v(n);
+    Read(v.data(), n * sizeof(T));
+    return v;
+  }
+
+  torch::Tensor ReadTensor() {
+    auto dtype = static_cast<torch::ScalarType>(Read<int8_t>());
+    int32_t dim = Read<int32_t>();
+    std::vector<int64_t> sizes(dim);
+    for (auto &d : sizes) {
+      d = Read<int64_t>();
+    }
+    torch::Tensor t = torch::empty(sizes, dtype);
+    Read(t.data_ptr(), t.nbytes());
+    return t;
+  }
+
+  bool Done() const { return pos_ == data_.size(); }
+
+ private:
+  const std::string &data_;
+  size_t pos_ = 0;
+};
+
+}  // namespace
+
 class OnlineStream::OnlineStreamImpl {
  public:
   explicit OnlineStreamImpl(const FeatureConfig &feat_config,
@@ -88,27 +180,73 @@ class OnlineStream::OnlineStreamImpl {
 
   int32_t NumFramesReady() const {
     std::lock_guard<std::mutex> lock(feat_mutex_);
-    return fbank_->NumFramesReady();
+    return NumFramesReadyLocked();
   }
 
   bool IsLastFrame(int32_t frame) const {
     std::lock_guard<std::mutex> lock(feat_mutex_);
-    return fbank_->IsLastFrame(frame);
+    int32_t offset = FbankOffset();
+    if (frame < offset) {
+      // A restored frame
+      return input_finished_ && frame + 1 == NumFramesReadyLocked();
+    }
+    return fbank_->IsLastFrame(frame - offset);
   }
 
   void InputFinished() {
     std::lock_guard<std::mutex> lock(feat_mutex_);
     fbank_->InputFinished();
+    input_finished_ = true;
   }
 
   torch::Tensor GetFrame(int32_t frame) {
     std::lock_guard<std::mutex> lock(feat_mutex_);
-    return fbank_->GetFrame(frame);
+    return GetFrameLocked(frame);
+  }
+
+  void CopyFramesTo(int32_t start, int32_t n, torch::Tensor dst) {
+    SHERPA_CHECK_EQ(dst.dim(), 2);
+    SHERPA_CHECK_EQ(dst.size(0), n);
+
+    std::lock_guard<std::mutex> lock(feat_mutex_);
+    SHERPA_CHECK_LE(start + n, NumFramesReadyLocked());
+
+    bool use_memcpy = dst.device().is_cpu() && dst.is_contiguous() &&
+                      dst.scalar_type() == torch::kFloat;
+    int32_t feature_dim = dst.size(1);
+    float *p = use_memcpy ? dst.data_ptr<float>() : nullptr;
+
+    for (int32_t k = 0; k != n; ++k) {
+      torch::Tensor frame = GetFrameLocked(start + k);
+      // frame is of shape (1, feature_dim)
+      if (use_memcpy && frame.device().is_cpu() && frame.is_contiguous()) {
+        SHERPA_CHECK_EQ(frame.numel(), feature_dim);
+        std::memcpy(p + k * feature_dim, frame.data_ptr<float>(),
+                    feature_dim * sizeof(float));
+      } else {
+        dst[k].copy_(frame.squeeze(0));
+      }
+    }
+  }
+
+  torch::IValue GetState() const {
+    return slot_ ? slot_->GetState() : state_;
+  }
+
+  void SetState(torch::IValue state) {
+    if (slot_) {
+      slot_->SetState(std::move(state));
+    } else {
+      state_ = std::move(state);
+    }
   }
 
-  torch::IValue GetState() const { return state_; }
+  void SetStateSlot(std::shared_ptr<OnlineEncoderStateSlot> slot) {
+    slot_ = std::move(slot);
+    state_ = torch::IValue();
+  }
 
-  void SetState(torch::IValue state) { state_ = std::move(state); }
+  OnlineEncoderStateSlot *GetStateSlot() const { return slot_.get(); }
 
   const ContextGraphPtr &GetContextGraph() { return context_graph_; }
 
@@ -126,13 +264,178 @@ class OnlineStream::OnlineStreamImpl {
 
   int32_t &GetStartFrame() { return start_frame_; }
 
+  bool IsSerializable() const { return !context_graph_ && !r_.rnnt_stream; }
+
+  std::string Serialize() const {
+    SHERPA_CHECK(IsSerializable())
+        << "Streams with a context graph or decoded with fast_beam_search "
+        << "cannot be serialized";
+
+    BinaryWriter w;
+    w.Write<uint32_t>(kSerializationMagic);
+
+    w.Write<int32_t>(num_processed_frames_);
+    w.Write<int32_t>(num_trailing_blank_frames_);
+    w.Write<int32_t>(segment_);
+    w.Write<int32_t>(start_frame_);
+
+    {
+      // Feature frames that are not processed yet
+      std::lock_guard<std::mutex> lock(feat_mutex_);
+      w.Write<uint8_t>(input_finished_);
+
+      int32_t start = num_processed_frames_;
+      int32_t n = std::max(NumFramesReadyLocked() - start, 0);
+      w.Write<int32_t>(n);
+      for (int32_t i = 0; i != n; ++i) {
+        w.WriteTensor(GetFrameLocked(start + i).squeeze(0));
+      }
+    }
+
+    w.Write<int32_t>(r_.frame_offset);
+    w.Write<int32_t>(r_.num_trailing_blanks);
+    w.Write<int32_t>(r_.num_processed_frames);
+    w.WriteVector(r_.tokens);
+    w.WriteVector(r_.timestamps);
+
+    // Hyps of modified_beam_search. The token store is not saved. We save
+    // only the tokens of each hyp.
+    w.Write<int32_t>(r_.hyps.Size());
+    for (const auto &p : r_.hyps) {
+      const Hypothesis &hyp = p.second;
+      w.WriteVector(r_.hyps.GetTokens(hyp));
+      w.WriteVector(r_.hyps.GetTimestamps(hyp));
+      w.Write<double>(hyp.log_prob);
+      w.Write<int32_t>(hyp.num_trailing_blanks);
+    }
+
+    std::vector<torch::Tensor> leaves;
+    FlattenStates(GetState(), &leaves);
+    w.Write<int32_t>(leaves.size());
+    for (const auto &t : leaves) {
+      w.WriteTensor(t);
+    }
+
+    return std::move(w.Data());
+  }
+
+  torch::IValue Deserialize(const std::string &data,
+                            const torch::IValue &init_state) {
+    BinaryReader r(data);
+    SHERPA_CHECK_EQ(r.Read<uint32_t>(), kSerializationMagic)
+        << "The data is not returned by OnlineStream::Serialize()";
+
+    num_processed_frames_ = r.Read<int32_t>();
+    num_trailing_blank_frames_ = r.Read<int32_t>();
+    segment_ = r.Read<int32_t>();
+    start_frame_ = r.Read<int32_t>();
+
+    {
+      std::lock_guard<std::mutex> lock(feat_mutex_);
+      bool input_finished = r.Read<uint8_t>();
+
+      int32_t n = r.Read<int32_t>();
+      std::vector<torch::Tensor> frames(n);
+      for (auto &f : frames) {
+        f = r.ReadTensor();
+      }
+
+      restored_start_ = num_processed_frames_;
+      if (n > 0) {
+        restored_frames_ = torch::stack(frames);
+      }
+
+      if (input_finished) {
+        fbank_->InputFinished();
+        input_finished_ = true;
+      }
+    }
+
+    r_.frame_offset = r.Read<int32_t>();
+    r_.num_trailing_blanks = r.Read<int32_t>();
+    r_.num_processed_frames = r.Read<int32_t>();
+    r_.tokens = r.ReadVector<int32_t>();
+    r_.timestamps = r.ReadVector<int32_t>();
+
+    int32_t num_hyps = r.Read<int32_t>();
+    r_.hyps = Hypotheses(std::make_shared<TokenStore>());
+    for (int32_t i = 0; i != num_hyps; ++i) {
+      auto tokens = r.ReadVector<int32_t>();
+      auto timestamps = r.ReadVector<int32_t>();
+      SHERPA_CHECK_EQ(tokens.size(), timestamps.size());
+
+      Hypothesis hyp;
+      for (size_t k = 0; k != tokens.size(); ++k) {
+        hyp = r_.hyps.Extend(hyp, tokens[k], timestamps[k]);
+      }
+      hyp.log_prob = r.Read<double>();
+      hyp.num_trailing_blanks = r.Read<int32_t>();
+      r_.hyps.Add(std::move(hyp));
+    }
+
+    std::vector<torch::Tensor> layout;
+    FlattenStates(init_state, &layout);
+
+    int32_t num_leaves = r.Read<int32_t>();
+    SHERPA_CHECK_EQ(num_leaves, static_cast<int32_t>(layout.size()))
+        << "The data is saved from a different model";
+
+    std::vector<torch::Tensor> leaves(num_leaves);
+    for (int32_t i = 0; i != num_leaves; ++i) {
+      leaves[i] = r.ReadTensor().to(layout[i].device());
+      SHERPA_CHECK(leaves[i].sizes() == layout[i].sizes())
+          << "The data is saved from a different model";
+    }
+
+    SHERPA_CHECK(r.Done()) << "Trailing bytes in the data";
+
+    return UnflattenStates(init_state, leaves);
+  }
+
+ private:
+  // Index of the first frame computed by fbank_. Frames before it are
+  // restored by Deserialize().
+  int32_t FbankOffset() const {
+    return restored_start_ +
+           (restored_frames_.defined() ? restored_frames_.size(0) : 0);
+  }
+
+  // The caller must hold feat_mutex_.
+  int32_t NumFramesReadyLocked() const {
+    return FbankOffset() + fbank_->NumFramesReady();
+  }
+
+  // Return a 2-D tensor of shape (1, feature_dim).
+  // The caller must hold feat_mutex_.
+  torch::Tensor GetFrameLocked(int32_t frame) const {
+    int32_t offset = FbankOffset();
+    if (frame >= offset) {
+      return fbank_->GetFrame(frame - offset);
+    }
+
+    SHERPA_CHECK_GE(frame, restored_start_)
+        << "Frames that are processed before the stream is serialized "
+        << "are not available";
+
+    int32_t i = frame - restored_start_;
+    return restored_frames_.slice(/*dim*/ 0, i, i + 1);
+  }
+
  private:
   kaldifeat::FbankOptions opts_;
   std::unique_ptr<kaldifeat::OnlineFbank> fbank_;
   FeatureConfig feat_config_;
   mutable std::mutex feat_mutex_;
+  bool input_finished_ = false;
+
+  // Frames [restored_start_, restored_start_ + restored_frames_.size(0))
+  // restored by Deserialize(). It is of shape (num_frames, feature_dim).
+  torch::Tensor restored_frames_;
+  int32_t restored_start_ = 0;
 
   torch::IValue state_;
+  // If not null, the encoder state is kept in an OnlineEncoderStatePool
+  std::shared_ptr<OnlineEncoderStateSlot> slot_;
   std::vector<int32_t> hyps_;
   Hypotheses hypotheses_;
   torch::Tensor decoder_out_;
@@ -173,10 +476,38 @@ torch::Tensor OnlineStream::GetFrame(int32_t frame) {
   return impl_->GetFrame(frame);
 }
 
+torch::Tensor OnlineStream::GetFrames(int32_t start, int32_t n) {
+  int32_t feature_dim = GetFrame(start).size(1);
+  torch::Tensor ans = torch::empty({n, feature_dim}, torch::kFloat);
+  impl_->CopyFramesTo(start, n, ans);
+  return ans;
+}
+
+void OnlineStream::CopyFramesTo(int32_t start, int32_t n, torch::Tensor dst) {
+  impl_->CopyFramesTo(start, n, dst);
+}
+
 torch::IValue OnlineStream::GetState() const { return impl_->GetState(); }
 
 void OnlineStream::SetState(torch::IValue state) { impl_->SetState(state); }
 
+void OnlineStream::SetStateSlot(std::shared_ptr<OnlineEncoderStateSlot> slot) {
+  impl_->SetStateSlot(std::move(slot));
+}
+
+OnlineEncoderStateSlot *OnlineStream::GetStateSlot() const {
+  return impl_->GetStateSlot();
+}
+
+bool OnlineStream::IsSerializable() const { return impl_->IsSerializable(); }
+
+std::string OnlineStream::Serialize() const { return impl_->Serialize(); }
+
+torch::IValue OnlineStream::Deserialize(const std::string &data,
+                                        const torch::IValue &init_state) {
+  return impl_->Deserialize(data, init_state);
+}
+
 const ContextGraphPtr &OnlineStream::GetContextGraph() const {
   return impl_->GetContextGraph();
 }
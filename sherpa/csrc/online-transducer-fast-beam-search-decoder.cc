@@ -70,7 +70,7 @@ void OnlineTransducerFastBeamSearchDecoder::Decode(
     contexts = contexts.to(torch::kLong);
     // contexts.shape: (num_hyps, context_size)
 
-    auto decoder_out = model_->RunDecoder(contexts).squeeze(1);
+    auto decoder_out = model_->RunDecoderWithCache(contexts).squeeze(1);
     // decoder_out.shape: (num_hyps, joiner_dim)
 
     auto cur_encoder_out = encoder_out.index({torch::indexing::Slice(), t});
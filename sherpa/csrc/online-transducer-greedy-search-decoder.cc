@@ -7,6 +7,8 @@
 #include <algorithm>
 #include <vector>
 
+#include "sherpa/csrc/speculative-joiner.h"
+
 namespace sherpa {
 
 static void BuildDecoderInput(
@@ -52,8 +54,6 @@ void OnlineTransducerGreedySearchDecoder::Decode(
   TORCH_CHECK(encoder_out.size(0) == static_cast<int32_t>(results->size()),
               encoder_out.size(0), " vs ", results->size());
 
-  auto device = model_->Device();
-  int32_t blank_id = 0;  // always 0
   int32_t context_size = model_->ContextSize();
 
   int32_t N = encoder_out.size(0);
@@ -64,41 +64,152 @@ void OnlineTransducerGreedySearchDecoder::Decode(
                              .memory_format(torch::MemoryFormat::Contiguous));
   BuildDecoderInput(*results, &decoder_input);
 
-  auto decoder_out = model_->RunDecoder(decoder_input.to(device)).squeeze(1);
+  auto decoder_out = model_->RunDecoderWithCache(decoder_input).squeeze(1);
   // decoder_out has shape (N, joiner_dim)
 
+  if (speculative_joiner_) {
+    DecodeSpeculative(encoder_out, decoder_out, decoder_input, results);
+    return;
+  }
+
   for (int32_t t = 0; t != T; ++t) {
     auto cur_encoder_out = encoder_out.index({torch::indexing::Slice(), t});
     // cur_encoder_out has shape (N, joiner_dim)
 
-    auto logits = model_->RunJoiner(cur_encoder_out, decoder_out);
-    // logits has shape (N, vocab_size)
+    DecodeFrame(cur_encoder_out, t, &decoder_out, &decoder_input, results);
+  }  // for (int32_t t = 0; t != T; ++t)
+
+  // Update frame_offset
+  for (auto &r : *results) {
+    r.frame_offset += T;
+  }
+}
+
+void OnlineTransducerGreedySearchDecoder::DecodeFrame(
+    torch::Tensor cur_encoder_out, int32_t t, torch::Tensor *decoder_out,
+    torch::Tensor *decoder_input,
+    std::vector<OnlineTransducerDecoderResult> *results) {
+  int32_t blank_id = 0;  // always 0
+  int32_t N = cur_encoder_out.size(0);
+
+  auto logits = model_->RunJoiner(cur_encoder_out, *decoder_out);
+  // logits has shape (N, vocab_size)
+
+  auto max_indices = logits.argmax(/*dim*/ -1).cpu();
+  auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
+  bool emitted = false;
+  for (int32_t n = 0; n != N; ++n) {
+    auto index = max_indices_accessor[n];
+    auto &r = (*results)[n];
+    if (index != blank_id) {
+      emitted = true;
+
+      r.tokens.push_back(index);
+      r.timestamps.push_back(t + r.frame_offset);
+      r.num_trailing_blanks = 0;
+    } else {
+      ++r.num_trailing_blanks;
+    }
+  }
+
+  if (emitted) {
+    BuildDecoderInput(*results, decoder_input);
+    *decoder_out = model_->RunDecoderWithCache(*decoder_input).squeeze(1);
+    // decoder_out has shape (N, joiner_dim)
+  }
+}
+
+void OnlineTransducerGreedySearchDecoder::DecodeSpeculative(
+    torch::Tensor encoder_out, torch::Tensor decoder_out,
+    torch::Tensor decoder_input,
+    std::vector<OnlineTransducerDecoderResult> *results) {
+  using torch::indexing::Slice;
+
+  int32_t blank_id = 0;  // always 0
+
+  int32_t N = encoder_out.size(0);
+  int32_t T = encoder_out.size(1);
+
+  auto is_token = [blank_id](int64_t i) { return i != blank_id; };
+  auto is_unclear = [](bool clear) { return !clear; };
+
+  int32_t t = 0;
+  while (t < T) {
+    // Evaluate the joiner for frames [t, T) with the current decoder_out,
+    // i.e., assume that no stream emits a token in these frames
+    int32_t num_frames = T - t;
+
+    // Row s * N + n is for frame t + s of stream n
+    auto cur_encoder_out = encoder_out.index({Slice(), Slice(t, T)})
+                               .transpose(0, 1)
+                               .reshape({num_frames * N, -1});
+
+    auto cur_decoder_out =
+        decoder_out.unsqueeze(0)
+            .expand({num_frames, N, decoder_out.size(1)})
+            .reshape({num_frames * N, -1});
+
+    auto logits = model_->RunJoiner(cur_encoder_out, cur_decoder_out);
+    // logits has shape (num_frames * N, vocab_size)
 
     auto max_indices = logits.argmax(/*dim*/ -1).cpu();
-    auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
-    bool emitted = false;
+    const int64_t *p = max_indices.data_ptr<int64_t>();
+
+    auto is_clear = IsArgmaxClear(logits);
+    const bool *c = is_clear.data_ptr<bool>();
+
+    // Find the first frame at which any stream emits a token or has a
+    // near-tie. All frames before it are blank for all streams, and the
+    // margins of blank are larger than the rounding errors of the joiner,
+    // so their results are the same as if they were evaluated one by one.
+    int32_t s = 0;
+    for (; s != num_frames; ++s) {
+      const int64_t *q = p + s * N;
+      const bool *d = c + s * N;
+      if (std::any_of(q, q + N, is_token) ||
+          std::any_of(d, d + N, is_unclear)) {
+        break;
+      }
+    }
+
+    for (auto &r : *results) {
+      r.num_trailing_blanks += s;
+    }
+
+    if (s == num_frames) {
+      break;
+    }
+
+    const bool *d = c + s * N;
+    if (std::any_of(d, d + N, is_unclear)) {
+      // Evaluate frame t + s with the same joiner call as the frame-by-frame
+      // search, so that its near-ties are broken in the same way
+      auto frame_encoder_out = encoder_out.index({Slice(), t + s});
+      DecodeFrame(frame_encoder_out, t + s, &decoder_out, &decoder_input,
+                  results);
+      t += s + 1;
+      continue;
+    }
+
+    // decoder_out is still valid for frame t + s, so its result is final
+    const int64_t *q = p + s * N;
     for (int32_t n = 0; n != N; ++n) {
-      auto index = max_indices_accessor[n];
       auto &r = (*results)[n];
-      if (index != blank_id) {
-        emitted = true;
-
-        r.tokens.push_back(index);
-        r.timestamps.push_back(t + r.frame_offset);
+      if (q[n] != blank_id) {
+        r.tokens.push_back(q[n]);
+        r.timestamps.push_back(t + s + r.frame_offset);
         r.num_trailing_blanks = 0;
       } else {
         ++r.num_trailing_blanks;
       }
     }
 
-    if (emitted) {
-      BuildDecoderInput(*results, &decoder_input);
-      decoder_out = model_->RunDecoder(decoder_input.to(device)).squeeze(1);
-      // decoder_out has shape (N, joiner_dim)
-    }
-  }  // for (int32_t t = 0; t != T; ++t)
+    BuildDecoderInput(*results, &decoder_input);
+    decoder_out = model_->RunDecoderWithCache(decoder_input).squeeze(1);
+
+    t += s + 1;
+  }
 
-  // Update frame_offset
   for (auto &r : *results) {
     r.frame_offset += T;
   }
@@ -13,8 +13,21 @@ namespace sherpa {
 
 class OnlineTransducerGreedySearchDecoder : public OnlineTransducerDecoder {
  public:
-  explicit OnlineTransducerGreedySearchDecoder(OnlineTransducerModel *model)
-      : model_(model) {}
+  /**
+   * @param model  Not owned.
+   * @param speculative_joiner  If true, the joiner is evaluated for all
+   *                            remaining frames of a chunk in one call,
+   *                            assuming no stream emits a token. It is
+   *                            re-evaluated only from the first frame at
+   *                            which a stream emits or the argmax of a
+   *                            stream is a near-tie. Near-ties are
+   *                            re-evaluated frame by frame, so the decoding
+   *                            result is the same as evaluating every frame
+   *                            one by one.
+   */
+  explicit OnlineTransducerGreedySearchDecoder(OnlineTransducerModel *model,
+                                               bool speculative_joiner = false)
+      : model_(model), speculative_joiner_(speculative_joiner) {}
 
   OnlineTransducerDecoderResult GetEmptyResult() override;
 
@@ -23,8 +36,28 @@ class OnlineTransducerGreedySearchDecoder : public OnlineTransducerDecoder {
   void Decode(torch::Tensor encoder_out,
               std::vector<OnlineTransducerDecoderResult> *result) override;
 
+ private:
+  /** Run one step of frame-by-frame greedy search.
+   *
+   * @param cur_encoder_out  Frame t of encoder_out. Its shape is
+   *                         (N, joiner_dim).
+   * @param t  Index of the frame in the current chunk.
+   * @param decoder_out  The decoder output for the current results. It is
+   *                     updated if a stream emits a token.
+   * @param decoder_input  Used to run the decoder.
+   * @param results  The results are updated in-place.
+   */
+  void DecodeFrame(torch::Tensor cur_encoder_out, int32_t t,
+                   torch::Tensor *decoder_out, torch::Tensor *decoder_input,
+                   std::vector<OnlineTransducerDecoderResult> *results);
+
+  void DecodeSpeculative(torch::Tensor encoder_out, torch::Tensor decoder_out,
+                         torch::Tensor decoder_input,
+                         std::vector<OnlineTransducerDecoderResult> *results);
+
  private:
   OnlineTransducerModel *model_;  // Not owned
+  bool speculative_joiner_;
 };
 
 }  // namespace sherpa
@@ -5,8 +5,10 @@
 #define SHERPA_CSRC_ONLINE_TRANSDUCER_MODEL_H_
 
 #include <tuple>
+#include <utility>
 #include <vector>
 
+#include "sherpa/csrc/decoder-cache.h"
 #include "torch/script.h"
 
 namespace sherpa {
@@ -120,6 +122,32 @@ class OnlineTransducerModel {
 
   int32_t SubsamplingFactor() const { return 4; }
 
+  /** Set the cache used by RunDecoderWithCache(). Pass nullptr to
+   * disable it.
+   */
+  void SetDecoderCache(DecoderCachePtr cache) {
+    decoder_cache_ = std::move(cache);
+  }
+
+  DecoderCache *GetDecoderCache() const { return decoder_cache_.get(); }
+
+  /** Same as RunDecoder() except that the outputs of contexts in the
+   * decoder cache are reused and the decoder is run only for the others.
+   *
+   * @param decoder_input A tensor of shape (N, context_size). It can be
+   *                      on CPU.
+   * @return Return a tensor of shape (N, 1, decoder_dim) on Device().
+   */
+  torch::Tensor RunDecoderWithCache(const torch::Tensor &decoder_input) {
+    if (!decoder_cache_) {
+      return RunDecoder(decoder_input.to(Device()));
+    }
+
+    return decoder_cache_->Run(decoder_input, [this](const torch::Tensor &x) {
+      return RunDecoder(x.to(Device()));
+    });
+  }
+
   void WarmUp(torch::Tensor features, torch::Tensor features_length) {
     torch::IValue states = GetEncoderInitStates();
     states = StackStates({states});
@@ -152,8 +180,40 @@ class OnlineTransducerModel {
 
  private:
   int32_t vocab_size_ = -1;
+
+  DecoderCachePtr decoder_cache_;
 };
 
+/** Return true if the given joiner can take inputs that are already
+ * projected, i.e., it has the submodules `encoder_proj` and `decoder_proj`
+ * and its forward() has the argument `project_input`. It is the case
+ * for joiners from icefall exported with torch.jit.script(). See
+ * https://github.com/k2-fsa/icefall/blob/master/egs/librispeech/ASR/pruned_transducer_stateless7_streaming/joiner.py
+ *
+ * For such a joiner, a model can project the encoder output once in
+ * RunEncoder() and the decoder output once in RunDecoder(), so that
+ * RunJoiner() runs only the output layer. It saves a lot for beam search,
+ * where the output of each frame is joined with every active hyp.
+ */
+inline bool JoinerAcceptsProjectedInput(const torch::jit::Module &joiner) {
+  if (!joiner.hasattr("encoder_proj") || !joiner.hasattr("decoder_proj")) {
+    return false;
+  }
+
+  auto forward = joiner.find_method("forward");
+  if (!forward) {
+    return false;
+  }
+
+  for (const auto &arg : forward->function().getSchema().arguments()) {
+    if (arg.name() == "project_input") {
+      return true;
+    }
+  }
+
+  return false;
+}
+
 }  // namespace sherpa
 
 #endif  // SHERPA_CSRC_ONLINE_TRANSDUCER_MODEL_H_
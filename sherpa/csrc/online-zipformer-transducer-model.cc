@@ -26,6 +26,12 @@ OnlineZipformerTransducerModel::OnlineZipformerTransducerModel(
   joiner_ = torch::jit::load(joiner_filename, device);
   joiner_.eval();
 
+  split_joiner_ = JoinerAcceptsProjectedInput(joiner_);
+  if (split_joiner_) {
+    encoder_proj_ = joiner_.attr("encoder_proj").toModule();
+    decoder_proj_ = joiner_.attr("decoder_proj").toModule();
+  }
+
   auto conv = decoder_.attr("conv").toModule();
 
   context_size_ =
@@ -49,6 +55,12 @@ OnlineZipformerTransducerModel::OnlineZipformerTransducerModel(
   decoder_ = model_.attr("decoder").toModule();
   joiner_ = model_.attr("joiner").toModule();
 
+  split_joiner_ = JoinerAcceptsProjectedInput(joiner_);
+  if (split_joiner_) {
+    encoder_proj_ = joiner_.attr("encoder_proj").toModule();
+    decoder_proj_ = joiner_.attr("decoder_proj").toModule();
+  }
+
   auto conv = decoder_.attr("conv").toModule();
 
   context_size_ =
@@ -248,28 +260,47 @@ OnlineZipformerTransducerModel::RunEncoder(
 
   auto next_states = tuple_ptr->elements()[2];
 
+  if (split_joiner_) {
+    encoder_out = encoder_proj_.run_method("forward", encoder_out).toTensor();
+  }
+
   return std::make_tuple(encoder_out, encoder_out_length, next_states);
 }
 
 torch::Tensor OnlineZipformerTransducerModel::RunDecoder(
     const torch::Tensor &decoder_input) {
   InferenceMode no_grad;
+  torch::Tensor decoder_out;
   if (from_torch_jit_trace_) {
-    return decoder_
-        .run_method("forward", decoder_input,
-                    /*need_pad*/ torch::tensor({0}).to(torch::kBool))
-        .toTensor();
+    decoder_out =
+        decoder_
+            .run_method("forward", decoder_input,
+                        /*need_pad*/ torch::tensor({0}).to(torch::kBool))
+            .toTensor();
   } else {
-    return decoder_
-        .run_method("forward", decoder_input,
-                    /*need_pad*/ false)
-        .toTensor();
+    decoder_out = decoder_
+                      .run_method("forward", decoder_input,
+                                  /*need_pad*/ false)
+                      .toTensor();
+  }
+
+  if (split_joiner_) {
+    decoder_out = decoder_proj_.run_method("forward", decoder_out).toTensor();
   }
+
+  return decoder_out;
 }
 
 torch::Tensor OnlineZipformerTransducerModel::RunJoiner(
     const torch::Tensor &encoder_out, const torch::Tensor &decoder_out) {
   InferenceMode no_grad;
+  if (split_joiner_) {
+    return joiner_
+        .run_method("forward", encoder_out, decoder_out,
+                    /*project_input*/ false)
+        .toTensor();
+  }
+
   return joiner_.run_method("forward", encoder_out, decoder_out).toTensor();
 }
 
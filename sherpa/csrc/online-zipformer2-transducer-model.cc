@@ -23,6 +23,12 @@ OnlineZipformer2TransducerModel::OnlineZipformer2TransducerModel(
   decoder_ = model_.attr("decoder").toModule();
   joiner_ = model_.attr("joiner").toModule();
 
+  split_joiner_ = JoinerAcceptsProjectedInput(joiner_);
+  if (split_joiner_) {
+    encoder_proj_ = joiner_.attr("encoder_proj").toModule();
+    decoder_proj_ = joiner_.attr("decoder_proj").toModule();
+  }
+
   auto conv = decoder_.attr("conv").toModule();
 
   context_size_ =
@@ -183,23 +189,34 @@ OnlineZipformer2TransducerModel::RunEncoder(
 
   auto next_states = tuple_ptr->elements()[2];
 
+  if (split_joiner_) {
+    encoder_out = encoder_proj_.run_method("forward", encoder_out).toTensor();
+  }
+
   return std::make_tuple(encoder_out, encoder_out_length, next_states);
 }
 
 torch::Tensor OnlineZipformer2TransducerModel::RunDecoder(
     const torch::Tensor &decoder_input) {
   InferenceMode no_grad;
-  return decoder_
-      .run_method("forward", decoder_input,
-                  /*need_pad*/ false)
-      .toTensor();
+  auto decoder_out = decoder_
+                         .run_method("forward", decoder_input,
+                                     /*need_pad*/ false)
+                         .toTensor();
+
+  if (split_joiner_) {
+    decoder_out = decoder_proj_.run_method("forward", decoder_out).toTensor();
+  }
+
+  return decoder_out;
 }
 
 torch::Tensor OnlineZipformer2TransducerModel::RunJoiner(
     const torch::Tensor &encoder_out, const torch::Tensor &decoder_out) {
   InferenceMode no_grad;
   return joiner_
-      .run_method("forward", encoder_out, decoder_out, /*project_input*/ true)
+      .run_method("forward", encoder_out, decoder_out,
+                  /*project_input*/ !split_joiner_)
       .toTensor();
 }
 
@@ -59,6 +59,15 @@ class OnlineZipformer2TransducerModel : public OnlineTransducerModel {
   torch::jit::Module decoder_;
   torch::jit::Module joiner_;
 
+  // true to project the encoder output in RunEncoder() and the decoder
+  // output in RunDecoder(), so that the joiner does not project its inputs
+  // again for every call. See JoinerAcceptsProjectedInput().
+  bool split_joiner_ = false;
+
+  // Valid only if split_joiner_ is true
+  torch::jit::Module encoder_proj_;
+  torch::jit::Module decoder_proj_;
+
   torch::Device device_{"cpu"};
 
   int32_t context_size_;
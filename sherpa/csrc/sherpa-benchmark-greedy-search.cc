@@ -0,0 +1,315 @@
+// sherpa/csrc/sherpa-benchmark-greedy-search.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include <algorithm>
+#include <chrono>  // NOLINT
+#include <cstdlib>
+#include <functional>
+#include <iostream>
+#include <memory>
+#include <string>
+#include <tuple>
+#include <utility>
+#include <vector>
+
+#include "kaldifeat/csrc/feature-fbank.h"
+#include "sherpa/cpp_api/feature-config.h"
+#include "sherpa/cpp_api/macros.h"
+#include "sherpa/cpp_api/parse-options.h"
+#include "sherpa/csrc/decoder-cache.h"
+#include "sherpa/csrc/fbank-features.h"
+#include "sherpa/csrc/frame-reducer.h"
+#include "sherpa/csrc/offline-conformer-transducer-model.h"
+#include "sherpa/csrc/offline-transducer-greedy-search-decoder.h"
+
+namespace sherpa {
+
+// It forwards everything to the given model and counts the calls of
+// the joiner.
+class CountingTransducerModel : public OfflineTransducerModel {
+ public:
+  explicit CountingTransducerModel(OfflineTransducerModel *model)
+      : model_(model) {}
+
+  std::pair<torch::Tensor, torch::Tensor> RunEncoder(
+      const torch::Tensor &features,
+      const torch::Tensor &features_length) override {
+    return model_->RunEncoder(features, features_length);
+  }
+
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    return model_->RunDecoder(decoder_input);
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    ++num_joiner_calls;
+    return model_->RunJoiner(encoder_out, decoder_out);
+  }
+
+  torch::Device Device() const override { return model_->Device(); }
+
+  int32_t ContextSize() const override { return model_->ContextSize(); }
+
+  int32_t SubsamplingFactor() const override {
+    return model_->SubsamplingFactor();
+  }
+
+  int64_t num_joiner_calls = 0;
+
+ private:
+  OfflineTransducerModel *model_;  // Not owned
+};
+
+static int32_t EditDistance(const std::vector<int32_t> &a,
+                            const std::vector<int32_t> &b) {
+  std::vector<int32_t> prev(b.size() + 1);
+  std::vector<int32_t> cur(b.size() + 1);
+  for (size_t j = 0; j <= b.size(); ++j) {
+    prev[j] = j;
+  }
+
+  for (size_t i = 1; i <= a.size(); ++i) {
+    cur[0] = i;
+    for (size_t j = 1; j <= b.size(); ++j) {
+      int32_t sub = prev[j - 1] + (a[i - 1] != b[j - 1]);
+      cur[j] = std::min({prev[j] + 1, cur[j - 1] + 1, sub});
+    }
+    std::swap(prev, cur);
+  }
+
+  return prev[b.size()];
+}
+
+// Run decode() num_iterations times after a warm up and print statistics.
+// It returns the result of the last run.
+static std::vector<OfflineTransducerDecoderResult> Benchmark(
+    const std::string &name,
+    std::function<std::vector<OfflineTransducerDecoderResult>()> decode,
+    int32_t num_iterations, int64_t num_frames,
+    CountingTransducerModel *model) {
+  // warm up
+  decode();
+
+  model->num_joiner_calls = 0;
+
+  const auto begin = std::chrono::steady_clock::now();
+  std::vector<OfflineTransducerDecoderResult> r;
+  for (int32_t i = 0; i != num_iterations; ++i) {
+    r = decode();
+  }
+  const auto end = std::chrono::steady_clock::now();
+
+  float elapsed_seconds =
+      std::chrono::duration_cast<std::chrono::microseconds>(end - begin)
+          .count() /
+      1e6;
+
+  int64_t num_calls = model->num_joiner_calls / num_iterations;
+  float seconds_per_iteration = elapsed_seconds / num_iterations;
+
+  int64_t num_tokens = 0;
+  for (const auto &res : r) {
+    num_tokens += res.tokens.size();
+  }
+
+  std::cout << name << "\n"
+            << "  frames: " << num_frames << ", tokens: " << num_tokens
+            << "\n"
+            << "  joiner calls per decode: " << num_calls << "\n"
+            << "  seconds per decode: " << seconds_per_iteration << "\n"
+            << "  joiner calls per second: "
+            << num_calls / seconds_per_iteration << "\n"
+            << "  frames per second: " << num_frames / seconds_per_iteration
+            << "\n";
+
+  return r;
+}
+
+}  // namespace sherpa
+
+int32_t main(int32_t argc, char *argv[]) {
+  const char *kUsageMessage = R"usage(
+This program compares the greedy search of an offline transducer model
+with and without --speculative-joiner. It runs the encoder once on the
+given files and then decodes the encoder output with both methods.
+
+If --frame-reducer-blank-threshold is positive and the model has a CTC
+head, it also decodes the encoder output after dropping blank frames and
+reports the token error rate against the search over all frames.
+
+If --decoder-cache-capacity is positive, decoder outputs are cached and
+the number of cache hits and misses is printed at the end.
+
+Usage:
+
+sherpa-benchmark-greedy-search \
+  --nn-model=/path/to/cpu_jit.pt \
+  --num-iterations=10 \
+  --use-gpu=false \
+  --frame-reducer-blank-threshold=0.9 \
+  foo.wav bar.wav
+)usage";
+
+  std::string nn_model;
+  bool use_gpu = false;
+  int32_t num_threads = 1;
+  int32_t num_iterations = 10;
+  float frame_reducer_blank_threshold = 0;
+  int32_t decoder_cache_capacity = 0;
+
+  sherpa::ParseOptions po(kUsageMessage);
+  sherpa::FeatureConfig feat_config;
+  feat_config.Register(&po);
+  po.Register("nn-model", &nn_model, "Path to the torchscript model");
+  po.Register("use-gpu", &use_gpu, "true to use GPU for computation");
+  po.Register("num-threads", &num_threads, "Number of threads for PyTorch");
+  po.Register("num-iterations", &num_iterations,
+              "Number of times to decode the encoder output with each "
+              "method");
+  po.Register("frame-reducer-blank-threshold",
+              &frame_reducer_blank_threshold,
+              "If positive, also benchmark the search with frame reduction "
+              "using this threshold. It requires a model with a CTC head");
+  po.Register("decoder-cache-capacity", &decoder_cache_capacity,
+              "If positive, cache this number of decoder outputs");
+  po.Read(argc, argv);
+
+  if (nn_model.empty() || po.NumArgs() < 1) {
+    po.PrintUsage();
+    exit(EXIT_FAILURE);
+  }
+
+  torch::set_num_threads(num_threads);
+  torch::set_num_interop_threads(num_threads);
+
+  sherpa::InferenceMode no_grad;
+
+  torch::Device device(torch::kCPU);
+  if (use_gpu) {
+    device = torch::Device("cuda:0");
+  }
+
+  sherpa::OfflineConformerTransducerModel model(nn_model, device);
+  sherpa::CountingTransducerModel counting_model(&model);
+  if (decoder_cache_capacity > 0) {
+    counting_model.SetDecoderCache(
+        std::make_shared<sherpa::DecoderCache>(decoder_cache_capacity));
+  }
+
+  kaldifeat::Fbank fbank(feat_config.fbank_opts);
+  float sample_rate = feat_config.fbank_opts.frame_opts.samp_freq;
+
+  std::vector<torch::Tensor> waves;
+  for (int32_t i = 1; i <= po.NumArgs(); ++i) {
+    waves.push_back(sherpa::ReadWave(po.GetArg(i), sample_rate).first);
+  }
+
+  std::vector<int64_t> num_frames;
+  auto features_vec = sherpa::ComputeFeatures(fbank, waves, &num_frames);
+
+  auto features = torch::nn::utils::rnn::pad_sequence(
+                      features_vec, /*batch_first*/ true,
+                      /*padding_value*/ -23.025850929940457f)
+                      .to(device);
+  auto features_length = torch::tensor(num_frames).to(device);
+
+  if (frame_reducer_blank_threshold > 0 && !model.HasCtcOutput()) {
+    std::cerr << "The model does not have a CTC head. "
+              << "Ignore --frame-reducer-blank-threshold\n";
+    frame_reducer_blank_threshold = 0;
+  }
+
+  torch::Tensor encoder_out;
+  torch::Tensor encoder_out_length;
+  torch::Tensor ctc_output;
+  if (frame_reducer_blank_threshold > 0) {
+    std::tie(encoder_out, encoder_out_length, ctc_output) =
+        model.RunEncoderWithCtcOutput(features, features_length);
+  } else {
+    std::tie(encoder_out, encoder_out_length) =
+        model.RunEncoder(features, features_length);
+  }
+  encoder_out_length = encoder_out_length.cpu();
+
+  int64_t total_frames = encoder_out_length.sum().item<int64_t>();
+
+  std::vector<std::vector<sherpa::OfflineTransducerDecoderResult>> results;
+
+  for (bool speculative_joiner : {false, true}) {
+    sherpa::OfflineTransducerGreedySearchDecoder decoder(&counting_model,
+                                                         speculative_joiner);
+
+    std::string name = speculative_joiner ? "speculative_joiner: true"
+                                          : "speculative_joiner: false";
+
+    results.push_back(sherpa::Benchmark(
+        name,
+        [&]() { return decoder.Decode(encoder_out, encoder_out_length); },
+        num_iterations, total_frames, &counting_model));
+  }
+
+  if (frame_reducer_blank_threshold > 0) {
+    sherpa::OfflineTransducerGreedySearchDecoder decoder(&counting_model);
+
+    int64_t num_reduced_frames = 0;
+    auto decode = [&]() {
+      torch::Tensor out;
+      torch::Tensor out_length;
+      torch::Tensor frame_index;
+      std::tie(out, out_length, frame_index) =
+          sherpa::ReduceFrames(encoder_out, encoder_out_length, ctc_output,
+                               frame_reducer_blank_threshold);
+      num_reduced_frames = out_length.sum().item<int64_t>();
+
+      auto r = decoder.Decode(out, out_length);
+
+      auto frame_index_accessor = frame_index.accessor<int64_t, 2>();
+      for (size_t i = 0; i != r.size(); ++i) {
+        for (auto &t : r[i].timestamps) {
+          t = frame_index_accessor[i][t];
+        }
+      }
+      return r;
+    };
+
+    std::string name = "frame_reducer_blank_threshold: " +
+                       std::to_string(frame_reducer_blank_threshold);
+    auto r = sherpa::Benchmark(name, decode, num_iterations, total_frames,
+                               &counting_model);
+
+    int64_t num_errors = 0;
+    int64_t num_tokens = 0;
+    for (size_t i = 0; i != r.size(); ++i) {
+      num_errors += sherpa::EditDistance(results[0][i].tokens, r[i].tokens);
+      num_tokens += results[0][i].tokens.size();
+    }
+
+    std::cout << "  frames after reduction: " << num_reduced_frames << " ("
+              << 100. * num_reduced_frames / total_frames << "%)\n"
+              << "  token error rate against all frames: "
+              << 100. * num_errors / std::max<int64_t>(num_tokens, 1)
+              << "%\n";
+  }
+
+  int32_t num_mismatches = 0;
+  for (size_t i = 0; i != results[0].size(); ++i) {
+    if (results[0][i].tokens != results[1][i].tokens ||
+        results[0][i].timestamps != results[1][i].timestamps) {
+      std::cout << "Result of " << po.GetArg(i + 1) << " differs\n";
+      ++num_mismatches;
+    }
+  }
+
+  if (num_mismatches == 0) {
+    std::cout << "Results are identical\n";
+  }
+
+  if (auto cache = counting_model.GetDecoderCache()) {
+    std::cout << "decoder cache hits: " << cache->NumHits()
+              << ", misses: " << cache->NumMisses() << "\n";
+  }
+
+  return num_mismatches == 0 ? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -3,6 +3,9 @@
 // Copyright (c)  2025  Xiaomi Corporation
 #include "sherpa/csrc/silero-vad-model.h"
 
+#include <mutex>  // NOLINT
+#include <vector>
+
 #include "sherpa/csrc/macros.h"
 namespace sherpa {
 
@@ -38,6 +41,8 @@ class SileroVadModel::Impl {
   torch::Device Device() const { return device_; }
 
   torch::Tensor Run(torch::Tensor samples) {
+    std::lock_guard<std::mutex> lock(mutex_);
+
     torch::Tensor sample_rate = torch::tensor(
         {config_.sample_rate}, torch::dtype(torch::kInt).device(device_));
 
@@ -47,7 +52,40 @@ class SileroVadModel::Impl {
         .toTensor();
   }
 
+  std::vector<torch::Tensor> GetInitStates() {
+    std::lock_guard<std::mutex> lock(mutex_);
+
+    model_.run_method("reset_states", 1);
+    return {model_.attr("_h").toTensor().clone(),
+            model_.attr("_c").toTensor().clone()};
+  }
+
+  torch::Tensor RunWindow(torch::Tensor samples,
+                          std::vector<torch::Tensor> *states) {
+    std::lock_guard<std::mutex> lock(mutex_);
+
+    // forward() of silero_vad v4 keeps the LSTM states in the attributes
+    // of the model and resets them if the batch size or the sample rate
+    // is changed. We set them so that the model continues from the given
+    // states.
+    int64_t batch_size = samples.size(0);
+    model_.setattr("_last_batch_size", batch_size);
+    model_.setattr("_last_sr", static_cast<int64_t>(config_.sample_rate));
+    model_.setattr("_h", (*states)[0]);
+    model_.setattr("_c", (*states)[1]);
+
+    torch::Tensor prob =
+        model_.forward({samples, config_.sample_rate}).toTensor();
+
+    (*states)[0] = model_.attr("_h").toTensor();
+    (*states)[1] = model_.attr("_c").toTensor();
+
+    return prob.reshape({-1});
+  }
+
  private:
+  // The model is stateful, so we cannot run it in multiple threads
+  std::mutex mutex_;
   torch::jit::Module model_;
   torch::Device device_{torch::kCPU};
   VadModelConfig config_;
@@ -64,4 +102,13 @@ torch::Tensor SileroVadModel::Run(torch::Tensor samples) const {
   return impl_->Run(samples);
 }
 
+std::vector<torch::Tensor> SileroVadModel::GetInitStates() const {
+  return impl_->GetInitStates();
+}
+
+torch::Tensor SileroVadModel::RunWindow(
+    torch::Tensor samples, std::vector<torch::Tensor> *states) const {
+  return impl_->RunWindow(samples, states);
+}
+
 }  // namespace sherpa
@@ -5,6 +5,7 @@
 #define SHERPA_CSRC_SILERO_VAD_MODEL_H_
 
 #include <memory>
+#include <vector>
 
 #include "sherpa/csrc/vad-model-config.h"
 #include "torch/script.h"
@@ -25,6 +26,25 @@ class SileroVadModel {
    */
   torch::Tensor Run(torch::Tensor samples) const;
 
+  /** Return the initial LSTM states of a single stream.
+   *
+   * @returns Return a list of 2 tensors, h and c, each of shape
+   *          (2, 1, 64).
+   */
+  std::vector<torch::Tensor> GetInitStates() const;
+
+  /** Run the model on the next window of a batch of streams.
+   *
+   * @param samples A 2-D tensor of shape (batch_size, 512)
+   * @param states  The stacked LSTM states of the streams. Each tensor
+   *                is of shape (2, batch_size, 64). On return, it contains
+   *                the next states.
+   * @returns Return a 1-D tensor of shape (batch_size,) containing the
+   *          speech probability of each stream.
+   */
+  torch::Tensor RunWindow(torch::Tensor samples,
+                          std::vector<torch::Tensor> *states) const;
+
  private:
   class Impl;
   std::unique_ptr<Impl> impl_;
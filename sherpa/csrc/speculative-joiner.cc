@@ -0,0 +1,40 @@
+// sherpa/csrc/speculative-joiner.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/speculative-joiner.h"
+
+#include <limits>
+#include <tuple>
+
+namespace sherpa {
+
+static double Epsilon(torch::ScalarType dtype) {
+  switch (dtype) {
+    case torch::kHalf:
+      return 9.765625e-4;  // 2^-10
+    case torch::kBFloat16:
+      return 7.8125e-3;  // 2^-7
+    case torch::kFloat:
+      return std::numeric_limits<float>::epsilon();
+    default:
+      return std::numeric_limits<double>::epsilon();
+  }
+}
+
+torch::Tensor IsArgmaxClear(torch::Tensor logits) {
+  TORCH_CHECK(logits.dim() == 2, logits.dim(), " vs ", 2);
+
+  double eps = Epsilon(logits.scalar_type());
+
+  // Compute the margins in double so that they are not rounded again
+  auto top2 = std::get<0>(logits.topk(2, /*dim*/ -1)).to(torch::kDouble);
+  auto top1 = top2.select(1, 0);
+  auto margin = top1 - top2.select(1, 1);
+
+  auto tolerance = top1.abs().clamp_min(1) * (kJoinerRoundingUlps * eps);
+
+  return (margin > tolerance).cpu();
+}
+
+}  // namespace sherpa
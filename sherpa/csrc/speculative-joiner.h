@@ -0,0 +1,35 @@
+// sherpa/csrc/speculative-joiner.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_SPECULATIVE_JOINER_H_
+#define SHERPA_CSRC_SPECULATIVE_JOINER_H_
+
+#include <cstdint>
+
+#include "torch/script.h"
+
+namespace sherpa {
+
+// Max difference, in units of the machine epsilon of the dtype of the
+// logits, between the output of the joiner for one frame and for many
+// frames in one call. The two calls may use different matmul kernels and
+// hence sum in a different order.
+constexpr int32_t kJoinerRoundingUlps = 256;
+
+/** Check which rows of the joiner output have an argmax that does not
+ * depend on the rounding errors of the joiner.
+ *
+ * @param logits A 2-D tensor of shape (num_rows, vocab_size).
+ *
+ * @return Return a 1-D bool tensor of shape (num_rows,) on CPU. Entry i is
+ *         true if the largest logit of row i exceeds the second largest one
+ *         by more than kJoinerRoundingUlps epsilons of the largest one.
+ *         It is false for ties and near-ties, whose argmax has to be
+ *         computed with the same joiner call as in frame-by-frame greedy
+ *         search.
+ */
+torch::Tensor IsArgmaxClear(torch::Tensor logits);
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_SPECULATIVE_JOINER_H_
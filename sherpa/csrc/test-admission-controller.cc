@@ -0,0 +1,91 @@
+// sherpa/csrc/test-admission-controller.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/admission-controller.h"
+
+#include <chrono>  // NOLINT
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+using Clock = AdmissionController::Clock;
+using std::chrono::milliseconds;
+
+TEST(AdmissionController, Overloaded) {
+  AdmissionControllerConfig config;
+  config.max_queue_delay_ms = 100;
+  config.smoothing = 1;
+
+  AdmissionController controller(config, 2);
+  auto t = Clock::now();
+
+  // Both threads are busy for the whole interval and requests wait
+  // 300 ms on average
+  controller.BeginBatch({200, 400}, t);
+  controller.BeginBatch({300}, t);
+  controller.Update(0, t + milliseconds(100));
+
+  EXPECT_NEAR(controller.Utilization(), 1, 1e-3);
+  EXPECT_NEAR(controller.QueueDelayMs(), 300, 1e-3);
+  EXPECT_TRUE(controller.Overloaded());
+
+  int32_t retry_after = 0;
+  EXPECT_FALSE(controller.Admit(&retry_after));
+  EXPECT_EQ(retry_after, 3);
+}
+
+TEST(AdmissionController, NotBusy) {
+  AdmissionControllerConfig config;
+  config.max_queue_delay_ms = 100;
+  config.smoothing = 1;
+
+  AdmissionController controller(config, 2);
+  auto t = Clock::now();
+
+  // Only one of the two threads is busy, so the delay is not caused by
+  // the load of the server
+  controller.BeginBatch({300}, t);
+  controller.EndBatch(t + milliseconds(100));
+  controller.Update(0, t + milliseconds(100));
+
+  EXPECT_NEAR(controller.Utilization(), 0.5, 1e-3);
+  EXPECT_FALSE(controller.Overloaded());
+
+  int32_t retry_after = 0;
+  EXPECT_TRUE(controller.Admit(&retry_after));
+}
+
+TEST(AdmissionController, OldestWait) {
+  AdmissionControllerConfig config;
+  config.max_queue_delay_ms = 100;
+  config.smoothing = 1;
+
+  AdmissionController controller(config, 1);
+  auto t = Clock::now();
+
+  // No batch is finished in the interval, but a request has been waiting
+  // for a long time
+  controller.BeginBatch({}, t);
+  controller.Update(500, t + milliseconds(100));
+
+  EXPECT_NEAR(controller.QueueDelayMs(), 500, 1e-3);
+  EXPECT_TRUE(controller.Overloaded());
+}
+
+TEST(AdmissionController, Disabled) {
+  AdmissionControllerConfig config;
+  config.smoothing = 1;
+
+  AdmissionController controller(config, 1);
+  auto t = Clock::now();
+
+  controller.BeginBatch({1000}, t);
+  controller.Update(1000, t + milliseconds(100));
+
+  int32_t retry_after = 0;
+  EXPECT_TRUE(controller.Admit(&retry_after));
+}
+
+}  // namespace sherpa
@@ -0,0 +1,62 @@
+// sherpa/csrc/test-audio-format.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/audio-format.h"
+
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+TEST(AudioFormat, FromJson) {
+  AudioFormat f;
+  EXPECT_TRUE(f.FromJson(R"({"sample_rate": 8000, "sample_format": "s16le"})"));
+  EXPECT_EQ(f.sample_rate, 8000);
+  EXPECT_EQ(f.sample_format, SampleFormat::kS16LE);
+  EXPECT_EQ(f.BytesPerSample(), 2);
+
+  // Missing fields are not changed
+  EXPECT_TRUE(f.FromJson(R"({"sample_rate": 16000})"));
+  EXPECT_EQ(f.sample_rate, 16000);
+  EXPECT_EQ(f.sample_format, SampleFormat::kS16LE);
+
+  // Invalid strings do not change it
+  EXPECT_FALSE(f.FromJson(R"({"sample_rate": 8000, "sample_format": "u8"})"));
+  EXPECT_FALSE(f.FromJson(R"({"sample_rate": -1})"));
+  EXPECT_FALSE(f.FromJson(R"({"sample_rate": "8000"})"));
+  EXPECT_FALSE(f.FromJson("Done"));
+  EXPECT_EQ(f.sample_rate, 16000);
+  EXPECT_EQ(f.sample_format, SampleFormat::kS16LE);
+}
+
+TEST(AudioFormat, ConvertS16LE) {
+  std::vector<int16_t> samples = {0, 16384, -32768, 32767};
+  AudioFormat f(16000, SampleFormat::kS16LE);
+
+  // The last byte is not a complete sample and is ignored
+  torch::Tensor t = f.Convert(samples.data(), samples.size() * 2 + 1);
+  ASSERT_EQ(t.numel(), 4);
+
+  const float *p = t.data_ptr<float>();
+  EXPECT_EQ(p[0], 0);
+  EXPECT_EQ(p[1], 0.5);
+  EXPECT_EQ(p[2], -1);
+  EXPECT_NEAR(p[3], 1, 1e-4);
+}
+
+TEST(AudioFormat, ConvertF32LE) {
+  std::vector<float> samples = {0.25, -0.5, 1};
+  AudioFormat f;
+
+  torch::Tensor t = f.Convert(samples.data(), samples.size() * 4);
+  ASSERT_EQ(t.numel(), 3);
+
+  const float *p = t.data_ptr<float>();
+  for (int32_t i = 0; i != 3; ++i) {
+    EXPECT_EQ(p[i], samples[i]);
+  }
+}
+
+}  // namespace sherpa
@@ -0,0 +1,55 @@
+// sherpa/csrc/test-context-graph-cache.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/context-graph-cache.h"
+
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+TEST(ContextGraphCache, Get) {
+  ContextGraphCache cache(2);
+
+  std::vector<std::vector<int32_t>> a = {{1, 2}, {3}};
+  std::vector<std::vector<int32_t>> b = {{1}, {2, 3}};
+
+  auto g1 = cache.Get(a, 1.5);
+  auto g2 = cache.Get(a, 1.5);
+  EXPECT_EQ(g1, g2);
+  EXPECT_EQ(cache.NumHits(), 1);
+  EXPECT_EQ(cache.NumMisses(), 1);
+
+  // Same tokens in a different grouping
+  auto g3 = cache.Get(b, 1.5);
+  EXPECT_NE(g3, g1);
+
+  // A different score
+  auto g4 = cache.Get(a, 2.0);
+  EXPECT_NE(g4, g1);
+
+  EXPECT_EQ(cache.Size(), 2);
+  EXPECT_EQ(cache.NumHits(), 1);
+  EXPECT_EQ(cache.NumMisses(), 3);
+
+  // (a, 1.5) has been evicted, but the stream holding it keeps it alive
+  auto g5 = cache.Get(a, 1.5);
+  EXPECT_NE(g5, g1);
+  EXPECT_NE(g1->Root(), nullptr);
+
+  auto res = g5->ForwardOneStep(g5->Root(), 1);
+  EXPECT_EQ(res.first, 1.5);
+}
+
+TEST(ContextGraphCache, Hash) {
+  std::vector<std::vector<int32_t>> a = {{1, 2}, {3}};
+  std::vector<std::vector<int32_t>> b = {{1}, {2, 3}};
+
+  EXPECT_EQ(ContextGraphCache::Hash(a, 1), ContextGraphCache::Hash(a, 1));
+  EXPECT_NE(ContextGraphCache::Hash(a, 1), ContextGraphCache::Hash(b, 1));
+  EXPECT_NE(ContextGraphCache::Hash(a, 1), ContextGraphCache::Hash(a, 2));
+}
+
+}  // namespace sherpa
@@ -0,0 +1,92 @@
+// sherpa/csrc/test-decoder-cache.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/decoder-cache.h"
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+// A decoder whose output for context (a, b) is [[a, b, a * 10 + b]].
+// It records the number of rows it has been run on.
+class DummyDecoder {
+ public:
+  torch::Tensor operator()(const torch::Tensor &decoder_input) {
+    num_rows_ += decoder_input.size(0);
+    auto x = decoder_input.to(torch::kFloat);
+    auto y = x.select(1, 0) * 10 + x.select(1, 1);
+    return torch::cat({x, y.unsqueeze(1)}, 1).unsqueeze(1);
+  }
+
+  int32_t NumRows() const { return num_rows_; }
+
+ private:
+  int32_t num_rows_ = 0;
+};
+
+TEST(DecoderCache, Run) {
+  DecoderCache cache(10);
+  DummyDecoder decoder;
+  DecoderCache::RunDecoderFunc run = [&decoder](const torch::Tensor &x) {
+    return decoder(x);
+  };
+
+  auto input = torch::tensor({1, 2, 3, 4, 1, 2}, torch::kLong).reshape({3, 2});
+  auto expected = decoder(input);
+  int32_t num_rows = decoder.NumRows();
+
+  // (1, 2) appears twice but is computed once
+  auto out = cache.Run(input, run);
+  EXPECT_TRUE(torch::equal(out, expected));
+  EXPECT_EQ(decoder.NumRows() - num_rows, 2);
+  EXPECT_EQ(cache.Size(), 2);
+  EXPECT_EQ(cache.NumHits(), 0);
+  EXPECT_EQ(cache.NumMisses(), 3);
+
+  input = torch::tensor({3, 4, 5, 6, 1, 2}, torch::kLong).reshape({3, 2});
+  expected = decoder(input);
+  num_rows = decoder.NumRows();
+
+  out = cache.Run(input, run);
+  EXPECT_TRUE(torch::equal(out, expected));
+  EXPECT_EQ(decoder.NumRows() - num_rows, 1);
+  EXPECT_EQ(cache.Size(), 3);
+  EXPECT_EQ(cache.NumHits(), 2);
+  EXPECT_EQ(cache.NumMisses(), 4);
+}
+
+TEST(DecoderCache, EvictLeastRecentlyUsed) {
+  DecoderCache cache(2);
+  DummyDecoder decoder;
+  DecoderCache::RunDecoderFunc run = [&decoder](const torch::Tensor &x) {
+    return decoder(x);
+  };
+
+  auto a = torch::tensor({{1, 2}}, torch::kLong);
+  auto b = torch::tensor({{3, 4}}, torch::kLong);
+  auto c = torch::tensor({{5, 6}}, torch::kLong);
+
+  cache.Run(a, run);
+  cache.Run(b, run);
+
+  // a becomes the most recently used one, so b is evicted by c
+  cache.Run(a, run);
+  cache.Run(c, run);
+  EXPECT_EQ(cache.Size(), 2);
+
+  int32_t num_rows = decoder.NumRows();
+  cache.Run(a, run);
+  EXPECT_EQ(decoder.NumRows(), num_rows);
+
+  cache.Run(b, run);
+  EXPECT_EQ(decoder.NumRows(), num_rows + 1);
+
+  EXPECT_EQ(cache.NumHits(), 2);
+  EXPECT_EQ(cache.NumMisses(), 4);
+
+  cache.Clear();
+  EXPECT_EQ(cache.Size(), 0);
+}
+
+}  // namespace sherpa
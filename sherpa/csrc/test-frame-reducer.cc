@@ -0,0 +1,82 @@
+// sherpa/csrc/test-frame-reducer.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/frame-reducer.h"
+
+#include <tuple>
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+// Return log-probs of shape (N, T, 2), where the blank probability of
+// frame t of utterance n is blank_prob[n][t]
+static torch::Tensor MakeCtcOutput(
+    const std::vector<std::vector<float>> &blank_prob) {
+  std::vector<torch::Tensor> v;
+  for (const auto &p : blank_prob) {
+    auto b = torch::tensor(p, torch::kFloat);
+    v.push_back(torch::stack({b, 1 - b}, 1).log());
+  }
+  return torch::stack(v);
+}
+
+TEST(ReduceFrames, Basic) {
+  // encoder_out[n][t] = [5 * n + t]
+  auto encoder_out = torch::arange(10, torch::kFloat).reshape({2, 5, 1});
+  auto encoder_out_length = torch::tensor({5, 3}, torch::kLong);
+
+  auto ctc_output = MakeCtcOutput({{0.95, 0.2, 0.99, 0.5, 0.1},
+                                   {0.3, 0.95, 0.1, 0.2, 0.2}});
+
+  torch::Tensor out;
+  torch::Tensor out_length;
+  torch::Tensor frame_index;
+  std::tie(out, out_length, frame_index) =
+      ReduceFrames(encoder_out, encoder_out_length, ctc_output, 0.9);
+
+  EXPECT_EQ(out_length[0].item<int64_t>(), 3);
+  EXPECT_EQ(out_length[1].item<int64_t>(), 2);
+
+  ASSERT_EQ(out.sizes(), torch::IntArrayRef({2, 3, 1}));
+  ASSERT_EQ(frame_index.sizes(), torch::IntArrayRef({2, 3}));
+
+  auto acc = frame_index.accessor<int64_t, 2>();
+  // Frames 1, 3, 4 of the first utterance are kept
+  EXPECT_EQ(acc[0][0], 1);
+  EXPECT_EQ(acc[0][1], 3);
+  EXPECT_EQ(acc[0][2], 4);
+
+  // Frames 0 and 2 of the second utterance are kept. Frames 3 and 4 are
+  // padding and are dropped though their blank probabilities are small.
+  EXPECT_EQ(acc[1][0], 0);
+  EXPECT_EQ(acc[1][1], 2);
+
+  for (int32_t n = 0; n != 2; ++n) {
+    for (int32_t t = 0; t != out_length[n].item<int64_t>(); ++t) {
+      EXPECT_EQ(out[n][t][0].item<float>(),
+                encoder_out[n][acc[n][t]][0].item<float>());
+    }
+  }
+}
+
+TEST(ReduceFrames, AllBlank) {
+  auto encoder_out = torch::rand({1, 4, 3});
+  auto encoder_out_length = torch::tensor({4}, torch::kLong);
+  auto ctc_output = MakeCtcOutput({{0.99, 0.99, 0.99, 0.99}});
+
+  torch::Tensor out;
+  torch::Tensor out_length;
+  torch::Tensor frame_index;
+  std::tie(out, out_length, frame_index) =
+      ReduceFrames(encoder_out, encoder_out_length, ctc_output, 0.9);
+
+  // The first frame is kept
+  EXPECT_EQ(out_length.item<int64_t>(), 1);
+  EXPECT_EQ(frame_index[0][0].item<int64_t>(), 0);
+  EXPECT_TRUE(out[0][0].equal(encoder_out[0][0]));
+}
+
+}  // namespace sherpa
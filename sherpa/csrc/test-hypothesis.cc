@@ -16,6 +16,9 @@
  * limitations under the License.
  */
 
+#include <cmath>
+#include <vector>
+
 #include "gtest/gtest.h"
 #include "sherpa/csrc/hypothesis.h"
 
@@ -23,34 +26,158 @@ namespace sherpa {
 
 TEST(Hypothesis, DefaultConstructor) {
   Hypothesis hyp;
-  EXPECT_TRUE(hyp.ys.empty());
+  EXPECT_EQ(hyp.num_tokens, 0);
+  EXPECT_EQ(hyp.last_token, -1);
   EXPECT_EQ(hyp.log_prob, 0);
+  EXPECT_EQ(hyp.decoder_out_index, -1);
 }
 
-TEST(Hypothesis, Constructor) {
-  Hypothesis hyp({1, 2, 3}, 0.5);
-  EXPECT_EQ(hyp.ys, (std::vector<int32_t>{1, 2, 3}));
+TEST(Hypotheses, Constructor) {
+  Hypotheses hyps({1, 2, 3}, 0.5);
+  EXPECT_EQ(hyps.Size(), 1);
+
+  Hypothesis hyp = hyps.GetMostProbable(false);
+  EXPECT_EQ(hyp.num_tokens, 3);
   EXPECT_EQ(hyp.log_prob, 0.5);
+  EXPECT_EQ(hyps.GetTokens(hyp), (std::vector<int32_t>{1, 2, 3}));
+  EXPECT_EQ(hyps.GetTimestamps(hyp), (std::vector<int32_t>{-1, -1, -1}));
 }
 
-TEST(Hypothesis, Key) {
-  Hypothesis hyp;
-  hyp.ys = {1, 2, 3};
-  EXPECT_EQ(hyp.Key(), "1-2-3");
+TEST(Hypotheses, Extend) {
+  Hypotheses hyps({-1, 0}, 0);
+  Hypothesis hyp = hyps.GetMostProbable(false);
+
+  Hypothesis a = hyps.Extend(hyp, 10, 3);
+  Hypothesis b = hyps.Extend(a, 20, 5);
+  Hypothesis c = hyps.Extend(a, 30, 6);
+
+  // b and c share the prefix [-1, 0, 10]
+  EXPECT_EQ(hyps.GetTokenStore()->Size(), 5);
+
+  EXPECT_EQ(hyps.GetTokens(b), (std::vector<int32_t>{-1, 0, 10, 20}));
+  EXPECT_EQ(hyps.GetTimestamps(b), (std::vector<int32_t>{-1, -1, 3, 5}));
+  EXPECT_EQ(hyps.GetTokens(c), (std::vector<int32_t>{-1, 0, 10, 30}));
+  EXPECT_EQ(hyps.GetTimestamps(c), (std::vector<int32_t>{-1, -1, 3, 6}));
+
+  int64_t context[2];
+  hyps.GetLastTokens(c, 2, context);
+  EXPECT_EQ(context[0], 10);
+  EXPECT_EQ(context[1], 30);
+}
+
+TEST(Hypotheses, ExtendInvalidatesDecoderOut) {
+  Hypotheses hyps({-1, 0}, 0);
+  Hypothesis hyp = hyps.GetMostProbable(false);
+  hyp.decoder_out_index = 3;
+
+  // A blank keeps the tokens, so the copy can reuse the decoder output
+  Hypothesis blank = hyp;
+  EXPECT_EQ(blank.decoder_out_index, 3);
+
+  Hypothesis a = hyps.Extend(hyp, 10, 2);
+  EXPECT_EQ(a.decoder_out_index, -1);
+}
+
+TEST(Hypotheses, AddMergesIdenticalTokenSequences) {
+  Hypotheses hyps({-1, 0}, 0);
+  Hypothesis hyp = hyps.GetMostProbable(false);
+
+  Hypotheses next(hyps.GetTokenStore());
+  Hypothesis a = next.Extend(hyp, 10, 1);
+  a.log_prob = std::log(0.25);
+
+  // The same token sequence decoded at a different frame
+  Hypothesis b = next.Extend(hyp, 10, 2);
+  b.log_prob = std::log(0.5);
+
+  Hypothesis c = next.Extend(hyp, 11, 2);
+
+  EXPECT_EQ(a.hash, b.hash);
+  EXPECT_NE(a.hash, c.hash);
+
+  next.Add(a);
+  next.Add(b);
+  next.Add(c);
+  EXPECT_EQ(next.Size(), 2);
+
+  next.Remove(c);
+  EXPECT_EQ(next.Size(), 1);
+  EXPECT_NEAR(next.GetMostProbable(false).log_prob, std::log(0.75), 1e-6);
 }
 
-TEST(Hypotheses, ConstructorFromVector) {
-  std::vector<Hypothesis> hyp_vec;
-  hyp_vec.emplace_back(Hypothesis({1, 2, 3}, -1.5));
-  hyp_vec.emplace_back(Hypothesis({30}, -2.5));
+TEST(Hypotheses, AddKeepsDifferentTokenSequencesWithTheSameHash) {
+  Hypotheses hyps({-1, 0}, 0);
+  Hypothesis hyp = hyps.GetMostProbable(false);
+
+  Hypotheses next(hyps.GetTokenStore());
+  Hypothesis a = next.Extend(hyp, 10, 1);
+  a.log_prob = std::log(0.25);
+
+  Hypothesis b = next.Extend(hyp, 11, 1);
+  b.log_prob = std::log(0.5);
+
+  // Force a hash collision
+  b.hash = a.hash;
+  EXPECT_FALSE(next.SameTokens(a, b));
+
+  next.Add(a);
+  next.Add(b);
+  EXPECT_EQ(next.Size(), 2);
+
+  Hypothesis best = next.GetMostProbable(false);
+  EXPECT_EQ(best.log_prob, std::log(0.5));
+  EXPECT_EQ(next.GetTokens(best), (std::vector<int32_t>{-1, 0, 11}));
+
+  // The same tokens as a are still merged into a
+  Hypothesis c = next.Extend(hyp, 10, 2);
+  c.log_prob = std::log(0.25);
+  EXPECT_TRUE(next.SameTokens(a, c));
+  next.Add(c);
+  EXPECT_EQ(next.Size(), 2);
+
+  next.Remove(b);
+  EXPECT_EQ(next.Size(), 1);
+  best = next.GetMostProbable(false);
+  EXPECT_NEAR(best.log_prob, std::log(0.5), 1e-6);
+  EXPECT_EQ(next.GetTokens(best), (std::vector<int32_t>{-1, 0, 10}));
+}
+
+TEST(Hypotheses, Compact) {
+  Hypotheses hyps({-1, 0}, 0);
+  Hypothesis hyp = hyps.GetMostProbable(false);
+
+  std::vector<int32_t> expected_tokens = {-1, 0};
+  std::vector<int32_t> expected_timestamps = {-1, -1};
+
+  Hypotheses cur = hyps;
+  for (int32_t t = 0; t != 3000; ++t) {
+    Hypotheses next(cur.GetTokenStore());
+
+    // A hyp that is pruned, i.e., not added to `next`
+    next.Extend(hyp, 1000 + t, t);
+
+    hyp = next.Extend(hyp, t % 500, t);
+    expected_tokens.push_back(t % 500);
+    expected_timestamps.push_back(t);
+
+    next.Add(hyp);
+    next.MaybeCompact();
+
+    // Compaction changes the index of the last token of hyp
+    hyp = next.GetMostProbable(false);
+    cur = std::move(next);
+  }
 
-  EXPECT_EQ(hyp_vec[0].ys.size(), 3);
-  EXPECT_EQ(hyp_vec[1].ys.size(), 1);
+  // Tokens of pruned hyps are removed
+  // Without compaction, it would be 2 + 2 * 3000
+  EXPECT_LT(cur.GetTokenStore()->Size(), 5000);
 
-  Hypotheses hyps(std::move(hyp_vec));
-  EXPECT_EQ(hyps.Size(), 2);
+  EXPECT_EQ(cur.GetTokens(hyp), expected_tokens);
+  EXPECT_EQ(cur.GetTimestamps(hyp), expected_timestamps);
 
-  EXPECT_EQ(hyp_vec.size(), 0);
+  // The original object is not affected by compaction
+  EXPECT_EQ(hyps.GetTokens(hyps.GetMostProbable(false)),
+            (std::vector<int32_t>{-1, 0}));
 }
 
 }  // namespace sherpa
@@ -0,0 +1,87 @@
+// sherpa/csrc/test-length-bucket-queue.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/length-bucket-queue.h"
+
+#include <string>
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+TEST(LengthBucketQueue, ItemsOfSimilarLengthsAreBatched) {
+  LengthBucketQueueConfig config;
+  config.bucket_boundaries = "100,1000";
+  config.max_frames_per_batch = 10000;
+  config.max_wait_ms = -1;  // wait until a bucket is full
+
+  LengthBucketQueue<std::string> q(config);
+  q.Push("a", 50);
+  q.Push("b", 3000);
+  q.Push("c", 80);
+  q.Push("d", 500);
+  EXPECT_EQ(q.Size(), 4);
+
+  // No bucket is full
+  EXPECT_TRUE(q.Pop().empty());
+  EXPECT_LT(q.TimeToNextDeadlineMs(), 0);
+
+  // 3000 * 3 < 10000, but the bucket has no upper bound
+  q.Push("e", 2000);
+  EXPECT_TRUE(q.Pop().empty());
+
+  // 3000 * 4 > 10000
+  q.Push("f", 1500);
+
+  std::vector<int32_t> lengths;
+  EXPECT_EQ(q.Pop(false, &lengths),
+            (std::vector<std::string>{"b", "e", "f"}));
+  EXPECT_EQ(lengths, (std::vector<int32_t>{3000, 2000, 1500}));
+
+  // The oldest item is in the first bucket
+  EXPECT_EQ(q.Pop(true), (std::vector<std::string>{"a", "c"}));
+  EXPECT_EQ(q.Pop(true), (std::vector<std::string>{"d"}));
+  EXPECT_TRUE(q.Empty());
+}
+
+TEST(LengthBucketQueue, FullBucket) {
+  LengthBucketQueueConfig config;
+  config.bucket_boundaries = "1000";
+  config.max_frames_per_batch = 2000;
+  config.max_wait_ms = 1000 * 1000;
+
+  LengthBucketQueue<int32_t> q(config);
+  q.Push(0, 800);
+  EXPECT_TRUE(q.Pop().empty());
+  EXPECT_GT(q.TimeToNextDeadlineMs(), 0);
+
+  // Another item of up to 1000 frames would exceed max_frames_per_batch
+  q.Push(1, 700);
+  EXPECT_EQ(q.TimeToNextDeadlineMs(), 0);
+  EXPECT_EQ(q.Pop(), (std::vector<int32_t>{0, 1}));
+}
+
+TEST(LengthBucketQueue, MaxWait) {
+  LengthBucketQueueConfig config;
+  config.max_wait_ms = 0;
+
+  LengthBucketQueue<int32_t> q(config);
+  q.Push(0, 10);
+  EXPECT_EQ(q.Pop(), (std::vector<int32_t>{0}));
+}
+
+TEST(PaddingStats, Efficiency) {
+  PaddingStats stats;
+  EXPECT_EQ(stats.Efficiency(), 1);
+
+  stats.Add({100, 50});
+  stats.Add({30});
+  EXPECT_EQ(stats.num_batches, 2);
+  EXPECT_EQ(stats.num_frames, 180);
+  EXPECT_EQ(stats.num_padded_frames, 230);
+  EXPECT_NEAR(stats.Efficiency(), 180.0 / 230, 1e-6);
+}
+
+}  // namespace sherpa
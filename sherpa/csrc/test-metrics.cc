@@ -0,0 +1,55 @@
+// sherpa/csrc/test-metrics.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/metrics.h"
+
+#include <string>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+TEST(Histogram, ToPrometheus) {
+  Histogram h("latency_seconds", "Latency.", {0.1, 1});
+  for (double v : {0.05, 0.1, 0.5, 2.0}) {
+    h.Observe(v);
+  }
+  EXPECT_EQ(h.Count(), 4);
+
+  std::string s = h.ToPrometheus();
+  EXPECT_EQ(s,
+            "# HELP latency_seconds Latency.\n"
+            "# TYPE latency_seconds histogram\n"
+            "latency_seconds_bucket{le=\"0.1\"} 2\n"
+            "latency_seconds_bucket{le=\"1\"} 3\n"
+            "latency_seconds_bucket{le=\"+Inf\"} 4\n"
+            "latency_seconds_sum 2.65\n"
+            "latency_seconds_count 4\n");
+}
+
+TEST(Metrics, ToPrometheus) {
+  Metrics metrics;
+  int32_t num_streams = 1;
+  metrics.AddGauge("active_streams", "Active streams.",
+                   [&num_streams]() { return num_streams; });
+  Histogram *h = metrics.AddHistogram("batch_size", "Batch size.", {1, 2});
+  h->Observe(2);
+  num_streams = 3;
+
+  std::string s = metrics.ToPrometheus();
+  EXPECT_NE(s.find("# TYPE active_streams gauge\nactive_streams 3\n"),
+            std::string::npos);
+  EXPECT_NE(s.find("batch_size_count 1\n"), std::string::npos);
+
+  // Gauges and histograms are rendered in the order they are added
+  EXPECT_LT(s.find("active_streams"), s.find("batch_size"));
+}
+
+TEST(Metrics, GetResidentMemoryBytes) {
+#if defined(__linux__)
+  EXPECT_GT(GetResidentMemoryBytes(), 0);
+#endif
+}
+
+}  // namespace sherpa
@@ -0,0 +1,83 @@
+// sherpa/csrc/test-offline-whisper-long-audio.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/offline-whisper-long-audio.h"
+
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+TEST(SplitFeaturesIntoWindows, Short) {
+  torch::Tensor features = torch::rand({100, 80});
+  auto windows = SplitFeaturesIntoWindows(features, 3000, 200);
+  ASSERT_EQ(windows.size(), 1);
+  EXPECT_TRUE(torch::equal(windows[0], features));
+}
+
+TEST(SplitFeaturesIntoWindows, Long) {
+  torch::Tensor features = torch::arange(7000).unsqueeze(1);
+  auto windows = SplitFeaturesIntoWindows(features, 3000, 200);
+  // [0, 3000), [2800, 5800), [5600, 7000)
+  ASSERT_EQ(windows.size(), 3);
+  EXPECT_EQ(windows[0].size(0), 3000);
+  EXPECT_EQ(windows[1].size(0), 3000);
+  EXPECT_EQ(windows[2].size(0), 1400);
+
+  EXPECT_EQ(windows[1][0].item().toInt(), 2800);
+  EXPECT_EQ(windows[2][0].item().toInt(), 5600);
+  EXPECT_EQ(windows[2][-1].item().toInt(), 6999);
+}
+
+TEST(MergeOverlappingTokens, Overlap) {
+  std::vector<int32_t> a = {1, 2, 3, 4, 5, 6};
+  std::vector<int32_t> b = {4, 5, 6, 7, 8};
+  std::vector<int32_t> expected = {1, 2, 3, 4, 5, 6, 7, 8};
+  EXPECT_EQ(MergeOverlappingTokens(a, b, 3, 3), expected);
+
+  // The last token of a and the first token of b are cut off by the
+  // window boundaries
+  a = {1, 2, 3, 4, 5, 9};
+  b = {10, 4, 5, 6, 7};
+  expected = {1, 2, 3, 4, 5, 6, 7};
+  EXPECT_EQ(MergeOverlappingTokens(a, b, 3, 3), expected);
+}
+
+TEST(MergeOverlappingTokens, NoOverlap) {
+  std::vector<int32_t> a = {1, 2, 3};
+  std::vector<int32_t> b = {3, 4};
+  // A single shared token is not enough. Without an overlap, they are
+  // concatenated
+  std::vector<int32_t> expected = {1, 2, 3, 3, 4};
+  EXPECT_EQ(MergeOverlappingTokens(a, b, 0, 0), expected);
+
+  EXPECT_EQ(MergeOverlappingTokens({}, b, 0, 0), b);
+  EXPECT_EQ(MergeOverlappingTokens(a, {}, 0, 0), a);
+}
+
+TEST(MergeOverlappingTokens, NoMatchCutsAtMidpoint) {
+  // The overlap is decoded as 20 21 22 23 in a and as 30 31 32 33 in b,
+  // e.g., with different spellings, so no common sequence is found
+  std::vector<int32_t> a = {1, 2, 3, 20, 21, 22, 23};
+  std::vector<int32_t> b = {30, 31, 32, 33, 4, 5};
+
+  // The first half of the overlap is taken from a and the second half
+  // from b
+  std::vector<int32_t> expected = {1, 2, 3, 20, 21, 32, 33, 4, 5};
+  EXPECT_EQ(MergeOverlappingTokens(a, b, 4, 4), expected);
+
+  // The estimates are clamped to the number of tokens
+  expected = {5};
+  EXPECT_EQ(MergeOverlappingTokens({1}, {4, 5}, 100, 2), expected);
+}
+
+TEST(EstimateNumOverlapTokens, Ratio) {
+  EXPECT_EQ(EstimateNumOverlapTokens(100, 3000, 300), 10);
+  EXPECT_EQ(EstimateNumOverlapTokens(7, 3000, 1000), 2);
+  EXPECT_EQ(EstimateNumOverlapTokens(10, 100, 300), 10);
+  EXPECT_EQ(EstimateNumOverlapTokens(10, 0, 300), 0);
+}
+
+}  // namespace sherpa
@@ -0,0 +1,150 @@
+// sherpa/csrc/test-online-encoder-state-pool.cc
+//
+// Copyright (c)  2023  Xiaomi Corporation
+
+#include "sherpa/csrc/online-encoder-state-pool.h"
+
+#include <tuple>
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+// A model whose state is a tuple of two tensors:
+//  - a tensor of shape (2, N, 3)
+//  - a list containing a tensor of shape (N, 4)
+//
+// RunEncoder() adds 1 to every state.
+class DummyOnlineModel : public OnlineTransducerModel {
+ public:
+  torch::IValue StackStates(
+      const std::vector<torch::IValue> &states) const override {
+    std::vector<torch::Tensor> a;
+    std::vector<torch::Tensor> b;
+    for (const auto &s : states) {
+      auto t = s.toTuple();
+      a.push_back(t->elements()[0].toTensor());
+      b.push_back(t->elements()[1].toList().get(0).toTensor());
+    }
+    return torch::ivalue::Tuple::create(
+        torch::cat(a, 1), torch::List<torch::Tensor>({torch::cat(b, 0)}));
+  }
+
+  std::vector<torch::IValue> UnStackStates(
+      torch::IValue states) const override {
+    auto t = states.toTuple();
+    auto a = t->elements()[0].toTensor();
+    auto b = t->elements()[1].toList().get(0).toTensor();
+
+    std::vector<torch::IValue> ans;
+    for (int32_t i = 0; i != a.size(1); ++i) {
+      ans.push_back(torch::ivalue::Tuple::create(
+          a.narrow(1, i, 1),
+          torch::List<torch::Tensor>({b.narrow(0, i, 1)})));
+    }
+    return ans;
+  }
+
+  torch::IValue GetEncoderInitStates(int32_t /*unused*/ = 1) override {
+    return MakeState(0);
+  }
+
+  std::tuple<torch::Tensor, torch::Tensor, torch::IValue> RunEncoder(
+      const torch::Tensor &features, const torch::Tensor &features_length,
+      const torch::Tensor & /*num_processed_frames*/,
+      torch::IValue states) override {
+    auto t = states.toTuple();
+    auto a = t->elements()[0].toTensor() + 1;
+    auto b = t->elements()[1].toList().get(0).toTensor() + 1;
+    torch::IValue next_states = torch::ivalue::Tuple::create(
+        a, torch::List<torch::Tensor>({b}));
+    return {features, features_length, next_states};
+  }
+
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    return decoder_input;
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    return encoder_out;
+  }
+
+  torch::Device Device() const override { return torch::kCPU; }
+  int32_t ContextSize() const override { return 2; }
+  int32_t ChunkSize() const override { return 8; }
+  int32_t ChunkShift() const override { return 6; }
+
+  static torch::IValue MakeState(float value) {
+    return torch::ivalue::Tuple::create(
+        torch::full({2, 1, 3}, value),
+        torch::List<torch::Tensor>({torch::full({1, 4}, value)}));
+  }
+
+  // Return the value of the given state
+  static float GetValue(torch::IValue state) {
+    auto t = state.toTuple();
+    auto a = t->elements()[0].toTensor();
+    auto b = t->elements()[1].toList().get(0).toTensor();
+    float v = a.view({-1})[0].item<float>();
+    EXPECT_TRUE(torch::allclose(a, torch::full_like(a, v)));
+    EXPECT_TRUE(torch::allclose(b, torch::full_like(b, v)));
+    return v;
+  }
+};
+
+TEST(OnlineEncoderStatePool, IsSupported) {
+  DummyOnlineModel model;
+  EXPECT_TRUE(OnlineEncoderStatePool::IsSupported(&model));
+}
+
+TEST(OnlineEncoderStatePool, GatherScatter) {
+  DummyOnlineModel model;
+  auto pool = std::make_shared<OnlineEncoderStatePool>(&model, 2);
+  EXPECT_EQ(pool->Capacity(), 2);
+
+  std::vector<std::shared_ptr<OnlineEncoderStateSlot>> slots;
+  for (int32_t i = 0; i != 5; ++i) {
+    slots.push_back(pool->Allocate(DummyOnlineModel::MakeState(i * 10)));
+    EXPECT_EQ(slots.back()->Index(), i);
+  }
+  EXPECT_EQ(pool->NumUsedSlots(), 5);
+  EXPECT_GE(pool->Capacity(), 5);
+
+  auto run = [&](const std::vector<int32_t> &indexes) {
+    torch::IValue states = pool->Gather(indexes);
+    torch::Tensor x = torch::zeros({1});
+    std::tuple<torch::Tensor, torch::Tensor, torch::IValue> out =
+        model.RunEncoder(x, x, x, states);
+    pool->Scatter(indexes, std::get<2>(out));
+  };
+
+  // contiguous slots
+  run({1, 2, 3});
+  // the same batch again, which uses the cached states
+  run({1, 2, 3});
+  // non-contiguous slots overlapping with the cached ones
+  run({4, 2, 0});
+
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[0]->GetState()), 1);
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[1]->GetState()), 12);
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[2]->GetState()), 23);
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[3]->GetState()), 32);
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[4]->GetState()), 41);
+
+  slots[2]->SetState(DummyOnlineModel::MakeState(100));
+  run({2});
+  EXPECT_EQ(DummyOnlineModel::GetValue(slots[2]->GetState()), 101);
+
+  // Freed slots are reused, smallest first
+  slots[3].reset();
+  slots[1].reset();
+  EXPECT_EQ(pool->NumUsedSlots(), 3);
+
+  auto s = pool->Allocate(DummyOnlineModel::MakeState(7));
+  EXPECT_EQ(s->Index(), 1);
+  EXPECT_EQ(DummyOnlineModel::GetValue(s->GetState()), 7);
+}
+
+}  // namespace sherpa
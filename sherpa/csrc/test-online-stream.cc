@@ -16,7 +16,10 @@
  * limitations under the License.
  */
 
+#include <chrono>  // NOLINT
 #include <fstream>
+#include <memory>
+#include <vector>
 
 #include "gtest/gtest.h"
 #include "sherpa/cpp_api/feature-config.h"
@@ -50,4 +53,101 @@ TEST(OnlineStream, Test) {
   EXPECT_TRUE(s.IsLastFrame(0));
 }
 
+TEST(OnlineStream, GetFrames) {
+  float sampling_rate = 16000;
+  int32_t feature_dim = 80;
+  FeatureConfig feat_config;
+  feat_config.fbank_opts.mel_opts.num_bins = feature_dim;
+
+  OnlineStream s(feat_config);
+  s.AcceptWaveform(sampling_rate, torch::rand({16000}, torch::kFloat));
+  int32_t num_frames = s.NumFramesReady();
+  ASSERT_GT(num_frames, 20);
+
+  int32_t start = 3;
+  int32_t n = 15;
+  std::vector<torch::Tensor> frames;
+  for (int32_t k = 0; k != n; ++k) {
+    frames.push_back(s.GetFrame(start + k));
+  }
+  torch::Tensor expected = torch::cat(frames, /*dim*/ 0);
+
+  torch::Tensor features = s.GetFrames(start, n);
+  EXPECT_EQ(features.dim(), 2);
+  EXPECT_EQ(features.size(0), n);
+  EXPECT_EQ(features.size(1), feature_dim);
+  EXPECT_TRUE(features.is_contiguous());
+  EXPECT_TRUE(torch::equal(features, expected));
+
+  // Copy into a view of a batch buffer
+  torch::Tensor buffer = torch::zeros({2, n, feature_dim}, torch::kFloat);
+  s.CopyFramesTo(start, n, buffer[1]);
+  EXPECT_TRUE(torch::equal(buffer[1], expected));
+  EXPECT_EQ(buffer[0].abs().sum().item<float>(), 0);
+
+  // A non-contiguous destination
+  torch::Tensor t = torch::zeros({feature_dim, n}, torch::kFloat);
+  s.CopyFramesTo(start, n, t.t());
+  EXPECT_TRUE(torch::equal(t.t(), expected));
+}
+
+// Compare the time to assemble the features of a batch frame by frame
+// (GetFrame + torch::cat + torch::stack) with copying them into a
+// preallocated batch buffer.
+TEST(OnlineStream, GetFramesBenchmark) {
+  float sampling_rate = 16000;
+  int32_t feature_dim = 80;
+  int32_t batch_size = 64;
+  int32_t chunk_size = 45;
+  int32_t num_iters = 20;
+  FeatureConfig feat_config;
+  feat_config.fbank_opts.mel_opts.num_bins = feature_dim;
+
+  std::vector<std::unique_ptr<OnlineStream>> streams;
+  for (int32_t i = 0; i != batch_size; ++i) {
+    streams.push_back(std::make_unique<OnlineStream>(feat_config));
+    streams.back()->AcceptWaveform(sampling_rate,
+                                   torch::rand({16000}, torch::kFloat));
+  }
+  ASSERT_GE(streams[0]->NumFramesReady(), chunk_size);
+
+  torch::Tensor expected;
+  auto start = std::chrono::steady_clock::now();
+  for (int32_t iter = 0; iter != num_iters; ++iter) {
+    std::vector<torch::Tensor> all_features(batch_size);
+    for (int32_t i = 0; i != batch_size; ++i) {
+      std::vector<torch::Tensor> features_vec(chunk_size);
+      for (int32_t k = 0; k != chunk_size; ++k) {
+        features_vec[k] = streams[i]->GetFrame(k);
+      }
+      all_features[i] = torch::cat(features_vec, /*dim*/ 0);
+    }
+    expected = torch::stack(all_features, /*dim*/ 0);
+  }
+  auto end = std::chrono::steady_clock::now();
+  float elapsed_frame_by_frame =
+      std::chrono::duration<float, std::milli>(end - start).count() /
+      num_iters;
+
+  torch::Tensor buffer =
+      torch::empty({batch_size, chunk_size, feature_dim}, torch::kFloat);
+  start = std::chrono::steady_clock::now();
+  for (int32_t iter = 0; iter != num_iters; ++iter) {
+    for (int32_t i = 0; i != batch_size; ++i) {
+      streams[i]->CopyFramesTo(0, chunk_size, buffer[i]);
+    }
+  }
+  end = std::chrono::steady_clock::now();
+  float elapsed_buffer =
+      std::chrono::duration<float, std::milli>(end - start).count() /
+      num_iters;
+
+  EXPECT_TRUE(torch::equal(buffer, expected));
+
+  SHERPA_LOG(INFO) << "batch size: " << batch_size
+                   << ", chunk size: " << chunk_size
+                   << ", frame by frame: " << elapsed_frame_by_frame
+                   << " ms, batch buffer: " << elapsed_buffer << " ms";
+}
+
 }  // namespace sherpa
@@ -0,0 +1,307 @@
+// sherpa/csrc/test-transducer-greedy-search-decoder.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include <utility>
+#include <vector>
+
+#include "gtest/gtest.h"
+#include "sherpa/csrc/offline-transducer-greedy-search-decoder.h"
+#include "sherpa/csrc/online-transducer-greedy-search-decoder.h"
+
+namespace sherpa {
+
+class Joiner {
+ public:
+  virtual ~Joiner() = default;
+
+  virtual torch::Tensor RunDecoder(const torch::Tensor &decoder_input) = 0;
+
+  virtual torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                                  const torch::Tensor &decoder_out) = 0;
+
+  int32_t NumCalls() const { return num_calls_; }
+
+ protected:
+  int32_t num_calls_ = 0;
+};
+
+// A stateless decoder that embeds the last token and a joiner computing
+// tanh(encoder_out + decoder_out) * proj + bias, where the bias of blank
+// is large enough that most frames are blank.
+class DummyJoiner : public Joiner {
+ public:
+  DummyJoiner(int32_t vocab_size, int32_t dim) {
+    torch::manual_seed(20250101);
+    auto opts = torch::dtype(torch::kDouble);
+    embedding_ = torch::randn({vocab_size, dim}, opts);
+    proj_ = torch::randn({dim, vocab_size}, opts);
+    bias_ = torch::zeros({vocab_size}, opts);
+    bias_[0] = 2.5;
+  }
+
+  // decoder_input is of shape (N, context_size). The context is padded
+  // with -1, which is mapped to blank.
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    auto last = decoder_input.select(1, -1).clamp_min(0);
+    return embedding_.index_select(0, last).unsqueeze(1);
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    ++num_calls_;
+    return torch::tanh(encoder_out + decoder_out).matmul(proj_) + bias_;
+  }
+
+ private:
+  torch::Tensor embedding_;
+  torch::Tensor proj_;
+  torch::Tensor bias_;
+};
+
+// The decoder output is 0, so the logits are the encoder output. If the
+// joiner is run for more than batch_size rows in one call, the logit of
+// token 1 is increased by less than the rounding errors of a float joiner.
+// It mimics a batched matmul that sums in a different order, which can
+// break ties in the other way.
+class TieJoiner : public Joiner {
+ public:
+  TieJoiner(int32_t vocab_size, int32_t batch_size)
+      : vocab_size_(vocab_size), batch_size_(batch_size) {}
+
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    return torch::zeros({decoder_input.size(0), 1, vocab_size_});
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    ++num_calls_;
+    auto logits = encoder_out + decoder_out;
+    if (encoder_out.size(0) > batch_size_) {
+      logits.select(-1, 1).add_(1e-5);
+    }
+    return logits;
+  }
+
+ private:
+  int32_t vocab_size_;
+  int32_t batch_size_;
+};
+
+// Logits of 2 streams and 6 frames with a vocabulary of 3 tokens.
+// Frame-by-frame greedy search breaks ties in favor of the lower token ID,
+// i.e., blank.
+static torch::Tensor TieLogits() {
+  return torch::tensor({{{1.f, 0.f, 0.f},
+                         {0.5f, 0.5f, 0.f},  // tie
+                         {0.f, 1.f, 0.f},
+                         {0.f, 0.f, 2.f},
+                         {1.f, 1.f, 0.f},  // tie
+                         {2.f, 0.f, 0.f}},
+                        {{0.25f, 0.25f, 0.f},  // tie
+                         {1.f, 0.f, 0.f},
+                         {1.f, 0.f, 0.f},
+                         {0.f, 0.f, 1.f},
+                         {3.f, 0.f, 0.f},
+                         {0.75f, 0.75f, 0.f}}});  // tie
+}
+
+class DummyOnlineModel : public OnlineTransducerModel {
+ public:
+  explicit DummyOnlineModel(Joiner *joiner) : joiner_(joiner) {}
+
+  torch::IValue StackStates(
+      const std::vector<torch::IValue> & /*states*/) const override {
+    return {};
+  }
+
+  std::vector<torch::IValue> UnStackStates(
+      torch::IValue /*states*/) const override {
+    return {};
+  }
+
+  torch::IValue GetEncoderInitStates(int32_t /*unused*/ = 1) override {
+    return {};
+  }
+
+  std::tuple<torch::Tensor, torch::Tensor, torch::IValue> RunEncoder(
+      const torch::Tensor &features, const torch::Tensor &features_length,
+      const torch::Tensor & /*num_processed_frames*/,
+      torch::IValue states) override {
+    return {features, features_length, states};
+  }
+
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    return joiner_->RunDecoder(decoder_input);
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    return joiner_->RunJoiner(encoder_out, decoder_out);
+  }
+
+  torch::Device Device() const override { return torch::kCPU; }
+  int32_t ContextSize() const override { return 2; }
+  int32_t ChunkSize() const override { return 8; }
+  int32_t ChunkShift() const override { return 6; }
+
+ private:
+  Joiner *joiner_;  // Not owned
+};
+
+class DummyOfflineModel : public OfflineTransducerModel {
+ public:
+  explicit DummyOfflineModel(Joiner *joiner) : joiner_(joiner) {}
+
+  std::pair<torch::Tensor, torch::Tensor> RunEncoder(
+      const torch::Tensor &features,
+      const torch::Tensor &features_length) override {
+    return {features, features_length};
+  }
+
+  torch::Tensor RunDecoder(const torch::Tensor &decoder_input) override {
+    return joiner_->RunDecoder(decoder_input);
+  }
+
+  torch::Tensor RunJoiner(const torch::Tensor &encoder_out,
+                          const torch::Tensor &decoder_out) override {
+    return joiner_->RunJoiner(encoder_out, decoder_out);
+  }
+
+  torch::Device Device() const override { return torch::kCPU; }
+  int32_t ContextSize() const override { return 2; }
+
+ private:
+  Joiner *joiner_;  // Not owned
+};
+
+static std::vector<OnlineTransducerDecoderResult> DecodeOnline(
+    Joiner *joiner, bool speculative_joiner,
+    const std::vector<torch::Tensor> &chunks) {
+  DummyOnlineModel model(joiner);
+  OnlineTransducerGreedySearchDecoder decoder(&model, speculative_joiner);
+
+  int32_t N = chunks[0].size(0);
+  std::vector<OnlineTransducerDecoderResult> results(N);
+  for (auto &r : results) {
+    r = decoder.GetEmptyResult();
+  }
+
+  for (const auto &c : chunks) {
+    decoder.Decode(c, &results);
+  }
+
+  return results;
+}
+
+TEST(OnlineTransducerGreedySearchDecoder, SpeculativeJoiner) {
+  torch::manual_seed(20250102);
+  std::vector<torch::Tensor> chunks;
+  for (int32_t i = 0; i != 4; ++i) {
+    chunks.push_back(torch::randn({3, 8, 4}, torch::kDouble));
+  }
+
+  DummyJoiner joiner(6, 4);
+  auto expected = DecodeOnline(&joiner, false, chunks);
+  int32_t num_calls = joiner.NumCalls();
+
+  DummyJoiner speculative_joiner(6, 4);
+  auto results = DecodeOnline(&speculative_joiner, true, chunks);
+  int32_t num_speculative_calls = speculative_joiner.NumCalls();
+
+  ASSERT_EQ(results.size(), expected.size());
+  for (size_t i = 0; i != results.size(); ++i) {
+    EXPECT_EQ(results[i].tokens, expected[i].tokens);
+    EXPECT_EQ(results[i].timestamps, expected[i].timestamps);
+    EXPECT_EQ(results[i].frame_offset, expected[i].frame_offset);
+    EXPECT_EQ(results[i].num_trailing_blanks,
+              expected[i].num_trailing_blanks);
+  }
+
+  EXPECT_EQ(num_calls, 4 * 8);
+  EXPECT_LT(num_speculative_calls, num_calls);
+}
+
+TEST(OnlineTransducerGreedySearchDecoder, SpeculativeJoinerBreaksTies) {
+  std::vector<torch::Tensor> chunks = {TieLogits()};
+
+  TieJoiner joiner(3, 2);
+  auto expected = DecodeOnline(&joiner, false, chunks);
+
+  EXPECT_EQ(expected[0].tokens, (std::vector<int32_t>{-1, 0, 1, 2}));
+  EXPECT_EQ(expected[0].timestamps, (std::vector<int32_t>{2, 3}));
+  EXPECT_EQ(expected[1].tokens, (std::vector<int32_t>{-1, 0, 2}));
+  EXPECT_EQ(expected[1].timestamps, (std::vector<int32_t>{3}));
+
+  TieJoiner speculative_joiner(3, 2);
+  auto results = DecodeOnline(&speculative_joiner, true, chunks);
+
+  ASSERT_EQ(results.size(), expected.size());
+  for (size_t i = 0; i != results.size(); ++i) {
+    EXPECT_EQ(results[i].tokens, expected[i].tokens);
+    EXPECT_EQ(results[i].timestamps, expected[i].timestamps);
+    EXPECT_EQ(results[i].num_trailing_blanks,
+              expected[i].num_trailing_blanks);
+  }
+}
+
+static std::vector<OfflineTransducerDecoderResult> DecodeOffline(
+    Joiner *joiner, bool speculative_joiner, torch::Tensor encoder_out,
+    torch::Tensor encoder_out_length) {
+  DummyOfflineModel model(joiner);
+  OfflineTransducerGreedySearchDecoder decoder(&model, speculative_joiner);
+
+  return decoder.Decode(encoder_out, encoder_out_length);
+}
+
+TEST(OfflineTransducerGreedySearchDecoder, SpeculativeJoiner) {
+  torch::manual_seed(20250103);
+  // The decoder requires a float encoder_out
+  auto encoder_out = torch::randn({4, 80, 4}, torch::kFloat);
+  auto encoder_out_length = torch::tensor({50, 80, 3, 71}, torch::kLong);
+
+  DummyJoiner joiner(6, 4);
+  auto expected =
+      DecodeOffline(&joiner, false, encoder_out, encoder_out_length);
+  int32_t num_calls = joiner.NumCalls();
+
+  DummyJoiner speculative_joiner(6, 4);
+  auto results = DecodeOffline(&speculative_joiner, true, encoder_out,
+                               encoder_out_length);
+  int32_t num_speculative_calls = speculative_joiner.NumCalls();
+
+  ASSERT_EQ(results.size(), expected.size());
+  for (size_t i = 0; i != results.size(); ++i) {
+    EXPECT_EQ(results[i].tokens, expected[i].tokens);
+    EXPECT_EQ(results[i].timestamps, expected[i].timestamps);
+  }
+
+  EXPECT_EQ(num_calls, 80);
+  EXPECT_LT(num_speculative_calls, num_calls);
+}
+
+TEST(OfflineTransducerGreedySearchDecoder, SpeculativeJoinerBreaksTies) {
+  auto encoder_out = TieLogits();
+  auto encoder_out_length = torch::tensor({6, 6}, torch::kLong);
+
+  TieJoiner joiner(3, 2);
+  auto expected =
+      DecodeOffline(&joiner, false, encoder_out, encoder_out_length);
+
+  EXPECT_EQ(expected[0].tokens, (std::vector<int32_t>{1, 2}));
+  EXPECT_EQ(expected[0].timestamps, (std::vector<int32_t>{2, 3}));
+  EXPECT_EQ(expected[1].tokens, (std::vector<int32_t>{2}));
+  EXPECT_EQ(expected[1].timestamps, (std::vector<int32_t>{3}));
+
+  TieJoiner speculative_joiner(3, 2);
+  auto results = DecodeOffline(&speculative_joiner, true, encoder_out,
+                               encoder_out_length);
+
+  ASSERT_EQ(results.size(), expected.size());
+  for (size_t i = 0; i != results.size(); ++i) {
+    EXPECT_EQ(results[i].tokens, expected[i].tokens);
+    EXPECT_EQ(results[i].timestamps, expected[i].timestamps);
+  }
+}
+
+}  // namespace sherpa
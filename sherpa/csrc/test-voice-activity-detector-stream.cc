@@ -0,0 +1,95 @@
+// sherpa/csrc/test-voice-activity-detector-stream.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/voice-activity-detector-stream.h"
+
+#include <vector>
+
+#include "gtest/gtest.h"
+
+namespace sherpa {
+
+static constexpr int32_t kWindowSize = VoiceActivityDetectorStream::kWindowSize;
+
+// Feed num_frames windows with the given speech probability
+static void Feed(VoiceActivityDetectorStream *s, int32_t num_frames,
+                 float prob) {
+  std::vector<float> samples(num_frames * kWindowSize);
+  s->AcceptWaveform(samples.data(), samples.size());
+
+  std::vector<float> window(kWindowSize);
+  while (s->NumReadyWindows() > 0) {
+    s->GetWindow(window.data());
+    s->AcceptProb(prob);
+  }
+}
+
+TEST(VoiceActivityDetectorStream, SegmentIsEmittedWhenClosed) {
+  VoiceActivityDetectorConfig config;
+  // min_speech_duration: 7 frames
+  // min_silence_duration: 15 frames
+  VoiceActivityDetectorStream s(config, {});
+
+  Feed(&s, 10, 0.1);
+  Feed(&s, 30, 0.9);
+  EXPECT_TRUE(s.Empty());
+
+  // frames 40 to 54 are not enough to close the segment
+  Feed(&s, 15, 0.1);
+  EXPECT_TRUE(s.Empty());
+
+  Feed(&s, 1, 0.1);
+  ASSERT_FALSE(s.Empty());
+
+  SpeechSegment seg = s.PopSegment();
+  EXPECT_TRUE(s.Empty());
+  EXPECT_NEAR(seg.start, 10 * 0.032 - 0.214, 1e-3);
+  // 55 * 0.032 + 0.064 exceeds the duration of the received audio
+  EXPECT_NEAR(seg.end, 56 * kWindowSize / 16000.0, 1e-3);
+}
+
+TEST(VoiceActivityDetectorStream, Flush) {
+  VoiceActivityDetectorConfig config;
+  VoiceActivityDetectorStream s(config, {});
+
+  Feed(&s, 20, 0.1);
+  Feed(&s, 20, 0.9);
+
+  // An incomplete window
+  std::vector<float> samples(100);
+  s.AcceptWaveform(samples.data(), samples.size());
+  EXPECT_EQ(s.NumReadyWindows(), 0);
+
+  s.Flush();
+  EXPECT_FALSE(s.IsFinished());
+  EXPECT_EQ(s.NumReadyWindows(), 1);
+
+  std::vector<float> window(kWindowSize, 1);
+  s.GetWindow(window.data());
+  EXPECT_EQ(window.back(), 0);
+
+  s.AcceptProb(0.9);
+  EXPECT_TRUE(s.IsFinished());
+  ASSERT_FALSE(s.Empty());
+
+  SpeechSegment seg = s.PopSegment();
+  EXPECT_NEAR(seg.start, 20 * 0.032 - 0.214, 1e-3);
+  // It does not exceed the duration of the audio
+  EXPECT_NEAR(seg.end, (40 * kWindowSize + 100) / 16000.0, 1e-3);
+}
+
+TEST(VoiceActivityDetectorStream, ShortSpeechIsIgnored) {
+  VoiceActivityDetectorConfig config;
+  VoiceActivityDetectorStream s(config, {});
+
+  Feed(&s, 5, 0.1);
+  Feed(&s, 3, 0.9);
+  Feed(&s, 30, 0.1);
+  s.Flush();
+
+  EXPECT_TRUE(s.IsFinished());
+  EXPECT_TRUE(s.Empty());
+}
+
+}  // namespace sherpa
@@ -6,6 +6,7 @@
 #include <memory>
 #include <vector>
 
+#include "sherpa/csrc/voice-activity-detector-stream.h"
 #include "sherpa/csrc/voice-activity-detector.h"
 #include "torch/script.h"
 
@@ -21,6 +22,10 @@ class VoiceActivityDetectorImpl {
   virtual const VoiceActivityDetectorConfig &GetConfig() const = 0;
 
   virtual std::vector<SpeechSegment> Process(torch::Tensor samples) = 0;
+
+  virtual std::unique_ptr<VoiceActivityDetectorStream> CreateStream() = 0;
+
+  virtual void ProcessStreams(VoiceActivityDetectorStream **ss, int32_t n) = 0;
 };
 
 }  // namespace sherpa
@@ -9,6 +9,7 @@
 #include <utility>
 #include <vector>
 
+#include "sherpa/cpp_api/macros.h"
 #include "sherpa/csrc/macros.h"
 #include "sherpa/csrc/silero-vad-model.h"
 #include "sherpa/csrc/voice-activity-detector-impl.h"
@@ -198,6 +199,89 @@ class VoiceActivityDetectorSileroVadImpl : public VoiceActivityDetectorImpl {
     return segments;
   }
 
+  std::unique_ptr<VoiceActivityDetectorStream> CreateStream() override {
+    return std::make_unique<VoiceActivityDetectorStream>(
+        config_, model_->GetInitStates());
+  }
+
+  void ProcessStreams(VoiceActivityDetectorStream **ss, int32_t n) override {
+    InferenceMode no_grad;
+
+    constexpr int32_t kWindowSize = VoiceActivityDetectorStream::kWindowSize;
+    auto device = model_->Device();
+
+    // Streams in the current batch and their stacked states. The states
+    // are split only when the batch composition is changed.
+    std::vector<VoiceActivityDetectorStream *> batch;
+    std::vector<torch::Tensor> states;
+
+    while (true) {
+      std::vector<VoiceActivityDetectorStream *> ready;
+      for (int32_t i = 0; i != n; ++i) {
+        if (ss[i]->NumReadyWindows() > 0) {
+          ready.push_back(ss[i]);
+        }
+      }
+
+      if (ready != batch) {
+        UnstackStates(batch, states);
+        batch = std::move(ready);
+        states = StackStates(batch);
+      }
+
+      if (batch.empty()) {
+        break;
+      }
+
+      int32_t batch_size = batch.size();
+      torch::Tensor samples =
+          torch::empty({batch_size, kWindowSize}, torch::kFloat);
+      float *p = samples.data_ptr<float>();
+      for (int32_t i = 0; i != batch_size; ++i) {
+        batch[i]->GetWindow(p + i * kWindowSize);
+      }
+
+      torch::Tensor probs =
+          model_->RunWindow(samples.to(device), &states).cpu();
+      const float *prob = probs.data_ptr<float>();
+      for (int32_t i = 0; i != batch_size; ++i) {
+        batch[i]->AcceptProb(prob[i]);
+      }
+    }
+  }
+
+ private:
+  static std::vector<torch::Tensor> StackStates(
+      const std::vector<VoiceActivityDetectorStream *> &batch) {
+    if (batch.empty()) {
+      return {};
+    }
+
+    int32_t num_states = batch[0]->GetStates().size();
+    std::vector<torch::Tensor> ans(num_states);
+    for (int32_t k = 0; k != num_states; ++k) {
+      std::vector<torch::Tensor> v;
+      v.reserve(batch.size());
+      for (auto s : batch) {
+        v.push_back(s->GetStates()[k]);
+      }
+      // (2, batch_size, 64)
+      ans[k] = torch::cat(v, 1);
+    }
+    return ans;
+  }
+
+  static void UnstackStates(
+      const std::vector<VoiceActivityDetectorStream *> &batch,
+      const std::vector<torch::Tensor> &states) {
+    for (int32_t i = 0; i != static_cast<int32_t>(batch.size()); ++i) {
+      auto &s = batch[i]->GetStates();
+      for (int32_t k = 0; k != static_cast<int32_t>(states.size()); ++k) {
+        s[k] = states[k].narrow(1, i, 1);
+      }
+    }
+  }
+
  private:
   VoiceActivityDetectorConfig config_;
   std::unique_ptr<SileroVadModel> model_;
@@ -0,0 +1,152 @@
+// sherpa/csrc/voice-activity-detector-stream.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+
+#include "sherpa/csrc/voice-activity-detector-stream.h"
+
+#include <algorithm>
+#include <utility>
+#include <vector>
+
+#include "sherpa/csrc/log.h"
+
+namespace sherpa {
+
+VoiceActivityDetectorStream::VoiceActivityDetectorStream(
+    const VoiceActivityDetectorConfig &config,
+    std::vector<torch::Tensor> states)
+    : config_(config), states_(std::move(states)) {}
+
+void VoiceActivityDetectorStream::AcceptWaveform(const float *samples,
+                                                 int32_t n) {
+  SHERPA_CHECK(!flushed_) << "Don't call AcceptWaveform() after Flush()";
+
+  // Drop processed samples so that the buffer does not grow with the
+  // length of the audio
+  if (offset_ > 0 && offset_ >= static_cast<int32_t>(buffer_.size()) / 2) {
+    buffer_.erase(buffer_.begin(), buffer_.begin() + offset_);
+    offset_ = 0;
+  }
+
+  buffer_.insert(buffer_.end(), samples, samples + n);
+  num_samples_ += n;
+}
+
+void VoiceActivityDetectorStream::Flush() {
+  flushed_ = true;
+  MaybeFinish();
+}
+
+bool VoiceActivityDetectorStream::IsFinished() const {
+  return flushed_ && NumReadyWindows() == 0;
+}
+
+SpeechSegment VoiceActivityDetectorStream::PopSegment() {
+  SHERPA_CHECK(!segments_.empty());
+
+  SpeechSegment ans = segments_.front();
+  segments_.pop_front();
+  return ans;
+}
+
+int32_t VoiceActivityDetectorStream::NumReadyWindows() const {
+  int32_t n = static_cast<int32_t>(buffer_.size()) - offset_;
+  int32_t ans = n / kWindowSize;
+  if (flushed_ && n % kWindowSize != 0) {
+    ans += 1;
+  }
+  return ans;
+}
+
+void VoiceActivityDetectorStream::GetWindow(float *dst) const {
+  int32_t n = std::min<int32_t>(static_cast<int32_t>(buffer_.size()) - offset_,
+                                kWindowSize);
+  std::copy(buffer_.begin() + offset_, buffer_.begin() + offset_ + n, dst);
+  std::fill(dst + n, dst + kWindowSize, 0);
+}
+
+void VoiceActivityDetectorStream::AcceptProb(float prob) {
+  offset_ += std::min<int32_t>(static_cast<int32_t>(buffer_.size()) - offset_,
+                               kWindowSize);
+  int32_t i = num_frames_++;
+
+  float threshold = config_.model.silero_vad.threshold;
+
+  int32_t min_speech_frames = config_.model.silero_vad.min_speech_duration *
+                              config_.model.sample_rate / kWindowSize;
+
+  int32_t min_silence_frames = config_.model.silero_vad.min_silence_duration *
+                               config_.model.sample_rate / kWindowSize;
+
+  if (prob > threshold && temp_end_ != -1) {
+    temp_end_ = -1;
+  }
+
+  if (prob > threshold && temp_start_ == -1) {
+    // start speaking, but we require that it must satisfy
+    // min_speech_duration
+    temp_start_ = i;
+  } else if (prob > threshold && !triggered_) {
+    if (i - temp_start_ >= min_speech_frames) {
+      triggered_ = true;
+    }
+  } else if (prob < threshold && !triggered_) {
+    // silence
+    temp_start_ = -1;
+    temp_end_ = -1;
+  } else if (prob > threshold - 0.15 && triggered_) {
+    // speaking
+  } else if (prob < threshold && triggered_) {
+    // stop speaking
+    if (temp_end_ == -1) {
+      temp_end_ = i;
+    }
+
+    if (i - temp_end_ >= min_silence_frames) {
+      // stopped speaking
+      AddSegment(temp_start_, i);
+
+      temp_start_ = -1;
+      temp_end_ = -1;
+      triggered_ = false;
+    }
+  }
+
+  MaybeFinish();
+}
+
+void VoiceActivityDetectorStream::MaybeFinish() {
+  if (!flushed_ || !triggered_ || NumReadyWindows() != 0) {
+    return;
+  }
+
+  AddSegment(temp_start_, num_frames_ - 1);
+
+  temp_start_ = -1;
+  temp_end_ = -1;
+  triggered_ = false;
+}
+
+void VoiceActivityDetectorStream::AddSegment(int32_t start_frame,
+                                             int32_t end_frame) {
+  float sr = config_.model.sample_rate;
+
+  float left_shift = 2 * kWindowSize / sr + 0.15;
+  float right_shift = 2 * kWindowSize / sr;
+
+  float start_time = start_frame * kWindowSize / sr - left_shift;
+  float end_time = end_frame * kWindowSize / sr + right_shift;
+
+  // Segments must not overlap and must not exceed the received audio
+  start_time = std::max(start_time, last_end_);
+  end_time = std::min(end_time, num_samples_ / sr);
+
+  if (end_time <= start_time) {
+    return;
+  }
+
+  segments_.push_back({start_time, end_time});
+  last_end_ = end_time;
+}
+
+}  // namespace sherpa
@@ -0,0 +1,106 @@
+// sherpa/csrc/voice-activity-detector-stream.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_CSRC_VOICE_ACTIVITY_DETECTOR_STREAM_H_
+#define SHERPA_CSRC_VOICE_ACTIVITY_DETECTOR_STREAM_H_
+
+#include <deque>
+#include <vector>
+
+#include "sherpa/csrc/voice-activity-detector.h"
+#include "torch/script.h"
+
+namespace sherpa {
+
+/* A stream for voice activity detection on audio that arrives
+ * incrementally.
+ *
+ * Samples are consumed window by window. The LSTM states of the model and
+ * the trigger state machine are kept across calls, so a segment is
+ * available as soon as the trailing silence is long enough.
+ *
+ * Use VoiceActivityDetector::CreateStream() to create a stream and
+ * VoiceActivityDetector::ProcessStreams() to run the model on it.
+ */
+class VoiceActivityDetectorStream {
+ public:
+  static constexpr int32_t kWindowSize = 512;
+
+  /**
+   * @param config  The config of the voice activity detector.
+   * @param states  Initial LSTM states of the model.
+   */
+  VoiceActivityDetectorStream(const VoiceActivityDetectorConfig &config,
+                              std::vector<torch::Tensor> states);
+
+  /** Append audio samples to this stream.
+   *
+   * @param samples Audio samples normalized to the range [-1, 1]. The
+   *                sample rate must be equal to the one of the VAD model.
+   * @param n  Number of samples.
+   */
+  void AcceptWaveform(const float *samples, int32_t n);
+
+  /** Signal that no more samples will be given.
+   *
+   * The last incomplete window is padded with zeros and a segment that is
+   * still open is closed once all windows are processed.
+   */
+  void Flush();
+
+  /** Return true if Flush() has been called and all samples are processed.
+   */
+  bool IsFinished() const;
+
+  /** Return true if there are no segments available. */
+  bool Empty() const { return segments_.empty(); }
+
+  /** Return and remove the first available segment.
+   * It is an error to call it when Empty() is true.
+   */
+  SpeechSegment PopSegment();
+
+  // Number of windows that can be processed now
+  int32_t NumReadyWindows() const;
+
+  /** Copy the samples of the next ready window to dst, which has
+   * kWindowSize elements. An incomplete window is padded with zeros.
+   */
+  void GetWindow(float *dst) const;
+
+  /** Consume the next window given its speech probability. */
+  void AcceptProb(float prob);
+
+  std::vector<torch::Tensor> &GetStates() { return states_; }
+
+ private:
+  // Close the open segment if all samples are processed after Flush()
+  void MaybeFinish();
+
+  void AddSegment(int32_t start_frame, int32_t end_frame);
+
+ private:
+  VoiceActivityDetectorConfig config_;
+  std::vector<torch::Tensor> states_;
+
+  // Samples not processed yet start at buffer_[offset_]
+  std::vector<float> buffer_;
+  int32_t offset_ = 0;
+
+  int64_t num_samples_ = 0;  // Number of accepted samples
+  int32_t num_frames_ = 0;   // Number of processed windows
+  bool flushed_ = false;
+
+  // Trigger state machine. See ProcessSegment() in
+  // voice-activity-detector-silero-vad-impl.h
+  int32_t temp_start_ = -1;
+  int32_t temp_end_ = -1;
+  bool triggered_ = false;
+
+  float last_end_ = 0;  // End time of the last segment
+  std::deque<SpeechSegment> segments_;
+};
+
+}  // namespace sherpa
+
+#endif  // SHERPA_CSRC_VOICE_ACTIVITY_DETECTOR_STREAM_H_
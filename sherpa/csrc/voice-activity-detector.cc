@@ -9,6 +9,7 @@
 
 #include "sherpa/csrc/macros.h"
 #include "sherpa/csrc/voice-activity-detector-impl.h"
+#include "sherpa/csrc/voice-activity-detector-stream.h"
 
 namespace sherpa {
 
@@ -62,4 +63,14 @@ std::vector<SpeechSegment> VoiceActivityDetector::Process(
   return impl_->Process(samples);
 }
 
+std::unique_ptr<VoiceActivityDetectorStream>
+VoiceActivityDetector::CreateStream() const {
+  return impl_->CreateStream();
+}
+
+void VoiceActivityDetector::ProcessStreams(VoiceActivityDetectorStream **ss,
+                                           int32_t n) const {
+  impl_->ProcessStreams(ss, n);
+}
+
 }  // namespace sherpa
@@ -36,6 +36,7 @@ struct VoiceActivityDetectorConfig {
 };
 
 class VoiceActivityDetectorImpl;
+class VoiceActivityDetectorStream;
 
 class VoiceActivityDetector {
  public:
@@ -49,6 +50,25 @@ class VoiceActivityDetector {
    */
   std::vector<SpeechSegment> Process(torch::Tensor samples) const;
 
+  /** Create a stream for processing audio incrementally.
+   * See voice-activity-detector-stream.h
+   */
+  std::unique_ptr<VoiceActivityDetectorStream> CreateStream() const;
+
+  /** Process all ready windows of the given streams.
+   *
+   * Windows of different streams are run in a batch.
+   *
+   * @param ss Pointer to an array of streams.
+   * @param n  Size of the input array.
+   */
+  void ProcessStreams(VoiceActivityDetectorStream **ss, int32_t n) const;
+
+  void ProcessStream(VoiceActivityDetectorStream *s) const {
+    VoiceActivityDetectorStream *ss[1] = {s};
+    ProcessStreams(ss, 1);
+  }
+
  private:
   std::unique_ptr<VoiceActivityDetectorImpl> impl_;
 };
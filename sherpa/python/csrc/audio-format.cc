@@ -0,0 +1,54 @@
+// sherpa/python/csrc/audio-format.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#include "sherpa/csrc/audio-format.h"
+
+#include <string>
+
+#include "sherpa/python/csrc/audio-format.h"
+
+namespace sherpa {
+
+static SampleFormat ToSampleFormat(const std::string &name) {
+  SampleFormat ans;
+  if (!ParseSampleFormat(name, &ans)) {
+    throw py::value_error("Unsupported sample format: '" + name +
+                          "'. Supported formats are: f32le, s16le");
+  }
+  return ans;
+}
+
+void PybindAudioFormat(py::module *m) {
+  using PyClass = AudioFormat;
+  py::class_<PyClass>(*m, "AudioFormat")
+      .def(py::init([](int32_t sample_rate, const std::string &sample_format) {
+             return PyClass(sample_rate, ToSampleFormat(sample_format));
+           }),
+           py::arg("sample_rate") = 16000, py::arg("sample_format") = "f32le")
+      .def_readwrite("sample_rate", &PyClass::sample_rate)
+      .def_property(
+          "sample_format",
+          [](const PyClass &self) {
+            return SampleFormatToString(self.sample_format);
+          },
+          [](PyClass &self, const std::string &name) {
+            self.sample_format = ToSampleFormat(name);
+          })
+      .def_property_readonly("bytes_per_sample", &PyClass::BytesPerSample)
+      .def("from_json", &PyClass::FromJson, py::arg("s"))
+      .def(
+          "convert",
+          [](const PyClass &self, py::buffer data) {
+            // It does not copy data
+            py::buffer_info info = data.request();
+            const void *p = info.ptr;
+            int32_t num_bytes = info.size * info.itemsize;
+
+            py::gil_scoped_release release;
+            return self.Convert(p, num_bytes);
+          },
+          py::arg("data"))
+      .def("__str__", &PyClass::ToString);
+}
+
+}  // namespace sherpa
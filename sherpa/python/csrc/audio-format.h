@@ -0,0 +1,15 @@
+// sherpa/python/csrc/audio-format.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_PYTHON_CSRC_AUDIO_FORMAT_H_
+#define SHERPA_PYTHON_CSRC_AUDIO_FORMAT_H_
+
+#include "sherpa/python/csrc/sherpa.h"
+
+namespace sherpa {
+
+void PybindAudioFormat(py::module *m);
+
+}
+
+#endif  // SHERPA_PYTHON_CSRC_AUDIO_FORMAT_H_
@@ -109,6 +109,27 @@ Args:
     Used only when the passed ``nn_model`` is a transducer model.
     Valid values are: ``greedy_search``, ``modified_beam_search``, and
     ``fast_beam_search``.
+  speculative_joiner:
+    Used only for greedy_search in transducer decoding. ``True`` to run the
+    joiner on several frames in one call, assuming that no token is emitted,
+    and rerun it only from the first frame that emits a token. The result
+    is the same as running it frame by frame.
+  frame_reducer_blank_threshold:
+    Used only for transducer models trained with an auxiliary CTC head.
+    If positive, frames of the encoder output whose blank probability from
+    the CTC head is not less than it are dropped before the search,
+    e.g., 0.9. ``0`` to disable it. It changes the results: tokens on
+    dropped frames are deleted, and lower values drop more frames.
+    Measure its accuracy on your data before enabling it.
+  decoder_cache_capacity:
+    Used only when the passed ``nn_model`` is a transducer model. Max number
+    of decoder outputs to cache, keyed by the last ``context_size`` tokens.
+    The decoder is run only for contexts that are not in the cache.
+    ``0`` to disable it.
+  context_graph_cache_capacity:
+    Max number of context graphs to cache, keyed by the token IDs of the
+    contexts and ``context_score``. Streams created with the same contexts
+    share a graph instead of building a new one. ``0`` to disable it.
 )doc";
 
 static void PybindOfflineCtcDecoderConfig(py::module &m) {  // NOLINT
@@ -159,7 +180,10 @@ static void PybindOfflineRecognizerConfig(py::module &m) {  // NOLINT
                        const std::string &nn_model, const std::string &tokens,
                        bool use_gpu = false, int32_t num_active_paths = 4,
                        float context_score = 1.5, bool use_bbpe = false,
-                       float temperature = 1.0,
+                       float temperature = 1.0, bool speculative_joiner = false,
+                       float frame_reducer_blank_threshold = 0,
+                       int32_t decoder_cache_capacity = 0,
+                       int32_t context_graph_cache_capacity = 0,
                        const OfflineCtcDecoderConfig &ctc_decoder_config = {},
                        const FeatureConfig &feat_config = {},
                        const FastBeamSearchConfig &fast_beam_search_config = {},
@@ -179,6 +203,12 @@ static void PybindOfflineRecognizerConfig(py::module &m) {  // NOLINT
              config->context_score = context_score;
              config->use_bbpe = use_bbpe;
              config->temperature = temperature;
+             config->speculative_joiner = speculative_joiner;
+             config->frame_reducer_blank_threshold =
+                 frame_reducer_blank_threshold;
+             config->decoder_cache_capacity = decoder_cache_capacity;
+             config->context_graph_cache_capacity =
+                 context_graph_cache_capacity;
 
              return config;
            }),
@@ -186,6 +216,10 @@ static void PybindOfflineRecognizerConfig(py::module &m) {  // NOLINT
            py::arg("tokens") = "", py::arg("use_gpu") = false,
            py::arg("num_active_paths") = 4, py::arg("context_score") = 1.5,
            py::arg("use_bbpe") = false, py::arg("temperature") = 1.0,
+           py::arg("speculative_joiner") = false,
+           py::arg("frame_reducer_blank_threshold") = 0,
+           py::arg("decoder_cache_capacity") = 0,
+           py::arg("context_graph_cache_capacity") = 0,
            py::arg("ctc_decoder_config") = OfflineCtcDecoderConfig(),
            py::arg("feat_config") = FeatureConfig(),
            py::arg("fast_beam_search_config") = FastBeamSearchConfig(),
@@ -205,6 +239,12 @@ static void PybindOfflineRecognizerConfig(py::module &m) {  // NOLINT
       .def_readwrite("context_score", &PyClass::context_score)
       .def_readwrite("use_bbpe", &PyClass::use_bbpe)
       .def_readwrite("temperature", &PyClass::temperature)
+      .def_readwrite("speculative_joiner", &PyClass::speculative_joiner)
+      .def_readwrite("frame_reducer_blank_threshold",
+                     &PyClass::frame_reducer_blank_threshold)
+      .def_readwrite("decoder_cache_capacity", &PyClass::decoder_cache_capacity)
+      .def_readwrite("context_graph_cache_capacity",
+                     &PyClass::context_graph_cache_capacity)
       .def("validate", &PyClass::Validate);
 }
 
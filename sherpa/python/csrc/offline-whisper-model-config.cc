@@ -15,12 +15,15 @@ void PybindOfflineWhisperModelConfig(py::module *m) {
   using PyClass = OfflineWhisperModelConfig;
   py::class_<PyClass>(*m, "OfflineWhisperModelConfig")
       .def(py::init<const std::string &, const std::string &,
-                    const std::string &>(),
+                    const std::string &, bool, float>(),
            py::arg("model") = "", py::arg("language") = "",
-           py::arg("task") = "transcribe")
+           py::arg("task") = "transcribe", py::arg("long_audio") = false,
+           py::arg("long_audio_overlap") = 2.0)
       .def_readwrite("model", &PyClass::model)
       .def_readwrite("language", &PyClass::language)
       .def_readwrite("task", &PyClass::task)
+      .def_readwrite("long_audio", &PyClass::long_audio)
+      .def_readwrite("long_audio_overlap", &PyClass::long_audio_overlap)
       .def("validate", &PyClass::Validate)
       .def("__str__", &PyClass::ToString);
 }
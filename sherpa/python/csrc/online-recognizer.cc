@@ -4,6 +4,7 @@
 #include "sherpa/cpp_api/online-recognizer.h"
 
 #include <memory>
+#include <sstream>
 #include <string>
 #include <vector>
 
@@ -23,7 +24,10 @@ static void PybindOnlineRecognizerConfig(py::module &m) {  // NOLINT
                        int32_t num_active_paths = 4, float context_score = 1.5,
                        int32_t left_context = 64, int32_t right_context = 0,
                        int32_t chunk_size = 16, bool use_bbpe = false,
-                       float temperature = 1.0,
+                       float temperature = 1.0, bool resident_states = false,
+                       bool speculative_joiner = false,
+                       int32_t decoder_cache_capacity = 0,
+                       int32_t context_graph_cache_capacity = 0,
                        const FeatureConfig &feat_config = {},
                        const EndpointConfig &endpoint_config = {},
                        const FastBeamSearchConfig &fast_beam_search_config = {})
@@ -48,6 +52,10 @@ static void PybindOnlineRecognizerConfig(py::module &m) {  // NOLINT
              ans->chunk_size = chunk_size;
              ans->use_bbpe = use_bbpe;
              ans->temperature = temperature;
+             ans->resident_states = resident_states;
+             ans->speculative_joiner = speculative_joiner;
+             ans->decoder_cache_capacity = decoder_cache_capacity;
+             ans->context_graph_cache_capacity = context_graph_cache_capacity;
              return ans;
            }),
            py::arg("nn_model"), py::arg("tokens"),
@@ -58,7 +66,10 @@ static void PybindOnlineRecognizerConfig(py::module &m) {  // NOLINT
            py::arg("num_active_paths") = 4, py::arg("context_score") = 1.5,
            py::arg("left_context") = 64, py::arg("right_context") = 0,
            py::arg("chunk_size") = 16, py::arg("use_bbpe") = false,
-           py::arg("temperature") = 1.0,
+           py::arg("temperature") = 1.0, py::arg("resident_states") = false,
+           py::arg("speculative_joiner") = false,
+           py::arg("decoder_cache_capacity") = 0,
+           py::arg("context_graph_cache_capacity") = 0,
            py::arg("feat_config") = FeatureConfig(),
            py::arg("endpoint_config") = EndpointConfig(),
            py::arg("fast_beam_search_config") = FastBeamSearchConfig())
@@ -82,13 +93,33 @@ static void PybindOnlineRecognizerConfig(py::module &m) {  // NOLINT
       .def_readwrite("chunk_size", &PyClass::chunk_size)
       .def_readwrite("use_bbpe", &PyClass::use_bbpe)
       .def_readwrite("temperature", &PyClass::temperature)
+      .def_readwrite("resident_states", &PyClass::resident_states)
+      .def_readwrite("speculative_joiner", &PyClass::speculative_joiner)
+      .def_readwrite("decoder_cache_capacity", &PyClass::decoder_cache_capacity)
+      .def_readwrite("context_graph_cache_capacity",
+                     &PyClass::context_graph_cache_capacity)
       .def("validate", &PyClass::Validate)
       .def("__str__",
            [](const PyClass &self) -> std::string { return self.ToString(); });
 }
 
+static void PybindOnlineDecodeTiming(py::module &m) {  // NOLINT
+  using PyClass = OnlineDecodeTiming;
+  py::class_<PyClass>(m, "OnlineDecodeTiming")
+      .def(py::init<>())
+      .def_readonly("encoder_time", &PyClass::encoder_time)
+      .def_readonly("search_time", &PyClass::search_time)
+      .def("__str__", [](const PyClass &self) -> std::string {
+        std::ostringstream os;
+        os << "OnlineDecodeTiming(encoder_time=" << self.encoder_time
+           << ", search_time=" << self.search_time << ")";
+        return os.str();
+      });
+}
+
 void PybindOnlineRecognizer(py::module &m) {  // NOLINT
   PybindOnlineRecognizerConfig(m);
+  PybindOnlineDecodeTiming(m);
   using PyClass = OnlineRecognizer;
   py::class_<PyClass>(m, "OnlineRecognizer")
       .def(py::init<const OnlineRecognizerConfig &>(), py::arg("config"))
@@ -102,6 +133,14 @@ void PybindOnlineRecognizer(py::module &m) {  // NOLINT
             return self.CreateStream(contexts_list);
           },
           py::arg("contexts_list"), py::call_guard<py::gil_scoped_release>())
+      .def(
+          "restore_stream",
+          [](PyClass &self, py::bytes data) {
+            std::string s = data;
+            py::gil_scoped_release release;
+            return self.RestoreStream(s);
+          },
+          py::arg("data"))
       .def("is_ready", &PyClass::IsReady, py::arg("s"),
            py::call_guard<py::gil_scoped_release>())
       .def("is_endpoint", &PyClass::IsEndpoint, py::arg("s"),
@@ -111,7 +150,9 @@ void PybindOnlineRecognizer(py::module &m) {  // NOLINT
       .def(
           "decode_streams",
           [](PyClass &self, std::vector<OnlineStream *> &ss) {
-            self.DecodeStreams(ss.data(), ss.size());
+            OnlineDecodeTiming timing;
+            self.DecodeStreams(ss.data(), ss.size(), &timing);
+            return timing;
           },
           py::arg("ss"), py::call_guard<py::gil_scoped_release>())
       .def("get_result", &PyClass::GetResult, py::arg("s"),
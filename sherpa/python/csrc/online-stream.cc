@@ -3,6 +3,7 @@
 // Copyright (c)  2022  Xiaomi Corporation
 #include "sherpa/cpp_api/online-stream.h"
 
+#include <string>
 #include <vector>
 
 #include "sherpa/python/csrc/online-stream.h"
@@ -13,28 +14,41 @@ namespace sherpa {
 static void PybindOnlineRecognitionResult(py::module &m) {  // NOLINT
   using PyClass = OnlineRecognitionResult;
   py::class_<PyClass>(m, "OnlineRecognitionResult")
-      .def_property_readonly(
-          "text", [](const PyClass &self) { return self.text; },
-          py::call_guard<py::gil_scoped_release>())
-      .def_property_readonly(
-          "tokens", [](const PyClass &self) { return self.tokens; },
-          py::call_guard<py::gil_scoped_release>())
-      .def_property_readonly(
-          "timestamps", [](const PyClass &self) { return self.timestamps; },
-          py::call_guard<py::gil_scoped_release>())
-      .def_property_readonly(
-          "segment", [](const PyClass &self) { return self.segment; },
-          py::call_guard<py::gil_scoped_release>())
-      .def_property_readonly(
-          "start_time", [](const PyClass &self) { return self.start_time; },
-          py::call_guard<py::gil_scoped_release>())
-      .def_property_readonly(
-          "is_final", [](const PyClass &self) { return self.is_final; },
-          py::call_guard<py::gil_scoped_release>())
-      .def("__str__", &PyClass::AsJsonString,
+      .def(py::init<>())
+      .def_readwrite("text", &PyClass::text)
+      .def_readwrite("tokens", &PyClass::tokens)
+      .def_readwrite("timestamps", &PyClass::timestamps)
+      .def_readwrite("segment", &PyClass::segment)
+      .def_readwrite("start_time", &PyClass::start_time)
+      .def_readwrite("is_final", &PyClass::is_final)
+      .def("__eq__",
+           [](const PyClass &self, const PyClass &other) {
+             return self == other;
+           })
+      .def("__str__",
+           [](const PyClass &self) { return self.AsJsonString(); },
            py::call_guard<py::gil_scoped_release>())
-      .def("as_json_string", &PyClass::AsJsonString,
-           py::call_guard<py::gil_scoped_release>());
+      .def(
+          "as_json_string",
+          [](const PyClass &self) { return self.AsJsonString(); },
+          py::call_guard<py::gil_scoped_release>())
+      .def(
+          "as_json_string",
+          [](const PyClass &self, const PyClass &prev) {
+            return self.AsJsonString(prev);
+          },
+          py::arg("prev"), py::call_guard<py::gil_scoped_release>())
+      .def(
+          "as_msgpack",
+          [](const PyClass &self, const PyClass &prev) -> py::bytes {
+            std::string s;
+            {
+              py::gil_scoped_release release;
+              s = self.AsMsgpack(prev);
+            }
+            return py::bytes(s);
+          },
+          py::arg("prev"));
 }
 
 void PybindOnlineStream(py::module &m) {  // NOLINT
@@ -45,7 +59,22 @@ void PybindOnlineStream(py::module &m) {  // NOLINT
            py::arg("sampling_rate"), py::arg("waveform"),
            py::call_guard<py::gil_scoped_release>())
       .def("input_finished", &PyClass::InputFinished,
-           py::call_guard<py::gil_scoped_release>());
+           py::call_guard<py::gil_scoped_release>())
+      .def_property_readonly("is_serializable", &PyClass::IsSerializable)
+      .def("serialize", [](const PyClass &self) -> py::bytes {
+        if (!self.IsSerializable()) {
+          throw py::value_error(
+              "Streams with a context graph or decoded with "
+              "fast_beam_search cannot be serialized");
+        }
+
+        std::string s;
+        {
+          py::gil_scoped_release release;
+          s = self.Serialize();
+        }
+        return py::bytes(s);
+      });
 }
 
 }  // namespace sherpa
@@ -21,6 +21,7 @@
 #include <string>
 
 #include "sherpa/csrc/version.h"
+#include "sherpa/python/csrc/audio-format.h"
 #include "sherpa/python/csrc/endpoint.h"
 #include "sherpa/python/csrc/fast-beam-search-config.h"
 #include "sherpa/python/csrc/feature-config.h"
@@ -31,6 +32,7 @@
 #include "sherpa/python/csrc/online-stream.h"
 #include "sherpa/python/csrc/resample.h"
 #include "sherpa/python/csrc/speaker-embedding-extractor.h"
+#include "sherpa/python/csrc/vad-asr-pipeline.h"
 #include "sherpa/python/csrc/voice-activity-detector.h"
 
 namespace sherpa {
@@ -43,6 +45,7 @@ PYBIND11_MODULE(_sherpa, m) {
   (void)kaldifeat.attr("FbankOptions");
 
   PybindResample(m);
+  PybindAudioFormat(&m);
 
   PybindFeatureConfig(m);
   PybindFastBeamSearch(m);
@@ -53,6 +56,7 @@ PYBIND11_MODULE(_sherpa, m) {
   PybindOnlineStream(m);
   PybindOnlineRecognizer(m);
   PybindVoiceActivityDetector(&m);
+  PybindVadAsrPipeline(&m);
 
   PybindSpeakerEmbeddingExtractor(&m);
 }
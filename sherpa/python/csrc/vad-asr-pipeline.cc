@@ -0,0 +1,64 @@
+// sherpa/python/csrc/vad-asr-pipeline.cc
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#include "sherpa/python/csrc/vad-asr-pipeline.h"
+
+#include <iomanip>
+#include <sstream>
+
+#include "sherpa/cpp_api/vad-asr-pipeline.h"
+#include "torch/torch.h"
+
+namespace sherpa {
+
+static void PybindVadAsrPipelineConfig(py::module *m) {
+  using PyClass = VadAsrPipelineConfig;
+
+  py::class_<PyClass>(*m, "VadAsrPipelineConfig")
+      .def(py::init<int32_t, float>(), py::arg("max_batch_size") = 16,
+           py::arg("max_batch_duration") = 300)
+      .def_readwrite("max_batch_size", &PyClass::max_batch_size)
+      .def_readwrite("max_batch_duration", &PyClass::max_batch_duration)
+      .def("validate", &PyClass::Validate)
+      .def("__str__", &PyClass::ToString);
+}
+
+static void PybindVadAsrSegment(py::module *m) {
+  using PyClass = VadAsrSegment;
+  py::class_<PyClass>(*m, "VadAsrSegment")
+      .def_property_readonly("start",
+                             [](const PyClass &self) { return self.start; })
+      .def_property_readonly("end",
+                             [](const PyClass &self) { return self.end; })
+      .def_property_readonly("result",
+                             [](const PyClass &self) { return self.result; })
+      .def_property_readonly(
+          "text", [](const PyClass &self) { return self.result.text; })
+      .def("__str__", [](const PyClass &self) {
+        std::ostringstream os;
+        os << "VadAsrSegment(";
+        os << std::fixed << std::setprecision(3) << self.start << ", ";
+        os << std::fixed << std::setprecision(3) << self.end << ", ";
+        os << "\"" << self.result.text << "\")";
+        return os.str();
+      });
+}
+
+void PybindVadAsrPipeline(py::module *m) {
+  PybindVadAsrPipelineConfig(m);
+  PybindVadAsrSegment(m);
+
+  using PyClass = VadAsrPipeline;
+  py::class_<PyClass>(*m, "VadAsrPipeline")
+      .def(py::init<const VadAsrPipelineConfig &, const VoiceActivityDetector *,
+                    OfflineRecognizer *>(),
+           py::arg("config"), py::arg("vad"), py::arg("recognizer"),
+           py::keep_alive<1, 3>(), py::keep_alive<1, 4>())
+      .def_property_readonly("config", &PyClass::GetConfig)
+      .def("process", &PyClass::Process, py::arg("samples"),
+           py::call_guard<py::gil_scoped_release>())
+      .def_static("get_batches", &PyClass::GetBatches, py::arg("num_samples"),
+                  py::arg("max_batch_size"), py::arg("max_batch_samples"));
+}
+
+}  // namespace sherpa
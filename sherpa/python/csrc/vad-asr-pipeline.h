@@ -0,0 +1,15 @@
+// sherpa/python/csrc/vad-asr-pipeline.h
+//
+// Copyright (c)  2025  Xiaomi Corporation
+#ifndef SHERPA_PYTHON_CSRC_VAD_ASR_PIPELINE_H_
+#define SHERPA_PYTHON_CSRC_VAD_ASR_PIPELINE_H_
+
+#include "sherpa/python/csrc/sherpa.h"
+
+namespace sherpa {
+
+void PybindVadAsrPipeline(py::module *m);
+
+}
+
+#endif  // SHERPA_PYTHON_CSRC_VAD_ASR_PIPELINE_H_
@@ -4,7 +4,10 @@
 #include "sherpa/python/csrc/voice-activity-detector.h"
 
 #include <iomanip>
+#include <memory>
+#include <vector>
 
+#include "sherpa/csrc/voice-activity-detector-stream.h"
 #include "sherpa/csrc/voice-activity-detector.h"
 #include "sherpa/python/csrc/voice-activity-detector-config.h"
 #include "torch/torch.h"
@@ -27,16 +30,49 @@ void PybindSpeechSegment(py::module *m) {
       });
 }
 
+static void PybindVoiceActivityDetectorStream(py::module *m) {
+  using PyClass = VoiceActivityDetectorStream;
+  py::class_<PyClass>(*m, "VoiceActivityDetectorStream")
+      .def(
+          "accept_waveform",
+          [](PyClass &self, const std::vector<float> &samples) {
+            self.AcceptWaveform(samples.data(), samples.size());
+          },
+          py::arg("samples"), py::call_guard<py::gil_scoped_release>())
+      .def(
+          "accept_waveform",
+          [](PyClass &self, torch::Tensor samples) {
+            samples = samples.contiguous().cpu();
+            self.AcceptWaveform(samples.data_ptr<float>(), samples.numel());
+          },
+          py::arg("samples"), py::call_guard<py::gil_scoped_release>())
+      .def("flush", &PyClass::Flush)
+      .def_property_readonly("is_finished", &PyClass::IsFinished)
+      .def("empty", &PyClass::Empty)
+      .def("pop_segment", &PyClass::PopSegment);
+}
+
 void PybindVoiceActivityDetector(py::module *m) {
   PybindVoiceActivityDetectorConfig(m);
   PybindSpeechSegment(m);
+  PybindVoiceActivityDetectorStream(m);
 
   using PyClass = VoiceActivityDetector;
   py::class_<PyClass>(*m, "VoiceActivityDetector")
       .def(py::init<const VoiceActivityDetectorConfig &>(), py::arg("config"))
       .def_property_readonly("config", &PyClass::GetConfig)
       .def("process", &PyClass::Process, py::arg("samples"),
-           py::call_guard<py::gil_scoped_release>());
+           py::call_guard<py::gil_scoped_release>())
+      .def("create_stream", &PyClass::CreateStream,
+           py::call_guard<py::gil_scoped_release>())
+      .def("process_stream", &PyClass::ProcessStream, py::arg("s"),
+           py::call_guard<py::gil_scoped_release>())
+      .def(
+          "process_streams",
+          [](PyClass &self, std::vector<VoiceActivityDetectorStream *> &ss) {
+            self.ProcessStreams(ss.data(), ss.size());
+          },
+          py::arg("ss"), py::call_guard<py::gil_scoped_release>());
 }
 
 }  // namespace sherpa
@@ -10,6 +10,7 @@ if torch.__version__.split("+")[0] != sherpa_torch_version.split("+")[0]:
     )
 
 from _sherpa import (
+    AudioFormat,
     EndpointConfig,
     EndpointRule,
     FastBeamSearchConfig,
@@ -22,6 +23,7 @@ from _sherpa import (
     OfflineSenseVoiceModelConfig,
     OfflineStream,
     OfflineWhisperModelConfig,
+    OnlineDecodeTiming,
     OnlineRecognitionResult,
     OnlineRecognizer,
     OnlineRecognizerConfig,
@@ -29,11 +31,25 @@ from _sherpa import (
     SileroVadModelConfig,
     SpeakerEmbeddingExtractor,
     SpeakerEmbeddingExtractorConfig,
+    VadAsrPipeline,
+    VadAsrPipelineConfig,
+    VadAsrSegment,
     VadModelConfig,
     VoiceActivityDetector,
     VoiceActivityDetectorConfig,
+    VoiceActivityDetectorStream,
     cxx_flags,
 )
 
+from .admission_controller import AdmissionController
+from .batch_scheduler import (
+    BatchScheduler,
+    BatchSchedulerStats,
+    BucketBatchScheduler,
+)
+from .event_loop_monitor import EventLoopLagMonitor
 from .http_server import HttpServer
+from .metrics import Gauge, Histogram, Metrics, ServerMetrics
+from .session_store import SessionStore
 from .utils import encode_contexts, setup_logger, str2bool
+from .workers import ConnectionCounter, create_listening_socket, run_workers
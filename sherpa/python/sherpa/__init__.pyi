@@ -4,6 +4,18 @@ from typing import List, overload
 import kaldifeat
 import torch
 
+class AudioFormat:
+    def __init__(
+        self, sample_rate: int = 16000, sample_format: str = "f32le"
+    ): ...
+
+    sample_rate: int
+    sample_format: str
+    @property
+    def bytes_per_sample(self) -> int: ...
+    def from_json(self, s: str) -> bool: ...
+    def convert(self, data: bytes) -> torch.Tensor: ...
+
 class EndpointRule:
     @overload
     def __init__(self): ...
@@ -214,33 +226,45 @@ class OnlineRecognizerConfig:
     def validate(self) -> None: ...
 
 class OnlineRecognitionResult:
-    @property
-    def text(self) -> str: ...
-    @property
-    def tokens(self) -> List[str]: ...
-    @property
-    def timestamps(self) -> float: ...
-    @property
-    def segment(self) -> int: ...
-    @property
-    def start_time(self) -> float: ...
-    @property
-    def is_final(self) -> bool: ...
+    def __init__(self): ...
+
+    text: str
+    tokens: List[str]
+    timestamps: List[float]
+    segment: int
+    start_time: float
+    is_final: bool
+
+    def __eq__(self, other: "OnlineRecognitionResult") -> bool: ...
+    @overload
     def as_json_string(self) -> str: ...
+    @overload
+    def as_json_string(self, prev: "OnlineRecognitionResult") -> str: ...
+    def as_msgpack(self, prev: "OnlineRecognitionResult") -> bytes: ...
 
 class OnlineStream:
     def accept_waveform(
         self, sampling_rate: int, waveform: torch.Tensor
     ) -> None: ...
     def input_finished(self) -> None: ...
+    @property
+    def is_serializable(self) -> bool: ...
+    def serialize(self) -> bytes: ...
+
+class OnlineDecodeTiming:
+    def __init__(self): ...
+
+    encoder_time: float
+    search_time: float
 
 class OnlineRecognizer:
     def __init__(self, config: OnlineRecognizerConfig): ...
     def create_stream(self) -> OnlineStream: ...
+    def restore_stream(self, data: bytes) -> OnlineStream: ...
     def is_ready(self, s: OnlineStream) -> bool: ...
     def is_endpoint(self, s: OnlineStream) -> bool: ...
     def decode_stream(self, s: OnlineStream) -> bool: ...
-    def decode_streams(self, ss: List[OnlineStream]) -> None: ...
+    def decode_streams(self, ss: List[OnlineStream]) -> OnlineDecodeTiming: ...
     def get_result(self, s: OnlineStream) -> OnlineRecognitionResult: ...
     @property
     def config(self) -> OnlineRecognizerConfig: ...
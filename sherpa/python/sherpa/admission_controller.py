@@ -0,0 +1,190 @@
+# Copyright      2023  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import math
+from typing import Callable, Optional
+
+from .batch_scheduler import BatchScheduler
+
+
+class AdmissionController:
+    """
+    Decide whether to accept a new session from the measured load of a
+    BatchScheduler.
+
+    Every ``interval_ms`` milliseconds, it measures
+
+      - the queue delay, i.e., the mean time that the items dispatched in the
+        interval spent in the queue, or the time that the oldest queued item
+        has waited if that is larger, and
+      - the utilization of the NN pool, i.e., the fraction of the interval
+        during which the threads of the executor were processing batches.
+
+    Both are smoothed with an exponential moving average.
+
+    The server is overloaded if the queue delay exceeds
+    ``max_queue_delay_ms`` while the utilization is at least
+    ``min_utilization``. Accepting more sessions then would only make all of
+    them slower, so new sessions are deferred for up to ``max_defer_ms``
+    milliseconds and rejected if the server is still overloaded.
+    """
+
+    def __init__(
+        self,
+        scheduler: BatchScheduler,
+        max_queue_delay_ms: float,
+        min_utilization: float = 0.9,
+        max_defer_ms: float = 0,
+        interval_ms: float = 100,
+        smoothing: float = 0.2,
+    ):
+        """
+        Args:
+          scheduler:
+            The batch scheduler of the server.
+          max_queue_delay_ms:
+            The latency SLO. A non-positive value disables admission control.
+            It should be larger than max_wait_ms of the scheduler since items
+            are expected to wait that long for a full batch.
+          min_utilization:
+            A value in the range [0, 1]. The server is not considered as
+            overloaded if the utilization of the NN pool is below it, e.g.,
+            when the delay is caused by a slow client.
+          max_defer_ms:
+            Max time in milliseconds to wait for the load to decrease before
+            rejecting a new session.
+          interval_ms:
+            Time in milliseconds between two measurements.
+          smoothing:
+            Weight of a new measurement in the moving average. A value in the
+            range (0, 1].
+        """
+        assert 0 <= min_utilization <= 1, min_utilization
+        assert max_defer_ms >= 0, max_defer_ms
+        assert interval_ms > 0, interval_ms
+        assert 0 < smoothing <= 1, smoothing
+
+        self.scheduler = scheduler
+        self.max_queue_delay = max_queue_delay_ms / 1000
+        self.min_utilization = min_utilization
+        self.max_defer = max_defer_ms / 1000
+        self.interval = interval_ms / 1000
+        self.smoothing = smoothing
+
+        # Smoothed queue delay in seconds
+        self.queue_delay = 0
+        self.utilization = 0
+
+        self.num_admitted = 0
+        self.num_deferred = 0
+        self.num_rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_queue_delay > 0
+
+    @property
+    def overloaded(self) -> bool:
+        return (
+            self.enabled
+            and self.queue_delay > self.max_queue_delay
+            and self.utilization >= self.min_utilization
+        )
+
+    @property
+    def retry_after(self) -> int:
+        """Number of seconds that a rejected client should wait before
+        retrying. The more the queue delay exceeds the SLO, the longer
+        it is."""
+        if not self.enabled:
+            return 1
+        return min(
+            max(math.ceil(self.queue_delay / self.max_queue_delay), 1), 60
+        )
+
+    async def run(self):
+        """Measure the load forever. It should be run in a separate task."""
+        loop = asyncio.get_running_loop()
+        scheduler = self.scheduler
+
+        last_time = loop.time()
+        last_busy_time = scheduler.busy_time(last_time)
+        last_stats = (
+            scheduler.stats.num_items,
+            scheduler.stats.total_queue_wait,
+        )
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            now = loop.time()
+            busy_time = scheduler.busy_time(now)
+            stats = scheduler.stats
+
+            elapsed = now - last_time
+            utilization = (busy_time - last_busy_time) / (
+                elapsed * scheduler.max_in_flight
+            )
+
+            num_items = stats.num_items - last_stats[0]
+            delay = 0
+            if num_items > 0:
+                delay = (stats.total_queue_wait - last_stats[1]) / num_items
+            delay = max(delay, scheduler.oldest_wait(now))
+
+            a = self.smoothing
+            self.utilization = (
+                a * min(utilization, 1) + (1 - a) * self.utilization
+            )
+            self.queue_delay = a * delay + (1 - a) * self.queue_delay
+
+            last_time = now
+            last_busy_time = busy_time
+            last_stats = (stats.num_items, stats.total_queue_wait)
+
+    async def admit(
+        self, try_acquire: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """Return True if a new session can be accepted. If the server is
+        overloaded, it waits for up to max_defer_ms before giving up.
+
+        Args:
+          try_acquire:
+            Optional. If not None, it is called once the load permits the
+            session, e.g., to take a connection slot. The session is rejected
+            if it returns False.
+        """
+        if self.overloaded and self.max_defer > 0:
+            self.num_deferred += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.max_defer
+            while self.overloaded and loop.time() < deadline:
+                await asyncio.sleep(min(self.interval, deadline - loop.time()))
+
+        if self.overloaded or (try_acquire is not None and not try_acquire()):
+            self.num_rejected += 1
+            return False
+
+        self.num_admitted += 1
+        return True
+
+    def __str__(self) -> str:
+        return (
+            f"queue delay (ms): {self.queue_delay * 1000:.3f}, "
+            f"utilization: {self.utilization:.3f}, "
+            f"admitted/deferred/rejected: "
+            f"{self.num_admitted}/{self.num_deferred}/{self.num_rejected}"
+        )
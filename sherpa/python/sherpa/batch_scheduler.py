@@ -0,0 +1,532 @@
+# Copyright      2023  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import bisect
+import collections
+import logging
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, Optional, Set, Tuple
+
+
+@dataclass
+class BatchSchedulerStats:
+    # Max time in milliseconds an item may wait in the queue before
+    # a (possibly partial) batch is dispatched
+    admission_deadline_ms: float
+
+    # Number of batches dispatched so far
+    num_batches: int = 0
+
+    # Number of items dispatched so far
+    num_items: int = 0
+
+    # Sum of the time in seconds that dispatched items spent in the queue
+    total_queue_wait: float = 0
+
+    # Max time in seconds that a dispatched item spent in the queue
+    max_queue_wait: float = 0
+
+    # Number of batches that are being processed by the executor
+    num_in_flight: int = 0
+
+    # Number of items waiting in the queue
+    queue_size: int = 0
+
+    max_batch_size: int = 1
+
+    # Sum of the lengths of dispatched items. Used only by
+    # BucketBatchScheduler
+    num_frames: int = 0
+
+    # Sum of the padded lengths of dispatched items, i.e., the length of the
+    # longest item in a batch times the batch size. Used only by
+    # BucketBatchScheduler
+    num_padded_frames: int = 0
+
+    @property
+    def padding_efficiency(self) -> float:
+        """Ratio of the non-padding frames to all frames in batches."""
+        if self.num_padded_frames == 0:
+            return 1
+        return self.num_frames / self.num_padded_frames
+
+    @property
+    def batch_fill_ratio(self) -> float:
+        """Average batch size divided by max_batch_size."""
+        if self.num_batches == 0:
+            return 0
+        return self.num_items / (self.num_batches * self.max_batch_size)
+
+    @property
+    def mean_queue_wait_ms(self) -> float:
+        if self.num_items == 0:
+            return 0
+        return self.total_queue_wait / self.num_items * 1000
+
+    def __str__(self) -> str:
+        s = (
+            f"batches: {self.num_batches}, "
+            f"fill ratio: {self.batch_fill_ratio:.3f}, "
+            f"queue wait (ms) mean/max: {self.mean_queue_wait_ms:.3f}/"
+            f"{self.max_queue_wait * 1000:.3f}, "
+            f"admission deadline (ms): {self.admission_deadline_ms}, "
+            f"in flight: {self.num_in_flight}, "
+            f"queued: {self.queue_size}"
+        )
+        if self.num_padded_frames > 0:
+            s += f", padding efficiency: {self.padding_efficiency:.3f}"
+        return s
+
+
+class BatchScheduler:
+    """
+    Collect items submitted from many coroutines into batches and run them
+    in an executor.
+
+    The scheduler is event driven: it wakes up only when an item is
+    submitted or when the admission deadline of the oldest queued item
+    expires. A batch is dispatched once it contains ``max_batch_size`` items
+    or once the oldest item has waited ``max_wait_ms`` milliseconds.
+    Up to ``max_in_flight`` batches are processed concurrently so that
+    all threads of the executor can be kept busy.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], None],
+        executor: Executor,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_in_flight: int = 1,
+        on_dispatch: Optional[Callable[[List[float]], None]] = None,
+    ):
+        """
+        Args:
+          process_batch:
+            A function that takes a list of items and processes them.
+            It is invoked in `executor`. If it returns a list, the i-th
+            element is returned to the submitter of the i-th item.
+          executor:
+            The executor, e.g., a ThreadPoolExecutor, to run process_batch.
+          max_batch_size:
+            Max number of items in a batch.
+          max_wait_ms:
+            Max time in milliseconds measured from the time the oldest item
+            is submitted to wait for a full batch.
+          max_in_flight:
+            Max number of batches that are processed at the same time.
+            Usually it equals to the number of threads in `executor`.
+          on_dispatch:
+            Optional. If not None, it is called with the time in seconds
+            that each item of a batch has waited in the queue when the batch
+            is dispatched, e.g., to update metrics.
+        """
+        assert max_batch_size > 0, max_batch_size
+        assert max_wait_ms >= 0, max_wait_ms
+        assert max_in_flight > 0, max_in_flight
+
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.on_dispatch = on_dispatch
+
+        # Each entry is (item, future, enqueue time)
+        self._queue: Deque[Tuple[Any, asyncio.Future, float]] = (
+            collections.deque()
+        )
+
+        # Note: They are created inside run() so that they are bound
+        # to the running event loop.
+        self._item_available: Optional[asyncio.Event] = None
+        self._slot_available: Optional[asyncio.Event] = None
+        self._num_in_flight = 0
+
+        # Tasks running _run_batch(). The event loop keeps only weak
+        # references to tasks, so we keep them here until they finish.
+        self._tasks: Set[asyncio.Task] = set()
+
+        # See busy_time()
+        self._busy_time = 0.0
+        self._busy_since = 0.0
+
+        self._stats = BatchSchedulerStats(
+            admission_deadline_ms=max_wait_ms,
+            max_batch_size=max_batch_size,
+        )
+
+    @property
+    def stats(self) -> BatchSchedulerStats:
+        self._stats.num_in_flight = self._num_in_flight
+        self._stats.queue_size = len(self._queue)
+        return self._stats
+
+    def busy_time(self, now: float) -> float:
+        """Return the total time in seconds that batches have been processed
+        up to `now`, i.e., the integral of the number of in-flight batches
+        over time. Its increase over an interval divided by the length of the
+        interval and max_in_flight is the utilization of the executor.
+
+        Args:
+          now:
+            The current time of the event loop, i.e., loop.time().
+        """
+        return self._busy_time + self._num_in_flight * (now - self._busy_since)
+
+    def oldest_wait(self, now: float) -> float:
+        """Return the time in seconds that the oldest queued item has waited.
+        It is 0 if the queue is empty."""
+        if not self._queue:
+            return 0
+        return now - self._queue[0][2]
+
+    def _set_num_in_flight(self, n: int) -> None:
+        now = asyncio.get_running_loop().time()
+        self._busy_time = self.busy_time(now)
+        self._busy_since = now
+        self._num_in_flight = n
+
+    async def submit(self, item: Any) -> Any:
+        """Put an item into the queue and wait until it is processed.
+
+        If process_batch raises, the exception is re-raised here.
+
+        Returns:
+          Return the result of process_batch for this item, or None if
+          process_batch does not return a list.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((item, future, loop.time()))
+
+        if self._item_available is not None:
+            self._item_available.set()
+
+        return await future
+
+    async def run(self):
+        """Dispatch batches forever. It should be run in a separate task."""
+        loop = asyncio.get_running_loop()
+        self._item_available = asyncio.Event()
+        self._slot_available = asyncio.Event()
+
+        while True:
+            while self._num_in_flight >= self.max_in_flight:
+                self._slot_available.clear()
+                await self._slot_available.wait()
+
+            while not self._queue:
+                self._item_available.clear()
+                await self._item_available.wait()
+
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                self._item_available.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._item_available.wait(), timeout=timeout
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            batch = []
+            waits = []
+            now = loop.time()
+            while self._queue and len(batch) < self.max_batch_size:
+                item, future, enqueue_time = self._queue.popleft()
+                if future.cancelled():
+                    # The connection is gone while waiting in the queue
+                    continue
+                batch.append((item, future))
+
+                wait = now - enqueue_time
+                waits.append(wait)
+                self._stats.total_queue_wait += wait
+                self._stats.max_queue_wait = max(
+                    self._stats.max_queue_wait, wait
+                )
+
+            if not batch:
+                continue
+
+            if self.on_dispatch is not None:
+                self.on_dispatch(waits)
+
+            self._stats.num_batches += 1
+            self._stats.num_items += len(batch)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self._set_num_in_flight(self._num_in_flight + 1)
+        task = asyncio.create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_batch_done)
+
+    def _on_batch_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Failed to run a batch", exc_info=task.exception())
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor,
+                self.process_batch,
+                [b[0] for b in batch],
+            )
+        except Exception as e:
+            for _, f in batch:
+                if not f.done():
+                    f.set_exception(e)
+        else:
+            if not isinstance(results, list):
+                results = [None] * len(batch)
+
+            for (_, f), r in zip(batch, results):
+                if not f.done():
+                    f.set_result(r)
+        finally:
+            self._set_num_in_flight(self._num_in_flight - 1)
+            self._slot_available.set()
+
+
+class BucketBatchScheduler(BatchScheduler):
+    """
+    A BatchScheduler that batches items of similar lengths.
+
+    Each item is submitted with its length, e.g., the number of feature
+    frames, and is put into a bucket according to ``bucket_boundaries``.
+    Batches are built from a single bucket, so little computation is
+    wasted on padding.
+
+    A bucket is dispatched once no more items can be added to its batch,
+    i.e., (length of the longest item) * (number of items) would exceed
+    ``max_frames_per_batch``, or once its oldest item has waited
+    ``max_wait_ms`` milliseconds.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], None],
+        executor: Executor,
+        bucket_boundaries: List[int],
+        max_frames_per_batch: int,
+        max_wait_ms: float,
+        max_batch_size: int = 1000,
+        max_in_flight: int = 1,
+        on_dispatch: Optional[Callable[[List[float]], None]] = None,
+    ):
+        """
+        Args:
+          process_batch:
+            A function that takes a list of items and processes them.
+            It is invoked in `executor`. See BatchScheduler.
+          executor:
+            The executor, e.g., a ThreadPoolExecutor, to run process_batch.
+          bucket_boundaries:
+            A sorted list of lengths. Items with length in the range
+            (bucket_boundaries[i-1], bucket_boundaries[i]] are put into the
+            i-th bucket. Items longer than the last boundary are put into
+            the last bucket.
+          max_frames_per_batch:
+            Max value of (length of the longest item) * (number of items)
+            of a batch. An item longer than it is put in a batch of its own.
+          max_wait_ms:
+            Max time in milliseconds measured from the time the oldest item
+            of a bucket is submitted to wait for a full batch.
+          max_batch_size:
+            Max number of items in a batch.
+          max_in_flight:
+            Max number of batches that are processed at the same time.
+            Usually it equals to the number of threads in `executor`.
+          on_dispatch:
+            Optional. See BatchScheduler.
+        """
+        super().__init__(
+            process_batch=process_batch,
+            executor=executor,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_in_flight=max_in_flight,
+            on_dispatch=on_dispatch,
+        )
+        assert list(bucket_boundaries) == sorted(bucket_boundaries), (
+            bucket_boundaries
+        )
+        assert max_frames_per_batch > 0, max_frames_per_batch
+
+        self.bucket_boundaries = list(bucket_boundaries)
+        self.max_frames_per_batch = max_frames_per_batch
+
+        # Each entry is (item, future, enqueue time, length)
+        self._buckets: List[Deque[Tuple[Any, asyncio.Future, float, int]]] = [
+            collections.deque() for _ in range(len(self.bucket_boundaries) + 1)
+        ]
+
+    @property
+    def stats(self) -> BatchSchedulerStats:
+        self._stats.num_in_flight = self._num_in_flight
+        self._stats.queue_size = sum(len(b) for b in self._buckets)
+        return self._stats
+
+    def oldest_wait(self, now: float) -> float:
+        waits = [now - b[0][2] for b in self._buckets if b]
+        return max(waits, default=0)
+
+    async def submit(self, item: Any, length: int = 1) -> Any:
+        """Put an item into its bucket and wait until it is processed.
+
+        If process_batch raises, the exception is re-raised here.
+        See BatchScheduler.submit() for the return value.
+
+        Args:
+          item:
+            The item to process.
+          length:
+            Length of the item, e.g., number of feature frames.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        i = bisect.bisect_left(self.bucket_boundaries, length)
+        self._buckets[i].append((item, future, loop.time(), length))
+
+        if self._item_available is not None:
+            self._item_available.set()
+
+        return await future
+
+    def _batch_size(self, bucket: Deque) -> Tuple[int, int]:
+        """Return a tuple (n, max_len), where n is the number of items at the
+        front of the bucket that fit into a batch and max_len is the length
+        of the longest one. n is at least 1 for a non-empty bucket."""
+        n = 0
+        max_len = 0
+        for _, _, _, length in bucket:
+            if n > 0 and (
+                n >= self.max_batch_size
+                or max(max_len, length) * (n + 1) > self.max_frames_per_batch
+            ):
+                break
+            max_len = max(max_len, length)
+            n += 1
+        return n, max_len
+
+    def _select_bucket(self, now: float) -> Tuple[Optional[int], float]:
+        """Select a bucket to dispatch.
+
+        Returns:
+          Return a tuple (index, timeout). If index is not None, the bucket
+          with that index should be dispatched now. Otherwise, timeout is
+          the time in seconds until the next deadline.
+        """
+        timeout = float("inf")
+        oldest = None
+        for i, bucket in enumerate(self._buckets):
+            if not bucket:
+                continue
+
+            n, max_len = self._batch_size(bucket)
+            if i < len(self.bucket_boundaries):
+                # Items arriving later may be as long as the boundary
+                max_len = max(max_len, self.bucket_boundaries[i])
+
+            if (
+                n < len(bucket)
+                or n >= self.max_batch_size
+                or max_len * (n + 1) > self.max_frames_per_batch
+            ):
+                # It is full. No more items can be added to the batch.
+                return i, 0
+
+            deadline = bucket[0][2] + self.max_wait
+            if deadline - now < timeout:
+                timeout = deadline - now
+                oldest = i
+
+        if timeout <= 0:
+            return oldest, 0
+
+        return None, timeout
+
+    async def run(self):
+        """Dispatch batches forever. It should be run in a separate task."""
+        loop = asyncio.get_running_loop()
+        self._item_available = asyncio.Event()
+        self._slot_available = asyncio.Event()
+
+        while True:
+            while self._num_in_flight >= self.max_in_flight:
+                self._slot_available.clear()
+                await self._slot_available.wait()
+
+            while not any(self._buckets):
+                self._item_available.clear()
+                await self._item_available.wait()
+
+            index, timeout = self._select_bucket(loop.time())
+            if index is None:
+                self._item_available.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._item_available.wait(), timeout=timeout
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            bucket = self._buckets[index]
+            n, _ = self._batch_size(bucket)
+
+            batch = []
+            lengths = []
+            waits = []
+            now = loop.time()
+            for _ in range(n):
+                item, future, enqueue_time, length = bucket.popleft()
+                if future.cancelled():
+                    # The connection is gone while waiting in the queue
+                    continue
+                batch.append((item, future))
+                lengths.append(length)
+
+                wait = now - enqueue_time
+                waits.append(wait)
+                self._stats.total_queue_wait += wait
+                self._stats.max_queue_wait = max(
+                    self._stats.max_queue_wait, wait
+                )
+
+            if not batch:
+                continue
+
+            if self.on_dispatch is not None:
+                self.on_dispatch(waits)
+
+            self._stats.num_batches += 1
+            self._stats.num_items += len(batch)
+            self._stats.num_frames += sum(lengths)
+            self._stats.num_padded_frames += max(lengths) * len(lengths)
+
+            self._dispatch(batch)
@@ -0,0 +1,80 @@
+# Copyright      2023  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import collections
+from typing import Deque
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how late the event loop wakes up a coroutine.
+
+    A task sleeps for ``interval_ms`` milliseconds repeatedly. The lag is the
+    extra time it takes to wake up. A large lag means that some code
+    blocks the event loop, e.g., computing features in the loop thread,
+    which delays the I/O of all connections.
+    """
+
+    def __init__(self, interval_ms: float = 50, max_num_samples: int = 1000):
+        """
+        Args:
+          interval_ms:
+            Time in milliseconds between two measurements.
+          max_num_samples:
+            Only the most recent max_num_samples measurements are kept
+            for computing percentiles.
+        """
+        assert interval_ms > 0, interval_ms
+        assert max_num_samples > 0, max_num_samples
+
+        self.interval = interval_ms / 1000
+
+        # lags in seconds
+        self._lags: Deque[float] = collections.deque(maxlen=max_num_samples)
+        self.max_lag = 0
+
+    async def run(self):
+        """Measure the lag forever. It should be run in a separate task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0)
+
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def percentile_ms(self, p: float) -> float:
+        """Return the p-th percentile of the recent lags in milliseconds.
+
+        Args:
+          p:
+            A value in the range [0, 100].
+        """
+        if not self._lags:
+            return 0
+
+        lags = sorted(self._lags)
+        index = min(int(len(lags) * p / 100), len(lags) - 1)
+        return lags[index] * 1000
+
+    def __str__(self) -> str:
+        return (
+            f"event loop lag (ms) p50/p99/max: "
+            f"{self.percentile_ms(50):.3f}/"
+            f"{self.percentile_ms(99):.3f}/"
+            f"{self.max_lag * 1000:.3f}"
+        )
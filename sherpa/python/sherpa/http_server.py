@@ -13,7 +13,9 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Tuple
+from typing import Optional, Tuple
+
+from .metrics import PROMETHEUS_CONTENT_TYPE, Metrics
 
 # Please sort it alphabetically
 _static_files = (
@@ -55,14 +57,23 @@ def read_file(root: str, name: str) -> str:
 
 class HttpServer:
     """
-    A simple HTTP server that hosts only static files
+    A simple HTTP server that hosts static files and, optionally,
+    /metrics in the Prometheus text format.
     """
 
-    def __init__(self, doc_root: str):
+    def __init__(self, doc_root: str, metrics: Optional[Metrics] = None):
+        """
+        Args:
+          doc_root:
+            Path to the directory containing the static files.
+          metrics:
+            Optional. If not None, it is rendered for requests to /metrics.
+        """
         content = dict()
         for f, mime_type in _static_files:
             content[f] = (read_file(doc_root, f), mime_type)
         self.content = content
+        self.metrics = metrics
 
     def process_request(self, f: str) -> Tuple[str, str, str]:
         """
@@ -76,6 +87,9 @@ class HttpServer:
               contains the content for the 404 page
             - a str, the MIME type of the returned content
         """
+        if f == "/metrics" and self.metrics is not None:
+            return True, self.metrics.render(), PROMETHEUS_CONTENT_TYPE
+
         if f in self.content:
             return True, self.content[f][0], self.content[f][1]
         else:
@@ -0,0 +1,247 @@
+# Copyright      2023  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bisect
+import os
+import sys
+import threading
+from typing import Callable, List, Sequence
+
+import torch
+
+# Content type of the Prometheus text format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets in seconds for latencies
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2)
+
+
+def _format_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    """
+    A Prometheus histogram. observe() costs a binary search and a few
+    additions, so it can be called for every chunk. It is thread-safe.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        """
+        Args:
+          name:
+            Name of the metric, e.g., sherpa_queue_wait_seconds.
+          documentation:
+            Description of the metric.
+          buckets:
+            Sorted upper bounds of the buckets. The +Inf bucket is added
+            automatically.
+        """
+        assert list(buckets) == sorted(buckets), buckets
+
+        self.name = name
+        self.documentation = documentation
+        self.buckets = list(buckets)
+
+        # counts[i] is the number of observations in
+        # (buckets[i-1], buckets[i]]. The last one is for +Inf.
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        ans = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        n = 0
+        for b, c in zip(self.buckets + [float("inf")], counts):
+            n += c
+            ans.append(f'{self.name}_bucket{{le="{_format_value(b)}"}} {n}')
+        ans.append(f"{self.name}_sum {_format_value(total)}")
+        ans.append(f"{self.name}_count {n}")
+        return ans
+
+
+class Gauge:
+    """
+    A Prometheus gauge. Its value is computed by a function when the
+    metrics are scraped, so it costs nothing in between.
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.fn())}",
+        ]
+
+
+class Metrics:
+    """
+    A collection of metrics that can be rendered in the Prometheus text
+    format. See https://prometheus.io/docs/instrumenting/exposition_formats/
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        h = Histogram(name, documentation, buckets)
+        self._metrics.append(h)
+        return h
+
+    def gauge(
+        self, name: str, documentation: str, fn: Callable[[], float]
+    ) -> Gauge:
+        g = Gauge(name, documentation, fn)
+        self._metrics.append(g)
+        return g
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> float:
+    """Return the resident set size of the current process in bytes.
+    If /proc is not available, the peak resident set size is returned."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class ServerMetrics(Metrics):
+    """
+    Metrics of the websocket servers.
+
+    Note: If the server runs several worker processes, each of them has its
+    own metrics. The servers do not serve them at /metrics in that case,
+    since a scrape would return those of the worker that handles it.
+    """
+
+    def __init__(self, num_active_streams: Callable[[], float]):
+        """
+        Args:
+          num_active_streams:
+            A function returning the number of active streams.
+        """
+        super().__init__()
+        self.queue_wait = self.histogram(
+            "sherpa_queue_wait_seconds",
+            "Time that a request waits in the batch queue.",
+        )
+        self.batch_size = self.histogram(
+            "sherpa_batch_size",
+            "Number of requests in a batch.",
+            BATCH_SIZE_BUCKETS,
+        )
+        self.encoder_time = self.histogram(
+            "sherpa_encoder_seconds",
+            "Time to run the encoder for a batch.",
+        )
+        self.search_time = self.histogram(
+            "sherpa_search_seconds",
+            "Time to run the search for a batch.",
+        )
+        self.latency = self.histogram(
+            "sherpa_chunk_latency_seconds",
+            "Time from receiving a message to sending its result.",
+        )
+        self.rtf = self.histogram(
+            "sherpa_connection_rtf",
+            "Real time factor of a connection, i.e., its share of the "
+            "computation time divided by the duration of its audio.",
+            RTF_BUCKETS,
+        )
+        self.gauge(
+            "sherpa_active_streams",
+            "Number of active streams.",
+            num_active_streams,
+        )
+        self.gauge(
+            "sherpa_resident_memory_bytes",
+            "Resident memory of the process.",
+            resident_memory_bytes,
+        )
+        if torch.cuda.is_available():
+            self.gauge(
+                "sherpa_cuda_memory_allocated_bytes",
+                "CUDA memory occupied by tensors.",
+                torch.cuda.memory_allocated,
+            )
+
+    def observe_dispatch(self, queue_waits: List[float]) -> None:
+        """Record a batch dispatched by the batch scheduler.
+
+        Args:
+          queue_waits:
+            Time in seconds that each item of the batch waited in the queue.
+        """
+        self.batch_size.observe(len(queue_waits))
+        for w in queue_waits:
+            self.queue_wait.observe(w)
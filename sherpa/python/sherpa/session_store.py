@@ -0,0 +1,164 @@
+# Copyright      2025  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+A store for serialized streams of idle connections.
+
+The streaming server serializes the stream of a connection that has been
+silent for a while with ``OnlineStream.serialize()`` and moves it into
+this store. The store is backed by a memory-mapped file of a fixed size,
+so the spilled streams are paged out by the kernel instead of occupying
+the memory of the process.
+"""
+import bisect
+import mmap
+import os
+import tempfile
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class SessionStore:
+    """
+    A key-value store of bytes in a memory-mapped file.
+
+    The space of the file is managed by a first-fit allocator. Free
+    extents are kept sorted by offset and adjacent ones are merged when
+    an entry is removed.
+
+    It is not thread-safe. The streaming server uses it only in the
+    event loop.
+    """
+
+    def __init__(self, capacity: int, filename: Optional[str] = None):
+        """
+        Args:
+          capacity:
+            Size of the file in bytes.
+          filename:
+            Optional. Path to the file. It is created, or truncated if
+            it exists. If None, an anonymous temporary file is used.
+        """
+        assert capacity > 0, capacity
+
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix="sherpa-sessions-")
+            os.unlink(filename)
+        else:
+            fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC)
+
+        try:
+            os.ftruncate(fd, capacity)
+            self._mmap = mmap.mmap(fd, capacity)
+        finally:
+            os.close(fd)
+
+        self.capacity = capacity
+
+        # Sorted list of (offset, size) of free extents
+        self._free: List[Tuple[int, int]] = [(0, capacity)]
+
+        # key -> (offset, size)
+        self._entries: Dict[Hashable, Tuple[int, int]] = {}
+
+        self._used = 0
+
+    @property
+    def used(self) -> int:
+        """Number of bytes occupied by the entries."""
+        return self._used
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def put(self, key: Hashable, data: bytes) -> bool:
+        """Store data under the given key.
+
+        Args:
+          key:
+            The key. It must not exist in the store.
+          data:
+            The bytes to store.
+        Returns:
+          Return True on success. Return False if there is no free extent
+          large enough for the data.
+        """
+        assert key not in self._entries, key
+
+        size = len(data)
+        for i, (offset, free_size) in enumerate(self._free):
+            if free_size < size:
+                continue
+
+            if free_size == size:
+                del self._free[i]
+            else:
+                self._free[i] = (offset + size, free_size - size)
+
+            end = offset + size
+            self._mmap[offset:end] = data
+            self._entries[key] = (offset, size)
+            self._used += size
+            return True
+
+        return False
+
+    def pop(self, key: Hashable) -> bytes:
+        """Remove the entry of the given key and return its data.
+
+        Raises:
+          KeyError if the key does not exist.
+        """
+        offset, size = self._entries[key]
+        end = offset + size
+        data = self._mmap[offset:end]
+        self._release(key)
+        return data
+
+    def discard(self, key: Hashable) -> None:
+        """Remove the entry of the given key if it exists."""
+        if key in self._entries:
+            self._release(key)
+
+    def close(self) -> None:
+        self._entries.clear()
+        self._free = []
+        self._used = 0
+        self._mmap.close()
+
+    def _release(self, key: Hashable) -> None:
+        offset, size = self._entries.pop(key)
+        self._used -= size
+
+        if size == 0:
+            return
+
+        i = bisect.bisect_left(self._free, (offset, size))
+
+        # Merge with the next extent
+        if i < len(self._free) and self._free[i][0] == offset + size:
+            size += self._free[i][1]
+            del self._free[i]
+
+        # Merge with the previous extent
+        if i > 0 and sum(self._free[i - 1]) == offset:
+            offset = self._free[i - 1][0]
+            size += self._free[i - 1][1]
+            del self._free[i - 1]
+            i -= 1
+
+        self._free.insert(i, (offset, size))
@@ -1,6 +1,8 @@
 import argparse
 import logging
 import re
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -94,6 +96,13 @@ def str2bool(v):
         raise argparse.ArgumentTypeError("Boolean value expected.")
 
 
+# Max number of entries in the cache of encode_contexts()
+ENCODE_CONTEXTS_CACHE_SIZE = 128
+
+_encode_contexts_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_encode_contexts_lock = threading.Lock()
+
+
 def encode_contexts(
     modeling_unit: str,
     contexts: List[str],
@@ -104,6 +113,11 @@ def encode_contexts(
     Encode the given contexts (a list of string) to a list of a list of token
     ids.
 
+    Results are cached, so encoding the same contexts again with the same
+    ``sp`` and ``tokens_table`` objects does not tokenize them again. The
+    cache keeps the last :data:`ENCODE_CONTEXTS_CACHE_SIZE` results.
+    Note that ``tokens_table`` must not be modified after it is passed.
+
     Args:
       modeling_unit:
         The valid values are bpe, char, bpe+char.
@@ -118,6 +132,35 @@ def encode_contexts(
     Returns:
       Return the contexts_list, it is a list of a list of token ids.
     """
+    key = (modeling_unit, tuple(contexts), id(sp), id(tokens_table))
+    with _encode_contexts_lock:
+        entry = _encode_contexts_cache.get(key)
+        if entry is not None:
+            _encode_contexts_cache.move_to_end(key)
+            return [list(ids) for ids in entry[-1]]
+
+    contexts_list = _encode_contexts(modeling_unit, contexts, sp, tokens_table)
+
+    with _encode_contexts_lock:
+        # Also keep sp and tokens_table in the entry, so that their ids
+        # are not reused by other objects while the entry exists.
+        _encode_contexts_cache[key] = (
+            sp,
+            tokens_table,
+            [list(ids) for ids in contexts_list],
+        )
+        while len(_encode_contexts_cache) > ENCODE_CONTEXTS_CACHE_SIZE:
+            _encode_contexts_cache.popitem(last=False)
+
+    return contexts_list
+
+
+def _encode_contexts(
+    modeling_unit: str,
+    contexts: List[str],
+    sp: Optional["SentencePieceProcessor"],  # noqa
+    tokens_table: Optional[Dict[str, int]],
+) -> List[List[int]]:
     contexts_list = []
     if "bpe" in modeling_unit:
         assert sp is not None
@@ -0,0 +1,196 @@
+# Copyright      2023  Xiaomi Corp.
+#
+# See ../../../LICENSE for clarification regarding multiple authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Helpers to run a websocket server in multiple worker processes.
+
+The parent process creates the listening socket and forks the workers.
+Every worker inherits the socket and accepts connections from it, so the
+kernel distributes incoming connections among the workers. Each worker
+creates its own recognizer after the fork.
+"""
+import logging
+import multiprocessing
+import multiprocessing.connection
+import socket
+import sys
+from typing import Any, Callable, Optional, Tuple
+
+
+def create_listening_socket(port: int, backlog: int = 1024) -> socket.socket:
+    """Create a TCP socket listening on all interfaces.
+
+    Args:
+      port:
+        The port to listen on.
+      backlog:
+        The backlog argument passed to socket.listen().
+    Returns:
+      Return a non-blocking listening socket that can be shared with
+      worker processes created by :func:`run_workers`.
+    """
+    if socket.has_ipv6:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        # Accept also IPv4 connections, like websockets.serve(host="")
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class ConnectionCounter:
+    """
+    Number of active connections. It is shared by all worker processes
+    so that the limit applies to the server as a whole.
+
+    The connections of each worker are also counted separately, so that
+    those of a worker that dies can be released by :func:`run_workers`.
+    """
+
+    def __init__(self, max_value: int, num_workers: int = 1):
+        """
+        Args:
+          max_value:
+            Max number of active connections.
+          num_workers:
+            Number of worker processes sharing the counter.
+        """
+        assert num_workers > 0, num_workers
+
+        self.max_value = max_value
+
+        # They must be created before forking the workers.
+        # _per_worker is protected by the lock of _value.
+        ctx = multiprocessing.get_context("fork")
+        self._value = ctx.Value("i", 0)
+        self._per_worker = ctx.Array("i", num_workers, lock=False)
+
+        # ID of the worker using this object. Each worker has its own copy
+        # of this attribute. It is set by run_workers() after the fork.
+        self.worker_id = 0
+
+    @property
+    def value(self) -> int:
+        return self._value.value
+
+    def try_acquire(self) -> bool:
+        """Increment the counter if it is less than max_value.
+
+        Returns:
+          Return True if the counter is incremented. False otherwise.
+        """
+        with self._value.get_lock():
+            if self._value.value < self.max_value:
+                self._value.value += 1
+                self._per_worker[self.worker_id] += 1
+                return True
+        return False
+
+    def release(self) -> None:
+        with self._value.get_lock():
+            self._value.value -= 1
+            self._per_worker[self.worker_id] -= 1
+
+    def release_worker(self, worker_id: int) -> int:
+        """Release all connections held by the given worker, e.g., after
+        it has exited.
+
+        Returns:
+          Return the number of released connections.
+        """
+        with self._value.get_lock():
+            n = self._per_worker[worker_id]
+            self._value.value -= n
+            self._per_worker[worker_id] = 0
+        return n
+
+    def __str__(self) -> str:
+        return f"{self.value}/{self.max_value}"
+
+
+def _run_worker(
+    target: Callable[..., None],
+    connection_counter: Optional[ConnectionCounter],
+    worker_id: int,
+    *args,
+) -> None:
+    if connection_counter is not None:
+        connection_counter.worker_id = worker_id
+    target(worker_id, *args)
+
+
+def run_workers(
+    num_workers: int,
+    target: Callable[..., None],
+    args: Tuple[Any, ...] = (),
+    connection_counter: Optional[ConnectionCounter] = None,
+) -> None:
+    """Fork `num_workers` processes running `target(worker_id, *args)`
+    and wait for them to exit.
+
+    Args:
+      num_workers:
+        Number of worker processes.
+      target:
+        The function run by each worker.
+      args:
+        Arguments passed to `target` after the worker ID.
+      connection_counter:
+        Optional. The counter shared by the workers. Once a worker exits,
+        the connections it still holds are released so that they are
+        not lost for the other workers.
+
+    Note: It is not supported on Windows since it relies on fork.
+    """
+    if sys.platform == "win32":
+        raise RuntimeError("Multiple workers are not supported on Windows")
+
+    ctx = multiprocessing.get_context("fork")
+    workers = []
+    for i in range(num_workers):
+        p = ctx.Process(
+            target=_run_worker,
+            args=(target, connection_counter, i) + tuple(args),
+            name=f"worker-{i}",
+        )
+        p.start()
+        logging.info(f"Started worker {i} (pid: {p.pid})")
+        workers.append(p)
+
+    try:
+        # Wait for the workers in the order they exit
+        running = {p.sentinel: i for i, p in enumerate(workers)}
+        while running:
+            for s in multiprocessing.connection.wait(list(running)):
+                i = running.pop(s)
+                p = workers[i]
+                p.join()
+                logging.info(f"{p.name} exited with code {p.exitcode}")
+
+                if connection_counter is not None:
+                    n = connection_counter.release_worker(i)
+                    if n > 0:
+                        logging.warning(f"Released {n} connections of {p.name}")
+    finally:
+        for p in workers:
+            if p.is_alive():
+                p.terminate()
+        for p in workers:
+            p.join()
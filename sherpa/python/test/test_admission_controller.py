@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_admission_controller_py
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import sherpa
+
+
+async def run_with_load(controller, scheduler, num_items, duration):
+    """Submit num_items items to the scheduler and wait for duration seconds
+    while the controller is measuring the load."""
+    scheduler_task = asyncio.create_task(scheduler.run())
+    controller_task = asyncio.create_task(controller.run())
+
+    items = [asyncio.create_task(scheduler.submit(i)) for i in range(num_items)]
+    await asyncio.sleep(duration)
+
+    for t in items:
+        t.cancel()
+    scheduler_task.cancel()
+    controller_task.cancel()
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_overloaded(self):
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: time.sleep(0.05),
+                executor=executor,
+                max_batch_size=1,
+                max_wait_ms=0,
+            )
+            controller = sherpa.AdmissionController(
+                scheduler=scheduler,
+                max_queue_delay_ms=20,
+                interval_ms=10,
+                smoothing=0.5,
+            )
+            await run_with_load(controller, scheduler, 100, 0.3)
+
+            admitted = await controller.admit()
+            executor.shutdown()
+            return controller, admitted
+
+        controller, admitted = asyncio.run(main())
+        print()
+        print(controller)
+        assert controller.overloaded, controller
+        assert not admitted, controller
+        assert controller.num_rejected == 1, controller
+        assert controller.utilization > 0.9, controller
+        assert controller.retry_after >= 1, controller
+
+    def test_not_overloaded(self):
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: time.sleep(0.001),
+                executor=executor,
+                max_batch_size=10,
+                max_wait_ms=0,
+            )
+            controller = sherpa.AdmissionController(
+                scheduler=scheduler,
+                max_queue_delay_ms=100,
+                interval_ms=10,
+            )
+            await run_with_load(controller, scheduler, 2, 0.1)
+
+            admitted = await controller.admit()
+            executor.shutdown()
+            return controller, admitted
+
+        controller, admitted = asyncio.run(main())
+        assert not controller.overloaded, controller
+        assert admitted, controller
+        assert controller.num_admitted == 1, controller
+
+    def test_try_acquire_fails(self):
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: None,
+                executor=executor,
+                max_batch_size=1,
+                max_wait_ms=0,
+            )
+            controller = sherpa.AdmissionController(
+                scheduler=scheduler,
+                max_queue_delay_ms=100,
+            )
+            admitted = await controller.admit(lambda: False)
+            executor.shutdown()
+            return controller, admitted
+
+        controller, admitted = asyncio.run(main())
+        assert not admitted, controller
+        assert controller.num_admitted == 0, controller
+        assert controller.num_rejected == 1, controller
+
+    def test_disabled(self):
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: time.sleep(0.05),
+                executor=executor,
+                max_batch_size=1,
+                max_wait_ms=0,
+            )
+            controller = sherpa.AdmissionController(
+                scheduler=scheduler,
+                max_queue_delay_ms=0,
+                interval_ms=10,
+            )
+            await run_with_load(controller, scheduler, 100, 0.1)
+
+            admitted = await controller.admit()
+            executor.shutdown()
+            return controller, admitted
+
+        controller, admitted = asyncio.run(main())
+        assert controller.queue_delay > 0, controller
+        assert not controller.overloaded, controller
+        assert admitted, controller
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_audio_format_py
+
+import unittest
+
+import torch
+
+import sherpa
+
+
+class TestAudioFormat(unittest.TestCase):
+    def test_from_json(self):
+        f = sherpa.AudioFormat(sample_rate=16000)
+        assert f.sample_format == "f32le", f.sample_format
+        assert f.bytes_per_sample == 4, f.bytes_per_sample
+
+        assert f.from_json('{"sample_rate": 8000, "sample_format": "s16le"}')
+        assert f.sample_rate == 8000, f.sample_rate
+        assert f.sample_format == "s16le", f.sample_format
+        assert f.bytes_per_sample == 2, f.bytes_per_sample
+
+        assert not f.from_json('{"sample_format": "u8"}')
+        assert not f.from_json("Done")
+        assert f.sample_rate == 8000, f.sample_rate
+        assert f.sample_format == "s16le", f.sample_format
+        print(f)
+
+    def test_convert_s16le(self):
+        samples = torch.tensor([0, 16384, -32768], dtype=torch.int16)
+        f = sherpa.AudioFormat(sample_format="s16le")
+
+        t = f.convert(samples.numpy().tobytes())
+        assert t.dtype == torch.float32, t.dtype
+        assert torch.allclose(t, torch.tensor([0, 0.5, -1])), t
+
+    def test_convert_f32le(self):
+        samples = torch.rand(10)
+        f = sherpa.AudioFormat()
+
+        t = f.convert(samples.numpy().tobytes())
+        assert torch.equal(t, samples), (t, samples)
+
+    def test_invalid_sample_format(self):
+        with self.assertRaises(ValueError):
+            sherpa.AudioFormat(sample_format="u8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_batch_scheduler_py
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import sherpa
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_full_batch_is_dispatched_without_waiting(self):
+        batches = []
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=batches.append,
+                executor=executor,
+                max_batch_size=4,
+                max_wait_ms=10 * 1000,
+            )
+            task = asyncio.create_task(scheduler.run())
+
+            start = time.time()
+            await asyncio.gather(*[scheduler.submit(i) for i in range(4)])
+            elapsed = time.time() - start
+
+            task.cancel()
+            executor.shutdown()
+            return elapsed, scheduler.stats
+
+        elapsed, stats = asyncio.run(main())
+        assert elapsed < 5, elapsed
+        assert batches == [[0, 1, 2, 3]], batches
+        assert stats.num_batches == 1, stats
+        assert stats.batch_fill_ratio == 1, stats
+
+    def test_partial_batch_after_deadline(self):
+        batches = []
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=batches.append,
+                executor=executor,
+                max_batch_size=10,
+                max_wait_ms=20,
+            )
+            task = asyncio.create_task(scheduler.run())
+            await asyncio.gather(scheduler.submit("a"), scheduler.submit("b"))
+
+            task.cancel()
+            executor.shutdown()
+            return scheduler.stats
+
+        stats = asyncio.run(main())
+        assert batches == [["a", "b"]], batches
+        assert stats.batch_fill_ratio == 0.2, stats
+        assert stats.max_queue_wait >= 0.015, stats
+
+    def test_multiple_batches_in_flight(self):
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=2)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: time.sleep(0.2),
+                executor=executor,
+                max_batch_size=1,
+                max_wait_ms=0,
+                max_in_flight=2,
+            )
+            task = asyncio.create_task(scheduler.run())
+
+            start = time.time()
+            await asyncio.gather(scheduler.submit(0), scheduler.submit(1))
+            elapsed = time.time() - start
+
+            task.cancel()
+            executor.shutdown()
+            return elapsed
+
+        elapsed = asyncio.run(main())
+        # The two batches run in parallel
+        assert elapsed < 0.35, elapsed
+
+    def test_results_and_on_dispatch(self):
+        dispatched = []
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=lambda batch: [i * 10 for i in batch],
+                executor=executor,
+                max_batch_size=3,
+                max_wait_ms=10 * 1000,
+                on_dispatch=dispatched.append,
+            )
+            task = asyncio.create_task(scheduler.run())
+            results = await asyncio.gather(
+                *[scheduler.submit(i) for i in range(3)]
+            )
+
+            task.cancel()
+            executor.shutdown()
+            return results
+
+        results = asyncio.run(main())
+        assert results == [0, 10, 20], results
+        assert len(dispatched) == 1, dispatched
+        assert len(dispatched[0]) == 3, dispatched
+
+    def test_exception(self):
+        def process_batch(batch):
+            raise ValueError("bad batch")
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BatchScheduler(
+                process_batch=process_batch,
+                executor=executor,
+                max_batch_size=2,
+                max_wait_ms=1,
+            )
+            task = asyncio.create_task(scheduler.run())
+            try:
+                await scheduler.submit(0)
+            finally:
+                task.cancel()
+                executor.shutdown()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+
+
+class TestBucketBatchScheduler(unittest.TestCase):
+    def test_items_of_similar_lengths_are_batched(self):
+        batches = []
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BucketBatchScheduler(
+                process_batch=batches.append,
+                executor=executor,
+                bucket_boundaries=[100, 1000],
+                max_frames_per_batch=10000,
+                max_wait_ms=20,
+            )
+            task = asyncio.create_task(scheduler.run())
+            await asyncio.gather(
+                scheduler.submit("a", 50),
+                scheduler.submit("b", 3000),
+                scheduler.submit("c", 80),
+                scheduler.submit("d", 500),
+                scheduler.submit("e", 2000),
+            )
+
+            task.cancel()
+            executor.shutdown()
+            return scheduler.stats
+
+        stats = asyncio.run(main())
+        assert sorted(batches) == [["a", "c"], ["b", "e"], ["d"]], batches
+        assert stats.num_frames == 5630, stats
+        assert stats.num_padded_frames == 80 * 2 + 3000 * 2 + 500, stats
+
+    def test_full_bucket_is_dispatched_without_waiting(self):
+        batches = []
+
+        async def main():
+            executor = ThreadPoolExecutor(max_workers=1)
+            scheduler = sherpa.BucketBatchScheduler(
+                process_batch=batches.append,
+                executor=executor,
+                bucket_boundaries=[1000],
+                max_frames_per_batch=2000,
+                max_wait_ms=10 * 1000,
+            )
+            task = asyncio.create_task(scheduler.run())
+
+            start = time.time()
+            await asyncio.gather(
+                scheduler.submit(0, 1000),
+                scheduler.submit(1, 900),
+                scheduler.submit(2, 800),
+                scheduler.submit(3, 700),
+            )
+            elapsed = time.time() - start
+
+            task.cancel()
+            executor.shutdown()
+            return elapsed
+
+        elapsed = asyncio.run(main())
+        assert elapsed < 5, elapsed
+        # 1000 * 3 > 2000, so there are 2 items in a batch
+        assert batches == [[0, 1], [2, 3]], batches
+
+
+if __name__ == "__main__":
+    unittest.main()
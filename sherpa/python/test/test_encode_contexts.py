@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_encode_contexts_py
+
+import unittest
+
+import sherpa
+
+
+class TestEncodeContexts(unittest.TestCase):
+    def test_char(self):
+        tokens_table = {"<unk>": 0, "你": 1, "好": 2}
+        ans = sherpa.encode_contexts(
+            modeling_unit="char",
+            contexts=["你好", "好人"],
+            tokens_table=tokens_table,
+        )
+        assert ans == [[1, 2], [2, 0]], ans
+
+    def test_cache(self):
+        tokens_table = {"<unk>": 0, "A": 1, "B": 2}
+        a = sherpa.encode_contexts(
+            modeling_unit="char",
+            contexts=["AB", "BA"],
+            tokens_table=tokens_table,
+        )
+
+        # Modifying the result does not change the cached one
+        a[0].append(100)
+
+        b = sherpa.encode_contexts(
+            modeling_unit="char",
+            contexts=["AB", "BA"],
+            tokens_table=tokens_table,
+        )
+        assert b == [[1, 2], [2, 1]], b
+
+        # A different table is not served from the cache
+        c = sherpa.encode_contexts(
+            modeling_unit="char",
+            contexts=["AB", "BA"],
+            tokens_table={"<unk>": 0, "A": 3, "B": 4},
+        )
+        assert c == [[3, 4], [4, 3]], c
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_event_loop_monitor_py
+
+import asyncio
+import time
+import unittest
+
+import sherpa
+
+
+class TestEventLoopLagMonitor(unittest.TestCase):
+    def test_blocking_call_is_detected(self):
+        async def main():
+            monitor = sherpa.EventLoopLagMonitor(interval_ms=10)
+            task = asyncio.create_task(monitor.run())
+
+            await asyncio.sleep(0.05)
+            # It blocks the event loop
+            time.sleep(0.2)
+            await asyncio.sleep(0.05)
+
+            task.cancel()
+            return monitor
+
+        monitor = asyncio.run(main())
+        print()
+        print(monitor)
+        assert monitor.max_lag >= 0.15, monitor
+        assert monitor.percentile_ms(100) >= 150, monitor
+        assert monitor.percentile_ms(50) < 150, monitor
+
+    def test_empty(self):
+        monitor = sherpa.EventLoopLagMonitor()
+        assert monitor.percentile_ms(99) == 0, monitor
+
+
+if __name__ == "__main__":
+    unittest.main()
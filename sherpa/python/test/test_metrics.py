@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_metrics_py
+
+import unittest
+
+import sherpa
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        h = sherpa.Histogram("latency_seconds", "Latency.", [0.1, 1])
+        for v in [0.05, 0.1, 0.5, 2]:
+            h.observe(v)
+
+        lines = h.render()
+        print()
+        print("\n".join(lines))
+        assert lines[0] == "# HELP latency_seconds Latency.", lines
+        assert lines[1] == "# TYPE latency_seconds histogram", lines
+        assert 'latency_seconds_bucket{le="0.1"} 2' in lines, lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines, lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines, lines
+        assert "latency_seconds_sum 2.65" in lines, lines
+        assert "latency_seconds_count 4" in lines, lines
+        assert h.count == 4, h.count
+
+    def test_gauge(self):
+        value = [1]
+        metrics = sherpa.Metrics()
+        metrics.gauge("active_streams", "Active streams.", lambda: value[0])
+        value[0] = 3
+
+        s = metrics.render()
+        assert "# TYPE active_streams gauge\n" in s, s
+        assert "active_streams 3\n" in s, s
+
+    def test_server_metrics(self):
+        metrics = sherpa.ServerMetrics(num_active_streams=lambda: 2)
+        metrics.observe_dispatch([0.001, 0.002, 0.003])
+
+        s = metrics.render()
+        assert "sherpa_batch_size_count 1\n" in s, s
+        assert "sherpa_queue_wait_seconds_count 3\n" in s, s
+        assert "sherpa_active_streams 2\n" in s, s
+        assert "sherpa_resident_memory_bytes " in s, s
+
+
+if __name__ == "__main__":
+    unittest.main()
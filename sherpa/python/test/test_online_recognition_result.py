@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_online_recognition_result_py
+
+import json
+import unittest
+
+import sherpa
+
+
+def make_result(tokens, segment=0, is_final=False):
+    r = sherpa.OnlineRecognitionResult()
+    r.tokens = tokens
+    r.text = "".join(tokens)
+    r.timestamps = [0.04 * i for i in range(len(tokens))]
+    r.segment = segment
+    r.is_final = is_final
+    return r
+
+
+class TestOnlineRecognitionResult(unittest.TestCase):
+    def test_delta_contains_appended_tokens(self):
+        prev = make_result(["HE", "LL"])
+        r = make_result(["HE", "LL", "O"])
+
+        d = json.loads(r.as_json_string(prev))
+        assert d["token_start"] == 2, d
+        assert d["tokens"] == ["O"], d
+        assert len(d["timestamps"]) == 1, d
+        assert d["text_start"] == 4, d
+        assert d["text"] == "O", d
+
+    def test_delta_with_changed_tokens(self):
+        prev = make_result(["HE", "LL", "O"])
+        r = make_result(["HE", "L", "P"])
+
+        d = json.loads(r.as_json_string(prev))
+        assert d["token_start"] == 1, d
+        assert d["tokens"] == ["L", "P"], d
+        assert d["text_start"] == 3, d
+        assert d["text"] == "P", d
+
+    def test_delta_counts_characters(self):
+        prev = make_result(["你", "好"])
+        r = make_result(["你", "们"])
+
+        d = json.loads(r.as_json_string(prev))
+        assert d["text_start"] == 1, d
+        assert d["text"] == "们", d
+
+    def test_new_segment_keeps_nothing(self):
+        prev = make_result(["HE", "LL", "O"], segment=0, is_final=True)
+        r = make_result(["HE"], segment=1)
+
+        d = json.loads(r.as_json_string(prev))
+        assert d["token_start"] == 0, d
+        assert d["text_start"] == 0, d
+        assert d["tokens"] == ["HE"], d
+        assert d["segment"] == 1, d
+
+    def test_eq(self):
+        assert make_result(["A"]) == make_result(["A"])
+        assert make_result(["A"]) != make_result(["A", "B"])
+        assert make_result(["A"]) != make_result(["A"], is_final=True)
+
+    def test_msgpack(self):
+        prev = make_result(["HE"])
+        r = make_result(["HE", "LL"])
+        b = r.as_msgpack(prev)
+        assert isinstance(b, bytes), type(b)
+        assert len(b) < len(r.as_json_string(prev)), b
+
+
+if __name__ == "__main__":
+    unittest.main()
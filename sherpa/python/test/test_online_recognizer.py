@@ -4,6 +4,7 @@
 #
 #  ctest --verbose -R  test_online_recognizer_py
 
+import time
 import unittest
 import wave
 from pathlib import Path
@@ -18,10 +19,15 @@ def decode(
     recognizer: sherpa.OnlineRecognizer,
     s: sherpa.OnlineStream,
     samples: torch.Tensor,
+    tail_padding_length: float = 0.3,
 ):
+    """Return the final result, the number of chunks decoded after
+    input_finished() and the time in seconds spent decoding them."""
     expected_sample_rate = 16000
 
-    tail_padding = torch.zeros(int(16000 * 0.3), dtype=torch.float32)
+    tail_padding = torch.zeros(
+        int(16000 * tail_padding_length), dtype=torch.float32
+    )
 
     chunk = int(0.2 * expected_sample_rate)  # 0.2 seconds
 
@@ -39,16 +45,21 @@ def decode(
                 last_result = result
                 print(result)
 
+    start = time.time()
     s.accept_waveform(expected_sample_rate, tail_padding)
     s.input_finished()
 
+    num_chunks = 0
     while recognizer.is_ready(s):
         recognizer.decode_stream(s)
+        num_chunks += 1
         result = recognizer.get_result(s).text
         if last_result != result:
             last_result = result
             print(result)
 
+    return last_result, num_chunks, time.time() - start
+
 
 d = "/tmp/icefall-models"
 # Please refer to
@@ -922,6 +933,66 @@ class TestOnlineRecognizer(unittest.TestCase):
 
         decode(recognizer=recognizer, s=s, samples=samples)
 
+    def test_flush_without_tail_padding(self):
+        nn_model = f"{d}/icefall_librispeech_streaming_pruned_transducer_stateless4_20220625/exp/cpu_jit-epoch-25-avg-3.pt"
+        tokens = f"{d}/icefall_librispeech_streaming_pruned_transducer_stateless4_20220625/data/lang_bpe_500/tokens.txt"
+        wave = f"{d}/icefall_librispeech_streaming_pruned_transducer_stateless4_20220625/test_waves/1089-134686-0001.wav"
+
+        if not Path(nn_model).is_file():
+            print(f"{nn_model} does not exist")
+            print("skipping test_flush_without_tail_padding()")
+            return
+
+        feat_config = sherpa.FeatureConfig()
+        expected_sample_rate = 16000
+
+        samples, sample_rate = torchaudio.load(wave)
+        assert sample_rate == expected_sample_rate, (
+            sample_rate,
+            expected_sample_rate,
+        )
+        samples = samples.squeeze(0)
+
+        feat_config.fbank_opts.frame_opts.samp_freq = expected_sample_rate
+        feat_config.fbank_opts.mel_opts.num_bins = 80
+        feat_config.fbank_opts.mel_opts.high_freq = -400
+        feat_config.fbank_opts.frame_opts.dither = 0
+
+        config = sherpa.OnlineRecognizerConfig(
+            nn_model=nn_model,
+            tokens=tokens,
+            use_gpu=False,
+            feat_config=feat_config,
+            decoding_method="greedy_search",
+            left_context=64,
+            right_context=0,
+            chunk_size=12,
+        )
+
+        recognizer = sherpa.OnlineRecognizer(config)
+
+        # The remaining frames are decoded without tail padding
+        text, num_chunks, elapsed = decode(
+            recognizer=recognizer,
+            s=recognizer.create_stream(),
+            samples=samples,
+            tail_padding_length=0,
+        )
+
+        padded_text, padded_num_chunks, padded_elapsed = decode(
+            recognizer=recognizer,
+            s=recognizer.create_stream(),
+            samples=samples,
+            tail_padding_length=1.0,
+        )
+        print(f"Without tail padding: {num_chunks} chunks, {elapsed:.3f} s")
+        print(f"1 s tail padding: {padded_num_chunks} chunks, ", end="")
+        print(f"{padded_elapsed:.3f} s")
+
+        assert num_chunks > 0, num_chunks
+        assert num_chunks < padded_num_chunks, (num_chunks, padded_num_chunks)
+        assert text.split() == padded_text.split(), (text, padded_text)
+
 
 torch.set_num_threads(1)
 torch.set_num_interop_threads(1)
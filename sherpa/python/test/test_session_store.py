@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_session_store_py
+
+import os
+import tempfile
+import unittest
+
+import sherpa
+
+
+class TestSessionStore(unittest.TestCase):
+    def test_put_and_pop(self):
+        store = sherpa.SessionStore(capacity=100)
+        assert store.put("a", b"hello")
+        assert store.put("b", b"world!")
+        assert "a" in store, "a"
+        assert len(store) == 2, len(store)
+        assert store.used == 11, store.used
+
+        assert store.pop("b") == b"world!"
+        assert "b" not in store, "b"
+        assert store.used == 5, store.used
+
+        with self.assertRaises(KeyError):
+            store.pop("b")
+
+        store.close()
+
+    def test_full(self):
+        store = sherpa.SessionStore(capacity=10)
+        assert store.put(0, b"x" * 6)
+        assert not store.put(1, b"y" * 6)
+        assert 1 not in store, 1
+
+        store.discard(0)
+        assert store.put(1, b"y" * 6)
+        store.close()
+
+    def test_free_extents_are_merged(self):
+        store = sherpa.SessionStore(capacity=30)
+        for i in range(3):
+            assert store.put(i, bytes([i]) * 10)
+
+        # Free the first and the last, then the middle one. The three
+        # extents are merged so that the whole file can be used again.
+        store.discard(0)
+        store.discard(2)
+        assert not store.put(3, b"z" * 20)
+        store.discard(1)
+        assert store.put(3, b"z" * 30)
+        assert store.pop(3) == b"z" * 30
+        store.close()
+
+    def test_filename(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "sessions.bin")
+            store = sherpa.SessionStore(capacity=1024, filename=filename)
+            assert os.path.getsize(filename) == 1024
+            assert store.put("a", b"abc")
+            assert store.pop("a") == b"abc"
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_vad_asr_pipeline_py
+
+import unittest
+
+import sherpa
+
+
+class TestVadAsrPipeline(unittest.TestCase):
+    def test_config(self):
+        config = sherpa.VadAsrPipelineConfig(max_batch_size=4)
+        assert config.max_batch_size == 4, config
+        assert config.validate(), config
+        print()
+        print(config)
+
+        config.max_batch_size = 0
+        assert not config.validate(), config
+
+    def test_get_batches(self):
+        num_samples = [10, 50, 20, 40, 30]
+        batches = sherpa.VadAsrPipeline.get_batches(
+            num_samples, max_batch_size=2, max_batch_samples=1000
+        )
+        # From the longest to the shortest
+        assert batches == [[1, 3], [4, 2], [0]], batches
+
+        batches = sherpa.VadAsrPipeline.get_batches(
+            num_samples, max_batch_size=10, max_batch_samples=90
+        )
+        # 50 * 2 > 90, so the longest segment is in a batch of its own
+        assert batches == [[1], [3, 4], [2, 0]], batches
+
+
+if __name__ == "__main__":
+    unittest.main()
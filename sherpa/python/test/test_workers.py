@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# To run this single test, use
+#
+#  ctest --verbose -R  test_workers_py
+
+import os
+import socket
+import sys
+import unittest
+
+import sherpa
+
+
+def acquire_and_die(worker_id, counter, n):
+    """Acquire n connections and exit without releasing them."""
+    for _ in range(n):
+        assert counter.try_acquire()
+    os._exit(1)
+
+
+class TestConnectionCounter(unittest.TestCase):
+    def test_try_acquire_and_release(self):
+        counter = sherpa.ConnectionCounter(max_value=2)
+        assert counter.try_acquire()
+        assert counter.try_acquire()
+        assert not counter.try_acquire()
+        assert counter.value == 2, counter
+
+        counter.release()
+        assert counter.value == 1, counter
+        assert counter.try_acquire()
+        assert str(counter) == "2/2", str(counter)
+
+    def test_release_worker(self):
+        counter = sherpa.ConnectionCounter(max_value=10, num_workers=2)
+        counter.worker_id = 0
+        assert counter.try_acquire()
+
+        counter.worker_id = 1
+        assert counter.try_acquire()
+        assert counter.try_acquire()
+        assert counter.value == 3, counter
+
+        assert counter.release_worker(1) == 2
+        assert counter.value == 1, counter
+        assert counter.release_worker(1) == 0
+
+    @unittest.skipIf(sys.platform == "win32", "fork is not available")
+    def test_dead_worker_releases_connections(self):
+        counter = sherpa.ConnectionCounter(max_value=5, num_workers=2)
+        sherpa.run_workers(
+            2,
+            target=acquire_and_die,
+            args=(counter, 2),
+            connection_counter=counter,
+        )
+        assert counter.value == 0, counter
+
+
+class TestCreateListeningSocket(unittest.TestCase):
+    def test_accept(self):
+        sock = sherpa.create_listening_socket(port=0)
+        assert not sock.getblocking()
+
+        port = sock.getsockname()[1]
+        assert port > 0, port
+
+        client = socket.create_connection(("localhost", port), timeout=5)
+        sock.setblocking(True)
+        sock.settimeout(5)
+        conn, _ = sock.accept()
+
+        client.sendall(b"hello")
+        assert conn.recv(5) == b"hello"
+
+        conn.close()
+        client.close()
+        sock.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
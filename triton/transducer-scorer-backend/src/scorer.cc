@@ -1,5 +1,8 @@
 // Copyright 2022, NVIDIA CORPORATION & AFFILIATES. All rights reserved.
 
+#include <algorithm>
+#include <numeric>
+
 #include "bls.h"
 #include "scorer_utils.h"
 #include "symbol-table.h"
@@ -21,6 +24,11 @@ struct ModelParams {
   std::string decoding_method;
   std::string tokenizer_file;
   int context_size;
+  // Used only for greedy_search. If positive, the joiner is evaluated for
+  // up to this number of frames in one call, assuming that no utterance
+  // emits a token. Note that the max_batch_size of the joiner must be at
+  // least speculative_frames times that of the scorer.
+  int speculative_frames = 0;
 };
 
 /////////////
@@ -108,6 +116,13 @@ TRITONSERVER_Error* ModelState::ValidateModelConfig() {
       ReadParameter(params, "tokenizer_file", &(model_params_.tokenizer_file)));
   RETURN_IF_ERROR(ReadParameter(params, "decoding_method",
                                 &(model_params_.decoding_method)));
+
+  // Optional
+  common::TritonJson::Value speculative_frames;
+  if (params.Find("speculative_frames", &speculative_frames)) {
+    RETURN_IF_ERROR(ReadParameter(params, "speculative_frames",
+                                  &(model_params_.speculative_frames)));
+  }
   return nullptr;  // success
 }
 
@@ -177,6 +192,10 @@ class ModelInstanceState : public BackendModelInstance {
                                              void* cuda_event);
   std::vector<std::vector<int32_t>> Search(
       std::vector<torch::jit::IValue>* input_tensors);
+  void SpeculativeSearch(
+      const torch::nn::utils::rnn::PackedSequence& packed_seq,
+      torch::Tensor decoder_out, torch::Tensor decoder_input,
+      std::vector<std::vector<int32_t>>* results);
 
   ModelState* model_state_;
   BLSExecutor bls_executor_;
@@ -541,54 +560,59 @@ std::vector<std::vector<int32_t>> ModelInstanceState::Search(
   std::vector<const char*> joiner_output_name{"logit"};
 
   using torch::indexing::Slice;
-  auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
-
-  int32_t max_T = packed_seq.batch_sizes().numel();
-
-  int32_t offset = 0;
-  for (int32_t t = 0; t != max_T; ++t) {
-    int32_t cur_batch_size = batch_sizes_accessor[t];
-    int32_t start = offset;
-    int32_t end = start + cur_batch_size;
-    auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
-    // Now cur_encoder_out is of shape (cur_batch_size, joiner_dim)
-    offset = end;
+  if (model_state_->Parameters()->speculative_frames > 0) {
+    SpeculativeSearch(packed_seq, decoder_out, decoder_input, &results);
+  } else {
+    auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
 
-    if (cur_batch_size < decoder_out.size(0)) {
-      decoder_out = decoder_out.index({Slice(0, cur_batch_size)});
-    }
-    std::vector<torch::Tensor> joiner_input_tensors{
-        cur_encoder_out, decoder_out.squeeze(1).to(device_)};
+    int32_t max_T = packed_seq.batch_sizes().numel();
 
-    auto logits = bls_executor_.Execute(joiner_input_tensors, joiner_input_name,
-                                        joiner_output_name, joiner_name);
+    int32_t offset = 0;
+    for (int32_t t = 0; t != max_T; ++t) {
+      int32_t cur_batch_size = batch_sizes_accessor[t];
+      int32_t start = offset;
+      int32_t end = start + cur_batch_size;
+      auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
+      // Now cur_encoder_out is of shape (cur_batch_size, joiner_dim)
+      offset = end;
 
-    // logits' shape is (cur_batch_size, vocab_size)
-    // logits is the output of nn.Linear. Since we are using greedy search
-    // and only the magnitude matters, we don't invoke log_softmax here
-    auto max_indices = logits.argmax(/*dim*/ -1).cpu();
-    auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
-    bool emitted = false;
-    for (int32_t k = 0; k != cur_batch_size; ++k) {
-      auto index = max_indices_accessor[k];
-      if (index != blank_id) {
-        emitted = true;
-        results[k].push_back(index);
-        // TODO: add timestamps here
-        // results[k].tokens.push_back(index);
-        // results[k].timestamps.push_back(t);
+      if (cur_batch_size < decoder_out.size(0)) {
+        decoder_out = decoder_out.index({Slice(0, cur_batch_size)});
+      }
+      std::vector<torch::Tensor> joiner_input_tensors{
+          cur_encoder_out, decoder_out.squeeze(1).to(device_)};
+
+      auto logits =
+          bls_executor_.Execute(joiner_input_tensors, joiner_input_name,
+                                joiner_output_name, joiner_name);
+
+      // logits' shape is (cur_batch_size, vocab_size)
+      // logits is the output of nn.Linear. Since we are using greedy search
+      // and only the magnitude matters, we don't invoke log_softmax here
+      auto max_indices = logits.argmax(/*dim*/ -1).cpu();
+      auto max_indices_accessor = max_indices.accessor<int64_t, 1>();
+      bool emitted = false;
+      for (int32_t k = 0; k != cur_batch_size; ++k) {
+        auto index = max_indices_accessor[k];
+        if (index != blank_id) {
+          emitted = true;
+          results[k].push_back(index);
+          // TODO: add timestamps here
+          // results[k].tokens.push_back(index);
+          // results[k].timestamps.push_back(t);
+        }
       }
-    }
 
-    if (emitted) {
-      BuildDecoderInput(results, &decoder_input);
-      std::vector<torch::Tensor> decoder_input_tensors{
-          decoder_input.to(device_)};
-      decoder_out =
-          bls_executor_.Execute(decoder_input_tensors, decoder_input_name,
-                                decoder_output_name, decoder_name);
-    }
-  }  // for (int32_t t = 0; t != max_T; ++t) {
+      if (emitted) {
+        BuildDecoderInput(results, &decoder_input);
+        std::vector<torch::Tensor> decoder_input_tensors{
+            decoder_input.to(device_)};
+        decoder_out =
+            bls_executor_.Execute(decoder_input_tensors, decoder_input_name,
+                                  decoder_output_name, decoder_name);
+      }
+    }  // for (int32_t t = 0; t != max_T; ++t) {
+  }
 
   auto unsorted_indices = packed_seq.unsorted_indices().cpu();
   auto unsorted_indices_accessor = unsorted_indices.accessor<int64_t, 1>();
@@ -608,6 +632,132 @@ std::vector<std::vector<int32_t>> ModelInstanceState::Search(
   return ans;
 }
 
+void ModelInstanceState::SpeculativeSearch(
+    const torch::nn::utils::rnn::PackedSequence& packed_seq,
+    torch::Tensor decoder_out, torch::Tensor decoder_input,
+    std::vector<std::vector<int32_t>>* results) {
+  using torch::indexing::Slice;
+
+  int32_t blank_id = 0;  // hard-code for now
+  int32_t speculative_frames = model_state_->Parameters()->speculative_frames;
+
+  std::string decoder_name = "decoder";
+  std::vector<const char*> decoder_input_name{"y"};
+  std::vector<const char*> decoder_output_name{"decoder_out"};
+
+  std::string joiner_name = "joiner";
+  std::vector<const char*> joiner_input_name{"encoder_out", "decoder_out"};
+  std::vector<const char*> joiner_output_name{"logit"};
+
+  auto batch_sizes_accessor = packed_seq.batch_sizes().accessor<int64_t, 1>();
+  int32_t max_T = packed_seq.batch_sizes().numel();
+
+  // Rows [offsets[t], offsets[t+1]) of packed_seq.data() are for frame t
+  std::vector<int32_t> offsets(max_T + 1, 0);
+  for (int32_t t = 0; t != max_T; ++t) {
+    offsets[t + 1] = offsets[t] + batch_sizes_accessor[t];
+  }
+
+  auto is_token = [blank_id](int64_t i) { return i != blank_id; };
+  auto is_unclear = [](bool clear) { return !clear; };
+
+  int32_t t = 0;
+  while (t < max_T) {
+    // Evaluate the joiner for frames [t, end_t) with the current
+    // decoder_out, assuming that no utterance emits a token in them
+    int32_t end_t = std::min(t + speculative_frames, max_T);
+    int32_t start = offsets[t];
+    int32_t end = offsets[end_t];
+
+    std::vector<int64_t> stream_index(end - start);
+    for (int32_t u = t; u != end_t; ++u) {
+      auto begin = stream_index.begin() + (offsets[u] - start);
+      std::iota(begin, begin + batch_sizes_accessor[u], 0);
+    }
+
+    auto cur_encoder_out = packed_seq.data().index({Slice(start, end)});
+    // Now cur_encoder_out is of shape (end - start, joiner_dim)
+
+    auto cur_decoder_out = decoder_out.squeeze(1).to(device_).index_select(
+        0, torch::tensor(stream_index, torch::kLong).to(device_));
+
+    std::vector<torch::Tensor> joiner_input_tensors{cur_encoder_out,
+                                                    cur_decoder_out};
+
+    auto logits = bls_executor_.Execute(joiner_input_tensors, joiner_input_name,
+                                        joiner_output_name, joiner_name);
+    // logits' shape is (end - start, vocab_size)
+
+    auto max_indices = logits.argmax(/*dim*/ -1).cpu();
+    const int64_t* p = max_indices.data_ptr<int64_t>();
+
+    auto is_clear = IsArgmaxClear(logits);
+    const bool* c = is_clear.data_ptr<bool>();
+
+    // Find the first frame at which any utterance emits a token or has a
+    // near-tie. The earlier frames are blank for all utterances, with
+    // margins larger than the rounding errors of the joiner.
+    int32_t u = t;
+    for (; u != end_t; ++u) {
+      const int64_t* q = p + (offsets[u] - start);
+      const bool* d = c + (offsets[u] - start);
+      if (std::any_of(q, q + batch_sizes_accessor[u], is_token) ||
+          std::any_of(d, d + batch_sizes_accessor[u], is_unclear)) {
+        break;
+      }
+    }
+
+    if (u == end_t) {
+      t = end_t;
+      continue;
+    }
+
+    const bool* d = c + (offsets[u] - start);
+    if (std::any_of(d, d + batch_sizes_accessor[u], is_unclear)) {
+      // Evaluate frame u with the same joiner call as the frame-by-frame
+      // search, so that its near-ties are broken in the same way
+      int32_t cur_batch_size = batch_sizes_accessor[u];
+      auto frame_encoder_out =
+          packed_seq.data().index({Slice(offsets[u], offsets[u + 1])});
+      auto frame_decoder_out = decoder_out.index({Slice(0, cur_batch_size)});
+
+      std::vector<torch::Tensor> frame_input_tensors{
+          frame_encoder_out, frame_decoder_out.squeeze(1).to(device_)};
+      logits = bls_executor_.Execute(frame_input_tensors, joiner_input_name,
+                                     joiner_output_name, joiner_name);
+      max_indices = logits.argmax(/*dim*/ -1).cpu();
+      p = max_indices.data_ptr<int64_t>();
+
+      const int64_t* q = p;
+      if (!std::any_of(q, q + cur_batch_size, is_token)) {
+        t = u + 1;
+        continue;
+      }
+
+      for (int32_t k = 0; k != cur_batch_size; ++k) {
+        if (q[k] != blank_id) {
+          (*results)[k].push_back(q[k]);
+        }
+      }
+    } else {
+      const int64_t* q = p + (offsets[u] - start);
+      for (int32_t k = 0; k != batch_sizes_accessor[u]; ++k) {
+        if (q[k] != blank_id) {
+          (*results)[k].push_back(q[k]);
+        }
+      }
+    }
+
+    BuildDecoderInput(*results, &decoder_input);
+    std::vector<torch::Tensor> decoder_input_tensors{decoder_input.to(device_)};
+    decoder_out =
+        bls_executor_.Execute(decoder_input_tensors, decoder_input_name,
+                              decoder_output_name, decoder_name);
+
+    t = u + 1;
+  }
+}
+
 TRITONSERVER_Error* ModelInstanceState::SetInputTensors(
     size_t total_batch_size, TRITONBACKEND_Request** requests,
     const uint32_t request_count,
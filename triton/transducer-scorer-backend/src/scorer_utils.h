@@ -3,6 +3,9 @@
 
 #include <triton/core/tritonserver.h>
 
+#include <limits>
+#include <tuple>
+
 #include "symbol-table.h"
 #include "torch/script.h"
 
@@ -35,6 +38,29 @@ static void BuildDecoderInput(const std::vector<std::vector<int32_t>>& r,
   }
 }
 
+// Return a 1-D bool tensor on CPU. Entry i is true if the largest logit of
+// row i exceeds the second largest one by more than the rounding errors
+// that a different batch size of the joiner may cause. It is false for
+// ties and near-ties. See also sherpa/csrc/speculative-joiner.h
+static torch::Tensor IsArgmaxClear(torch::Tensor logits) {
+  constexpr int32_t kJoinerRoundingUlps = 256;
+
+  double eps = std::numeric_limits<double>::epsilon();
+  if (logits.scalar_type() == torch::kHalf) {
+    eps = 9.765625e-4;  // 2^-10
+  } else if (logits.scalar_type() == torch::kBFloat16) {
+    eps = 7.8125e-3;  // 2^-7
+  } else if (logits.scalar_type() == torch::kFloat) {
+    eps = std::numeric_limits<float>::epsilon();
+  }
+
+  auto top2 = std::get<0>(logits.topk(2, /*dim*/ -1)).to(torch::kDouble);
+  auto top1 = top2.select(1, 0);
+  auto margin = top1 - top2.select(1, 1);
+  auto tolerance = top1.abs().clamp_min(1) * (kJoinerRoundingUlps * eps);
+  return (margin > tolerance).cpu();
+}
+
 std::pair<bool, torch::ScalarType> ConvertDataTypeToTorchType(
     const TRITONSERVER_DataType dtype) {
   torch::ScalarType type = torch::kInt;